@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+消息分类热路径微基准
+同一套分类代码分别挂接逐个 `kw in message` 子串扫描（改造前）与共享关键词自动机 + 缓存（改造后）
+覆盖 SmartModelRouter._classify_task/_analyze_complexity、FirstTurnRouter 转人工/业务查询、
+IntentClassifier.classify_detailed
+
+用法：
+    python benchmark_classification.py [--rounds 2000]
+"""
+import argparse
+import logging
+import time
+
+from modules.ai_gateway.first_turn_router import FirstTurnRouter
+from modules.ai_gateway.smart_router import SmartModelRouter
+from modules.conversation_context.context_manager import IntentClassifier
+
+logging.disable(logging.CRITICAL)
+
+MESSAGES = [
+    '你好',
+    '充电桩多少钱？',
+    '充电桩怎么安装？需要什么条件吗',
+    '我的订单 20240101000123 什么时候发货，物流到哪了',
+    '如果充电桩红灯亮且有异响，可能是什么原因？应该如何排查？请详细分析并给出建议',
+    '帮我总结一下7kW和11kW两款交流桩的区别和优势',
+    '发票什么时候能开？金额是 ¥1998.00',
+    '库存还有现货吗，明天能发吗',
+    '我要投诉，转人工客服',
+    '家里是老小区，物业不让装，有没有别的办法，能不能用便携式的，功率够不够用',
+]
+
+
+# ==================== 改造前：逐个子串扫描 ====================
+
+class SubstringMatcher:
+    """改造前的匹配方式：用到哪个分组就对该分组逐个 `kw in message`，不缓存"""
+
+    def __init__(self, groups):
+        self.groups = groups
+
+    def count(self, text):
+        return _LazyCounts(self.groups, text)
+
+
+class _LazyCounts:
+    def __init__(self, groups, text):
+        self.groups = groups
+        self.text = text
+
+    def __getitem__(self, name):
+        return sum(1 for kw in self.groups[name] if kw in self.text)
+
+
+def pipeline(message: str, router: SmartModelRouter, first_turn: FirstTurnRouter,
+             intent: IntentClassifier) -> None:
+    """同一条消息依次经过三个分类层"""
+    router._classify_task(message)
+    router._analyze_complexity(message)
+
+    hits = first_turn.keyword_matcher.count(message)
+    if not hits['transfer']:
+        for query_type, config in first_turn.business_patterns.items():
+            if hits[query_type] and config['pattern'].search(message):
+                break
+
+    intent.classify_detailed(message)
+
+
+def measure(pipeline, messages, rounds, *components, repeat: int = 5) -> float:
+    """返回每条消息平均耗时（微秒，取多次重复中的最小值）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for message in messages:
+                pipeline(message, *components)
+        best = min(best, time.perf_counter() - start)
+    return best / (rounds * len(messages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息分类热路径微基准")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    components = (SmartModelRouter(), FirstTurnRouter(), IntentClassifier())
+    legacy = (SmartModelRouter(), FirstTurnRouter(), IntentClassifier())
+    for component in legacy:
+        component.keyword_matcher = SubstringMatcher(component.keyword_matcher.groups)
+
+    # 冷路径：新消息（消息数远大于缓存容量，缓存不命中）
+    unique = [f"{message}{i}" for i in range(args.rounds) for message in MESSAGES]
+    legacy_cold = measure(pipeline, unique, 1, *legacy)
+    matcher_cold = measure(pipeline, unique, 1, *components)
+
+    # 热路径：重复消息（客服场景常见，命中缓存）
+    legacy_warm = measure(pipeline, MESSAGES, args.rounds, *legacy)
+    matcher_warm = measure(pipeline, MESSAGES, args.rounds, *components)
+
+    print("=" * 60)
+    print("📊 消息分类热路径（每条消息，三个分类层合计）")
+    print("=" * 60)
+    print(f"{'':12}{'子串扫描':>12}{'自动机':>12}{'加速':>10}")
+    print(f"{'新消息':12}{legacy_cold:>10.1f}µs{matcher_cold:>10.1f}µs{legacy_cold / matcher_cold:>9.1f}x")
+    print(f"{'重复消息':12}{legacy_warm:>10.1f}µs{matcher_warm:>10.1f}µs{legacy_warm / matcher_warm:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
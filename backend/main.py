@@ -138,6 +138,10 @@ async def lifespan(app: FastAPI):
         raise
     finally:
         logger.info("👋 服务正在关闭...")
+        from modules.embeddings.http_client import close_http_client
+        await close_http_client()
+        from modules.ai_gateway.providers.openai_compatible import close_shared_async_http_client
+        await close_shared_async_http_client()
 
 
 # 创建 FastAPI 应用
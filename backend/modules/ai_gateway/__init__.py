@@ -3,22 +3,39 @@ AI Gateway模块
 支持智能路由、多提供商、自动降级、首轮判断
 """
 from .gateway import AIGateway
-from .types import LLMRequest, LLMResponse, ProviderConfig
+from .types import LLMRequest, LLMResponse, LLMStreamChunk, ProviderConfig
+from .streaming import LLMStream
+from .response_cache import ResponseCache, CacheHit
+from .batch import BatchResult, RateLimiter
+from .prompt_budget import PromptBudget, PromptBudgeter
 
 # 智能路由器（可选）
 try:
     from .smart_router import SmartModelRouter
     from .first_turn_router import FirstTurnRouter, FirstTurnDecision
+    from .speculative import SpeculativeResponder, SpeculativeAnswer
     __all__ = [
         'AIGateway',
         'SmartModelRouter',
         'FirstTurnRouter',
         'FirstTurnDecision',
+        'SpeculativeResponder',
+        'SpeculativeAnswer',
         'LLMRequest',
         'LLMResponse',
-        'ProviderConfig'
+        'LLMStream',
+        'LLMStreamChunk',
+        'ProviderConfig',
+        'ResponseCache',
+        'CacheHit',
+        'BatchResult',
+        'RateLimiter',
+        'PromptBudget',
+        'PromptBudgeter'
     ]
 except ImportError:
-    __all__ = ['AIGateway', 'LLMRequest', 'LLMResponse', 'ProviderConfig']
+    __all__ = ['AIGateway', 'LLMRequest', 'LLMResponse', 'LLMStream', 'LLMStreamChunk', 'ProviderConfig',
+               'ResponseCache', 'CacheHit', 'BatchResult', 'RateLimiter',
+               'PromptBudget', 'PromptBudgeter']
 
 __version__ = '2.1.0'
\ No newline at end of file
@@ -1,10 +1,11 @@
 """
 AI 网关基类
 """
+import asyncio
 import logging
 from abc import ABC, abstractmethod
-from typing import Optional
-from .types import LLMRequest, LLMResponse, ProviderConfig
+from typing import AsyncIterator, Optional
+from .types import LLMRequest, LLMResponse, LLMStreamChunk, ProviderConfig
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +29,41 @@ class BaseLLMProvider(ABC):
         """
         pass
     
+    async def agenerate(self, request: LLMRequest) -> LLMResponse:
+        """
+        异步生成响应
+        默认实现把同步 generate 放到线程池（兼容路径），支持原生异步的提供商应覆盖
+        Args:
+            request: LLM 请求
+        Returns:
+            LLMResponse: 响应结果
+        """
+        return await asyncio.to_thread(self.generate, request)
+    
+    async def astream(self, request: LLMRequest) -> AsyncIterator[LLMStreamChunk]:
+        """
+        流式生成响应（逐段产出文本增量）
+        默认实现整段生成后一次性产出，支持流式的提供商应覆盖
+        Args:
+            request: LLM 请求
+        Raises:
+            Exception: 调用失败（首个片段之前抛出时网关可降级）
+        """
+        response = await self.agenerate(request)
+        if response.error or not response.content:
+            raise Exception(response.error or "空响应")
+        
+        yield LLMStreamChunk(
+            delta=response.content,
+            finish_reason=response.finish_reason,
+            token_in=response.token_in,
+            token_out=response.token_out
+        )
+    
+    def _get_default_system_prompt(self) -> Optional[str]:
+        """请求未指定系统指令时实际发送的系统指令（None 表示不发送），子类按各自的请求构造覆盖"""
+        return None
+    
     def is_available(self) -> bool:
         """检查提供商是否可用"""
         return self.config.enabled and bool(self.config.api_key)
@@ -0,0 +1,254 @@
+"""
+离线批量调用
+批量请求以有界并发执行，按提供商的 RPM/TPM 配额排队，结果按完成顺序流式返回；
+每完成一条写入检查点（JSONL），进程崩溃后用同一检查点重跑会跳过已完成的条目
+"""
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .types import LLMRequest, LLMResponse
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== 配额限制 ====================
+
+class RateLimiter:
+    """
+    提供商配额（每分钟请求数 / 每分钟 token 数）令牌桶
+
+    - 在线请求调用 consume：只记账不等待（可透支），保证在线延迟
+    - 批量请求调用 acquire：额度不足时等待，自动给在线流量让路
+    """
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        """
+        Args:
+            requests_per_minute: 每分钟请求数上限（None 表示不限）
+            tokens_per_minute: 每分钟 token 数上限（None 表示不限）
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._stats = {"requests": 0, "tokens": 0, "waits": 0, "wait_ms": 0}
+
+    def consume(self, tokens: int) -> None:
+        """记账一次请求（不等待）"""
+        self._refill()
+        self._debit(tokens)
+
+    async def acquire(self, tokens: int) -> None:
+        """等待配额足够后记账一次请求"""
+        start = time.monotonic()
+        waited = False
+        while True:
+            self._refill()
+            delay = self._wait_seconds(tokens)
+            if delay <= 0:
+                break
+            waited = True
+            await asyncio.sleep(delay)
+
+        if waited:
+            self._stats["waits"] += 1
+            self._stats["wait_ms"] += int((time.monotonic() - start) * 1000)
+        self._debit(tokens)
+
+    def adjust(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """用实际用量修正预估（多退少补）"""
+        if self.tokens_per_minute:
+            self._tokens -= actual_tokens - estimated_tokens
+        self._stats["tokens"] += actual_tokens - estimated_tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        """配额状态"""
+        self._refill()
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "available_requests": round(self._requests, 1) if self.requests_per_minute else None,
+            "available_tokens": int(self._tokens) if self.tokens_per_minute else None,
+            **self._stats
+        }
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self._requests + elapsed * self.requests_per_minute / 60, self.requests_per_minute)
+        if self.tokens_per_minute:
+            self._tokens = min(self._tokens + elapsed * self.tokens_per_minute / 60, self.tokens_per_minute)
+
+    def _wait_seconds(self, tokens: int) -> float:
+        """额度补足所需的秒数（超过桶容量的大请求只要求桶满）"""
+        delay = 0.0
+        if self.requests_per_minute and self._requests < 1:
+            delay = max(delay, (1 - self._requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute:
+            needed = min(tokens, self.tokens_per_minute)
+            if self._tokens < needed:
+                delay = max(delay, (needed - self._tokens) * 60 / self.tokens_per_minute)
+        return delay
+
+    def _debit(self, tokens: int) -> None:
+        if self.requests_per_minute:
+            self._requests -= 1
+        if self.tokens_per_minute:
+            self._tokens -= tokens
+        self._stats["requests"] += 1
+        self._stats["tokens"] += tokens
+
+
+# ==================== 批量任务 ====================
+
+@dataclass
+class BatchResult:
+    """批量任务中一条请求的结果"""
+    item_id: str
+    index: int
+    response: Optional[LLMResponse]
+    error: Optional[str] = None
+    resumed: bool = False  # 来自检查点（本次未调用）
+
+    @property
+    def ok(self) -> bool:
+        return self.response is not None and self.error is None
+
+
+def request_fingerprint(request: LLMRequest) -> str:
+    """请求指纹：检查点只复用内容未变的条目"""
+    payload = json.dumps(
+        [request.user_message, request.evidence_context, request.system_prompt,
+         request.session_history, request.max_tokens, request.temperature],
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class BatchCheckpoint:
+    """
+    批量任务检查点（JSONL，每行一条成功结果）
+    追加写 + 每行 flush，崩溃时最多丢失正在写的一行（加载时跳过不完整的行）
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 检查点文件路径
+        """
+        self.path = path
+        self._file = None
+
+    def load(self) -> Dict[str, Tuple[str, LLMResponse]]:
+        """已完成条目：{item_id: (请求指纹, 响应)}"""
+        completed: Dict[str, Tuple[str, LLMResponse]] = {}
+        if not os.path.exists(self.path):
+            return completed
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    completed[record["id"]] = (record["fingerprint"], LLMResponse(**record["response"]))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"跳过损坏的检查点记录: {self.path}")
+        return completed
+
+    def append(self, item_id: str, fingerprint: str, response: LLMResponse) -> None:
+        """写入一条成功结果"""
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+        record = {
+            "id": item_id,
+            "fingerprint": fingerprint,
+            "response": dataclasses.asdict(dataclasses.replace(response, raw_response=None))
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def run_batch(
+    call: Callable[[LLMRequest], Awaitable[LLMResponse]],
+    requests: Iterable[LLMRequest],
+    ids: Optional[Iterable[str]] = None,
+    max_concurrency: int = 8,
+    checkpoint_path: Optional[str] = None
+) -> AsyncIterator[BatchResult]:
+    """
+    有界并发执行批量请求，结果按完成顺序产出
+
+    Args:
+        call: 单条请求的调用函数（失败时返回 error 不为空的响应或抛出异常）
+        requests: 请求列表
+        ids: 条目 ID（与 requests 一一对应，用于检查点恢复；默认为序号）
+        max_concurrency: 最大并发数
+        checkpoint_path: 检查点文件（None 表示不做检查点）
+
+    Yields:
+        BatchResult：检查点中已完成的条目先产出（resumed=True），其余按完成顺序产出
+    """
+    requests = list(requests)
+    ids = [str(i) for i in ids] if ids is not None else [str(i) for i in range(len(requests))]
+    if len(ids) != len(requests):
+        raise ValueError(f"ids 数量({len(ids)})与 requests 数量({len(requests)})不一致")
+
+    checkpoint = BatchCheckpoint(checkpoint_path) if checkpoint_path else None
+    completed = checkpoint.load() if checkpoint else {}
+
+    pending: List[Tuple[int, str, str, LLMRequest]] = []
+    for index, (item_id, request) in enumerate(zip(ids, requests)):
+        fingerprint = request_fingerprint(request)
+        saved = completed.get(item_id)
+        if saved is not None and saved[0] == fingerprint:
+            yield BatchResult(item_id=item_id, index=index, response=saved[1], resumed=True)
+        else:
+            pending.append((index, item_id, fingerprint, request))
+
+    if completed:
+        logger.info(f"批量任务从检查点恢复: 已完成 {len(requests) - len(pending)}，剩余 {len(pending)}")
+
+    results: asyncio.Queue = asyncio.Queue()
+    work = iter(pending)
+
+    async def worker() -> None:
+        for index, item_id, fingerprint, request in work:
+            try:
+                response = await call(request)
+                error = response.error
+            except Exception as e:
+                logger.error(f"批量条目失败: {item_id}, {e}")
+                response, error = None, str(e)
+            if checkpoint is not None and error is None:
+                checkpoint.append(item_id, fingerprint, response)
+            await results.put(BatchResult(item_id=item_id, index=index, response=response, error=error))
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(max_concurrency, len(pending)))]
+    try:
+        for _ in range(len(pending)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if checkpoint is not None:
+            checkpoint.close()
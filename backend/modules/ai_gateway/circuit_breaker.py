@@ -0,0 +1,164 @@
+"""
+熔断器
+closed（正常）→ 连续失败 / 窗口错误率达到阈值 → open（拒绝请求）→ 冷却后 half_open（放行少量探测请求）
+→ 探测成功恢复 closed，失败重新 open
+超过慢调用阈值的成功调用按失败计入熔断判断（上游变慢与上游报错同样需要隔离）
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """单个提供商/模型的熔断器"""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        error_rate_threshold: Optional[float] = None,
+        window_size: int = 20,
+        min_calls: int = 10,
+        slow_call_ms: Optional[int] = None
+    ):
+        """
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            recovery_timeout: 熔断后多少秒进入半开状态
+            half_open_max_calls: 半开状态同时放行的探测请求数
+            error_rate_threshold: 最近 window_size 次调用的失败率达到该值时熔断（None 表示只看连续失败）
+            window_size: 错误率统计窗口（调用次数）
+            min_calls: 窗口内调用次数少于该值时不按错误率熔断
+            slow_call_ms: 慢调用阈值（毫秒），超过的成功调用按失败计（None 表示不启用）
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.min_calls = min_calls
+        self.slow_call_ms = slow_call_ms
+
+        self._state = CLOSED
+        self._failures = 0
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)  # True 表示失败
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._probe_started = 0.0
+        self._trips = 0
+        self._rejected = 0
+        self._slow_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """当前状态（open 冷却期满时视为 half_open）"""
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self) -> bool:
+        """是否放行请求（半开状态下占用一个探测名额）"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._state = HALF_OPEN
+                self._half_open_calls += 1
+                self._probe_started = time.monotonic()
+                return True
+            self._rejected += 1
+            return False
+
+    def is_open(self) -> bool:
+        """是否处于熔断状态（只读，不占用探测名额）"""
+        return self.state == OPEN
+
+    def record_result(self, success: bool, latency_ms: Optional[int] = None) -> None:
+        """
+        记录调用结果
+        Args:
+            success: 是否成功
+            latency_ms: 调用延迟（毫秒），用于慢调用判断
+        """
+        if success and self.slow_call_ms is not None and latency_ms is not None and latency_ms > self.slow_call_ms:
+            with self._lock:
+                self._slow_calls += 1
+            success = False
+
+        if success:
+            self.record_success()
+        else:
+            self.record_failure()
+
+    def record_success(self) -> None:
+        """记录成功：恢复 closed"""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+            self._outcomes.append(False)
+
+    def record_failure(self) -> None:
+        """记录失败：连续失败 / 窗口错误率达到阈值或半开探测失败时熔断"""
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            self._outcomes.append(True)
+            if state == HALF_OPEN or self._failures >= self.failure_threshold or self._error_rate_exceeded():
+                if state != OPEN:
+                    self._trips += 1
+                    # 重新计数，恢复后按新窗口判断
+                    self._outcomes.clear()
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def release_probe(self) -> None:
+        """放行后未实际调用（如本地过载被拒绝）：归还半开探测名额，不计入成功/失败"""
+        with self._lock:
+            if self._half_open_calls:
+                self._half_open_calls -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """熔断器状态"""
+        with self._lock:
+            state = self._current_state()
+            outcomes = len(self._outcomes)
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "error_rate": round(sum(self._outcomes) / outcomes, 4) if outcomes else 0.0,
+                "trips": self._trips,
+                "rejected": self._rejected,
+                "slow_calls": self._slow_calls,
+                "retry_in_s": (
+                    round(max(0.0, self._opened_at + self.recovery_timeout - time.monotonic()), 1)
+                    if state == OPEN else 0.0
+                )
+            }
+
+    def _error_rate_exceeded(self) -> bool:
+        """窗口错误率是否达到阈值（调用方持有锁）"""
+        if self.error_rate_threshold is None or len(self._outcomes) < self.min_calls:
+            return False
+        return sum(self._outcomes) / len(self._outcomes) >= self.error_rate_threshold
+
+    def _current_state(self) -> str:
+        """计算当前状态（调用方持有锁）"""
+        now = time.monotonic()
+        if self._state == OPEN and now - self._opened_at >= self.recovery_timeout:
+            return HALF_OPEN
+        if (
+            self._state == HALF_OPEN
+            and self._half_open_calls
+            and now - self._probe_started >= self.recovery_timeout
+        ):
+            # 探测请求未回报结果（被取消等），释放探测名额
+            self._half_open_calls = 0
+        return self._state
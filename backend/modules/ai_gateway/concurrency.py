@@ -0,0 +1,118 @@
+"""
+提供商并发限制
+每个提供商最多 max_concurrency 个在途请求，超出的请求进入有界等待队列；
+队列已满或等待超时立即拒绝（快速失败，交给网关降级），避免请求在慢上游前无限堆积
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderOverloaded(Exception):
+    """提供商并发已满且等待队列已满 / 等待超时"""
+
+
+class ConcurrencyLimiter:
+    """
+    有界队列的异步并发限制器
+
+    用法：
+        async with limiter:
+            await provider.agenerate(request)
+
+    不绑定事件循环（等待者的 future 在调用时的循环上创建），网关实例可跨 asyncio.run 复用
+    """
+
+    def __init__(self, max_concurrency: int = 64, max_queue: int = 128, queue_timeout: float = 5.0):
+        """
+        Args:
+            max_concurrency: 最大在途请求数
+            max_queue: 最大排队请求数（0 表示不排队，满即拒绝）
+            queue_timeout: 排队最长等待时间（秒）
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._stats = {"admitted": 0, "queued": 0, "rejected": 0, "timeouts": 0}
+        self._waited = 0
+        self._total_wait_ms = 0.0
+
+    async def acquire(self) -> None:
+        """
+        获取一个并发名额
+        Raises:
+            ProviderOverloaded: 队列已满或等待超时
+        """
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            self._stats["admitted"] += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise ProviderOverloaded(
+                f"并发已满（{self._active}/{self.max_concurrency}），排队已满（{len(self._waiters)}）"
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._stats["queued"] += 1
+        start = time.monotonic()
+
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # 名额已转交但等待者被取消/超时：归还名额
+                self._release_slot()
+            else:
+                try:
+                    self._waiters.remove(future)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self._stats["timeouts"] += 1
+                raise ProviderOverloaded(f"排队等待超过 {self.queue_timeout}s") from None
+            raise
+
+        self._waited += 1
+        self._total_wait_ms += (time.monotonic() - start) * 1000
+        self._stats["admitted"] += 1
+
+    def release(self) -> None:
+        """归还并发名额"""
+        self._release_slot()
+
+    async def __aenter__(self) -> "ConcurrencyLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """并发状态"""
+        return {
+            "active": self._active,
+            "waiting": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            **self._stats,
+            "avg_queue_wait_ms": round(self._total_wait_ms / self._waited, 1) if self._waited else 0.0
+        }
+
+    def _release_slot(self) -> None:
+        """名额直接转交给下一个仍在等待的请求，没有等待者时在途数减一"""
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
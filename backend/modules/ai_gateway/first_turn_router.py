@@ -7,6 +7,8 @@ import re
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 
+from modules.nlp.keyword_matcher import get_keyword_matcher
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,6 +21,7 @@ class FirstTurnDecision:
     suggested_model: Optional[str] = None
     suggested_response: Optional[str] = None
     confidence: float = 0.0
+    speculative_response: Optional[str] = None  # 临界置信度时的模板答案（与 LLM 并行，LLM 超时则返回）
 
 
 class FirstTurnRouter:
@@ -38,8 +41,24 @@ class FirstTurnRouter:
     - 用户体验不打折
     """
     
-    def __init__(self):
-        """初始化首轮路由器"""
+    def __init__(
+        self,
+        template_threshold: float = 0.95,
+        speculative_threshold: float = 0.85,
+        template_max_chars: int = 300
+    ):
+        """
+        初始化首轮路由器
+        
+        Args:
+            template_threshold: 知识库置信度达到该值时直接模板组装，不调用 LLM
+            speculative_threshold: 置信度介于该值与 template_threshold 之间时同时准备模板答案（投机执行）
+            template_max_chars: 模板答案引用证据的最大字数
+        """
+        self.template_threshold = template_threshold
+        self.speculative_threshold = speculative_threshold
+        self.template_max_chars = template_max_chars
+        
         # 简单问候规则库
         self.simple_greetings = {
             '你好': '您好！我是AI客服助手，很高兴为您服务！有什么可以帮您的吗？',
@@ -57,20 +76,23 @@ class FirstTurnRouter:
             '什么': '请问您想了解什么呢？我可以帮您解答产品、使用、售后等方面的问题。'
         }
         
-        # 业务查询模式
+        # 业务查询模式（triggers 为模式的必要关键词，未命中时跳过正则）
         self.business_patterns = {
             'order_query': {
-                'pattern': r'(订单|单号).*?([A-Z]{2}\d{8,}|\d{10,})',
+                'pattern': re.compile(r'(订单|单号).*?([A-Z]{2}\d{8,}|\d{10,})'),
+                'triggers': ['订单', '单号'],
                 'action': 'query_erp_order',
                 'response_template': '正在为您查询订单{order_no}的信息...'
             },
             'logistics_query': {
-                'pattern': r'(物流|快递|发货|配送).*?(\d{10,})?',
+                'pattern': re.compile(r'(物流|快递|发货|配送).*?(\d{10,})?'),
+                'triggers': ['物流', '快递', '发货', '配送'],
                 'action': 'query_erp_logistics',
                 'response_template': '正在为您查询物流信息...'
             },
             'invoice_query': {
-                'pattern': r'(发票|开票|票据)',
+                'pattern': re.compile(r'(发票|开票|票据)'),
+                'triggers': ['发票', '开票', '票据'],
                 'action': 'query_erp_invoice',
                 'response_template': '正在为您查询发票信息...'
             }
@@ -82,6 +104,12 @@ class FirstTurnRouter:
             '投诉', '经理', '主管', '领导'
         ]
         
+        # 转人工关键词与业务模式触发词编译为一个匹配自动机，一次扫描得到所有分组
+        self.keyword_matcher = get_keyword_matcher({
+            'transfer': self.transfer_keywords,
+            **{name: config['triggers'] for name, config in self.business_patterns.items()}
+        })
+        
         logger.info("首轮智能路由器初始化完成")
     
     async def decide(
@@ -125,8 +153,11 @@ class FirstTurnRouter:
                 confidence=0.9
             )
         
+        # 转人工与业务查询关键词一次扫描
+        hits = self.keyword_matcher.count(message)
+        
         # 3. 转人工请求检查
-        if any(keyword in message for keyword in self.transfer_keywords):
+        if hits['transfer']:
             logger.info(f"✅ 转人工请求: {message[:30]}...")
             return FirstTurnDecision(
                 use_llm=False,
@@ -138,7 +169,9 @@ class FirstTurnRouter:
         
         # 4. 业务查询检查（5%场景）
         for query_type, config in self.business_patterns.items():
-            match = re.search(config['pattern'], message)
+            if not hits[query_type]:
+                continue
+            match = config['pattern'].search(message)
             if match:
                 logger.info(f"✅ 业务查询: {query_type}")
                 
@@ -159,25 +192,28 @@ class FirstTurnRouter:
         # 5. 知识库置信度分流（75%场景）
         if evidences and kb_confidence > 0:
             
-            if kb_confidence >= 0.95:
+            if kb_confidence >= self.template_threshold:
                 # 超高置信度：模板组装（10%场景）
                 logger.info(f"✅ 知识库超高置信度: {kb_confidence:.2f}")
                 return FirstTurnDecision(
                     use_llm=False,
                     reason=f'知识库超高置信度（{kb_confidence:.2f}），模板组装',
                     suggested_action='template_assembly',
+                    suggested_response=self.assemble_template(evidences),
                     confidence=kb_confidence
                 )
             
             elif kb_confidence >= 0.75:
-                # 中等置信度：轻量LLM（40%场景）
+                # 中等置信度：轻量LLM（40%场景）；临界高置信度时同时准备模板答案
                 logger.info(f"🤖 知识库中等置信度: {kb_confidence:.2f}，使用轻量LLM")
+                speculative = kb_confidence >= self.speculative_threshold
                 return FirstTurnDecision(
                     use_llm=True,
                     reason=f'知识库中等置信度（{kb_confidence:.2f}），轻量LLM组织答案',
                     suggested_action='llm_light',
                     suggested_model='qwen-turbo',
-                    confidence=kb_confidence
+                    confidence=kb_confidence,
+                    speculative_response=self.assemble_template(evidences) if speculative else None
                 )
             
             else:
@@ -201,6 +237,29 @@ class FirstTurnRouter:
             confidence=0.5
         )
     
+    def assemble_template(self, evidences: List) -> Optional[str]:
+        """
+        模板组装：引用最相关的证据并标注出处
+        
+        Args:
+            evidences: 知识库检索结果（Evidence，按相关性排序）
+        
+        Returns:
+            模板答案，证据为空时返回 None
+        """
+        if not evidences:
+            return None
+        
+        top = evidences[0]
+        content = top.content.strip()
+        if len(content) > self.template_max_chars:
+            content = content[:self.template_max_chars].rstrip() + '…'
+        
+        source = f"《{top.document_name}》"
+        if getattr(top, 'section', ''):
+            source += f" {top.section}"
+        return f"{content}\n\n（参考：{source}）"
+    
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
         return {
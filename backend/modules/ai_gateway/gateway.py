@@ -3,9 +3,12 @@ AI 网关：智能路由 + 主备切换 + 自动降级
 支持多个大模型提供商，根据任务复杂度智能选择最优模型
 """
 import os
+import time
 import logging
 import asyncio
-from typing import Optional, List, Dict, Any
+import dataclasses
+import weakref
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Iterable, Tuple
 
 from .types import LLMRequest, LLMResponse, ProviderConfig
 from .providers import (
@@ -19,6 +22,13 @@ from .providers import (
     MoonshotProvider
 )
 from .base import BaseLLMProvider
+from .streaming import LLMStream
+from .hedging import HedgeBudget
+from .response_cache import ResponseCache, DEFAULT_TENANT
+from .circuit_breaker import CircuitBreaker
+from .concurrency import ConcurrencyLimiter, ProviderOverloaded
+from .batch import BatchResult, RateLimiter, run_batch
+from .prompt_budget import PromptBudget, PromptBudgeter
 
 # 导入深度思考客户端
 try:
@@ -33,10 +43,12 @@ logger = logging.getLogger(__name__)
 # 尝试导入智能路由器
 try:
     from .smart_router import SmartModelRouter
+    from .telemetry import ModelTelemetry
     SMART_ROUTER_AVAILABLE = True
 except ImportError:
     SMART_ROUTER_AVAILABLE = False
     SmartModelRouter = None
+    ModelTelemetry = None
 
 
 class AIGateway:
@@ -57,7 +69,23 @@ class AIGateway:
         fallback_provider: Optional[str] = "deepseek",
         fallback_model: str = "deepseek-chat",
         enable_fallback: bool = True,
-        enable_smart_routing: bool = True
+        enable_smart_routing: bool = True,
+        enable_hedging: bool = False,
+        hedge_delay_factor: float = 1.5,
+        hedge_default_delay_ms: int = 2000,
+        hedge_delays_ms: Optional[Dict[str, int]] = None,
+        hedge_budget_ratio: float = 0.1,
+        hedge_budgets: Optional[Dict[str, float]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        provider_max_concurrency: int = 64,
+        provider_max_queue: int = 128,
+        provider_queue_timeout: float = 5.0,
+        breaker_failure_threshold: int = 5,
+        breaker_error_rate: Optional[float] = 0.5,
+        breaker_slow_call_ms: Optional[int] = None,
+        breaker_recovery_timeout: float = 30.0,
+        provider_rate_limits: Optional[Dict[str, Dict[str, int]]] = None,
+        max_input_tokens: Optional[int] = None
     ):
         """
         初始化AI网关
@@ -69,10 +97,60 @@ class AIGateway:
             fallback_model: 备用模型
             enable_fallback: 是否启用备用降级
             enable_smart_routing: 是否启用智能路由
+            enable_hedging: 是否启用对冲请求（主请求超时未返回时并行请求备用，先返回者胜出）
+            hedge_delay_factor: 对冲延迟 = 模型画像延迟 × 该系数
+            hedge_default_delay_ms: 无模型画像时的对冲延迟（毫秒）
+            hedge_delays_ms: 按路由覆盖的对冲延迟 {"qwen-turbo": 1500}
+            hedge_budget_ratio: 默认对冲预算（对冲次数 / 请求数）
+            hedge_budgets: 按路由覆盖的对冲预算 {"qwen-max": 0.0}
+            response_cache: 响应缓存（None 表示不缓存）
+            provider_max_concurrency: 每个提供商实例的最大在途请求数
+            provider_max_queue: 每个提供商实例的最大排队请求数（满即拒绝）
+            provider_queue_timeout: 排队最长等待时间（秒），超时按过载拒绝
+            breaker_failure_threshold: 连续失败多少次后熔断该提供商
+            breaker_error_rate: 最近调用错误率达到该值时熔断（None 表示只看连续失败）
+            breaker_slow_call_ms: 慢调用阈值（毫秒），超过的调用按失败计（None 表示不启用）
+            breaker_recovery_timeout: 熔断后多少秒放行探测请求
+            provider_rate_limits: 按提供商名的配额 {"qwen": {"rpm": 600, "tpm": 200000}}
+                （在线请求只记账，批量请求额度不足时排队）
+            max_input_tokens: 输入 token 预算（超出时按优先级裁剪历史与证据；
+                None 表示以模型上下文窗口减去输出上限为预算）
         """
         self.enable_fallback = enable_fallback
         self.enable_smart_routing = enable_smart_routing
         
+        # 对冲请求
+        self.enable_hedging = enable_hedging
+        self.hedge_delay_factor = hedge_delay_factor
+        self.hedge_default_delay_ms = hedge_default_delay_ms
+        self.hedge_delays_ms = hedge_delays_ms or {}
+        self.hedge_budget = HedgeBudget(ratio=hedge_budget_ratio, route_ratios=hedge_budgets)
+        
+        # 响应缓存（仅用于无会话历史的单轮问答），知识块变更时由已订阅的知识源触发失效
+        self.response_cache = response_cache
+        self._watched_sources: "weakref.WeakSet[Any]" = weakref.WeakSet()
+        
+        # 提供商熔断 + 并发限制（首次调用时创建；启用智能路由时熔断器取自路由遥测，每个模型一个）
+        self.provider_max_concurrency = provider_max_concurrency
+        self.provider_max_queue = provider_max_queue
+        self.provider_queue_timeout = provider_queue_timeout
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_error_rate = breaker_error_rate
+        self.breaker_slow_call_ms = breaker_slow_call_ms
+        self.breaker_recovery_timeout = breaker_recovery_timeout
+        self._provider_breakers: Dict[BaseLLMProvider, CircuitBreaker] = {}
+        self._provider_limiters: Dict[BaseLLMProvider, ConcurrencyLimiter] = {}
+        
+        # 提供商配额（同一提供商的各模型共享账号配额）
+        self.rate_limiters: Dict[str, RateLimiter] = {
+            name: RateLimiter(requests_per_minute=limits.get("rpm"), tokens_per_minute=limits.get("tpm"))
+            for name, limits in (provider_rate_limits or {}).items()
+        }
+        
+        # 提示词预算：按目标模型分词器计数，超出预算时裁剪
+        self.max_input_tokens = max_input_tokens
+        self.prompt_budgeter = PromptBudgeter()
+        
         # 初始化深度思考客户端
         self.thinking_client = None
         if THINKING_CLIENT_AVAILABLE:
@@ -88,7 +166,8 @@ class AIGateway:
         
         # 初始化智能路由器
         if enable_smart_routing and SMART_ROUTER_AVAILABLE:
-            self.router = SmartModelRouter()
+            # 路由遥测中的模型熔断器按网关的熔断配置创建
+            self.router = SmartModelRouter(telemetry=ModelTelemetry(breaker_factory=self._new_breaker))
             logger.info("✅ 智能路由器已启用")
         else:
             self.router = None
@@ -99,6 +178,9 @@ class AIGateway:
         self.all_providers: Dict[str, BaseLLMProvider] = {}
         if enable_smart_routing:
             self._init_all_providers()
+            if self.router is not None and self.all_providers:
+                # 实时降级只在网关能调用的模型之间切换
+                self.router.available_models = set(self.all_providers)
         
         # 初始化传统主备提供商列表
         self.providers: List[BaseLLMProvider] = []
@@ -141,6 +223,18 @@ class AIGateway:
             except Exception as e:
                 logger.warning(f"提供商注册失败 {key}: {e}")
     
+    def watch_knowledge_source(self, source: Any) -> None:
+        """
+        订阅知识源的知识块变更，变更时失效相关的缓存回答
+        
+        Args:
+            source: 提供 add_change_listener 的知识源（VectorSearchService / Retriever）
+        """
+        if self.response_cache is None or source in self._watched_sources:
+            return
+        source.add_change_listener(self.response_cache.invalidate_chunks)
+        self._watched_sources.add(source)
+    
     async def generate(
         self,
         user_message: str,
@@ -149,7 +243,8 @@ class AIGateway:
         max_tokens: int = 512,
         temperature: float = 0.3,
         prompt: Optional[str] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        evidence_ids: Optional[List[str]] = None
     ) -> LLMResponse:
         """
         生成响应（支持智能路由和自动降级）
@@ -161,11 +256,362 @@ class AIGateway:
             max_tokens: 最大 token 数
             temperature: 温度参数
             prompt: 完整提示词（如果提供，优先使用）
-            metadata: 元数据（用于智能路由决策）
+            metadata: 元数据（用于智能路由决策，tenant_id 用于响应缓存隔离）
+            evidence_ids: 证据 chunk_id（响应缓存键的一部分，知识块变更时据此失效）
         
         Returns:
             LLMResponse: 响应结果
         """
+        # 响应缓存：有会话历史时回答依赖上下文，不走缓存
+        use_cache = self.response_cache is not None and not session_history
+        if use_cache:
+            start_time = time.time()
+            tenant = str((metadata or {}).get('tenant_id') or DEFAULT_TENANT)
+            hit = await self.response_cache.lookup(
+                user_message, evidence_ids, tenant,
+                evidence_context=evidence_context, max_tokens=max_tokens, temperature=temperature
+            )
+            if hit is not None:
+                logger.info(f"⚡ 响应缓存命中: {hit.match}, similarity={hit.similarity:.3f}")
+                response = dataclasses.replace(
+                    hit.response,
+                    token_in=0,
+                    token_out=0,
+                    token_total=0,
+                    latency_ms=int((time.time() - start_time) * 1000),
+                    raw_response=None
+                )
+                response.cache_hit = {"match": hit.match, "similarity": round(hit.similarity, 4)}
+                return response
+            generation = self.response_cache.generation
+        
+        response = await self._generate_uncached(
+            user_message, evidence_context, session_history, max_tokens, temperature, metadata
+        )
+        
+        if use_cache and response.provider != "stub":
+            await self.response_cache.store(
+                user_message, response, evidence_ids, tenant, generation=generation,
+                evidence_context=evidence_context, max_tokens=max_tokens, temperature=temperature
+            )
+        return response
+    
+    async def _generate_uncached(
+        self,
+        user_message: str,
+        evidence_context: Optional[str],
+        session_history: Optional[List],
+        max_tokens: int,
+        temperature: float,
+        metadata: Optional[Dict[str, Any]]
+    ) -> LLMResponse:
+        """构建请求并调用提供商"""
+        request = LLMRequest(
+            user_message=user_message,
+            evidence_context=evidence_context,
+            session_history=session_history,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return await self._dispatch(request, metadata)
+    
+    async def _dispatch(
+        self,
+        request: LLMRequest,
+        metadata: Optional[Dict[str, Any]],
+        batch: bool = False
+    ) -> LLMResponse:
+        """
+        路由 + 对冲/降级调用提供商
+        
+        Args:
+            request: LLM 请求
+            metadata: 元数据（用于智能路由决策）
+            batch: 批量请求（不对冲，配额不足时等待而不是透支）
+        """
+        selected_provider, routing_info = await self._route(request.user_message, request.evidence_context, metadata)
+        
+        candidates = self._candidate_providers(selected_provider)
+        tried: List[BaseLLMProvider] = []
+        
+        # 对冲模式：主请求超过延迟阈值未返回时并行请求备用
+        if self.enable_hedging and not batch and len(candidates) > 1:
+            response, tried = await self._hedged_generate(candidates, request, routing_info)
+            if response is not None:
+                if routing_info:
+                    response.routing_info = routing_info
+                return response
+        
+        # 依次尝试（智能路由选择的模型优先，然后主备提供商）
+        for i, provider in enumerate(candidates):
+            if provider in tried:
+                continue
+            
+            is_fallback = i > 0
+            logger.info(
+                f"调用 {'备用' if is_fallback else '主'} 提供商: {provider.name}"
+            )
+            
+            response = await self._call_provider(provider, request, wait_for_quota=batch)
+            if response is not None:
+                if is_fallback:
+                    logger.warning(f"备用提供商成功: {provider.name}")
+                if routing_info:
+                    response.routing_info = routing_info
+                return response
+        
+        # 所有提供商都失败，返回桩响应
+        logger.error("所有 LLM 提供商都失败，使用桩响应")
+        return self._stub_response(request.user_message)
+    
+    async def generate_batch(
+        self,
+        requests: Iterable[LLMRequest],
+        ids: Optional[Iterable[str]] = None,
+        max_concurrency: int = 8,
+        checkpoint_path: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[BatchResult]:
+        """
+        批量生成（离线任务：触发器表单提取、摘要、评测等）
+        
+        有界并发执行，按提供商配额排队（在线请求优先），结果按完成顺序流式返回；
+        成功的条目写入检查点，用同一检查点重跑时跳过已完成的条目。
+        批量请求不走响应缓存，也不发起对冲请求。
+        
+        Args:
+            requests: 请求列表
+            ids: 条目 ID（用于检查点恢复，默认为序号）
+            max_concurrency: 最大并发数
+            checkpoint_path: 检查点文件路径（None 表示不做检查点）
+            metadata: 元数据（用于智能路由决策，所有条目共用）
+        
+        Yields:
+            BatchResult
+        """
+        async def call(request: LLMRequest) -> LLMResponse:
+            return await self._dispatch(request, metadata, batch=True)
+        
+        async for result in run_batch(call, requests, ids, max_concurrency, checkpoint_path):
+            yield result
+    
+    def _candidate_providers(self, selected_provider: Optional[BaseLLMProvider]) -> List[BaseLLMProvider]:
+        """候选提供商（智能路由选择的优先，同一提供商/模型只保留一个）"""
+        candidates = []
+        seen = set()
+        for provider in ([selected_provider] if selected_provider else []) + self.providers:
+            key = (provider.name, provider.config.model)
+            if key not in seen:
+                seen.add(key)
+                candidates.append(provider)
+        return candidates
+    
+    async def _call_provider(
+        self,
+        provider: BaseLLMProvider,
+        request: LLMRequest,
+        wait_for_quota: bool = False
+    ) -> Optional[LLMResponse]:
+        """
+        调用单个提供商（原生异步），失败返回 None
+        熔断中或并发/排队已满时立即返回 None（不等待上游超时），由调用方降级
+        
+        Args:
+            provider: 提供商
+            request: LLM 请求
+            wait_for_quota: 配额不足时等待（批量请求），否则只记账
+        """
+        breaker, limiter = self._get_provider_guard(provider)
+        if not breaker.allow_request():
+            logger.debug(f"提供商已熔断，跳过: {provider.name}/{provider.config.model}")
+            return None
+        
+        request, budget = self._fit_prompt(provider, request)
+        
+        rate_limiter = self.rate_limiters.get(provider.name)
+        estimated_tokens = budget.input_tokens + request.max_tokens
+        if rate_limiter is not None:
+            if wait_for_quota:
+                await rate_limiter.acquire(estimated_tokens)
+            else:
+                rate_limiter.consume(estimated_tokens)
+        
+        try:
+            async with limiter:
+                start_time = time.time()
+                try:
+                    response = await provider.agenerate(request)
+                except Exception as e:
+                    logger.error(f"提供商调用异常: {provider.name}, {e}")
+                    self._record_telemetry(provider, start_time, success=False)
+                    return None
+        except ProviderOverloaded as e:
+            # 本地过载不代表上游故障，不计入熔断；归还可能占用的探测名额
+            logger.warning(f"提供商过载，快速拒绝: {provider.name}, {e}")
+            breaker.release_probe()
+            return None
+        
+        if rate_limiter is not None and response.token_total:
+            rate_limiter.adjust(estimated_tokens, response.token_total)
+        
+        if response.content and not response.error:
+            self._record_telemetry(provider, start_time, success=True, token_out=response.token_out)
+            response.prompt_budget = budget.to_dict()
+            return response
+        
+        logger.warning(f"提供商返回错误: {provider.name}, error={response.error}")
+        self._record_telemetry(provider, start_time, success=False)
+        return None
+    
+    def _fit_prompt(self, provider: BaseLLMProvider, request: LLMRequest) -> Tuple[LLMRequest, PromptBudget]:
+        """按提供商模型计算输入 token 数，超出预算时裁剪历史与证据"""
+        model = provider.config.model
+        limit = self.max_input_tokens
+        context_window = self._context_window(model)
+        if context_window:
+            window_limit = context_window - request.max_tokens
+            limit = min(limit, window_limit) if limit else window_limit
+        
+        # 与提供商构造请求时一致（子类可覆盖 _get_default_system_prompt）
+        system_prompt = None if request.system_prompt else provider._get_default_system_prompt()
+        request, budget = self.prompt_budgeter.fit(request, model, limit, system_prompt)
+        logger.debug(
+            f"预计输入 {budget.input_tokens} tokens: {provider.name}/{model}"
+            f"{'' if budget.exact else '（估算）'}"
+        )
+        return request, budget
+    
+    def _context_window(self, model: str) -> Optional[int]:
+        """模型上下文窗口（取自智能路由的模型画像）"""
+        if self.router is None:
+            return None
+        for profile in self.router.model_profiles.values():
+            if profile.model == model:
+                return profile.max_context
+        return None
+    
+    def _get_provider_guard(self, provider: BaseLLMProvider) -> Tuple[CircuitBreaker, ConcurrencyLimiter]:
+        """
+        提供商对应的熔断器与并发限制器
+        每个模型只有一个熔断器：启用智能路由时使用遥测中的模型熔断器，路由降级与网关快速失败看同一状态；
+        否则按提供商实例创建
+        """
+        if self.router is not None:
+            breaker = self.router.get_breaker(provider.config.model)
+        else:
+            breaker = self._provider_breakers.get(provider)
+            if breaker is None:
+                breaker = self._provider_breakers[provider] = self._new_breaker()
+        
+        limiter = self._provider_limiters.get(provider)
+        if limiter is None:
+            limiter = self._provider_limiters[provider] = ConcurrencyLimiter(
+                max_concurrency=self.provider_max_concurrency,
+                max_queue=self.provider_max_queue,
+                queue_timeout=self.provider_queue_timeout
+            )
+        return breaker, limiter
+    
+    def _new_breaker(self) -> CircuitBreaker:
+        """按网关熔断配置创建熔断器"""
+        return CircuitBreaker(
+            failure_threshold=self.breaker_failure_threshold,
+            recovery_timeout=self.breaker_recovery_timeout,
+            error_rate_threshold=self.breaker_error_rate,
+            slow_call_ms=self.breaker_slow_call_ms
+        )
+    
+    def _record_telemetry(
+        self,
+        provider: BaseLLMProvider,
+        start_time: float,
+        success: bool,
+        token_out: int = 0
+    ) -> None:
+        """回报调用结果：启用智能路由时记入遥测（同时更新模型熔断器），否则只更新提供商熔断器"""
+        latency_ms = int((time.time() - start_time) * 1000)
+        if self.router is None:
+            breaker, _ = self._get_provider_guard(provider)
+            breaker.record_result(success, latency_ms)
+            return
+        self.router.record_result(provider.config.model, latency_ms, success, token_out)
+    
+    async def _hedged_generate(
+        self,
+        candidates: List[BaseLLMProvider],
+        request: LLMRequest,
+        routing_info: Optional[Dict[str, Any]]
+    ) -> Tuple[Optional[LLMResponse], List[BaseLLMProvider]]:
+        """
+        对冲请求：主请求超过延迟阈值未返回且预算允许时，向备用提供商并行发起请求，
+        先成功返回者胜出，另一方被取消
+        
+        Returns:
+            (成功响应或 None, 已尝试的提供商)
+        """
+        primary, backup = candidates[0], candidates[1]
+        route = routing_info['model_key'] if routing_info else primary.config.model
+        delay = self._hedge_delay_ms(route, routing_info) / 1000
+        
+        self.hedge_budget.record_request(route)
+        tasks = {asyncio.ensure_future(self._call_provider(primary, request)): primary}
+        tried = [primary]
+        
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            
+            if not done:
+                if self.hedge_budget.try_acquire(route):
+                    logger.info(
+                        f"⏱️ 对冲请求: {primary.name} 超过 {delay * 1000:.0f}ms 未返回，"
+                        f"并行请求 {backup.name}"
+                    )
+                    tasks[asyncio.ensure_future(self._call_provider(backup, request))] = backup
+                    tried.append(backup)
+                else:
+                    logger.debug(f"对冲预算不足: route={route}")
+            
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = tasks.pop(task)
+                    response = task.result()
+                    if response is not None:
+                        if provider is backup:
+                            self.hedge_budget.record_backup_win(route)
+                            logger.warning(f"对冲请求胜出: {backup.name}")
+                        return response, tried
+            
+            return None, tried
+        
+        finally:
+            # 取消落后的请求（AsyncOpenAI 会随之关闭连接）
+            for task in tasks:
+                task.cancel()
+    
+    def _hedge_delay_ms(self, route: str, routing_info: Optional[Dict[str, Any]]) -> float:
+        """对冲延迟：路由覆盖 > 模型画像延迟 × 系数 > 默认值"""
+        if route in self.hedge_delays_ms:
+            return self.hedge_delays_ms[route]
+        
+        estimated_latency = routing_info.get('estimated_latency') if routing_info else None
+        if estimated_latency:
+            return estimated_latency * self.hedge_delay_factor
+        
+        return self.hedge_default_delay_ms
+    
+    async def _route(
+        self,
+        user_message: str,
+        evidence_context: Optional[str],
+        metadata: Optional[Dict[str, Any]]
+    ) -> Tuple[Optional[BaseLLMProvider], Optional[Dict[str, Any]]]:
+        """
+        智能路由选择提供商
+        
+        Returns:
+            (选中的提供商, 路由信息)，未启用或失败时提供商为 None
+        """
         metadata = metadata or {}
         
         # 如果启用智能路由，先选择最优模型
@@ -195,65 +641,97 @@ class AIGateway:
             except Exception as e:
                 logger.error(f"智能路由失败: {e}，使用默认提供商")
         
-        # 构建请求
+        return selected_provider, routing_info
+    
+    async def generate_stream(
+        self,
+        user_message: str,
+        evidence_context: Optional[str] = None,
+        session_history: Optional[List] = None,
+        max_tokens: int = 512,
+        temperature: float = 0.3,
+        metadata: Optional[Dict[str, Any]] = None,
+        on_complete: Optional[Callable[[LLMResponse], Any]] = None
+    ) -> LLMStream:
+        """
+        流式生成响应
+        
+        首个片段返回之前失败会依次降级到下一个提供商；
+        首个片段之后的失败无法降级，流被截断并在汇总响应中记录 error。
+        
+        Args:
+            user_message: 用户消息
+            evidence_context: 证据上下文
+            session_history: 会话历史
+            max_tokens: 最大 token 数
+            temperature: 温度参数
+            metadata: 元数据（用于智能路由决策）
+            on_complete: 流关闭时的回调（参数为汇总的 LLMResponse，用于记账）
+        
+        Returns:
+            LLMStream: 异步迭代文本增量
+        """
+        start_time = time.time()
+        selected_provider, routing_info = await self._route(user_message, evidence_context, metadata)
+        
         request = LLMRequest(
             user_message=user_message,
             evidence_context=evidence_context,
             session_history=session_history,
             max_tokens=max_tokens,
-            temperature=temperature
+            temperature=temperature,
+            stream=True
         )
         
-        # 如果智能路由选择了模型，优先尝试
-        if selected_provider:
-            try:
-                # ✅ 修复异步阻塞：使用 asyncio.to_thread 包装同步调用
-                response = await asyncio.to_thread(selected_provider.generate, request)
-                
-                if response.content and not response.error:
-                    # 添加路由信息到响应
-                    if routing_info:
-                        response.routing_info = routing_info
-                    return response
-                else:
-                    logger.warning(
-                        f"智能路由选择的模型失败: {selected_provider.name}, "
-                        f"error={response.error}，尝试降级"
-                    )
-            
-            except Exception as e:
-                logger.error(f"智能路由模型调用异常: {selected_provider.name}, {e}，尝试降级")
-        
-        # 降级：依次尝试主备提供商
-        for i, provider in enumerate(self.providers):
-            is_fallback = i > 0
+        for provider in self._candidate_providers(selected_provider):
+            # 流式请求持续时间由客户端决定，不占并发名额，只受熔断保护
+            breaker, _ = self._get_provider_guard(provider)
+            if not breaker.allow_request():
+                logger.debug(f"提供商已熔断，跳过流式调用: {provider.name}/{provider.config.model}")
+                continue
             
+            call_start = time.time()
+            provider_request, _ = self._fit_prompt(provider, request)
+            chunks = provider.astream(provider_request)
             try:
-                logger.info(
-                    f"调用 {'备用' if is_fallback else '主'} 提供商: {provider.name}"
-                )
-                
-                # ✅ 修复异步阻塞：使用 asyncio.to_thread 包装同步调用
-                response = await asyncio.to_thread(provider.generate, request)
-                
-                # 检查是否成功
-                if response.content and not response.error:
-                    if is_fallback:
-                        logger.warning(f"备用提供商成功: {provider.name}")
-                    return response
-                else:
-                    logger.warning(
-                        f"提供商返回错误: {provider.name}, error={response.error}"
-                    )
-                    continue
-                    
+                first_chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                logger.warning(f"流式提供商无输出: {provider.name}，尝试降级")
+                self._record_telemetry(provider, call_start, success=False)
+                continue
             except Exception as e:
-                logger.error(f"提供商调用异常: {provider.name}, {e}")
+                logger.error(f"流式提供商调用失败: {provider.name}, {e}，尝试降级")
+                self._record_telemetry(provider, call_start, success=False)
+                await chunks.aclose()
                 continue
+            
+            return LLMStream(
+                provider=provider.name,
+                model=provider.config.model,
+                chunks=chunks,
+                first_chunk=first_chunk,
+                start_time=start_time,
+                on_complete=self._stream_completion_hook(provider, call_start, on_complete),
+                routing_info=routing_info
+            )
         
-        # 所有提供商都失败，返回桩响应
-        logger.error("所有 LLM 提供商都失败，使用桩响应")
-        return self._stub_response(user_message)
+        logger.error("所有 LLM 提供商流式调用都失败，使用桩响应")
+        return LLMStream.from_response(self._stub_response(user_message), on_complete=on_complete)
+    
+    def _stream_completion_hook(
+        self,
+        provider: BaseLLMProvider,
+        call_start: float,
+        on_complete: Optional[Callable[[LLMResponse], Any]]
+    ) -> Callable[[LLMResponse], Any]:
+        """流结束时回报遥测，再调用调用方的回调"""
+        def hook(response: LLMResponse) -> Any:
+            self._record_telemetry(
+                provider, call_start, success=not response.error, token_out=response.token_out
+            )
+            if on_complete is not None:
+                return on_complete(response)
+        return hook
     
     def _create_provider(
         self,
@@ -389,6 +867,8 @@ class AIGateway:
             "providers": [],
             "available": len(self.providers) > 0,
             "smart_routing_enabled": self.enable_smart_routing and self.router is not None,
+            "hedging_enabled": self.enable_hedging,
+            "response_cache_enabled": self.response_cache is not None,
             "total_providers": len(self.all_providers) if self.all_providers else len(self.providers)
         }
         
@@ -397,7 +877,8 @@ class AIGateway:
             status["providers"].append({
                 "name": provider.name,
                 "available": provider.is_available(),
-                "type": "primary" if provider == self.providers[0] else "fallback"
+                "type": "primary" if provider == self.providers[0] else "fallback",
+                **self._guard_status(provider)
             })
         
         # 智能路由提供商状态
@@ -406,21 +887,45 @@ class AIGateway:
                 {
                     "key": key,
                     "name": provider.name,
-                    "available": provider.is_available()
+                    "available": provider.is_available(),
+                    **self._guard_status(provider)
                 }
                 for key, provider in self.all_providers.items()
             ]
         
         return status
     
+    def _guard_status(self, provider: BaseLLMProvider) -> Dict[str, Any]:
+        """提供商熔断与并发状态"""
+        breaker, limiter = self._get_provider_guard(provider)
+        return {"circuit": breaker.get_stats(), "concurrency": limiter.get_stats()}
+    
+    def get_live_model_table(self) -> Dict[str, Any]:
+        """模型实时遥测表（EWMA/p95 延迟、错误率、吞吐、熔断状态）"""
+        if not self.router:
+            return {}
+        return self.router.get_live_table()
+    
     def get_routing_stats(self) -> Dict[str, Any]:
         """获取路由统计信息"""
+        hedging = {"enabled": self.enable_hedging, "routes": self.hedge_budget.get_stats()}
+        response_cache = self.response_cache.get_stats() if self.response_cache is not None else None
+        rate_limits = {name: limiter.get_stats() for name, limiter in self.rate_limiters.items()}
+        
         if not self.router:
-            return {"smart_routing_enabled": False}
+            return {
+                "smart_routing_enabled": False,
+                "hedging": hedging,
+                "response_cache": response_cache,
+                "rate_limits": rate_limits
+            }
         
         return {
             "smart_routing_enabled": True,
-            "router_stats": self.router.get_model_stats()
+            "router_stats": self.router.get_model_stats(),
+            "hedging": hedging,
+            "response_cache": response_cache,
+            "rate_limits": rate_limits
         }
     
     async def deep_thinking(
@@ -534,3 +1039,62 @@ class AIGateway:
                 "error": str(e)
             }
 
+
+# 全局网关实例
+_ai_gateway: Optional[AIGateway] = None
+
+
+def get_ai_gateway() -> AIGateway:
+    """获取全局 AI 网关实例（未初始化时按默认配置创建）"""
+    global _ai_gateway
+    if _ai_gateway is None:
+        _ai_gateway = AIGateway(
+            enable_hedging=os.getenv("AI_GATEWAY_HEDGING", "false").lower() == "true",
+            hedge_budget_ratio=float(os.getenv("AI_GATEWAY_HEDGE_BUDGET", "0.1")),
+            response_cache=_create_response_cache(),
+            provider_max_concurrency=int(os.getenv("AI_GATEWAY_PROVIDER_CONCURRENCY", "64")),
+            provider_max_queue=int(os.getenv("AI_GATEWAY_PROVIDER_QUEUE", "128")),
+            breaker_slow_call_ms=int(os.getenv("AI_GATEWAY_SLOW_CALL_MS", "0")) or None,
+            max_input_tokens=int(os.getenv("AI_GATEWAY_MAX_INPUT_TOKENS", "0")) or None,
+            provider_rate_limits=_parse_rate_limits(os.getenv("AI_GATEWAY_RATE_LIMITS", ""))
+        )
+    return _ai_gateway
+
+
+def _parse_rate_limits(spec: str) -> Dict[str, Dict[str, int]]:
+    """解析配额配置 "qwen=600/200000,deepseek=300/100000"（提供商=RPM/TPM，0 表示不限）"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            name, values = item.split("=", 1)
+            rpm, tpm = (values.split("/", 1) + ["0"])[:2]
+            limits[name.strip()] = {"rpm": int(rpm) or None, "tpm": int(tpm) or None}
+        except ValueError:
+            logger.warning(f"忽略无效的配额配置: {item}")
+    return limits
+
+
+def _create_response_cache() -> Optional[ResponseCache]:
+    """按环境变量创建响应缓存，近似匹配复用全局嵌入服务（不可用时只做精确命中）"""
+    if os.getenv("AI_RESPONSE_CACHE", "false").lower() != "true":
+        return None
+    
+    return ResponseCache(
+        max_entries=int(os.getenv("AI_RESPONSE_CACHE_MAX_ENTRIES", "5000")),
+        ttl=int(os.getenv("AI_RESPONSE_CACHE_TTL", "3600")),
+        similarity_threshold=float(os.getenv("AI_RESPONSE_CACHE_SIMILARITY", "0.92")),
+        embedder=_embed_with_global_service
+    )
+
+
+async def _embed_with_global_service(text: str) -> List[float]:
+    """调用时才取全局嵌入服务（网关可能先于嵌入服务初始化）"""
+    from modules.embeddings.unified_embedding_service import get_embedding_service
+    return await get_embedding_service().embed_text(text)
+
+
+def init_ai_gateway(**kwargs) -> AIGateway:
+    """初始化全局 AI 网关"""
+    global _ai_gateway
+    _ai_gateway = AIGateway(**kwargs)
+    return _ai_gateway
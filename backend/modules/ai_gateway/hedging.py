@@ -0,0 +1,84 @@
+"""
+对冲请求预算
+主请求超过延迟阈值未返回时向备用提供商发起对冲请求，先返回者胜出。
+预算按路由（模型 key）独立计算，保证对冲带来的额外调用量有上界。
+"""
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeBudget:
+    """
+    按路由的对冲预算（令牌桶）
+
+    每个请求为所在路由积累 ratio 个额度（上限 burst），每次对冲消耗 1 个，
+    长期来看对冲次数 ≤ ratio × 请求数。
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.1,
+        burst: float = 5.0,
+        route_ratios: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            ratio: 默认对冲比例（对冲次数 / 请求数）
+            burst: 额度上限（允许的突发对冲次数）
+            route_ratios: 按路由覆盖的对冲比例 {"qwen-turbo": 0.2, "qwen-max": 0.0}
+        """
+        self.ratio = ratio
+        self.burst = burst
+        self.route_ratios = route_ratios or {}
+
+        self._credits: Dict[str, float] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record_request(self, route: str) -> None:
+        """记录一次请求（积累额度）"""
+        ratio = self.route_ratios.get(route, self.ratio)
+        with self._lock:
+            credits = self._credits.get(route, min(1.0, self.burst))
+            self._credits[route] = min(credits + ratio, self.burst)
+            self._route_stats(route)["requests"] += 1
+
+    def try_acquire(self, route: str) -> bool:
+        """尝试消耗一次对冲额度"""
+        enabled = self.route_ratios.get(route, self.ratio) > 0
+
+        with self._lock:
+            stats = self._route_stats(route)
+            credits = self._credits.get(route, min(1.0, self.burst))
+            if enabled and credits >= 1.0:
+                self._credits[route] = credits - 1.0
+                stats["hedged"] += 1
+                return True
+            stats["denied"] += 1
+            return False
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """按路由的对冲统计"""
+        with self._lock:
+            return {
+                route: {
+                    **stats,
+                    "credits": round(self._credits.get(route, 0.0), 2),
+                    "ratio": self.route_ratios.get(route, self.ratio)
+                }
+                for route, stats in self._stats.items()
+            }
+
+    def record_backup_win(self, route: str) -> None:
+        """记录一次备用请求胜出"""
+        with self._lock:
+            self._route_stats(route)["backup_wins"] += 1
+
+    def _route_stats(self, route: str) -> Dict[str, int]:
+        stats = self._stats.get(route)
+        if stats is None:
+            stats = self._stats[route] = {"requests": 0, "hedged": 0, "denied": 0, "backup_wins": 0}
+        return stats
@@ -0,0 +1,186 @@
+"""
+提示词预算
+按目标模型的分词器计算请求的实际输入 token 数（与提供商构建的消息列表一致），
+超出预算时按优先级裁剪：用户问题与系统指令必保留 → 最近一轮历史 → 证据（按检索排序）→ 更早的历史
+"""
+import dataclasses
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from modules.nlp.token_counter import TOKENS_PER_MESSAGE, TokenCounter, get_token_counter
+
+from .types import LLMRequest
+
+logger = logging.getLogger(__name__)
+
+# 证据块之间的分隔（检索结果拼接 evidence_context 时使用空行分隔）
+EVIDENCE_SEPARATOR = "\n\n"
+
+# 与 OpenAI 兼容提供商的消息构建保持一致
+EVIDENCE_TEMPLATE = "参考资料：\n{evidence}\n\n用户问题：{question}"
+
+
+@dataclass
+class PromptBudget:
+    """一次请求的提示词预算结果"""
+    model: str
+    input_tokens: int                     # 预计输入 token 数（调用前确定）
+    max_input_tokens: Optional[int]       # 预算（None 表示不裁剪）
+    exact: bool                           # 是否使用真实分词器计数
+    history_kept: int = 0
+    history_dropped: int = 0
+    evidence_kept: int = 0
+    evidence_dropped: int = 0
+    breakdown: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(self.history_dropped or self.evidence_dropped)
+
+    def to_dict(self) -> Dict[str, object]:
+        return dataclasses.asdict(self)
+
+
+class PromptBudgeter:
+    """
+    提示词预算器
+
+    用法：
+        budgeter = PromptBudgeter()
+        request, budget = budgeter.fit(request, model="qwen-turbo", max_input_tokens=6000)
+    """
+
+    def __init__(self, counter: Optional[TokenCounter] = None, min_history_turns: int = 1):
+        """
+        Args:
+            counter: token 计数器（默认全局实例）
+            min_history_turns: 优先于证据保留的最近历史消息数
+        """
+        self.counter = counter or get_token_counter()
+        self.min_history_turns = min_history_turns
+
+    def count(self, request: LLMRequest, model: str, system_prompt: Optional[str] = None) -> int:
+        """请求的输入 token 数"""
+        return self.counter.count_messages(self._build_messages(request, system_prompt), model)
+
+    def fit(
+        self,
+        request: LLMRequest,
+        model: str,
+        max_input_tokens: Optional[int] = None,
+        system_prompt: Optional[str] = None
+    ) -> Tuple[LLMRequest, PromptBudget]:
+        """
+        将请求裁剪到预算以内
+
+        Args:
+            request: 原始请求
+            model: 目标模型（决定分词器）
+            max_input_tokens: 输入 token 预算（None 表示只计数不裁剪）
+            system_prompt: 提供商实际使用的系统指令（request.system_prompt 为空时）
+
+        Returns:
+            (裁剪后的请求, 预算结果)；无需裁剪时返回原请求
+        """
+        history = list(request.session_history or [])
+        evidence = self._split_evidence(request.evidence_context)
+        system = request.system_prompt or system_prompt
+
+        total = self.count(request, model, system_prompt)
+        budget = PromptBudget(
+            model=model,
+            input_tokens=total,
+            max_input_tokens=max_input_tokens,
+            exact=self.counter.is_exact(model),
+            history_kept=len(history),
+            evidence_kept=len(evidence)
+        )
+
+        if max_input_tokens is None or total <= max_input_tokens:
+            budget.breakdown = self._breakdown(request, model, system)
+            return request, budget
+
+        # 必保留部分：系统指令 + 用户问题（含证据模板的固定文字）
+        base = self.counter.count_messages(
+            self._build_messages(dataclasses.replace(request, session_history=None, evidence_context=None),
+                                 system_prompt),
+            model
+        )
+        remaining = max_input_tokens - base
+        if evidence:
+            remaining -= self.counter.count(EVIDENCE_TEMPLATE.format(evidence="", question=""), model)
+
+        # 按优先级依次放入：最近历史 → 证据（检索排序）→ 更早历史（由近及远）
+        recent = list(range(len(history) - 1, max(len(history) - 1 - self.min_history_turns, -1), -1))
+        older = list(range(len(history) - 1 - len(recent), -1, -1))
+        candidates = (
+            [("history", i) for i in recent]
+            + [("evidence", i) for i in range(len(evidence))]
+            + [("history", i) for i in older]
+        )
+
+        kept = {"history": set(), "evidence": set()}
+        for kind, index in candidates:
+            if kind == "history":
+                cost = self.counter.count(history[index].get("content") or "", model) + TOKENS_PER_MESSAGE
+            else:
+                cost = self.counter.count(evidence[index], model) + (
+                    self.counter.count(EVIDENCE_SEPARATOR, model) if kept["evidence"] else 0
+                )
+            if cost <= remaining:
+                kept[kind].add(index)
+                remaining -= cost
+
+        trimmed = dataclasses.replace(
+            request,
+            session_history=[turn for i, turn in enumerate(history) if i in kept["history"]] or None,
+            evidence_context=EVIDENCE_SEPARATOR.join(
+                chunk for i, chunk in enumerate(evidence) if i in kept["evidence"]
+            ) or None
+        )
+
+        budget.input_tokens = self.count(trimmed, model, system_prompt)
+        budget.history_kept = len(kept["history"])
+        budget.history_dropped = len(history) - budget.history_kept
+        budget.evidence_kept = len(kept["evidence"])
+        budget.evidence_dropped = len(evidence) - budget.evidence_kept
+        budget.breakdown = self._breakdown(trimmed, model, system)
+
+        logger.info(
+            f"✂️ 提示词裁剪: {model} {total} -> {budget.input_tokens} tokens (预算 {max_input_tokens})，"
+            f"历史 -{budget.history_dropped}，证据 -{budget.evidence_dropped}"
+        )
+        return trimmed, budget
+
+    # ==================== 内部实现 ====================
+
+    def _build_messages(self, request: LLMRequest, system_prompt: Optional[str]) -> List[Dict[str, str]]:
+        """与提供商 _build_messages 一致的消息列表"""
+        messages = []
+        system = request.system_prompt or system_prompt
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.extend(request.session_history or [])
+
+        user_content = request.user_message
+        if request.evidence_context:
+            user_content = EVIDENCE_TEMPLATE.format(evidence=request.evidence_context, question=user_content)
+        messages.append({"role": "user", "content": user_content})
+        return messages
+
+    def _breakdown(self, request: LLMRequest, model: str, system: Optional[str]) -> Dict[str, int]:
+        """各部分 token 数"""
+        return {
+            "system": self.counter.count(system or "", model),
+            "history": sum(self.counter.count(turn.get("content") or "", model)
+                           for turn in request.session_history or []),
+            "evidence": self.counter.count(request.evidence_context or "", model),
+            "question": self.counter.count(request.user_message, model)
+        }
+
+    @staticmethod
+    def _split_evidence(evidence_context: Optional[str]) -> List[str]:
+        if not evidence_context:
+            return []
+        return [chunk for chunk in evidence_context.split(EVIDENCE_SEPARATOR) if chunk.strip()]
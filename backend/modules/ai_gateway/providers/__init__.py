@@ -1,6 +1,7 @@
 """
 AI 提供商模块
 """
+from .openai_compatible import OpenAICompatibleProvider
 from .openai_provider import OpenAIProvider
 from .deepseek_provider import DeepSeekProvider
 from .claude_provider import ClaudeProvider
@@ -11,6 +12,7 @@ from .gemini_provider import GeminiProvider
 from .moonshot_provider import MoonshotProvider
 
 __all__ = [
+    'OpenAICompatibleProvider',
     'OpenAIProvider',
     'DeepSeekProvider',
     'ClaudeProvider',
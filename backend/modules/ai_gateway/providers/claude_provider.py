@@ -4,10 +4,10 @@ Anthropic Claude 提供商
 """
 import time
 import logging
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict
 
 from ..base import BaseLLMProvider
-from ..types import LLMRequest, LLMResponse, ProviderConfig
+from ..types import LLMRequest, LLMResponse, LLMStreamChunk, ProviderConfig
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +24,10 @@ class ClaudeProvider(BaseLLMProvider):
                 api_key=config.api_key,
                 timeout=config.timeout
             )
+            self.async_client = anthropic.AsyncAnthropic(
+                api_key=config.api_key,
+                timeout=config.timeout
+            )
             logger.info("Claude 客户端初始化成功")
         except ImportError:
             logger.error("anthropic 库未安装，请运行: pip install anthropic")
@@ -33,59 +37,94 @@ class ClaudeProvider(BaseLLMProvider):
             raise
     
     def generate(self, request: LLMRequest) -> LLMResponse:
-        """调用 Claude API"""
+        """调用 Claude API（同步兼容路径）"""
         start_time = time.time()
         
         try:
-            # Claude API 使用不同的消息格式
-            system_prompt = request.system_prompt or "你是专业的技术客服。"
-            messages = self._build_messages(request)
-            
-            response = self.client.messages.create(
-                model=self.config.model,
-                max_tokens=request.max_tokens,
-                temperature=request.temperature,
-                system=system_prompt,
-                messages=messages
-            )
-            
-            latency_ms = int((time.time() - start_time) * 1000)
-            
-            content = response.content[0].text
-            finish_reason = response.stop_reason
+            response = self.client.messages.create(**self._build_params(request))
+            return self._parse_response(response, start_time)
             
-            token_in = response.usage.input_tokens
-            token_out = response.usage.output_tokens
-            token_total = token_in + token_out
-            
-            logger.info(f"Claude 成功: latency={latency_ms}ms, tokens={token_in}/{token_out}/{token_total}")
-            
-            return LLMResponse(
-                content=content,
-                provider="claude",
-                model=self.config.model,
-                token_in=token_in,
-                token_out=token_out,
-                token_total=token_total,
-                latency_ms=latency_ms,
-                finish_reason=finish_reason
-            )
+        except Exception as e:
+            return self._error_response(e, start_time)
+    
+    async def agenerate(self, request: LLMRequest) -> LLMResponse:
+        """调用 Claude API（原生异步）"""
+        start_time = time.time()
+        
+        try:
+            response = await self.async_client.messages.create(**self._build_params(request))
+            return self._parse_response(response, start_time)
             
         except Exception as e:
-            latency_ms = int((time.time() - start_time) * 1000)
-            logger.error(f"Claude 调用失败: {e}")
+            return self._error_response(e, start_time)
+    
+    async def astream(self, request: LLMRequest) -> AsyncIterator[LLMStreamChunk]:
+        """流式调用 Claude API"""
+        async with self.async_client.messages.stream(**self._build_params(request)) as stream:
+            async for text in stream.text_stream:
+                yield LLMStreamChunk(delta=text)
             
-            return LLMResponse(
-                content="",
-                provider="claude",
-                model=self.config.model,
-                token_in=0,
-                token_out=0,
-                token_total=0,
-                latency_ms=latency_ms,
-                error=str(e)
+            final = await stream.get_final_message()
+            yield LLMStreamChunk(
+                finish_reason=final.stop_reason,
+                token_in=final.usage.input_tokens,
+                token_out=final.usage.output_tokens
             )
     
+    def _build_params(self, request: LLMRequest) -> Dict:
+        """构建请求参数（Claude API 使用不同的消息格式）"""
+        return {
+            "model": self.config.model,
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature,
+            "system": request.system_prompt or self._get_default_system_prompt(),
+            "messages": self._build_messages(request)
+        }
+    
+    def _get_default_system_prompt(self) -> str:
+        """默认系统指令"""
+        return "你是专业的技术客服。"
+    
+    def _parse_response(self, response, start_time: float) -> LLMResponse:
+        """解析 messages 响应"""
+        latency_ms = int((time.time() - start_time) * 1000)
+        
+        content = response.content[0].text
+        finish_reason = response.stop_reason
+        
+        token_in = response.usage.input_tokens
+        token_out = response.usage.output_tokens
+        token_total = token_in + token_out
+        
+        logger.info(f"Claude 成功: latency={latency_ms}ms, tokens={token_in}/{token_out}/{token_total}")
+        
+        return LLMResponse(
+            content=content,
+            provider="claude",
+            model=self.config.model,
+            token_in=token_in,
+            token_out=token_out,
+            token_total=token_total,
+            latency_ms=latency_ms,
+            finish_reason=finish_reason
+        )
+    
+    def _error_response(self, error: Exception, start_time: float) -> LLMResponse:
+        """调用失败响应"""
+        latency_ms = int((time.time() - start_time) * 1000)
+        logger.error(f"Claude 调用失败: {error}")
+        
+        return LLMResponse(
+            content="",
+            provider="claude",
+            model=self.config.model,
+            token_in=0,
+            token_out=0,
+            token_total=0,
+            latency_ms=latency_ms,
+            error=str(error)
+        )
+    
     def _build_messages(self, request: LLMRequest) -> List[Dict[str, str]]:
         """构建消息列表（Claude 格式）"""
         messages = []
@@ -0,0 +1,256 @@
+"""
+OpenAI 兼容接口提供商基类
+OpenAI / DeepSeek / 通义千问 / GLM / Gemini / Moonshot 共用
+- generate: 同步调用（兼容旧代码）
+- agenerate: 原生异步调用（AsyncOpenAI），同一事件循环内所有提供商共享一个连接池
+- astream: 流式调用，逐段产出文本增量
+"""
+import asyncio
+import os
+import time
+import logging
+import weakref
+from typing import AsyncIterator, List, Dict, Optional
+
+from ..base import BaseLLMProvider
+from ..types import LLMRequest, LLMResponse, LLMStreamChunk, ProviderConfig
+
+logger = logging.getLogger(__name__)
+
+# 所有 AsyncOpenAI 客户端共享的连接池（keep-alive 复用，避免每个提供商各建一套连接）
+# httpx.AsyncClient 的连接绑定事件循环，因此按事件循环各建一个
+_shared_async_http_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_shared_async_http_client():
+    """获取当前事件循环共享的异步 HTTP 客户端（首次调用或已关闭时创建）"""
+    loop = asyncio.get_running_loop()
+    client = _shared_async_http_clients.get(loop)
+    if client is None or client.is_closed:
+        import httpx
+        import openai
+
+        client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "2000")),
+                max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "200")),
+                keepalive_expiry=30.0
+            )
+        )
+        _shared_async_http_clients[loop] = client
+    return client
+
+
+async def close_shared_async_http_client() -> None:
+    """关闭当前事件循环的共享连接池（应用关闭时调用，之后的请求会重新创建）"""
+    client = _shared_async_http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+class OpenAICompatibleProvider(BaseLLMProvider):
+    """OpenAI 兼容接口提供商"""
+
+    # 子类覆盖
+    provider_key = "openai"           # LLMResponse.provider
+    display_name = "OpenAI"           # 日志名称
+    default_api_base: Optional[str] = None
+    default_system_prompt = "你是专业的技术客服。"
+    include_raw_response = False
+    stream_usage = True               # 是否支持 stream_options.include_usage
+
+    def __init__(self, config: ProviderConfig):
+        super().__init__(config)
+
+        # AsyncOpenAI 按共享连接池创建，连接池随事件循环重建时跟随更换（见 async_client）
+        self._async_client = None
+        self._async_http_client = None
+        self._async_client_override = None
+
+        try:
+            import openai
+            self.base_url = config.api_base or self.default_api_base
+            self.client = openai.OpenAI(
+                api_key=config.api_key,
+                base_url=self.base_url,
+                timeout=config.timeout
+            )
+            logger.info(f"{self.display_name} 客户端初始化成功: {config.model}")
+        except ImportError:
+            logger.error("openai 库未安装，请运行: pip install openai")
+            raise
+        except Exception as e:
+            logger.error(f"{self.display_name} 客户端初始化失败: {e}")
+            raise
+
+    @property
+    def async_client(self):
+        """当前事件循环的 AsyncOpenAI 客户端（每次调用时获取，不持有已关闭的连接池）"""
+        if self._async_client_override is not None:
+            return self._async_client_override
+
+        http_client = get_shared_async_http_client()
+        if self._async_client is None or self._async_http_client is not http_client:
+            import openai
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self.config.api_key,
+                base_url=self.base_url,
+                timeout=self.config.timeout,
+                http_client=http_client
+            )
+            self._async_http_client = http_client
+        return self._async_client
+
+    @async_client.setter
+    def async_client(self, client) -> None:
+        """指定异步客户端（自定义传输、测试）"""
+        self._async_client_override = client
+
+    def generate(self, request: LLMRequest) -> LLMResponse:
+        """同步调用（兼容路径）"""
+        start_time = time.time()
+
+        try:
+            messages = self._build_messages(request)
+
+            logger.debug(f"{self.display_name} 请求: model={self.config.model}, messages={len(messages)}")
+
+            response = self.client.chat.completions.create(
+                model=self.config.model,
+                messages=messages,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature
+            )
+
+            return self._parse_response(response, start_time)
+
+        except Exception as e:
+            return self._error_response(e, start_time)
+
+    async def agenerate(self, request: LLMRequest) -> LLMResponse:
+        """原生异步调用（不占用线程）"""
+        start_time = time.time()
+
+        try:
+            messages = self._build_messages(request)
+
+            logger.debug(f"{self.display_name} 异步请求: model={self.config.model}, messages={len(messages)}")
+
+            response = await self.async_client.chat.completions.create(
+                model=self.config.model,
+                messages=messages,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature
+            )
+
+            return self._parse_response(response, start_time)
+
+        except Exception as e:
+            return self._error_response(e, start_time)
+
+    async def astream(self, request: LLMRequest) -> AsyncIterator[LLMStreamChunk]:
+        """流式调用（异常直接抛出，由网关决定是否降级）"""
+        params = {
+            "model": self.config.model,
+            "messages": self._build_messages(request),
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature,
+            "stream": True
+        }
+        if self.stream_usage:
+            params["stream_options"] = {"include_usage": True}
+
+        stream = await self.async_client.chat.completions.create(**params)
+
+        try:
+            async for event in stream:
+                delta = ""
+                finish_reason = None
+                if event.choices:
+                    choice = event.choices[0]
+                    delta = (choice.delta.content or "") if choice.delta else ""
+                    finish_reason = choice.finish_reason
+
+                usage = getattr(event, "usage", None)
+                if delta or finish_reason or usage:
+                    yield LLMStreamChunk(
+                        delta=delta,
+                        finish_reason=finish_reason,
+                        token_in=usage.prompt_tokens if usage else 0,
+                        token_out=usage.completion_tokens if usage else 0
+                    )
+        finally:
+            # 提前结束（客户端断开/取消）时释放连接
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+
+    def _parse_response(self, response, start_time: float) -> LLMResponse:
+        """解析 chat.completions 响应"""
+        latency_ms = int((time.time() - start_time) * 1000)
+
+        content = response.choices[0].message.content
+        finish_reason = response.choices[0].finish_reason
+
+        token_in = response.usage.prompt_tokens if response.usage else 0
+        token_out = response.usage.completion_tokens if response.usage else 0
+        token_total = response.usage.total_tokens if response.usage else 0
+
+        logger.info(
+            f"{self.display_name} 成功: latency={latency_ms}ms, "
+            f"tokens={token_in}/{token_out}/{token_total}"
+        )
+
+        raw_response = None
+        if self.include_raw_response and hasattr(response, 'model_dump'):
+            raw_response = response.model_dump()
+
+        return LLMResponse(
+            content=content,
+            provider=self.provider_key,
+            model=self.config.model,
+            token_in=token_in,
+            token_out=token_out,
+            token_total=token_total,
+            latency_ms=latency_ms,
+            finish_reason=finish_reason,
+            raw_response=raw_response
+        )
+
+    def _error_response(self, error: Exception, start_time: float) -> LLMResponse:
+        """调用失败响应"""
+        latency_ms = int((time.time() - start_time) * 1000)
+        logger.error(f"{self.display_name} 调用失败: {error}")
+
+        return LLMResponse(
+            content="",
+            provider=self.provider_key,
+            model=self.config.model,
+            token_in=0,
+            token_out=0,
+            token_total=0,
+            latency_ms=latency_ms,
+            error=str(error)
+        )
+
+    def _build_messages(self, request: LLMRequest) -> List[Dict[str, str]]:
+        """构建消息列表"""
+        messages = []
+
+        system_prompt = request.system_prompt or self._get_default_system_prompt()
+        messages.append({"role": "system", "content": system_prompt})
+
+        if request.session_history:
+            messages.extend(request.session_history)
+
+        user_content = request.user_message
+        if request.evidence_context:
+            user_content = f"参考资料：\n{request.evidence_context}\n\n用户问题：{user_content}"
+
+        messages.append({"role": "user", "content": user_content})
+
+        return messages
+
+    def _get_default_system_prompt(self) -> str:
+        """默认系统指令"""
+        return self.default_system_prompt
@@ -0,0 +1,434 @@
+"""
+网关响应缓存
+- 精确命中：规范化问题 + 证据指纹（证据 chunk_id 集合，或无 chunk_id 时证据文本，连同生成参数的哈希）
+- 近似命中：同一租户、同一证据指纹下，问题向量余弦相似度超过阈值；
+  同组向量保存在连续矩阵中，一次矩阵乘完成扫描，扫描不持有锁
+- LRU + TTL 淘汰，按租户隔离命名空间
+- 知识块变更时按 chunk_id 失效依赖它的缓存条目
+"""
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .types import LLMResponse
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], Awaitable[Sequence[float]]]
+
+DEFAULT_TENANT = "default"
+
+
+def normalize_question(text: str) -> str:
+    """规范化问题：全角转半角、小写、去掉空白与标点（"多少钱？" 与 "多少钱" 视为同一问题）"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(
+        ch for ch in text
+        if not ch.isspace() and not unicodedata.category(ch).startswith("P")
+    )
+
+
+def evidence_fingerprint(
+    chunk_ids: Optional[Iterable[str]],
+    evidence_context: Optional[str] = None,
+    params: Sequence[Any] = ()
+) -> str:
+    """
+    证据指纹：与顺序无关的 chunk_id 集合哈希；没有 chunk_id 但有证据文本时哈希文本本身，
+    生成参数（max_tokens / temperature）一并计入。无证据且无参数时为空串
+    """
+    parts = []
+    chunk_ids = sorted(set(chunk_ids or ()))
+    if chunk_ids:
+        parts.append("ids\0" + "\0".join(chunk_ids))
+    elif evidence_context:
+        parts.append("ctx\0" + evidence_context)
+    if params:
+        parts.append("params\0" + repr(tuple(params)))
+    if not parts:
+        return ""
+    payload = "\1".join(parts).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+@dataclass
+class CacheHit:
+    """缓存命中结果"""
+    response: LLMResponse
+    match: str          # exact | semantic
+    similarity: float
+
+
+@dataclass
+class _Entry:
+    tenant: str
+    fingerprint: str
+    chunk_ids: Tuple[str, ...]
+    response: LLMResponse
+    expires_at: float
+    vector: Optional[np.ndarray] = None
+
+
+class _VectorGroup:
+    """
+    同一 (租户, 证据指纹) 下条目向量的连续矩阵
+    追加按容量倍增，删除用末行填补空位，行号与条目键双向映射
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.matrix = np.empty((8, dim), dtype=np.float32)
+        self.keys: List[Tuple[str, str]] = []
+        self.rows: Dict[Tuple[str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: Tuple[str, str], vector: np.ndarray) -> None:
+        size = len(self.keys)
+        if size == len(self.matrix):
+            # 扩容时换新数组，正在扫描旧数组的读者不受影响
+            grown = np.empty((size * 2, self.dim), dtype=np.float32)
+            grown[:size] = self.matrix[:size]
+            self.matrix = grown
+        self.matrix[size] = vector
+        self.keys.append(key)
+        self.rows[key] = size
+
+    def remove(self, key: Tuple[str, str]) -> None:
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            self.matrix[row] = self.matrix[last]
+            self.keys[row] = moved
+            self.rows[moved] = row
+        self.keys.pop()
+
+    def snapshot(self) -> Tuple[np.ndarray, List[Tuple[str, str]]]:
+        """供无锁扫描的矩阵视图与键列表（调用方持有锁）"""
+        return self.matrix[:len(self.keys)], list(self.keys)
+
+
+class ResponseCache:
+    """
+    AI 网关响应缓存
+
+    向量由 embedder 计算（通常为 SmartEmbeddingService.embed_text，自带嵌入缓存，
+    查询与写入时对同一问题重复调用不会重复请求嵌入接口）；未配置 embedder 时只做精确命中。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        ttl: int = 3600,
+        similarity_threshold: float = 0.92,
+        embedder: Optional[Embedder] = None
+    ):
+        """
+        Args:
+            max_entries: 最大条数（所有租户合计）
+            ttl: 过期时间（秒）
+            similarity_threshold: 近似命中的余弦相似度阈值
+            embedder: 异步嵌入函数 text -> vector（None 表示不启用近似命中）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder
+
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        # (租户, 证据指纹) -> 同组条目的向量矩阵，近似匹配只扫描同组条目
+        self._groups: Dict[Tuple[str, str], _VectorGroup] = {}
+        # chunk_id -> 条目键，知识块变更时反查失效
+        self._chunk_index: Dict[str, Set[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+        # 每次失效递增；写入时代数已变化说明证据可能过期，丢弃
+        self.generation = 0
+
+        self._stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "stale_stores": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    async def lookup(
+        self,
+        question: str,
+        evidence_ids: Optional[Iterable[str]] = None,
+        tenant: str = DEFAULT_TENANT,
+        evidence_context: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None
+    ) -> Optional[CacheHit]:
+        """
+        查询缓存
+
+        Args:
+            question: 用户问题
+            evidence_ids: 本次回答使用的证据 chunk_id
+            tenant: 租户
+            evidence_context: 证据文本（没有 chunk_id 时用于区分证据）
+            max_tokens: 生成参数，不同参数的回答互不命中
+            temperature: 生成参数
+        Returns:
+            CacheHit 或 None
+        """
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+
+        fingerprint = self._fingerprint(evidence_ids, evidence_context, max_tokens, temperature)
+        key = (tenant, self._entry_key(fingerprint, normalized))
+
+        with self._lock:
+            entry = self._get_live(key)
+            if entry is not None:
+                self._stats["exact_hits"] += 1
+                return CacheHit(response=entry.response, match="exact", similarity=1.0)
+
+        vector = await self._embed(question)
+        if vector is not None:
+            hit = self._semantic_lookup(vector, (tenant, fingerprint))
+            if hit is not None:
+                return hit
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    async def store(
+        self,
+        question: str,
+        response: LLMResponse,
+        evidence_ids: Optional[Iterable[str]] = None,
+        tenant: str = DEFAULT_TENANT,
+        generation: Optional[int] = None,
+        evidence_context: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None
+    ) -> bool:
+        """
+        写入缓存
+
+        Args:
+            question: 用户问题
+            response: 成功的 LLM 响应
+            evidence_ids: 本次回答使用的证据 chunk_id
+            tenant: 租户
+            generation: 调用 LLM 前读取的 self.generation；期间发生过失效则不写入
+            evidence_context: 证据文本（没有 chunk_id 时用于区分证据）
+            max_tokens: 生成参数
+            temperature: 生成参数
+        Returns:
+            是否写入
+        """
+        normalized = normalize_question(question)
+        if not normalized or not response.content or response.error:
+            return False
+
+        chunk_ids = tuple(sorted(set(evidence_ids or ())))
+        fingerprint = self._fingerprint(chunk_ids, evidence_context, max_tokens, temperature)
+        vector = await self._embed(question)
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self._stats["stale_stores"] += 1
+                return False
+
+            key = (tenant, self._entry_key(fingerprint, normalized))
+            self._remove(key)
+
+            self._entries[key] = _Entry(
+                tenant=tenant,
+                fingerprint=fingerprint,
+                chunk_ids=chunk_ids,
+                response=response,
+                expires_at=time.time() + self.ttl,
+                vector=vector
+            )
+            if vector is not None:
+                group = self._groups.get((tenant, fingerprint))
+                if group is None:
+                    group = self._groups[(tenant, fingerprint)] = _VectorGroup(len(vector))
+                if group.dim == len(vector):
+                    group.add(key, vector)
+            for chunk_id in chunk_ids:
+                self._chunk_index.setdefault(chunk_id, set()).add(key)
+            self._stats["stores"] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+        return True
+
+    def invalidate_chunks(self, chunk_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        知识块变更时失效缓存
+        Args:
+            chunk_ids: 变更的 chunk_id；None 表示知识库整体变更（全部失效）
+        Returns:
+            失效条数
+        """
+        with self._lock:
+            self.generation += 1
+
+            if chunk_ids is None:
+                count = len(self._entries)
+                self._clear()
+            else:
+                keys = set()
+                for chunk_id in chunk_ids:
+                    keys |= self._chunk_index.get(chunk_id, set())
+                for key in keys:
+                    self._remove(key)
+                count = len(keys)
+
+            self._stats["invalidations"] += count
+
+        if count:
+            logger.info(f"响应缓存失效: {count} 条")
+        return count
+
+    def invalidate_tenant(self, tenant: str) -> int:
+        """清空某个租户的缓存"""
+        with self._lock:
+            self.generation += 1
+            keys = [key for key in self._entries if key[0] == tenant]
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self.generation += 1
+            self._clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        """缓存统计"""
+        with self._lock:
+            hits = self._stats["exact_hits"] + self._stats["semantic_hits"]
+            total = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "tenants": len({key[0] for key in self._entries}),
+                "hit_rate": round(hits / total, 4) if total else 0.0
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ==================== 辅助方法 ====================
+
+    @staticmethod
+    def _fingerprint(
+        evidence_ids: Optional[Iterable[str]],
+        evidence_context: Optional[str],
+        max_tokens: Optional[int],
+        temperature: Optional[float]
+    ) -> str:
+        params = (max_tokens, temperature) if max_tokens is not None or temperature is not None else ()
+        return evidence_fingerprint(evidence_ids, evidence_context, params)
+
+    def _semantic_lookup(self, vector: np.ndarray, group_key: Tuple[str, str]) -> Optional[CacheHit]:
+        """
+        近似匹配：锁内只取矩阵视图，矩阵乘在锁外完成；
+        扫描期间条目可能被删除或移位，命中的候选在锁内按其当前向量复核
+        """
+        with self._lock:
+            group = self._groups.get(group_key)
+            if group is None or not len(group) or group.dim != len(vector):
+                return None
+            matrix, keys = group.snapshot()
+
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+
+        with self._lock:
+            candidate = keys[best]
+            entry = self._get_live(candidate, touch=False)
+            if entry is None or entry.vector is None:
+                return None
+            score = float(entry.vector @ vector)
+            if score < self.similarity_threshold:
+                return None
+            self._entries.move_to_end(candidate)
+            self._stats["semantic_hits"] += 1
+            return CacheHit(response=entry.response, match="semantic", similarity=score)
+
+    @staticmethod
+    def _entry_key(fingerprint: str, normalized: str) -> str:
+        payload = f"{fingerprint}\0{normalized}".encode("utf-8")
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    async def _embed(self, question: str) -> Optional[np.ndarray]:
+        """计算归一化的问题向量，失败时退化为只做精确命中"""
+        if self.embedder is None:
+            return None
+        try:
+            vector = await self.embedder(question)
+        except Exception as e:
+            logger.debug(f"响应缓存嵌入失败，跳过近似匹配: {e}")
+            return None
+
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if not norm:
+            return None
+        return vector / norm
+
+    def _get_live(self, key: Tuple[str, str], touch: bool = True) -> Optional[_Entry]:
+        """读取未过期的条目（调用方持有锁）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self._remove(key)
+            return None
+        if touch:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        """删除条目及其索引（调用方持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        group = self._groups.get((entry.tenant, entry.fingerprint))
+        if group is not None:
+            group.remove(key)
+            if not len(group):
+                del self._groups[(entry.tenant, entry.fingerprint)]
+
+        for chunk_id in entry.chunk_ids:
+            keys = self._chunk_index.get(chunk_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._chunk_index[chunk_id]
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._groups.clear()
+        self._chunk_index.clear()
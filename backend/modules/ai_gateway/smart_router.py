@@ -1,12 +1,18 @@
 """
 智能模型路由器
-根据问题复杂度、任务类型、上下文长度自动选择最优模型
+根据问题复杂度、任务类型、上下文长度自动选择最优模型，
+并按实时遥测（延迟/错误率/熔断状态）降级表现异常的模型
 """
 import logging
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set, Tuple
 from dataclasses import dataclass
 
+from .circuit_breaker import CircuitBreaker
+from .telemetry import ModelTelemetry
+from modules.nlp.keyword_matcher import get_keyword_matcher
+from modules.nlp.token_counter import get_token_counter
+
 logger = logging.getLogger(__name__)
 
 
@@ -34,18 +40,50 @@ class SmartModelRouter:
     3. 评估上下文长度
     4. 智能选择最优模型
     5. 成本优化
+    6. 实时降级：模型熔断、错误率过高或延迟明显高于画像时改选健康模型
     """
     
-    def __init__(self):
-        """初始化路由器"""
+    def __init__(
+        self,
+        telemetry: Optional[ModelTelemetry] = None,
+        degrade_latency_factor: float = 2.0,
+        max_error_rate: float = 0.3
+    ):
+        """
+        初始化路由器
+        
+        Args:
+            telemetry: 实时遥测存储（默认新建）
+            degrade_latency_factor: EWMA 延迟超过画像延迟的倍数时视为降级
+            max_error_rate: 窗口错误率超过该值时视为降级
+        """
         # 定义模型画像
         self.model_profiles = self._init_model_profiles()
         
+        # 实时遥测
+        self.telemetry = telemetry or ModelTelemetry()
+        self.degrade_latency_factor = degrade_latency_factor
+        self.max_error_rate = max_error_rate
+        
+        # 可用模型（由网关按已注册的提供商设置，None 表示不限制）
+        self.available_models: Optional[Set[str]] = None
+        
+        # 模型名 -> 模型 key（如 deepseek-chat -> deepseek）
+        self._model_keys = {profile.model: key for key, profile in self.model_profiles.items()}
+        
         # 路由规则
         self.routing_rules = self._init_routing_rules()
         
-        # 复杂度关键词
+        # 复杂度关键词（与复杂度打分用的逻辑词/推理词一起编译为一个匹配自动机）
         self.complexity_keywords = self._init_complexity_keywords()
+        self.keyword_matcher = get_keyword_matcher({
+            **self.complexity_keywords,
+            'logic_words': ['如果', '那么', '为什么', '怎么办', '原因', '导致'],
+            'reasoning_words': ['对比', '分析', '评估', '建议', '判断', '排查', '诊断']
+        })
+        
+        # 成本估算按模型分词器计数
+        self.token_counter = get_token_counter()
         
         logger.info("智能模型路由器初始化完成")
     
@@ -233,7 +271,7 @@ class SmartModelRouter:
                 has_image=has_image,
                 is_critical=is_critical
             ):
-                model_key = rule['target_model']
+                model_key, demoted_reason = self._apply_health(rule['target_model'], context_length)
                 profile = self.model_profiles[model_key]
                 
                 # 估算成本
@@ -243,21 +281,28 @@ class SmartModelRouter:
                     context
                 )
                 
+                reason = rule['reason']
+                if demoted_reason:
+                    reason = f"{reason}；{demoted_reason}"
+                
                 logger.info(
                     f"路由决策: {model_key} (复杂度={complexity:.2f}, "
-                    f"任务={task_type}, 原因={rule['reason']})"
+                    f"任务={task_type}, 原因={reason})"
                 )
                 
-                return {
+                routing_info = {
                     'model_key': model_key,
                     'provider': profile.provider,
                     'model': profile.model,
-                    'reason': rule['reason'],
+                    'reason': reason,
                     'estimated_cost': estimated_cost,
-                    'estimated_latency': profile.avg_latency_ms,
+                    'estimated_latency': self._live_latency(model_key),
                     'task_type': task_type,
                     'complexity': complexity
                 }
+                if demoted_reason:
+                    routing_info['demoted_from'] = rule['target_model']
+                return routing_info
         
         # 默认：Qwen-turbo
         default_profile = self.model_profiles['qwen-turbo']
@@ -267,19 +312,120 @@ class SmartModelRouter:
             'model': default_profile.model,
             'reason': '默认选择',
             'estimated_cost': self._estimate_cost(default_profile, question, context),
-            'estimated_latency': default_profile.avg_latency_ms
+            'estimated_latency': self._live_latency('qwen-turbo')
         }
     
+    # ==================== 实时遥测 ====================
+    
+    def record_result(
+        self,
+        model: str,
+        latency_ms: int,
+        success: bool,
+        token_out: int = 0
+    ) -> None:
+        """
+        记录模型调用结果（由网关在每次调用后回报）
+        
+        Args:
+            model: 模型 key 或模型名（如 deepseek-chat）
+            latency_ms: 延迟（毫秒）
+            success: 是否成功
+            token_out: 输出 token 数
+        """
+        model_key = self._model_keys.get(model, model)
+        self.telemetry.record(model_key, latency_ms, success, token_out)
+    
+    def get_breaker(self, model: str) -> CircuitBreaker:
+        """
+        模型熔断器（网关与路由共用，每个模型一个）
+        
+        Args:
+            model: 模型 key 或模型名（如 deepseek-chat）
+        """
+        return self.telemetry.breaker(self._model_keys.get(model, model))
+    
+    def get_live_table(self) -> Dict[str, Dict[str, Any]]:
+        """所有模型的实时指标（含画像延迟与是否降级）"""
+        table = {}
+        for key, profile in self.model_profiles.items():
+            snapshot = self.telemetry.snapshot(key)
+            healthy, reason = self._check_health(key, snapshot)
+            table[key] = {
+                **snapshot,
+                'profile_latency_ms': profile.avg_latency_ms,
+                'healthy': healthy,
+                'degraded_reason': reason
+            }
+        return table
+    
+    def _apply_health(self, model_key: str, context_length: int) -> Tuple[str, Optional[str]]:
+        """
+        目标模型不健康时改选健康模型
+        
+        Returns:
+            (最终模型 key, 降级原因或 None)
+        """
+        healthy, reason = self._check_health(model_key)
+        if healthy:
+            return model_key, None
+        
+        alternatives = [
+            key for key, profile in self.model_profiles.items()
+            if key != model_key
+            and (self.available_models is None or key in self.available_models)
+            and profile.max_context * 2 >= context_length  # 粗略按 2 字符/token 估算
+            and self._check_health(key)[0]
+        ]
+        if not alternatives:
+            logger.warning(f"模型 {model_key} 降级（{reason}），但没有健康的替代模型")
+            return model_key, None
+        
+        replacement = min(alternatives, key=self._live_latency)
+        logger.warning(f"⚠️ 模型降级: {model_key} → {replacement}（{reason}）")
+        return replacement, f"{model_key} 降级: {reason}"
+    
+    def _check_health(
+        self,
+        model_key: str,
+        snapshot: Optional[Dict[str, Any]] = None
+    ) -> Tuple[bool, Optional[str]]:
+        """按遥测判断模型是否健康，返回 (是否健康, 原因)"""
+        snapshot = snapshot or self.telemetry.snapshot(model_key)
+        
+        if snapshot['circuit'] == 'open':
+            return False, "熔断中"
+        
+        if snapshot['samples'] < self.telemetry.min_samples:
+            return True, None
+        
+        if snapshot['error_rate'] > self.max_error_rate:
+            return False, f"错误率 {snapshot['error_rate']:.0%}"
+        
+        baseline = self.model_profiles[model_key].avg_latency_ms
+        ewma = snapshot['ewma_latency_ms']
+        if ewma is not None and ewma > baseline * self.degrade_latency_factor:
+            return False, f"延迟 {ewma}ms（画像 {baseline}ms）"
+        
+        return True, None
+    
+    def _live_latency(self, model_key: str) -> int:
+        """预估延迟：有足够样本时用 EWMA，否则用画像值"""
+        snapshot = self.telemetry.snapshot(model_key)
+        if snapshot['samples'] >= self.telemetry.min_samples and snapshot['ewma_latency_ms'] is not None:
+            return snapshot['ewma_latency_ms']
+        return self.model_profiles[model_key].avg_latency_ms
+    
     def _classify_task(self, question: str) -> str:
         """分类任务类型"""
-        question_lower = question.lower()
+        hits = self.keyword_matcher.count(question)
         
         # 检查总结任务
-        if any(kw in question for kw in self.complexity_keywords['summary']):
+        if hits['summary']:
             return 'summary'
         
         # 检查推理任务
-        if any(kw in question for kw in self.complexity_keywords['reasoning']):
+        if hits['reasoning']:
             return 'reasoning'
         
         # 默认为问答
@@ -293,6 +439,7 @@ class SmartModelRouter:
             float: 0-1之间的复杂度分数
         """
         score = 0.0
+        hits = self.keyword_matcher.count(question)
         
         # 1. 问题长度（20%权重）
         length_score = min(len(question) / 100, 1.0) * 0.2
@@ -304,14 +451,10 @@ class SmartModelRouter:
             score += 0.2
         
         # 3. 逻辑词（30%权重）
-        logic_words = ['如果', '那么', '为什么', '怎么办', '原因', '导致']
-        logic_count = sum(1 for word in logic_words if word in question)
-        score += min(logic_count / 3, 1.0) * 0.3
+        score += min(hits['logic_words'] / 3, 1.0) * 0.3
         
         # 4. 推理词（30%权重）
-        reasoning_words = ['对比', '分析', '评估', '建议', '判断', '排查', '诊断']
-        reasoning_count = sum(1 for word in reasoning_words if word in question)
-        score += min(reasoning_count / 3, 1.0) * 0.3
+        score += min(hits['reasoning_words'] / 3, 1.0) * 0.3
         
         return min(score, 1.0)
     
@@ -355,10 +498,10 @@ class SmartModelRouter:
         context: Optional[str]
     ) -> float:
         """估算成本（元）"""
-        # 简单估算tokens
-        input_tokens = len(question) // 2
+        # 按模型分词器计数
+        input_tokens = self.token_counter.count(question, profile.model)
         if context:
-            input_tokens += len(context) // 2
+            input_tokens += self.token_counter.count(context, profile.model)
         
         output_tokens = 200  # 假设平均输出200 tokens
         
@@ -370,6 +513,7 @@ class SmartModelRouter:
     
     def get_model_stats(self) -> Dict[str, Any]:
         """获取模型统计信息"""
+        live = self.get_live_table()
         return {
             'total_models': len(self.model_profiles),
             'models': {
@@ -377,8 +521,9 @@ class SmartModelRouter:
                     'provider': profile.provider,
                     'model': profile.model,
                     'cost_per_1k_avg': (profile.cost_per_1k_input + profile.cost_per_1k_output) / 2,
-                    'latency_ms': profile.avg_latency_ms,
-                    'best_for': profile.best_for_tasks
+                    'latency_ms': self._live_latency(key),
+                    'best_for': profile.best_for_tasks,
+                    'live': live[key]
                 }
                 for key, profile in self.model_profiles.items()
             }
@@ -0,0 +1,224 @@
+"""
+首轮投机应答
+- 高置信度（规则引擎 / 模板组装）：不调用 LLM，立即返回
+- 临界置信度：模板答案与 LLM 调用并行，LLM 在延迟 SLO 内返回则用 LLM，否则先返回模板；
+  LLM 在后台继续完成，两个答案一并记录用于对比评估
+- 其他：正常调用 LLM
+"""
+import asyncio
+import difflib
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from .first_turn_router import FirstTurnDecision, FirstTurnRouter
+from .types import LLMResponse
+
+logger = logging.getLogger(__name__)
+
+# 与提示词预算的证据分隔一致
+EVIDENCE_SEPARATOR = "\n\n"
+
+
+@dataclass
+class SpeculativeAnswer:
+    """投机应答结果"""
+    content: str
+    source: str                               # rule_engine | template_assembly | template_fallback | llm | 业务动作
+    decision: FirstTurnDecision
+    latency_ms: int
+    llm_response: Optional[LLMResponse] = None
+
+
+class SpeculativeResponder:
+    """
+    首轮投机应答器
+
+    用法：
+        responder = SpeculativeResponder(gateway)
+        answer = await responder.respond(message, evidences, kb_confidence)
+    """
+
+    def __init__(
+        self,
+        gateway,
+        router: Optional[FirstTurnRouter] = None,
+        latency_slo_ms: int = 1500,
+        background_timeout: float = 30.0,
+        max_comparisons: int = 500,
+        on_compare: Optional[Callable[[Dict[str, Any]], Any]] = None
+    ):
+        """
+        Args:
+            gateway: AI 网关（AIGateway）
+            router: 首轮路由器（默认新建）
+            latency_slo_ms: 临界置信度时等待 LLM 的最长时间（毫秒），超时返回模板答案
+            background_timeout: 超时后 LLM 在后台继续完成的最长时间（秒）
+            max_comparisons: 保留的对比记录条数
+            on_compare: 对比记录回调（如写入评估表）
+        """
+        self.gateway = gateway
+        self.router = router or FirstTurnRouter()
+        self.latency_slo_ms = latency_slo_ms
+        self.background_timeout = background_timeout
+        self.on_compare = on_compare
+
+        self.comparisons: Deque[Dict[str, Any]] = deque(maxlen=max_comparisons)
+        self._background: Set[asyncio.Task] = set()
+        self._stats = {
+            "total": 0, "direct": 0, "speculative": 0, "template_fallback": 0, "llm": 0
+        }
+
+    async def respond(
+        self,
+        message: str,
+        evidences: Optional[List] = None,
+        kb_confidence: float = 0.0,
+        evidence_context: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> SpeculativeAnswer:
+        """
+        首轮应答
+
+        Args:
+            message: 用户消息
+            evidences: 知识库检索结果（按相关性排序）
+            kb_confidence: 知识库置信度
+            evidence_context: 提供给 LLM 的证据上下文（默认由 evidences 拼接）
+            metadata: 网关元数据
+
+        Returns:
+            SpeculativeAnswer
+        """
+        start = time.time()
+        self._stats["total"] += 1
+        decision = await self.router.decide(message, evidences, kb_confidence)
+
+        # 高置信度：规则/模板/业务动作直接返回
+        if not decision.use_llm and decision.suggested_response:
+            self._stats["direct"] += 1
+            return SpeculativeAnswer(
+                content=decision.suggested_response,
+                source=decision.suggested_action,
+                decision=decision,
+                latency_ms=self._elapsed_ms(start)
+            )
+
+        llm_call = self._generate(message, evidences, evidence_context, metadata)
+
+        if not decision.speculative_response:
+            self._stats["llm"] += 1
+            response = await llm_call
+            return SpeculativeAnswer(
+                content=response.content, source="llm", decision=decision,
+                latency_ms=self._elapsed_ms(start), llm_response=response
+            )
+
+        # 临界置信度：模板已就绪，LLM 在 SLO 内返回才使用
+        self._stats["speculative"] += 1
+        task = asyncio.ensure_future(llm_call)
+        done, _ = await asyncio.wait({task}, timeout=self.latency_slo_ms / 1000)
+
+        if done and self._usable(task.result()):
+            response = task.result()
+            self._record_comparison(message, decision, response, start, served="llm")
+            return SpeculativeAnswer(
+                content=response.content, source="llm", decision=decision,
+                latency_ms=self._elapsed_ms(start), llm_response=response
+            )
+
+        self._stats["template_fallback"] += 1
+        logger.info(f"⚡ LLM 超过 {self.latency_slo_ms}ms 未返回，先返回模板答案")
+        if not done:
+            self._finish_in_background(task, message, decision, start)
+        else:
+            self._record_comparison(message, decision, task.result(), start, served="template")
+
+        return SpeculativeAnswer(
+            content=decision.speculative_response,
+            source="template_fallback",
+            decision=decision,
+            latency_ms=self._elapsed_ms(start)
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """投机应答统计（含模板与 LLM 答案的平均相似度）"""
+        similarities = [c["similarity"] for c in self.comparisons if c["similarity"] is not None]
+        return {
+            **self._stats,
+            "pending_background": len(self._background),
+            "comparisons": len(self.comparisons),
+            "avg_similarity": round(sum(similarities) / len(similarities), 4) if similarities else None
+        }
+
+    async def drain(self) -> None:
+        """等待后台 LLM 调用完成（测试与优雅退出用）"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    # ==================== 内部实现 ====================
+
+    async def _generate(
+        self,
+        message: str,
+        evidences: Optional[List],
+        evidence_context: Optional[str],
+        metadata: Optional[Dict[str, Any]]
+    ) -> LLMResponse:
+        if evidence_context is None and evidences:
+            evidence_context = EVIDENCE_SEPARATOR.join(e.content for e in evidences)
+        evidence_ids = [e.chunk_id for e in evidences] if evidences else None
+        return await self.gateway.generate(
+            message, evidence_context=evidence_context, metadata=metadata, evidence_ids=evidence_ids
+        )
+
+    def _finish_in_background(self, task: asyncio.Task, message: str,
+                              decision: FirstTurnDecision, start: float) -> None:
+        """超时的 LLM 调用在后台完成后记录对比"""
+        async def finish() -> None:
+            try:
+                response = await asyncio.wait_for(task, timeout=self.background_timeout)
+            except Exception as e:
+                logger.warning(f"投机应答后台 LLM 调用未完成: {e}")
+                response = None
+            self._record_comparison(message, decision, response, start, served="template")
+
+        background = asyncio.ensure_future(finish())
+        self._background.add(background)
+        background.add_done_callback(self._background.discard)
+
+    def _record_comparison(self, message: str, decision: FirstTurnDecision,
+                           response: Optional[LLMResponse], start: float, served: str) -> None:
+        llm_content = response.content if self._usable(response) else None
+        record = {
+            "message": message,
+            "confidence": decision.confidence,
+            "served": served,
+            "template": decision.speculative_response,
+            "llm": llm_content,
+            "llm_latency_ms": self._elapsed_ms(start),
+            "similarity": (
+                round(difflib.SequenceMatcher(None, decision.speculative_response, llm_content).ratio(), 4)
+                if llm_content else None
+            )
+        }
+        self.comparisons.append(record)
+        logger.info(
+            f"📊 投机应答对比: served={served}, confidence={decision.confidence:.2f}, "
+            f"LLM {record['llm_latency_ms']}ms, similarity={record['similarity']}"
+        )
+        if self.on_compare is not None:
+            try:
+                self.on_compare(record)
+            except Exception as e:
+                logger.warning(f"投机应答对比回调失败: {e}")
+
+    @staticmethod
+    def _usable(response: Optional[LLMResponse]) -> bool:
+        return response is not None and bool(response.content) and not response.error
+
+    @staticmethod
+    def _elapsed_ms(start: float) -> int:
+        return int((time.time() - start) * 1000)
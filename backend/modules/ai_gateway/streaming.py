@@ -0,0 +1,171 @@
+"""
+网关流式响应
+- 异步迭代文本增量
+- 流结束（正常结束/出错/调用方提前关闭）时汇总为 LLMResponse，记录 token 与延迟
+"""
+import time
+import logging
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional
+
+from .types import LLMResponse, LLMStreamChunk
+
+logger = logging.getLogger(__name__)
+
+
+class LLMStream:
+    """
+    流式响应
+
+    用法：
+        stream = await gateway.generate_stream(...)
+        async for delta in stream:
+            ...
+        response = stream.response  # 流关闭后可用
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        chunks: Optional[AsyncIterator[LLMStreamChunk]],
+        first_chunk: LLMStreamChunk,
+        start_time: float,
+        on_complete: Optional[Callable[[LLMResponse], Any]] = None,
+        routing_info: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            provider: 提供商名称
+            model: 模型名称
+            chunks: 提供商片段迭代器（首个片段已取出）
+            first_chunk: 首个片段
+            start_time: 请求开始时间（time.time()）
+            on_complete: 流关闭时的回调（参数为汇总响应）
+            routing_info: 智能路由信息
+        """
+        self.provider = provider
+        self.model = model
+        self.routing_info = routing_info
+        self.response: Optional[LLMResponse] = None
+
+        self._chunks = chunks
+        self._first_chunk = first_chunk
+        self._start_time = start_time
+        self._ttft_ms = int((time.time() - start_time) * 1000)
+        self._on_complete = on_complete
+
+        self._parts: List[str] = []
+        self._finish_reason: Optional[str] = None
+        self._token_in = 0
+        self._token_out = 0
+        self._error: Optional[str] = None
+
+    @classmethod
+    def from_response(
+        cls,
+        response: LLMResponse,
+        on_complete: Optional[Callable[[LLMResponse], Any]] = None
+    ) -> "LLMStream":
+        """将完整响应包装为单片段流（桩响应等）"""
+        stream = cls(
+            provider=response.provider,
+            model=response.model,
+            chunks=None,
+            first_chunk=LLMStreamChunk(
+                delta=response.content,
+                finish_reason=response.finish_reason,
+                token_in=response.token_in,
+                token_out=response.token_out
+            ),
+            start_time=time.time(),
+            on_complete=on_complete
+        )
+        stream._error = response.error
+        return stream
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[str]:
+        try:
+            chunk = self._first_chunk
+            self._first_chunk = None
+            if chunk is not None:
+                self._consume(chunk)
+                if chunk.delta:
+                    yield chunk.delta
+
+            if self._chunks is not None:
+                async for chunk in self._chunks:
+                    self._consume(chunk)
+                    if chunk.delta:
+                        yield chunk.delta
+
+        except Exception as e:
+            # 首 token 之后的失败无法降级，截断并记录错误
+            self._error = str(e)
+            logger.error(f"流式响应中断: {self.provider}/{self.model}, {e}")
+
+        finally:
+            await self.aclose()
+
+    async def text(self) -> str:
+        """读取完整文本"""
+        async for _ in self:
+            pass
+        return self.response.content if self.response else ""
+
+    async def aclose(self) -> LLMResponse:
+        """关闭流并汇总（幂等）"""
+        if self.response is not None:
+            return self.response
+
+        if self._chunks is not None:
+            chunks, self._chunks = self._chunks, None
+            close = getattr(chunks, "aclose", None)
+            if close is not None:
+                try:
+                    await close()
+                except Exception as e:
+                    logger.debug(f"关闭上游流失败: {e}")
+
+        content = "".join(self._parts)
+        token_out = self._token_out or len(content)  # 未返回用量时按字符数估算
+
+        self.response = LLMResponse(
+            content=content,
+            provider=self.provider,
+            model=self.model,
+            token_in=self._token_in,
+            token_out=token_out,
+            token_total=self._token_in + token_out,
+            latency_ms=int((time.time() - self._start_time) * 1000),
+            finish_reason=self._finish_reason,
+            error=self._error,
+            ttft_ms=self._ttft_ms
+        )
+        if self.routing_info:
+            self.response.routing_info = self.routing_info
+
+        logger.info(
+            f"流式响应结束: {self.provider}/{self.model}, ttft={self._ttft_ms}ms, "
+            f"latency={self.response.latency_ms}ms, tokens={self._token_in}/{token_out}"
+        )
+
+        if self._on_complete is not None:
+            try:
+                self._on_complete(self.response)
+            except Exception as e:
+                logger.error(f"流式响应回调失败: {e}")
+
+        return self.response
+
+    def _consume(self, chunk: LLMStreamChunk) -> None:
+        if chunk.delta:
+            self._parts.append(chunk.delta)
+        if chunk.finish_reason:
+            self._finish_reason = chunk.finish_reason
+        if chunk.token_in:
+            self._token_in = chunk.token_in
+        if chunk.token_out:
+            self._token_out = chunk.token_out
@@ -0,0 +1,164 @@
+"""
+模型实时遥测
+按模型记录滚动窗口内的调用结果：EWMA 延迟、p95 延迟、错误率、输出吞吐（token/s），
+并为每个模型维护唯一的熔断器（网关调用前检查同一个熔断器）。智能路由据此降级变慢或出错的模型。
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from .circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class _ModelWindow:
+    """单个模型的滚动窗口"""
+
+    def __init__(self, window_size: int, breaker: CircuitBreaker):
+        # (时间戳, 延迟ms, 是否成功, 输出 token)
+        self.samples: Deque[Tuple[float, int, bool, int]] = deque(maxlen=window_size)
+        self.ewma_latency_ms: Optional[float] = None
+        self.breaker = breaker
+        self.total_calls = 0
+        self.total_errors = 0
+
+
+class ModelTelemetry:
+    """
+    模型遥测存储
+
+    - EWMA 延迟对最近的变化敏感（高峰期变慢几秒内可见）
+    - p95、错误率、吞吐只统计最近 window_seconds 秒内的样本；
+      被降级的模型没有新流量，窗口内样本过期后重新参与路由（相当于定期探测）
+    """
+
+    def __init__(
+        self,
+        ewma_alpha: float = 0.3,
+        window_size: int = 200,
+        window_seconds: float = 60.0,
+        min_samples: int = 5,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        breaker_factory: Optional[Callable[[], CircuitBreaker]] = None
+    ):
+        """
+        Args:
+            ewma_alpha: EWMA 平滑系数（越大越偏向最新样本）
+            window_size: 每个模型保留的最大样本数
+            window_seconds: 统计窗口（秒）
+            min_samples: 样本数少于该值时不判定降级
+            failure_threshold: 熔断器连续失败阈值
+            recovery_timeout: 熔断器冷却时间（秒）
+            breaker_factory: 创建模型熔断器（网关传入自己的熔断配置；默认按上面两个参数创建）
+        """
+        self.ewma_alpha = ewma_alpha
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.breaker_factory = breaker_factory
+
+        self._models: Dict[str, _ModelWindow] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        model_key: str,
+        latency_ms: int,
+        success: bool,
+        token_out: int = 0
+    ) -> None:
+        """
+        记录一次调用结果
+        Args:
+            model_key: 模型 key
+            latency_ms: 延迟（毫秒）
+            success: 是否成功
+            token_out: 输出 token 数
+        """
+        with self._lock:
+            window = self._window(model_key)
+            window.samples.append((time.time(), latency_ms, success, token_out))
+            window.total_calls += 1
+
+            if success:
+                # 失败多为超时/快速报错，不计入延迟均值
+                if window.ewma_latency_ms is None:
+                    window.ewma_latency_ms = float(latency_ms)
+                else:
+                    window.ewma_latency_ms += self.ewma_alpha * (latency_ms - window.ewma_latency_ms)
+            else:
+                window.total_errors += 1
+
+        was_open = window.breaker.is_open()
+        window.breaker.record_result(success, latency_ms)
+        if not was_open and window.breaker.is_open():
+            logger.warning(f"⚠️ 模型熔断: {model_key}")
+
+    def breaker(self, model_key: str) -> CircuitBreaker:
+        """模型熔断器（网关调用前检查，与路由降级共用同一状态）"""
+        with self._lock:
+            return self._window(model_key).breaker
+
+    def snapshot(self, model_key: str) -> Dict[str, Any]:
+        """
+        模型实时指标
+        Returns:
+            {samples, ewma_latency_ms, p95_latency_ms, error_rate, tokens_per_second, circuit}
+        """
+        with self._lock:
+            window = self._models.get(model_key)
+            if window is None:
+                return {
+                    "samples": 0,
+                    "ewma_latency_ms": None,
+                    "p95_latency_ms": None,
+                    "error_rate": 0.0,
+                    "tokens_per_second": None,
+                    "circuit": "closed",
+                    "total_calls": 0,
+                    "total_errors": 0
+                }
+
+            cutoff = time.time() - self.window_seconds
+            recent = [sample for sample in window.samples if sample[0] >= cutoff]
+            latencies = sorted(sample[1] for sample in recent if sample[2])
+            errors = sum(1 for sample in recent if not sample[2])
+            busy_ms = sum(sample[1] for sample in recent if sample[2] and sample[3])
+            tokens = sum(sample[3] for sample in recent if sample[2])
+
+            return {
+                "samples": len(recent),
+                "ewma_latency_ms": round(window.ewma_latency_ms) if window.ewma_latency_ms is not None else None,
+                "p95_latency_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+                "error_rate": round(errors / len(recent), 4) if recent else 0.0,
+                "tokens_per_second": round(tokens * 1000 / busy_ms, 1) if busy_ms else None,
+                "circuit": window.breaker.state,
+                "total_calls": window.total_calls,
+                "total_errors": window.total_errors
+            }
+
+    def get_table(self) -> Dict[str, Dict[str, Any]]:
+        """所有模型的实时指标表"""
+        with self._lock:
+            keys = list(self._models)
+        return {key: self.snapshot(key) for key in keys}
+
+    def _window(self, model_key: str) -> _ModelWindow:
+        """获取或创建模型窗口（调用方持有锁）"""
+        window = self._models.get(model_key)
+        if window is None:
+            if self.breaker_factory is not None:
+                breaker = self.breaker_factory()
+            else:
+                breaker = CircuitBreaker(
+                    failure_threshold=self.failure_threshold,
+                    recovery_timeout=self.recovery_timeout
+                )
+            window = self._models[model_key] = _ModelWindow(self.window_size, breaker)
+        return window
@@ -31,6 +31,16 @@ class LLMResponse:
     finish_reason: Optional[str] = None
     raw_response: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    ttft_ms: Optional[int] = None  # 流式响应首 token 延迟
+
+
+@dataclass
+class LLMStreamChunk:
+    """LLM 流式响应片段"""
+    delta: str = ""
+    finish_reason: Optional[str] = None
+    token_in: int = 0   # 用量通常只在最后一个片段给出
+    token_out: int = 0
 
 
 @dataclass
@@ -139,20 +139,6 @@ class HealthService:
                 "response_time_ms": None
             }
     
-    async def _check_vector_db(self) -> Dict[str, Any]:
-        """检查向量数据库连接"""
-        try:
-            from modules.vector.supabase_vector_client import SupabaseVectorClient
-            from modules.storage.supabase_client import get_supabase_client
-            
-            supabase = get_supabase_client()
-            if not supabase:
-                return {
-                    "status": "error",
-                    "message": "Supabase客户端未初始化",
-                    "response_time_ms": None
-                }
-            
     async def _check_vector_db(self) -> Dict[str, Any]:
         """检查向量数据库连接"""
         try:
@@ -324,6 +310,22 @@ async def get_metrics():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/models")
+async def models_health():
+    """大模型实时状态（路由遥测：EWMA/p95 延迟、错误率、吞吐、熔断、是否降级）"""
+    try:
+        from modules.ai_gateway.gateway import get_ai_gateway
+        
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "models": get_ai_gateway().get_live_model_table()
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ 获取模型状态失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/ping")
 async def ping():
     """简单ping检查"""
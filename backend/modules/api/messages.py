@@ -3,10 +3,12 @@
 支持多租户、实时同步、AI智能回复
 """
 
+import json
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncIterator
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from modules.storage.unified_database import UnifiedDatabaseManager, get_database_manager as get_database_manager_dep
@@ -29,6 +31,7 @@ class MessageRequest(BaseModel):
     session_id: Optional[str] = Field(None, description="会话ID")
     group_name: Optional[str] = Field(None, description="群组名称")
     sender_name: Optional[str] = Field(None, description="发送者名称")
+    stream: bool = Field(False, description="是否以 SSE 流式返回回复")
 
 
 class MessageResponse(BaseModel):
@@ -67,10 +70,15 @@ class MessageService:
     def __init__(self, 
                  db_manager: UnifiedDatabaseManager,
                  vector_service: Optional[VectorSearchService] = None,
-                 embedding_service: Optional[SmartEmbeddingService] = None):
+                 embedding_service: Optional[SmartEmbeddingService] = None,
+                 ai_gateway=None,
+                 hybrid_retriever=None):
         self.db_manager = db_manager
         self.vector_service = vector_service
         self.embedding_service = embedding_service
+        self.ai_gateway = ai_gateway
+        # BM25 + 向量并发召回；本地知识库为空或检索失败时只用向量检索
+        self.hybrid_retriever = hybrid_retriever
         
         logger.info("✅ 消息处理服务初始化完成")
     
@@ -80,24 +88,15 @@ class MessageService:
             start_time = datetime.now()
             
             # 1. 记录消息
-            message_data = {
-                "request_id": request.request_id,
-                "group_id": request.group_id,
-                "sender_id": request.sender_id,
-                "user_message": request.user_message,
-                "session_id": request.session_id,
-                "group_name": request.group_name,
-                "sender_name": request.sender_name,
-                "received_at": start_time.isoformat(),
-                "status": "processing"
-            }
-            
-            await self.db_manager.create_message(tenant_id, message_data)
+            await self.db_manager.create_message(tenant_id, self._build_message_data(request, start_time))
             
-            # 2. 生成AI回复
+            # 2. 检索证据并生成AI回复（与流式模式共用同一流程）
+            evidence = await self._retrieve_evidence(request.user_message)
             bot_response, ai_metadata = await self._generate_ai_response(
                 request.user_message, 
-                tenant_id
+                tenant_id,
+                evidence,
+                request.session_id
             )
             
             # 3. 更新消息记录
@@ -156,31 +155,203 @@ class MessageService:
             
             raise HTTPException(status_code=500, detail=f"消息处理失败: {e}")
     
-    async def _generate_ai_response(self, message: str, tenant_id: str) -> tuple[str, Dict[str, Any]]:
-        """生成AI回复"""
+    async def stream_message(self, request: MessageRequest, tenant_id: str = "default") -> AsyncIterator[str]:
+        """
+        流式处理消息（SSE）
+        
+        事件：
+            meta   提供商/模型信息（首 token 之前发送）
+            delta  文本增量 {"content": ...}
+            done   汇总结果（与 MessageResponse 字段一致）
+            error  处理失败
+        
+        流关闭时（含客户端提前断开）记录 token 与延迟
+        """
+        start_time = datetime.now()
+        stream = None
+        evidence: Dict[str, Any] = {}
+        
         try:
-            # 这里应该集成AI Gateway
-            # 暂时返回模拟回复
-            bot_response = f"收到您的消息：{message}。我正在为您处理中..."
+            await self.db_manager.create_message(tenant_id, self._build_message_data(request, start_time))
             
-            metadata = {
-                "provider": "qwen",
-                "model": "qwen-turbo",
-                "token_in": len(message),
-                "token_out": len(bot_response),
-                "confidence": 0.85,
-                "branch": "direct",
+            # 与非流式模式相同：先检索证据，再交给网关生成
+            evidence = await self._retrieve_evidence(request.user_message)
+            stream = await self.ai_gateway.generate_stream(
+                user_message=request.user_message,
+                evidence_context=evidence["evidence_context"],
+                metadata={"tenant_id": tenant_id, "session_id": request.session_id}
+            )
+            yield _sse_event("meta", {
+                "request_id": request.request_id,
+                "provider": stream.provider,
+                "model": stream.model
+            })
+            
+            async for delta in stream:
+                yield _sse_event("delta", {"content": delta})
+            
+            response = await stream.aclose()
+            latency_total_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+            
+            yield _sse_event("done", MessageResponse(
+                request_id=request.request_id,
+                bot_response=response.content,
+                confidence=evidence["confidence"],
+                evidence_ids=evidence["evidence_ids"],
+                evidence_summary=evidence["evidence_summary"],
+                branch=evidence["branch"],
+                provider=response.provider,
+                model=response.model,
+                token_in=response.token_in,
+                token_out=response.token_out,
+                latency_total_ms=latency_total_ms,
+                status="error" if response.error else "completed"
+            ).model_dump())
+            
+        except Exception as e:
+            logger.error(f"❌ 流式消息处理失败: {e}")
+            yield _sse_event("error", {"request_id": request.request_id, "detail": str(e)})
+            
+        finally:
+            # 正常结束或客户端断开都在这里记账
+            if stream is not None:
+                response = await stream.aclose()
+                await self.db_manager.update_message(
+                    tenant_id,
+                    request.request_id,
+                    {
+                        "bot_response": response.content,
+                        "provider": response.provider,
+                        "model": response.model,
+                        "token_in": response.token_in,
+                        "token_out": response.token_out,
+                        "confidence": evidence.get("confidence", 0.0),
+                        "branch": evidence.get("branch", "direct"),
+                        "evidence_ids": evidence.get("evidence_ids"),
+                        "evidence_summary": evidence.get("evidence_summary"),
+                        "status": "error" if response.error else "completed",
+                        "error_message": response.error,
+                        "responded_at": datetime.now().isoformat()
+                    }
+                )
+    
+    def _build_message_data(self, request: MessageRequest, received_at: datetime) -> Dict[str, Any]:
+        """构建消息记录"""
+        return {
+            "request_id": request.request_id,
+            "group_id": request.group_id,
+            "sender_id": request.sender_id,
+            "user_message": request.user_message,
+            "session_id": request.session_id,
+            "group_name": request.group_name,
+            "sender_name": request.sender_name,
+            "received_at": received_at.isoformat(),
+            "status": "processing"
+        }
+    
+    async def _retrieve_evidence(self, message: str, top_k: int = 4) -> Dict[str, Any]:
+        """
+        检索证据（流式与非流式共用）
+        本地知识库已加载时走混合检索（BM25 与向量并发召回后融合），否则只用向量检索
+        Returns:
+            Dict: evidence_context / evidence_ids / evidence_summary / confidence / branch
+        """
+        hybrid = self.hybrid_retriever
+        if hybrid is not None and hybrid.retriever.corpus_size > 0:
+            try:
+                evidences = await hybrid.retrieve(message, k=top_k)
+                if evidences:
+                    return {
+                        "evidence_context": "\n\n".join(evidence.content for evidence in evidences),
+                        "evidence_ids": [evidence.chunk_id for evidence in evidences],
+                        "evidence_summary": hybrid.retriever.format_evidence_summary(evidences),
+                        "confidence": hybrid.retriever.calculate_confidence(evidences),
+                        "branch": "rag"
+                    }
+            except Exception as e:
+                logger.warning(f"⚠️ 混合检索失败，回退到向量检索: {e}")
+        
+        matches = []
+        if self.vector_service is not None:
+            matches = await self.vector_service.search_similar_documents(query=message, top_k=top_k)
+        
+        if not matches:
+            return {
+                "evidence_context": None,
                 "evidence_ids": None,
-                "evidence_summary": None
+                "evidence_summary": None,
+                "confidence": 0.0,
+                "branch": "direct"
+            }
+        
+        sources = []
+        for i, match in enumerate(matches, 1):
+            metadata = match.get("metadata") or {}
+            name = metadata.get("document_name") or metadata.get("title") or str(match["id"])
+            sources.append(f"{i}. {name} {metadata.get('section', '')}".rstrip())
+        
+        return {
+            "evidence_context": "\n\n".join(match.get("content", "") for match in matches),
+            "evidence_ids": [str(match["id"]) for match in matches],
+            "evidence_summary": "\n".join(sources),
+            "confidence": max(float(match.get("score", 0.0)) for match in matches),
+            "branch": "rag"
+        }
+    
+    async def _generate_ai_response(
+        self,
+        message: str,
+        tenant_id: str,
+        evidence: Dict[str, Any],
+        session_id: Optional[str] = None
+    ) -> tuple[str, Dict[str, Any]]:
+        """生成AI回复（经 AI Gateway；未配置网关时返回模拟回复）"""
+        try:
+            metadata = {
+                "confidence": evidence["confidence"],
+                "branch": evidence["branch"],
+                "evidence_ids": evidence["evidence_ids"],
+                "evidence_summary": evidence["evidence_summary"]
             }
             
-            return bot_response, metadata
+            if self.ai_gateway is None:
+                # 暂时返回模拟回复
+                bot_response = f"收到您的消息：{message}。我正在为您处理中..."
+                metadata.update({
+                    "provider": "qwen",
+                    "model": "qwen-turbo",
+                    "token_in": len(message),
+                    "token_out": len(bot_response)
+                })
+                return bot_response, metadata
+            
+            response = await self.ai_gateway.generate(
+                user_message=message,
+                evidence_context=evidence["evidence_context"],
+                metadata={"tenant_id": tenant_id, "session_id": session_id},
+                evidence_ids=evidence["evidence_ids"]
+            )
+            if response.error:
+                raise RuntimeError(response.error)
+            
+            metadata.update({
+                "provider": response.provider,
+                "model": response.model,
+                "token_in": response.token_in,
+                "token_out": response.token_out
+            })
+            return response.content, metadata
             
         except Exception as e:
             logger.error(f"❌ AI回复生成失败: {e}")
             raise
 
 
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """格式化 SSE 事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
 # API端点
 @router.post("/process", response_model=MessageResponse)
 async def process_message(
@@ -190,9 +361,28 @@ async def process_message(
     vector_service: Optional[VectorSearchService] = Depends(get_vector_search_service_dep),
     tenant_id: str = "default"
 ):
-    """处理消息"""
+    """处理消息（stream=true 时以 SSE 流式返回；两种模式共用 检索 → 网关 流程）"""
+    from modules.ai_gateway.gateway import get_ai_gateway
+    from modules.rag.hybrid_retriever import get_hybrid_retriever
+    
+    ai_gateway = get_ai_gateway()
+    hybrid_retriever = get_hybrid_retriever(vector_service)
+    # 知识块更新/删除时失效引用它的缓存回答（重复订阅会被忽略）
+    ai_gateway.watch_knowledge_source(hybrid_retriever.retriever)
+    if vector_service is not None:
+        ai_gateway.watch_knowledge_source(vector_service)
+    
+    message_service = MessageService(
+        db_manager, vector_service, ai_gateway=ai_gateway, hybrid_retriever=hybrid_retriever
+    )
+    if request.stream:
+        return StreamingResponse(
+            message_service.stream_message(request, tenant_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
     try:
-        message_service = MessageService(db_manager, vector_service)
         response = await message_service.process_message(request, tenant_id)
         
         logger.info(f"✅ 消息处理完成: {request.request_id}")
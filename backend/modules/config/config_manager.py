@@ -39,7 +39,7 @@ class ConfigManager:
                     "service_role_key": os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
                 },
                 "vector_settings": {
-                    "type": "supabase_pgvector",
+                    "type": "local" if os.getenv("VECTOR_BACKEND", "supabase") == "local" else "supabase_pgvector",
                     "table_name": os.getenv("VECTOR_TABLE_NAME", "knowledge_vectors"),
                     "dimension": int(os.getenv("VECTOR_DIMENSION", "1536")),
                     "distance_metric": os.getenv("VECTOR_DISTANCE_METRIC", "cosine"),
@@ -88,12 +88,18 @@ class ConfigValidator:
             vector_type = config_data.get("type", "")
             table_name = config_data.get("table_name", "")
             
-            if vector_type != "supabase_pgvector":
-                return False, "仅支持Supabase pgvector", None
+            if vector_type not in ("supabase_pgvector", "local"):
+                return False, "仅支持Supabase pgvector或本地向量库", None
             
             if not table_name:
                 return False, "向量表名不能为空", None
             
+            if vector_type == "local":
+                return True, "本地向量库无需连接测试", {
+                    "table_name": table_name,
+                    "type": vector_type
+                }
+            
             # 测试Supabase连接（向量数据库使用相同的Supabase连接）
             try:
                 from modules.storage.supabase_client import get_supabase_client
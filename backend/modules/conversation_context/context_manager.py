@@ -12,6 +12,10 @@ from datetime import datetime, timedelta
 import re
 import logging
 
+from modules.nlp.keyword_matcher import get_keyword_matcher
+from modules.nlp.tokenizer import Tokenizer, default_tokenizer
+from modules.nlp.token_counter import get_token_counter
+
 logger = logging.getLogger(__name__)
 
 
@@ -62,6 +66,28 @@ class IntentClassifier:
         self.number_pattern = re.compile(r'\d{3,}')  # 3位以上数字
         self.date_pattern = re.compile(r'\d{4}[-/年]\d{1,2}[-/月]\d{1,2}')
         self.money_pattern = re.compile(r'[¥$￥]\s*\d+(\.\d{2})?|(\d+(\.\d{2})?)\s*元')
+        
+        # 细分子类型关键词
+        self.subtype_keywords = {
+            'consult_product': ['产品', '功能', '特点', '支持', '性能'],
+            'consult_usage': ['安装', '使用', '操作', '步骤', '教程'],
+            'consult_price': ['政策', '价格', '费用', '收费', '多少钱'],
+            'business_order': ['订单', '发货', '物流', '快递'],
+            'business_inventory': ['库存', '现货', '有货', '缺货'],
+            'business_price': ['报价', '价格', '多少钱', '费用'],
+            'business_finance': ['发票', '账单', '付款', '退款']
+        }
+        
+        # 所有关键词编译为一个匹配自动机：一次扫描得到各分组命中数，结果按原文缓存
+        # （digits 分组用于跳过不含数字的消息的数字/日期/金额正则）
+        self.keyword_matcher = get_keyword_matcher({
+            'small_talk': self.small_talk_keywords,
+            'consultation': self.consultation_keywords,
+            'business': self.business_keywords,
+            'question': ['？', '?', '吗', '呢', '么'],
+            'digits': list('0123456789'),
+            **self.subtype_keywords
+        })
     
     def classify(self, message: str, context: List[Dict] = None) -> Tuple[DialogueType, float]:
         """
@@ -74,28 +100,29 @@ class IntentClassifier:
         Returns:
             (对话类型, 置信度)
         """
-        message_lower = message.lower()
+        hits = self.keyword_matcher.count(message)
         
         # 1. 超短消息判断
         if len(message) <= 5:
-            if any(kw in message for kw in self.small_talk_keywords):
+            if hits['small_talk']:
                 return DialogueType.SMALL_TALK, 0.9
         
         # 2. 关键词匹配评分
-        small_talk_score = sum(1 for kw in self.small_talk_keywords if kw in message)
-        consultation_score = sum(1 for kw in self.consultation_keywords if kw in message)
-        business_score = sum(1 for kw in self.business_keywords if kw in message)
-        
-        # 3. 特征加权
-        if self.number_pattern.search(message):
-            business_score += 1.5
-        if self.date_pattern.search(message):
-            business_score += 1.5
-        if self.money_pattern.search(message):
-            business_score += 2
+        small_talk_score = hits['small_talk']
+        consultation_score = hits['consultation']
+        business_score = hits['business']
+        
+        # 3. 特征加权（三个模式都需要数字）
+        if hits['digits']:
+            if self.number_pattern.search(message):
+                business_score += 1.5
+            if self.date_pattern.search(message):
+                business_score += 1.5
+            if self.money_pattern.search(message):
+                business_score += 2
         
         # 咨询类：包含疑问词
-        if any(q in message for q in ['？', '?', '吗', '呢', '么']):
+        if hits['question']:
             consultation_score += 1
         
         # 4. 上下文延续性
@@ -143,15 +170,16 @@ class IntentClassifier:
             'suggested_action': None
         }
         
-        # 细分子类型和建议动作
+        # 细分子类型和建议动作（命中结果来自 classify 时的同一次扫描缓存）
+        hits = self.keyword_matcher.count(message)
         if dialogue_type == DialogueType.CONSULTATION:
-            if any(kw in message for kw in ['产品', '功能', '特点', '支持', '性能']):
+            if hits['consult_product']:
                 result['subtype'] = '产品咨询'
                 result['suggested_action'] = 'query_knowledge_base'
-            elif any(kw in message for kw in ['安装', '使用', '操作', '步骤', '教程']):
+            elif hits['consult_usage']:
                 result['subtype'] = '使用咨询'
                 result['suggested_action'] = 'query_knowledge_base'
-            elif any(kw in message for kw in ['政策', '价格', '费用', '收费', '多少钱']):
+            elif hits['consult_price']:
                 result['subtype'] = '价格咨询'
                 result['suggested_action'] = 'query_knowledge_base'
             else:
@@ -159,16 +187,16 @@ class IntentClassifier:
                 result['suggested_action'] = 'query_knowledge_base'
         
         elif dialogue_type == DialogueType.BUSINESS:
-            if any(kw in message for kw in ['订单', '发货', '物流', '快递']):
+            if hits['business_order']:
                 result['subtype'] = '订单查询'
                 result['suggested_action'] = 'query_erp_order'
-            elif any(kw in message for kw in ['库存', '现货', '有货', '缺货']):
+            elif hits['business_inventory']:
                 result['subtype'] = '库存查询'
                 result['suggested_action'] = 'query_erp_inventory'
-            elif any(kw in message for kw in ['报价', '价格', '多少钱', '费用']):
+            elif hits['business_price']:
                 result['subtype'] = '价格查询'
                 result['suggested_action'] = 'query_erp_price'
-            elif any(kw in message for kw in ['发票', '账单', '付款', '退款']):
+            elif hits['business_finance']:
                 result['subtype'] = '财务查询'
                 result['suggested_action'] = 'query_erp_finance'
             else:
@@ -184,7 +212,8 @@ class IntentClassifier:
 class TopicChangeDetector:
     """主题切换检测器"""
     
-    def __init__(self):
+    def __init__(self, tokenizer: Optional[Tokenizer] = None):
+        self.tokenizer = tokenizer or default_tokenizer
         self.topic_change_signals = [
             '对了', '另外', '还有', '换个问题', '顺便问',
             '不说这个了', '说说', '问一下', '再问',
@@ -248,24 +277,8 @@ class TopicChangeDetector:
         return False
     
     def _extract_keywords(self, text: str) -> Set[str]:
-        """提取关键词（简化版）"""
-        # 移除标点符号
-        text = re.sub(r'[^\w\s]', ' ', text)
-        
-        # 简单分词
-        words = set(text.split())
-        
-        # 停用词
-        stopwords = {
-            '的', '了', '吗', '呢', '啊', '是', '在', '有', '个',
-            '我', '你', '他', '她', '它', '我们', '你们', '他们',
-            '这', '那', '这个', '那个', '什么', '怎么', '为什么',
-            '一', '一个', '两', '三', '能', '会', '要', '想'
-        }
-        
-        keywords = {w for w in words if w not in stopwords and len(w) >= 2}
-        
-        return keywords
+        """提取关键词（中文 bigram + 词典词，结果由分词器缓存）"""
+        return self.tokenizer.keywords(text)
 
 
 class ContextCompressor:
@@ -429,7 +442,8 @@ class ContextManager:
     
     def get_relevant_context(self, contact_id: str, 
                            current_type: DialogueType = None,
-                           max_tokens: int = 2000) -> List[Dict]:
+                           max_tokens: int = 2000,
+                           model: Optional[str] = None) -> List[Dict]:
         """
         获取相关上下文（智能筛选）
         
@@ -437,6 +451,7 @@ class ContextManager:
             contact_id: 联系人ID
             current_type: 当前对话类型
             max_tokens: 最大token数
+            model: 目标模型（按其分词器计数，默认通义千问）
         
         Returns:
             精简后的上下文列表
@@ -470,16 +485,18 @@ class ContextManager:
         # 3. 滑动窗口
         windowed_messages = valid_messages[-window_size:]
         
-        # 4. Token控制
-        estimated_tokens = sum(len(msg['content']) // 2 for msg in windowed_messages)
+        # 4. Token控制（按消息缓存计数，从最早的消息开始丢弃）
+        counter = get_token_counter()
+        message_tokens = [counter.count(msg['content'], model) for msg in windowed_messages]
+        total_tokens = sum(message_tokens)
         
-        while estimated_tokens > max_tokens and len(windowed_messages) > 1:
+        while total_tokens > max_tokens and len(windowed_messages) > 1:
             windowed_messages.pop(0)
-            estimated_tokens = sum(len(msg['content']) // 2 for msg in windowed_messages)
+            total_tokens -= message_tokens.pop(0)
         
         logger.debug(
             f"上下文筛选: {len(all_messages)}条 -> {len(windowed_messages)}条, "
-            f"约{estimated_tokens} tokens"
+            f"{total_tokens} tokens"
         )
         
         return windowed_messages
@@ -2,11 +2,11 @@
 置信打分引擎
 基于关键词、文件类型、工作时间、知识库匹配的综合打分
 """
-import re
 import logging
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
 
+from modules.nlp.tokenizer import Tokenizer
 from .types import Signal, Bucket, ScoringRules
 
 logger = logging.getLogger(__name__)
@@ -23,6 +23,13 @@ class ScoringEngine:
             rules: 打分规则,如果为None则使用默认规则
         """
         self.rules = rules or ScoringRules()
+        
+        # 规则关键词与黑名单词编入词典，单次扫描统计全部命中
+        rule_words = [kw for kws in self.rules.keywords.values() for kw in kws]
+        self.tokenizer = Tokenizer(
+            dictionary=rule_words + list(self.rules.blacklist_keywords)
+        )
+        
         logger.info(
             f"打分引擎初始化: 白名单阈值={self.rules.white_promotion_threshold}, "
             f"灰名单下限={self.rules.gray_lower}"
@@ -111,9 +118,9 @@ class ScoringEngine:
         Returns:
             True=黑名单, False=通过
         """
-        text_lower = text.lower()
+        term_counts = self.tokenizer.term_counts(text)
         for keyword in self.rules.blacklist_keywords:
-            if keyword in text_lower:
+            if term_counts.get(self.tokenizer.normalize(keyword)):
                 logger.debug(f"命中黑名单关键词: {keyword}")
                 return True
         return False
@@ -136,13 +143,13 @@ class ScoringEngine:
         keyword_score = 0
         keyword_hits = {}
         
+        # 词典匹配(忽略大小写/全半角),结果按文本缓存
+        term_counts = self.tokenizer.term_counts(text)
+        
         # 遍历所有关键词组
         for group_name, keywords in self.rules.keywords.items():
             for kw in keywords:
-                # 正则匹配(忽略大小写)
-                pattern = re.compile(re.escape(kw), re.IGNORECASE)
-                matches = pattern.findall(text)
-                hits = len(matches)
+                hits = term_counts.get(self.tokenizer.normalize(kw), 0)
                 
                 if hits > 0:
                     # 每个关键词最多贡献20分
@@ -205,7 +205,54 @@ class CustomerHubService:
             'reply_draft': output.reply_draft,
             'labels': [label.value for label in output.labels]
         }
-    
+
+    async def trigger_scenarios_batch(
+        self,
+        items: List[Dict[str, str]],
+        max_concurrency: int = 8,
+        checkpoint_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        批量触发场景（夜间重跑）
+
+        Args:
+            items: [{'thread_id', 'text', 'trigger_type'}]
+            max_concurrency: 最大并发数
+            checkpoint_path: 检查点文件路径（中断后用同一路径重跑跳过已完成条目）
+
+        Returns:
+            {'total', 'succeeded', 'failed', 'skipped', 'output_ids': {条目ID: 输出ID}}
+        """
+        summary = {'total': len(items), 'succeeded': 0, 'failed': 0, 'skipped': 0, 'output_ids': {}}
+
+        batch = []
+        thread_ids = {}
+        for item in items:
+            thread = self.repo.get_thread_by_id(item['thread_id'])
+            if not thread or thread.bucket == Bucket.BLACK:
+                summary['skipped'] += 1
+                continue
+            item_id = f"{item['thread_id']}:{item['trigger_type']}"
+            thread_ids[item_id] = item['thread_id']
+            batch.append((item_id, item['trigger_type'], item['text']))
+
+        async for result in self.triggers.trigger_batch(batch, max_concurrency, checkpoint_path):
+            if result['output'] is None:
+                summary['failed'] += 1
+                logger.warning(f"批量触发失败: {result['item_id']}, {result['error']}")
+                continue
+            summary['output_ids'][result['item_id']] = self.repo.save_trigger_output(
+                thread_id=thread_ids[result['item_id']],
+                trigger_type=result['trigger_type'],
+                output=result['output']
+            )
+            summary['succeeded'] += 1
+
+        logger.info(
+            f"批量触发完成: 成功 {summary['succeeded']}, 失败 {summary['failed']}, 跳过 {summary['skipped']}"
+        )
+        return summary
+
     # ==================== 未知池 ====================
     
     def get_unknown_pool(self, limit: int = 100) -> List[Dict[str, Any]]:
@@ -4,7 +4,7 @@
 """
 import json
 import logging
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
 from .types import TriggerOutput, TriggerLabel
@@ -159,6 +159,16 @@ PROMPT_BIZDEV = """你是一位资深的渠道拓展经理。请从以下对话
 """
 
 
+TRIGGER_PROMPTS = {
+    TriggerLabel.PRE_SALES: PROMPT_PRE_SALES,
+    TriggerLabel.AFTER_SALES: PROMPT_AFTER_SALES,
+    TriggerLabel.BIZ_DEV: PROMPT_BIZDEV
+}
+
+# 批量触发时单条请求的输出上限（表单 + 草稿的 JSON 较长）
+BATCH_MAX_TOKENS = 1024
+
+
 # ==================== 触发器类 ====================
 
 class TriggerEngine:
@@ -288,6 +298,70 @@ class TriggerEngine:
         logger.info(f"客户开发触发完成, 表单字段数: {len(output.form)}")
         return output
     
+    async def trigger_batch(
+        self,
+        items: List[Tuple[str, str, str]],
+        max_concurrency: int = 8,
+        checkpoint_path: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        批量触发（夜间重跑等离线任务）
+        
+        llm_client 支持 generate_batch（AIGateway）时以有界并发 + 配额排队执行，
+        结果按完成顺序返回，并可通过检查点断点续跑；否则逐条触发。
+        
+        Args:
+            items: [(条目ID, 触发类型 '售前'|'售后'|'客户开发', 对话文本)]
+            max_concurrency: 最大并发数
+            checkpoint_path: 检查点文件路径（None 表示不做检查点）
+        
+        Yields:
+            {'item_id', 'trigger_type', 'output': TriggerOutput 或 None, 'error'}
+        """
+        labels = [TriggerLabel(trigger_type) for _, trigger_type, _ in items]
+        logger.info(f"批量触发: {len(items)} 条")
+        
+        if self.llm_client is None or not hasattr(self.llm_client, 'generate_batch'):
+            for (item_id, _, text), label in zip(items, labels):
+                output = await self._trigger(label, text)
+                yield {'item_id': item_id, 'trigger_type': label.value, 'output': output, 'error': None}
+            return
+        
+        from modules.ai_gateway.types import LLMRequest
+        
+        requests = [
+            LLMRequest(user_message=TRIGGER_PROMPTS[label].format(text=text), max_tokens=BATCH_MAX_TOKENS)
+            for (_, _, text), label in zip(items, labels)
+        ]
+        results = self.llm_client.generate_batch(
+            requests,
+            ids=[item_id for item_id, _, _ in items],
+            max_concurrency=max_concurrency,
+            checkpoint_path=checkpoint_path
+        )
+        async for result in results:
+            label = labels[result.index]
+            output = None
+            if result.ok:
+                output = self._build_output(label, self._parse_llm_response(result.response.content))
+            yield {'item_id': result.item_id, 'trigger_type': label.value, 'output': output, 'error': result.error}
+    
+    async def _trigger(self, label: TriggerLabel, text: str) -> TriggerOutput:
+        """按触发类型调用对应的单条触发器"""
+        if label == TriggerLabel.PRE_SALES:
+            return await self.trigger_pre_sales(text)
+        if label == TriggerLabel.AFTER_SALES:
+            return await self.trigger_after_sales(text)
+        return await self.trigger_bizdev(text)
+    
+    def _build_output(self, label: TriggerLabel, result: Dict[str, Any]) -> TriggerOutput:
+        """由解析后的 LLM 输出构建 TriggerOutput"""
+        return TriggerOutput(
+            form=result.get('form', {}),
+            reply_draft=result.get('reply_draft', ''),
+            labels=[label]
+        )
+    
     def _parse_llm_response(self, response: str) -> Dict[str, Any]:
         """
         解析LLM返回的JSON响应
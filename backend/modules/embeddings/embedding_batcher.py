@@ -0,0 +1,122 @@
+"""
+嵌入请求合并器（micro-batching）
+- 在短时间窗口内收集并发的单文本请求，合并为一次 embed_batch 调用
+- 达到批量上限立即发送，否则窗口到期发送
+- 同一窗口内相同文本只请求一次，结果分发给所有等待者
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    单个提供商的请求合并器
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        name: str = ""
+    ):
+        """
+        Args:
+            embed_batch: 批量嵌入函数（通常为 provider.embed_batch）
+            max_batch_size: 单批最大文本数
+            max_wait_ms: 合并窗口（毫秒）
+            name: 名称（用于日志）
+        """
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+
+        # 当前窗口：key -> (text, future)
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+        self.stats = {
+            "requests": 0,
+            "deduplicated": 0,
+            "batches": 0,
+            "texts_sent": 0
+        }
+
+    async def submit(self, text: str, key: Optional[str] = None) -> List[float]:
+        """
+        提交单个文本，等待所在批次返回
+        Args:
+            text: 文本
+            key: 去重键（默认为文本本身）
+        Returns:
+            嵌入向量
+        """
+        key = key or text
+        loop = asyncio.get_running_loop()
+        self.stats["requests"] += 1
+
+        entry = self._pending.get(key)
+        if entry is not None:
+            self.stats["deduplicated"] += 1
+            future = entry[1]
+        else:
+            future = loop.create_future()
+            self._pending[key] = (text, future)
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+
+        # shield：单个等待者取消不影响同批其他等待者
+        return await asyncio.shield(future)
+
+    def get_stats(self) -> Dict[str, float]:
+        stats = dict(self.stats)
+        stats["avg_batch_size"] = stats["texts_sent"] / max(stats["batches"], 1)
+        return stats
+
+    # ==================== 内部实现 ====================
+
+    def _flush(self) -> None:
+        """发送当前窗口"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._pending:
+            return
+
+        batch = list(self._pending.values())
+        self._pending = {}
+
+        task = asyncio.ensure_future(self._run(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in batch]
+        self.stats["batches"] += 1
+        self.stats["texts_sent"] += len(texts)
+
+        try:
+            embeddings = await self.embed_batch(texts)
+            if len(embeddings) != len(texts):
+                raise Exception(f"批量嵌入返回数量不一致: {len(embeddings)} != {len(texts)}")
+        except Exception as e:
+            logger.error(f"合并嵌入失败: {self.name}, 数量: {len(texts)}, 错误: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+        logger.debug(f"合并嵌入完成: {self.name}, 数量: {len(texts)}")
@@ -0,0 +1,258 @@
+"""
+嵌入向量缓存
+- 键：blake2b(提供商/模型 + 规范化文本)，避免以原文为键占用内存
+- 内存层：LRU + TTL，条数有上限，向量以 float32 array 存储
+- 磁盘层（可选）：SQLite（WAL），重启后保留，多 worker 共享；
+  打开时及每 purge_interval 次写入清理过期条目，超过 max_disk_entries 时淘汰最早过期的条目
+"""
+
+import array
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：全角转半角、合并空白、去首尾空白"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def make_cache_key(provider: str, text: str) -> str:
+    """
+    生成缓存键
+    Args:
+        provider: 提供商+模型标识（如 ZhipuAI-embedding-2）
+        text: 原始文本
+    """
+    payload = f"{provider}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    两级嵌入缓存（内存 LRU/TTL + 可选 SQLite 磁盘层）
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl: int = 3600,
+        disk_path: Optional[str] = None,
+        disk_ttl: Optional[int] = None,
+        max_disk_entries: int = 100000,
+        purge_interval: int = 1000
+    ):
+        """
+        Args:
+            max_entries: 内存层最大条数
+            ttl: 内存层过期时间（秒）
+            disk_path: 磁盘层 SQLite 路径（None 表示不启用）
+            disk_ttl: 磁盘层过期时间（秒，默认同 ttl）
+            max_disk_entries: 磁盘层最大条数
+            purge_interval: 磁盘层每写入多少条执行一次过期清理与容量检查
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_ttl = disk_ttl if disk_ttl is not None else ttl
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self.purge_interval = purge_interval
+
+        self._memory: "OrderedDict[str, Tuple[float, array.array]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        # 磁盘层行数估计（覆盖写按新增计，清理时校正）与距上次清理的写入数
+        self._disk_rows = 0
+        self._disk_writes = 0
+
+        self.stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "disk_evictions": 0
+        }
+
+        if disk_path:
+            self._init_disk(disk_path)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    # ==================== 读写 ====================
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """读取缓存，未命中返回 None"""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[List[float]]]:
+        """批量读取：先查内存层，未命中的一次性查磁盘层并回填内存"""
+        now = time.time()
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        missing: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._memory.get(key)
+                if entry is not None:
+                    if entry[0] > now:
+                        self._memory.move_to_end(key)
+                        results[i] = entry[1].tolist()
+                        self.stats["hits"] += 1
+                        continue
+                    del self._memory[key]
+                    self.stats["expirations"] += 1
+                missing.setdefault(key, []).append(i)
+
+        if missing and self._disk is not None:
+            for key, vector in self._disk_get(list(missing), now).items():
+                self._put_memory(key, vector, now)
+                for i in missing.pop(key):
+                    results[i] = vector.tolist()
+                    self.stats["disk_hits"] += 1
+
+        self.stats["misses"] += sum(len(indices) for indices in missing.values())
+        return results
+
+    def set(self, key: str, vector: Sequence[float]) -> None:
+        """写入缓存"""
+        self.set_many([(key, vector)])
+
+    def set_many(self, items: Iterable[Tuple[str, Sequence[float]]]) -> None:
+        """批量写入（内存层 + 磁盘层）"""
+        now = time.time()
+        packed = [(key, array.array("f", vector)) for key, vector in items]
+        for key, vector in packed:
+            self._put_memory(key, vector, now)
+
+        if packed and self._disk is not None:
+            self._disk_set(packed, now)
+
+    def clear(self) -> None:
+        """清空缓存（含磁盘层）"""
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM embedding_cache")
+                self._disk.commit()
+                self._disk_rows = 0
+
+    def purge_expired(self) -> int:
+        """清理过期条目，返回清理数量"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._memory.items() if expires_at <= now]
+            for key in expired:
+                del self._memory[key]
+            self.stats["expirations"] += len(expired)
+
+            expired_disk = self._disk_purge(now) if self._disk is not None else 0
+
+        return len(expired) + expired_disk
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = dict(self.stats)
+        stats["entries"] = len(self._memory)
+        stats["disk_enabled"] = self._disk is not None
+        stats["disk_entries"] = self._disk_rows
+        return stats
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    # ==================== 内部实现 ====================
+
+    def _put_memory(self, key: str, vector: array.array, now: float) -> None:
+        with self._lock:
+            self._memory[key] = (now + self.ttl, vector)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _init_disk(self, disk_path: str) -> None:
+        Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+        self._disk = sqlite3.connect(disk_path, check_same_thread=False, timeout=5.0)
+        self._disk.execute("PRAGMA journal_mode=WAL")
+        self._disk.execute("PRAGMA synchronous=NORMAL")
+        self._disk.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._disk.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_expires ON embedding_cache(expires_at)")
+        self._disk.commit()
+        with self._lock:
+            self._disk_purge(time.time())
+        logger.info(f"嵌入缓存磁盘层已启用: {disk_path} ({self._disk_rows} 条)")
+
+    def _disk_get(self, keys: List[str], now: float) -> Dict[str, array.array]:
+        found: Dict[str, array.array] = {}
+        with self._lock:
+            # SQLite 变量数上限，分块查询
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._disk.execute(
+                    f"SELECT key, vector FROM embedding_cache "
+                    f"WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*chunk, now)
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array.array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector
+        return found
+
+    def _disk_set(self, packed: List[Tuple[str, array.array]], now: float) -> None:
+        expires_at = now + self.disk_ttl
+        with self._lock:
+            self._disk.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, vector, expires_at) VALUES (?, ?, ?)",
+                [(key, vector.tobytes(), expires_at) for key, vector in packed]
+            )
+            self._disk.commit()
+
+            self._disk_rows += len(packed)
+            self._disk_writes += len(packed)
+            if self._disk_writes >= self.purge_interval or self._disk_rows > self.max_disk_entries:
+                self._disk_purge(now)
+
+    def _disk_purge(self, now: float) -> int:
+        """清理磁盘层过期条目，超过容量时淘汰最早过期的条目（调用方持有锁），返回清理数量"""
+        removed = self._disk.execute("DELETE FROM embedding_cache WHERE expires_at <= ?", (now,)).rowcount
+        rows = self._disk.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+        overflow = rows - self.max_disk_entries
+        if overflow > 0:
+            # 多淘汰 10%，避免容量边界上每次写入都触发
+            evict = overflow + self.max_disk_entries // 10
+            evicted = self._disk.execute(
+                "DELETE FROM embedding_cache WHERE key IN "
+                "(SELECT key FROM embedding_cache ORDER BY expires_at LIMIT ?)",
+                (evict,)
+            ).rowcount
+            rows -= evicted
+            removed += evicted
+            self.stats["disk_evictions"] += evicted
+
+        self._disk.commit()
+        self._disk_rows = rows
+        self._disk_writes = 0
+        return removed
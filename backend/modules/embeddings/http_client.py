@@ -0,0 +1,128 @@
+"""
+嵌入提供商共享异步 HTTP 客户端
+- 进程内共享一个 httpx.AsyncClient：keep-alive 连接池，安装 h2 时启用 HTTP/2
+- ProviderHTTP：每个提供商独立的并发上限与超时，慢提供商不会占满连接池
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 全局共享客户端（绑定创建时的事件循环）
+_client = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_http_client():
+    """
+    获取共享 AsyncClient（首次调用时创建）
+
+    连接池大小由 EMBEDDING_HTTP_MAX_CONNECTIONS / EMBEDDING_HTTP_MAX_KEEPALIVE 控制
+    """
+    global _client, _client_loop
+
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    if _client is not None and not _client.is_closed and _client_loop is loop:
+        return _client
+
+    http2 = _http2_available()
+    _client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("EMBEDDING_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("EMBEDDING_HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=30.0
+        ),
+        timeout=httpx.Timeout(30.0, connect=5.0)
+    )
+    _client_loop = loop
+    logger.info(f"嵌入 HTTP 客户端已创建: http2={http2}")
+    return _client
+
+
+async def close_http_client() -> None:
+    """关闭共享客户端（应用关闭时调用）"""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+
+class ProviderHTTP:
+    """
+    单个提供商的 HTTP 调用入口（共享连接池 + 独立并发上限/超时）
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 8,
+        timeout: float = 10.0,
+        connect_timeout: float = 3.0
+    ):
+        """
+        Args:
+            name: 提供商名称（用于日志）
+            max_concurrency: 最大并发请求数
+            timeout: 请求总超时（秒）
+            connect_timeout: 建连超时（秒）
+        """
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("httpx库未安装: pip install httpx[http2]")
+
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def post_json(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        发送 JSON POST 请求
+
+        Returns:
+            响应 JSON
+
+        Raises:
+            Exception: HTTP 错误状态（包含响应内容）
+        """
+        async with self._get_semaphore():
+            response = await get_http_client().post(
+                url,
+                json=payload,
+                headers=headers,
+                timeout=self.timeout
+            )
+
+        if response.status_code >= 400:
+            raise Exception(f"{self.name} HTTP {response.status_code}: {response.text[:500]}")
+        return response.json()
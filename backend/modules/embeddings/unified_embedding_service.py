@@ -12,12 +12,20 @@ import os
 from datetime import datetime
 import json
 
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import EmbeddingCache, make_cache_key
+from .http_client import ProviderHTTP
+from modules.nlp.token_counter import get_token_counter
+
 logger = logging.getLogger(__name__)
 
 
 class EmbeddingService(ABC):
     """嵌入服务抽象基类"""
     
+    # 单次请求最多文本数（None 表示不限），合并与批量调用按此拆分
+    max_batch_size: Optional[int] = None
+    
     @abstractmethod
     async def embed_text(self, text: str) -> List[float]:
         """生成单个文本的嵌入向量"""
@@ -42,6 +50,8 @@ class EmbeddingService(ABC):
 class OpenAIEmbeddingService(EmbeddingService):
     """OpenAI嵌入服务"""
     
+    max_batch_size = 2048
+    
     def __init__(self, api_key: str, model: str = "text-embedding-3-small"):
         self.api_key = api_key
         self.model = model
@@ -87,37 +97,35 @@ class OpenAIEmbeddingService(EmbeddingService):
 class ZhipuAIEmbeddingService(EmbeddingService):
     """智谱AI嵌入服务 - 中文效果最佳"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_concurrency: int = 8, timeout: float = 10.0):
         self.api_key = api_key
         self.dimension = 1024
         self.base_url = "https://open.bigmodel.cn/api/paas/v4/embeddings"
         
-        try:
-            import requests
-            self.requests = requests
-        except ImportError:
-            raise ImportError("requests库未安装: pip install requests")
+        # 共享异步连接池，独立并发上限/超时
+        self.http = ProviderHTTP("ZhipuAI", max_concurrency=max_concurrency, timeout=timeout)
+    
+    async def _request(self, input_data: Union[str, List[str]]) -> List[List[float]]:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": "embedding-2",
+            "input": input_data
+        }
+        
+        result = await self.http.post_json(self.base_url, data, headers=headers)
+        
+        if "data" in result and result["data"]:
+            return [item["embedding"] for item in result["data"]]
+        else:
+            raise Exception(f"智谱AI API错误: {result}")
     
     async def embed_text(self, text: str) -> List[float]:
         """生成单个文本的嵌入向量"""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "model": "embedding-2",
-                "input": text
-            }
-            
-            response = self.requests.post(self.base_url, headers=headers, json=data)
-            result = response.json()
-            
-            if "data" in result and result["data"]:
-                return result["data"][0]["embedding"]
-            else:
-                raise Exception(f"智谱AI API错误: {result}")
-                
+            return (await self._request(text))[0]
         except Exception as e:
             logger.error(f"智谱AI嵌入失败: {e}")
             raise
@@ -125,23 +133,7 @@ class ZhipuAIEmbeddingService(EmbeddingService):
     async def embed_batch(self, texts: List[str]) -> List[List[float]]:
         """批量生成嵌入向量"""
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "model": "embedding-2",
-                "input": texts
-            }
-            
-            response = self.requests.post(self.base_url, headers=headers, json=data)
-            result = response.json()
-            
-            if "data" in result and result["data"]:
-                return [item["embedding"] for item in result["data"]]
-            else:
-                raise Exception(f"智谱AI API错误: {result}")
-                
+            return await self._request(texts)
         except Exception as e:
             logger.error(f"智谱AI批量嵌入失败: {e}")
             raise
@@ -203,29 +195,41 @@ class DeepSeekEmbeddingService(EmbeddingService):
 class QwenEmbeddingService(EmbeddingService):
     """通义千问嵌入服务 - 技术文档处理更准"""
     
-    def __init__(self, api_key: str):
+    # DashScope text-embedding-v2 单次最多 25 条
+    max_batch_size = 25
+    
+    def __init__(self, api_key: str, max_concurrency: int = 8, timeout: float = 10.0):
         self.api_key = api_key
         self.dimension = 1024
+        # DashScope HTTP 接口（SDK 为同步调用，会阻塞事件循环）
+        self.base_url = "https://dashscope.aliyuncs.com/api/v1/services/embeddings/text-embedding/text-embedding"
         
-        try:
-            import dashscope
-            self.dashscope = dashscope
-        except ImportError:
-            raise ImportError("DashScope库未安装: pip install dashscope")
+        # 共享异步连接池，独立并发上限/超时
+        self.http = ProviderHTTP("Qwen", max_concurrency=max_concurrency, timeout=timeout)
+    
+    async def _request(self, texts: List[str]) -> List[List[float]]:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": "text-embedding-v2",
+            "input": {"texts": texts}
+        }
+        
+        result = await self.http.post_json(self.base_url, data, headers=headers)
+        
+        embeddings = (result.get("output") or {}).get("embeddings")
+        if embeddings:
+            embeddings = sorted(embeddings, key=lambda item: item.get("text_index", 0))
+            return [item["embedding"] for item in embeddings]
+        else:
+            raise Exception(f"通义千问API错误: {result.get('message', result)}")
     
     async def embed_text(self, text: str) -> List[float]:
         """生成单个文本的嵌入向量"""
         try:
-            response = self.dashscope.TextEmbedding.call(
-                model="text-embedding-v2",
-                input=text
-            )
-            
-            if response.status_code == 200:
-                return response.output["embeddings"][0]["embedding"]
-            else:
-                raise Exception(f"通义千问API错误: {response.message}")
-                
+            return (await self._request([text]))[0]
         except Exception as e:
             logger.error(f"通义千问嵌入失败: {e}")
             raise
@@ -233,16 +237,7 @@ class QwenEmbeddingService(EmbeddingService):
     async def embed_batch(self, texts: List[str]) -> List[List[float]]:
         """批量生成嵌入向量"""
         try:
-            response = self.dashscope.TextEmbedding.call(
-                model="text-embedding-v2",
-                input=texts
-            )
-            
-            if response.status_code == 200:
-                return [item["embedding"] for item in response.output["embeddings"]]
-            else:
-                raise Exception(f"通义千问API错误: {response.message}")
-                
+            return await self._request(texts)
         except Exception as e:
             logger.error(f"通义千问批量嵌入失败: {e}")
             raise
@@ -270,7 +265,12 @@ class SmartEmbeddingService:
                  providers: Dict[str, EmbeddingService],
                  language_rules: Dict[str, str] = None,
                  enable_cache: bool = True,
-                 cache_ttl: int = 3600):
+                 cache_ttl: int = 3600,
+                 cache_max_entries: int = 10000,
+                 cache_path: Optional[str] = None,
+                 enable_batching: bool = True,
+                 batch_max_size: int = 32,
+                 batch_window_ms: float = 5.0):
         """
         初始化智能嵌入服务
         
@@ -279,6 +279,11 @@ class SmartEmbeddingService:
             language_rules: 语言规则 {"chinese": "zhipuai", "english": "deepseek", ...}
             enable_cache: 是否启用缓存
             cache_ttl: 缓存TTL（秒）
+            cache_max_entries: 内存缓存最大条数（LRU淘汰）
+            cache_path: 磁盘缓存路径（SQLite，默认读取 EMBEDDING_CACHE_PATH，为空则不启用）
+            enable_batching: 是否合并并发的 embed_text 请求为批量调用
+            batch_max_size: 单批最大文本数（不超过提供商的 max_batch_size）
+            batch_window_ms: 合并窗口（毫秒）
         """
         self.providers = providers
         self.enable_cache = enable_cache
@@ -292,8 +297,19 @@ class SmartEmbeddingService:
             "default": "zhipuai"       # 默认智谱AI
         }
         
-        # 缓存
-        self.text_cache: Dict[str, Dict[str, Any]] = {}
+        # 缓存（键为 提供商/模型 + 规范化文本 的哈希）
+        self.cache = EmbeddingCache(
+            max_entries=cache_max_entries,
+            ttl=cache_ttl,
+            disk_path=cache_path or os.getenv("EMBEDDING_CACHE_PATH") or None,
+            max_disk_entries=int(os.getenv("EMBEDDING_CACHE_MAX_DISK_ENTRIES", "100000"))
+        ) if enable_cache else None
+        
+        # 请求合并器（每个提供商一个）
+        self.enable_batching = enable_batching
+        self.batch_max_size = batch_max_size
+        self.batch_window_ms = batch_window_ms
+        self.batchers: Dict[str, EmbeddingBatcher] = {}
         
         # 统计信息
         self.stats = {
@@ -372,15 +388,7 @@ class SmartEmbeddingService:
         Returns:
             嵌入向量
         """
-        # 检查缓存
-        if self.enable_cache and text in self.text_cache:
-            cache_data = self.text_cache[text]
-            if time.time() - cache_data["timestamp"] < self.cache_ttl:
-                self.stats["cache_hits"] += 1
-                logger.debug(f"缓存命中: {text[:30]}...")
-                return cache_data["embedding"]
-        
-        # 选择提供商
+        # 选择提供商（缓存键依赖提供商/模型，需先确定）
         if force_provider and force_provider in self.providers:
             provider = self.providers[force_provider]
             provider_name = force_provider
@@ -395,18 +403,25 @@ class SmartEmbeddingService:
         if not provider:
             raise Exception("没有可用的嵌入提供商")
         
+        # 检查缓存
+        cache_key = make_cache_key(provider.get_provider_name(), text) if self.cache is not None else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                logger.debug(f"缓存命中: {text[:30]}...")
+                return cached
+        
         # 生成嵌入
         try:
-            embedding = await provider.embed_text(text)
+            if self.enable_batching:
+                embedding = await self._get_batcher(provider).submit(text, key=cache_key)
+            else:
+                embedding = await provider.embed_text(text)
             
             # 缓存结果
-            if self.enable_cache:
-                self.text_cache[text] = {
-                    "embedding": embedding,
-                    "timestamp": time.time(),
-                    "provider": provider_name,
-                    "language": language if not force_provider else "forced"
-                }
+            if cache_key:
+                self.cache.set(cache_key, embedding)
             
             # 统计
             self.stats["total_requests"] += 1
@@ -422,6 +437,31 @@ class SmartEmbeddingService:
             logger.error(f"嵌入失败: {provider_name}, 错误: {e}")
             raise
     
+    def _get_batcher(self, provider: EmbeddingService) -> EmbeddingBatcher:
+        """获取提供商对应的请求合并器"""
+        name = provider.get_provider_name()
+        batcher = self.batchers.get(name)
+        if batcher is None:
+            batcher = EmbeddingBatcher(
+                provider.embed_batch,
+                max_batch_size=min(self.batch_max_size, provider.max_batch_size or self.batch_max_size),
+                max_wait_ms=self.batch_window_ms,
+                name=name
+            )
+            self.batchers[name] = batcher
+        return batcher
+    
+    async def _embed_in_chunks(self, provider: EmbeddingService, texts: List[str]) -> List[List[float]]:
+        """按提供商单次请求上限拆分批量调用（并发受提供商连接池限制）"""
+        size = provider.max_batch_size
+        if not size or len(texts) <= size:
+            return await provider.embed_batch(texts)
+        
+        chunks = await asyncio.gather(*(
+            provider.embed_batch(texts[start:start + size]) for start in range(0, len(texts), size)
+        ))
+        return [embedding for chunk in chunks for embedding in chunk]
+    
     async def embed_batch(self, texts: List[str], force_provider: str = None) -> List[List[float]]:
         """
         批量生成嵌入向量
@@ -433,65 +473,60 @@ class SmartEmbeddingService:
         Returns:
             嵌入向量列表
         """
-        embeddings = []
-        uncached_texts = []
-        uncached_indices = []
+        if not texts:
+            return []
         
-        # 检查缓存
-        for i, text in enumerate(texts):
-            if self.enable_cache and text in self.text_cache:
-                cache_data = self.text_cache[text]
-                if time.time() - cache_data["timestamp"] < self.cache_ttl:
-                    embeddings.append(cache_data["embedding"])
-                    self.stats["cache_hits"] += 1
-                else:
-                    uncached_texts.append(text)
-                    uncached_indices.append(i)
-                    embeddings.append(None)
-            else:
-                uncached_texts.append(text)
-                uncached_indices.append(i)
-                embeddings.append(None)
+        # 选择提供商（缓存键依赖提供商/模型，需先确定）
+        if force_provider and force_provider in self.providers:
+            provider = self.providers[force_provider]
+            provider_name = force_provider
+        else:
+            # 检测主要语言
+            languages = [self._detect_language(text) for text in texts]
+            main_language = max(set(languages), key=languages.count)
+            provider = self._get_best_provider(main_language)
+            provider_name = provider.get_provider_name() if provider else "unknown"
+            
+            # 统计语言检测
+            for lang in languages:
+                self.stats["language_detections"][lang] = self.stats["language_detections"].get(lang, 0) + 1
+        
+        if not provider:
+            raise Exception("没有可用的嵌入提供商")
+        
+        # 检查缓存（一次批量查询，磁盘层只访问一次）
+        if self.cache is not None:
+            cache_keys = [make_cache_key(provider.get_provider_name(), text) for text in texts]
+            embeddings = self.cache.get_many(cache_keys)
+        else:
+            cache_keys = []
+            embeddings = [None] * len(texts)
+        
+        uncached_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        uncached_texts = [texts[i] for i in uncached_indices]
+        self.stats["cache_hits"] += len(texts) - len(uncached_indices)
         
         # 批量生成未缓存的
         if uncached_texts:
-            # 选择提供商
-            if force_provider and force_provider in self.providers:
-                provider = self.providers[force_provider]
-                provider_name = force_provider
-            else:
-                # 检测主要语言
-                languages = [self._detect_language(text) for text in uncached_texts]
-                main_language = max(set(languages), key=languages.count)
-                provider = self._get_best_provider(main_language)
-                provider_name = provider.get_provider_name() if provider else "unknown"
-                
-                # 统计语言检测
-                for lang in languages:
-                    self.stats["language_detections"][lang] = self.stats["language_detections"].get(lang, 0) + 1
-            
-            if not provider:
-                raise Exception("没有可用的嵌入提供商")
-            
             try:
-                batch_embeddings = await provider.embed_batch(uncached_texts)
+                batch_embeddings = await self._embed_in_chunks(provider, uncached_texts)
                 
                 for i, idx in enumerate(uncached_indices):
                     embeddings[idx] = batch_embeddings[i]
-                    
-                    # 缓存结果
-                    if self.enable_cache:
-                        self.text_cache[uncached_texts[i]] = {
-                            "embedding": batch_embeddings[i],
-                            "timestamp": time.time(),
-                            "provider": provider_name,
-                            "language": languages[i] if not force_provider else "forced"
-                        }
+                
+                # 缓存结果
+                if self.cache is not None:
+                    self.cache.set_many(
+                        (cache_keys[idx], batch_embeddings[i]) for i, idx in enumerate(uncached_indices)
+                    )
                 
                 # 统计
                 self.stats["total_requests"] += len(texts)
                 self.stats["provider_usage"][provider_name] = self.stats["provider_usage"].get(provider_name, 0) + len(uncached_texts)
-                self._estimate_cost(provider, "", sum(len(text) for text in uncached_texts))
+                counter = get_token_counter()
+                self._estimate_cost(
+                    provider, "", sum(counter.count(text, provider_name) for text in uncached_texts)
+                )
                 
                 logger.debug(f"批量嵌入成功: {provider_name}, 数量: {len(uncached_texts)}")
                 
@@ -503,9 +538,9 @@ class SmartEmbeddingService:
         return embeddings
     
     def _estimate_cost(self, provider: EmbeddingService, text: str = "", tokens: int = 0):
-        """估算API调用成本"""
+        """估算API调用成本（按嵌入模型分词器计数）"""
         if tokens == 0:
-            tokens = len(text)
+            tokens = get_token_counter().count(text, provider.get_provider_name())
         
         self.stats["total_tokens"] += tokens
         
@@ -540,7 +575,9 @@ class SmartEmbeddingService:
         stats.update({
             "cache_hit_rate": stats["cache_hits"] / max(stats["total_requests"], 1),
             "error_rate": stats["errors"] / max(stats["total_requests"], 1),
-            "cached_texts": len(self.text_cache),
+            "cached_texts": len(self.cache) if self.cache is not None else 0,
+            "cache": self.cache.get_stats() if self.cache is not None else None,
+            "batching": {name: batcher.get_stats() for name, batcher in self.batchers.items()},
             "available_providers": list(self.providers.keys()),
             "language_rules": self.language_rules
         })
@@ -548,7 +585,8 @@ class SmartEmbeddingService:
     
     def clear_cache(self):
         """清除缓存"""
-        self.text_cache.clear()
+        if self.cache is not None:
+            self.cache.clear()
         logger.info("智能嵌入缓存已清除")
 
 
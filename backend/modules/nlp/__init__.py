@@ -0,0 +1,7 @@
+"""NLP 模块：中文分词、关键词匹配等文本处理工具"""
+from .tokenizer import Tokenizer, default_tokenizer
+from .keyword_matcher import KeywordMatcher, KeywordGroups, get_keyword_matcher
+from .token_counter import TokenCounter, get_token_counter
+
+__all__ = ["Tokenizer", "default_tokenizer", "KeywordMatcher", "KeywordGroups", "get_keyword_matcher",
+           "TokenCounter", "get_token_counter"]
@@ -0,0 +1,188 @@
+"""
+关键词分组匹配引擎：所有关键词编译为一个 Aho-Corasick 自动机
+一次扫描返回每个分组的命中数，结果按原文 LRU 缓存
+供智能路由、首轮路由、意图分类共用（替代逐个 `kw in message` 子串扫描）：
+各分类器注册的分组合并进同一个进程级自动机，同一条消息经过多个分类层只扫描一次
+"""
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+
+class KeywordMatcher:
+    """
+    多分组关键词匹配器
+
+    - 匹配语义与 `kw in text` 相同（区分大小写，子串匹配，关键词之间可重叠）
+    - 每个分组的命中数 = 该分组中出现过的不同关键词个数
+    - 同一关键词可属于多个分组
+    - 自动机预先展开失败转移为 DFA，扫描时每个字符只查一次表
+    """
+
+    def __init__(self, groups: Mapping[str, Iterable[str]], cache_size: int = 4096):
+        """
+        Args:
+            groups: {分组名: 关键词列表}
+            cache_size: LRU 缓存条数
+        """
+        self.groups: Dict[str, Tuple[str, ...]] = {
+            name: tuple(dict.fromkeys(kw for kw in keywords if kw))
+            for name, keywords in groups.items()
+        }
+        self.cache_size = cache_size
+
+        # 关键词 -> 所属分组
+        keyword_groups: Dict[str, Tuple[str, ...]] = {}
+        for name, keywords in self.groups.items():
+            for keyword in keywords:
+                keyword_groups[keyword] = keyword_groups.get(keyword, ()) + (name,)
+
+        self._keywords = list(keyword_groups)
+        self._keyword_groups = [keyword_groups[kw] for kw in self._keywords]
+
+        self._build_automaton(self._keywords)
+        self.scan = lru_cache(maxsize=cache_size)(self._scan_uncached)
+
+    # ==================== 公共 API ====================
+
+    def count(self, text: str) -> Dict[str, int]:
+        """每个分组命中的不同关键词个数（包含所有分组，未命中为 0）"""
+        counts = self.scan(text or "")
+        return {name: counts.get(name, 0) for name in self.groups}
+
+    def has(self, text: str, group: str) -> bool:
+        """文本是否命中分组中任一关键词"""
+        return group in self.scan(text or "")
+
+    def cache_info(self):
+        """LRU 缓存统计"""
+        return self.scan.cache_info()
+
+    # ==================== 内部实现 ====================
+
+    def _build_automaton(self, keywords: List[str]) -> None:
+        """构建 Aho-Corasick 自动机并展开为 DFA 转移表"""
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[Tuple[int, ...]] = [()]
+
+        for index, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append(())
+                state = next_state
+            outputs[state] = outputs[state] + (index,)
+
+        # 按 BFS 顺序计算失败转移，并把失败状态的转移并入当前状态
+        fail = [0] * len(goto)
+        transitions = [dict(edges) for edges in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in transitions[fail[state]].items():
+                transitions[state].setdefault(char, next_state)
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fail[next_state] = transitions[fail[state]].get(char, 0)
+                outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+
+        self._transitions = transitions
+        self._outputs = outputs
+
+    def _scan_uncached(self, text: str) -> Dict[str, int]:
+        """扫描文本，返回命中分组的计数（只含命中的分组；结果被缓存共享，调用方不得修改）"""
+        transitions = self._transitions
+        outputs = self._outputs
+
+        found = set()
+        state = 0
+        for char in text:
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+
+        counts: Dict[str, int] = {}
+        for index in found:
+            for name in self._keyword_groups[index]:
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+
+class GroupCounts:
+    """某个分类器视角下的分组命中数（未命中的分组为 0）"""
+
+    __slots__ = ("_counts", "_prefix")
+
+    def __init__(self, counts: Dict[str, int], prefix: str):
+        self._counts = counts
+        self._prefix = prefix
+
+    def __getitem__(self, group: str) -> int:
+        return self._counts.get(self._prefix + group, 0)
+
+
+class KeywordGroups:
+    """
+    共享自动机中属于某个分类器的一组分组
+    通过 get_keyword_matcher 获取
+    """
+
+    def __init__(self, engine: "_SharedEngine", prefix: str, groups: Dict[str, Tuple[str, ...]]):
+        self._engine = engine
+        self._prefix = prefix
+        self.groups = groups
+
+    def count(self, text: str) -> GroupCounts:
+        """各分组命中的不同关键词个数：counts[分组名]"""
+        return GroupCounts(self._engine.matcher.scan(text or ""), self._prefix)
+
+    def has(self, text: str, group: str) -> bool:
+        """文本是否命中分组中任一关键词"""
+        return self._prefix + group in self._engine.matcher.scan(text or "")
+
+
+# ==================== 共享实例 ====================
+
+class _SharedEngine:
+    """进程级共享自动机：注册新分组时整体重建（只在某类分类器首次创建时发生）"""
+
+    def __init__(self, cache_size: int = 8192):
+        self.cache_size = cache_size
+        self.matcher = KeywordMatcher({}, cache_size)
+        self._groups: Dict[str, Tuple[str, ...]] = {}
+        self._views: Dict[Tuple, KeywordGroups] = {}
+        self._lock = threading.Lock()
+
+    def register(self, groups: Mapping[str, Iterable[str]]) -> KeywordGroups:
+        key = tuple((name, tuple(keywords)) for name, keywords in groups.items())
+        view = self._views.get(key)
+        if view is not None:
+            return view
+
+        with self._lock:
+            view = self._views.get(key)
+            if view is None:
+                prefix = f"{len(self._views)}:"
+                for name, keywords in key:
+                    self._groups[prefix + name] = keywords
+                self.matcher = KeywordMatcher(self._groups, self.cache_size)
+                view = self._views[key] = KeywordGroups(self, prefix, dict(key))
+        return view
+
+
+_engine = _SharedEngine()
+
+
+def get_keyword_matcher(groups: Mapping[str, Iterable[str]]) -> KeywordGroups:
+    """
+    在共享自动机中注册分组并返回其视图
+    相同的分组与关键词只注册一次（分类器按请求新建实例时不会重建自动机）
+    Args:
+        groups: {分组名: 关键词列表}，分组名只需在本次注册内唯一
+    """
+    return _engine.register(groups)
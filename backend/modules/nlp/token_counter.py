@@ -0,0 +1,174 @@
+"""
+模型 token 计数
+按模型族选择分词器：安装了 tiktoken 时 OpenAI 系模型用真实编码，其余模型可通过
+register_tokenizer 挂接官方分词器（如 HuggingFace tokenizers），未挂接时按各家公布的
+中文/英文字符换算比例估算。计数结果按（模型族, 文本）LRU 缓存，多轮对话中历史消息只计一次
+"""
+import logging
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+
+# 模型名关键字 -> 模型族（按顺序匹配，模型名统一小写；厂商名优先于通用名，如 qwen-text-embedding）
+MODEL_FAMILIES: List[Tuple[str, str]] = [
+    ("gpt-4o", "openai-o200k"),
+    ("gpt-4.1", "openai-o200k"),
+    ("qwen", "qwen"),
+    ("deepseek", "deepseek"),
+    ("glm", "glm"),
+    ("zhipu", "glm"),
+    ("moonshot", "moonshot"),
+    ("ernie", "ernie"),
+    ("claude", "claude"),
+    ("gemini", "gemini"),
+    ("gpt", "openai"),
+    ("text-embedding", "openai"),
+    ("openai", "openai"),
+]
+
+DEFAULT_FAMILY = "qwen"
+
+# 估算比例：(每个中日韩字符的 token 数, 每个其他字符的 token 数)
+# 取自各厂商计费文档的换算说明（如 DeepSeek：1 个中文字符 ≈ 0.6 token，1 个英文字符 ≈ 0.3 token）
+FAMILY_RATIOS: Dict[str, Tuple[float, float]] = {
+    "openai": (1.1, 0.25),
+    "openai-o200k": (0.8, 0.25),
+    "qwen": (0.7, 0.28),
+    "deepseek": (0.6, 0.3),
+    "glm": (0.6, 0.28),
+    "moonshot": (0.7, 0.28),
+    "ernie": (0.75, 0.3),
+    "claude": (1.2, 0.3),
+    "gemini": (0.8, 0.25),
+}
+
+TIKTOKEN_ENCODINGS = {
+    "openai": "cl100k_base",
+    "openai-o200k": "o200k_base",
+}
+
+# 聊天格式开销：每条消息的角色/分隔符 token，以及回复起始标记
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return (
+        0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or 0x3000 <= code <= 0x303F
+        or 0xFF00 <= code <= 0xFFEF or 0x3040 <= code <= 0x30FF or 0xAC00 <= code <= 0xD7AF
+    )
+
+
+class TokenCounter:
+    """
+    按模型计数 token（带缓存）
+
+    用法：
+        counter = get_token_counter()
+        counter.count("充电桩怎么安装", model="qwen-turbo")
+        counter.count_messages([{"role": "user", "content": "..."}], model="deepseek-chat")
+    """
+
+    def __init__(self, cache_size: int = 8192):
+        """
+        Args:
+            cache_size: 计数缓存条数（按模型族 + 文本）
+        """
+        self.cache_size = cache_size
+        self._encoders: Dict[str, Optional[Callable[[str], List[int]]]] = {}
+        self._lock = threading.Lock()
+        self._count_cached = lru_cache(maxsize=cache_size)(self._count_uncached)
+
+    # ==================== 公共 API ====================
+
+    def count(self, text: str, model: Optional[str] = None) -> int:
+        """文本 token 数"""
+        if not text:
+            return 0
+        return self._count_cached(self.family(model), text)
+
+    def count_messages(self, messages: Iterable[Dict[str, str]], model: Optional[str] = None) -> int:
+        """聊天消息列表的输入 token 数（含消息格式开销）"""
+        family = self.family(model)
+        total = TOKENS_PER_REPLY
+        for message in messages:
+            content = message.get("content") or ""
+            total += TOKENS_PER_MESSAGE + (self._count_cached(family, content) if content else 0)
+        return total
+
+    def family(self, model: Optional[str]) -> str:
+        """模型所属的分词器族"""
+        name = (model or "").lower()
+        for keyword, family in MODEL_FAMILIES:
+            if keyword in name:
+                return family
+        return DEFAULT_FAMILY
+
+    def is_exact(self, model: Optional[str] = None) -> bool:
+        """该模型是否使用真实分词器计数（否则为按比例估算）"""
+        return self._get_encoder(self.family(model)) is not None
+
+    def register_tokenizer(self, family: str, encode: Callable[[str], List[int]]) -> None:
+        """
+        挂接模型族的真实分词器
+        Args:
+            family: 模型族（qwen / deepseek / glm ...）
+            encode: 文本 -> token id 列表
+        """
+        with self._lock:
+            self._encoders[family] = encode
+            self._count_cached.cache_clear()
+        logger.info(f"已挂接分词器: {family}")
+
+    def cache_info(self):
+        """计数缓存统计"""
+        return self._count_cached.cache_info()
+
+    # ==================== 内部实现 ====================
+
+    def _count_uncached(self, family: str, text: str) -> int:
+        encode = self._get_encoder(family)
+        if encode is not None:
+            return len(encode(text))
+
+        cjk_ratio, other_ratio = FAMILY_RATIOS.get(family, FAMILY_RATIOS[DEFAULT_FAMILY])
+        cjk = sum(1 for char in text if _is_cjk(char))
+        return max(1, round(cjk * cjk_ratio + (len(text) - cjk) * other_ratio))
+
+    def _get_encoder(self, family: str) -> Optional[Callable[[str], List[int]]]:
+        if family in self._encoders:
+            return self._encoders[family]
+
+        encode = None
+        encoding_name = TIKTOKEN_ENCODINGS.get(family)
+        if encoding_name and TIKTOKEN_AVAILABLE:
+            try:
+                encode = tiktoken.get_encoding(encoding_name).encode_ordinary
+            except Exception as e:
+                logger.warning(f"tiktoken 编码加载失败: {encoding_name}, {e}，按比例估算")
+
+        with self._lock:
+            return self._encoders.setdefault(family, encode)
+
+
+# 全局实例
+_token_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    """获取全局 token 计数器"""
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = TokenCounter()
+    return _token_counter
@@ -0,0 +1,216 @@
+"""
+中文分词器：字符 bigram/trigram + 词典匹配，带 LRU 缓存
+供 RAG 检索、上下文主题检测、客户中台打分共用
+"""
+import logging
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set
+
+logger = logging.getLogger(__name__)
+
+
+# 单字停用词：在中文串中作为切分点，不参与 n-gram
+# 只收几乎不参与构词的助词/语气词；有/会/要/能/到/个 等实词语素会切断 功能、需要、会员、到货、个人
+STOPWORDS: Set[str] = {
+    '的', '了', '吗', '呢', '吧', '啊', '呀', '哦', '嗯', '哈', '嘛', '哇', '啦',
+}
+
+# 多字停用词：不作为 token 输出
+STOP_PHRASES: Set[str] = {
+    '我们', '你们', '他们', '这个', '那个', '什么', '怎么', '为什么', '一个',
+    '请问', '一下', '可以', '可不可以', '是不是',
+}
+
+# 内置领域词典（充电桩客服场景）
+DEFAULT_DICTIONARY: Set[str] = {
+    '充电桩', '充电枪', '交流桩', '直流桩', '枪型', '功率', '电流', '电压',
+    '报警码', '故障码', '无法充电', '序列号', '安装', '调试', '保修', '返修',
+    '上门', '工单', '报价', '价格', '多少钱', '含税', '发票', '交期', '型号',
+    '参数', '样机', '订单', '发货', '物流', '库存', '退款', '合同', '代理',
+    '使用方法', '操作步骤', '固件', '升级', '刷卡', '扫码',
+}
+
+_SEGMENT_PATTERN = re.compile(r'[\u4e00-\u9fff]+|[a-z0-9]+(?:[._\-][a-z0-9]+)*')
+
+
+def _is_cjk(text: str) -> bool:
+    return '\u4e00' <= text[0] <= '\u9fff'
+
+
+class _Analysis(NamedTuple):
+    """单条文本的分析结果（缓存单元）"""
+    tokens: tuple           # 检索用 token（含重复，保留词频）
+    keywords: frozenset     # 主题关键词：bigram + 词典词 + 英文数字词
+    term_counts: tuple      # 词典词命中次数 ((word, count), ...)
+
+
+class Tokenizer:
+    """
+    中文感知分词器
+    - 英文/数字按词切分
+    - 中文连续串按单字停用词断开，输出字符 n-gram
+    - 词典词在全文范围内匹配（可跨中英文），补充 n-gram 覆盖不到的长词
+    - 分析结果按原文 LRU 缓存，重复消息零开销
+    """
+
+    def __init__(
+        self,
+        dictionary: Optional[Iterable[str]] = None,
+        ngram_sizes: Sequence[int] = (2, 3),
+        cache_size: int = 4096
+    ):
+        """
+        Args:
+            dictionary: 额外词典词（与内置领域词典合并）
+            ngram_sizes: 中文字符 n-gram 长度
+            cache_size: LRU 缓存条数
+        """
+        self.ngram_sizes = tuple(sorted(set(ngram_sizes)))
+        self.cache_size = cache_size
+
+        self._dictionary: Set[str] = set()
+        self._word_lengths: List[int] = []
+        self.add_words(DEFAULT_DICTIONARY)
+        if dictionary:
+            self.add_words(dictionary)
+
+    # ==================== 词典管理 ====================
+
+    def add_words(self, words: Iterable[str]) -> None:
+        """添加词典词（会清空缓存）"""
+        for word in words:
+            word = self.normalize(word).strip()
+            if word:
+                self._dictionary.add(word)
+
+        self._word_lengths = sorted({len(w) for w in self._dictionary}, reverse=True)
+        self._analyze = lru_cache(maxsize=self.cache_size)(self._analyze_uncached)
+
+    @property
+    def dictionary(self) -> Set[str]:
+        return set(self._dictionary)
+
+    # ==================== 公共 API ====================
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """全角转半角 + 小写"""
+        return unicodedata.normalize('NFKC', text).lower()
+
+    def tokenize(self, text: str) -> List[str]:
+        """分词（检索用，保留重复以计词频）"""
+        if not text:
+            return []
+        return list(self._analyze(text).tokens)
+
+    def tokenize_batch(self, texts: Iterable[str]) -> List[List[str]]:
+        """批量分词"""
+        return [self.tokenize(text) for text in texts]
+
+    def keywords(self, text: str) -> Set[str]:
+        """提取关键词集合（主题检测用）"""
+        if not text:
+            return set()
+        return set(self._analyze(text).keywords)
+
+    def term_counts(self, text: str) -> Dict[str, int]:
+        """
+        统计词典词在文本中的出现次数（大小写/全半角不敏感）
+        Returns:
+            Dict[str, int]: {规范化词: 次数}，只含命中的词
+        """
+        if not text:
+            return {}
+        return dict(self._analyze(text).term_counts)
+
+    def cache_info(self):
+        """LRU 缓存统计"""
+        return self._analyze.cache_info()
+
+    # ==================== 内部实现 ====================
+
+    def _analyze_uncached(self, text: str) -> _Analysis:
+        normalized = self.normalize(text)
+
+        tokens: List[str] = []
+        keywords: Set[str] = set()
+
+        for match in _SEGMENT_PATTERN.finditer(normalized):
+            segment = match.group()
+            if _is_cjk(segment):
+                for run in self._split_stopwords(segment):
+                    self._emit_ngrams(run, tokens, keywords)
+            elif segment not in STOP_PHRASES:
+                tokens.append(segment)
+                if len(segment) >= 2:
+                    keywords.add(segment)
+
+        # 词典匹配：补充 n-gram 未覆盖的词（长词、中英混合词）
+        term_counts = self._match_dictionary(normalized)
+        ngram_set = set(tokens)
+        for word, count in term_counts.items():
+            if word in STOP_PHRASES:
+                continue
+            keywords.add(word)
+            if word not in ngram_set:
+                tokens.extend([word] * count)
+
+        return _Analysis(
+            tokens=tuple(tokens),
+            keywords=frozenset(keywords),
+            term_counts=tuple(term_counts.items())
+        )
+
+    @staticmethod
+    def _split_stopwords(segment: str) -> List[str]:
+        """按单字停用词断开中文串"""
+        runs = []
+        start = 0
+        for i, char in enumerate(segment):
+            if char in STOPWORDS:
+                if i > start:
+                    runs.append(segment[start:i])
+                start = i + 1
+        if start < len(segment):
+            runs.append(segment[start:])
+        return runs
+
+    def _emit_ngrams(self, run: str, tokens: List[str], keywords: Set[str]) -> None:
+        """输出中文串的字符 n-gram；单字串直接输出"""
+        length = len(run)
+        if length == 1:
+            tokens.append(run)
+            return
+
+        for n in self.ngram_sizes:
+            for i in range(length - n + 1):
+                gram = run[i:i + n]
+                if gram in STOP_PHRASES:
+                    continue
+                tokens.append(gram)
+                if n == 2:
+                    keywords.add(gram)
+
+    def _match_dictionary(self, normalized: str) -> Dict[str, int]:
+        """在全文中匹配所有词典词（逐位置按词长查表）"""
+        counts: Dict[str, int] = {}
+        dictionary = self._dictionary
+        lengths = self._word_lengths
+        text_len = len(normalized)
+
+        for i in range(text_len):
+            for n in lengths:
+                if i + n > text_len:
+                    continue
+                word = normalized[i:i + n]
+                if word in dictionary:
+                    counts[word] = counts.get(word, 0) + 1
+
+        return counts
+
+
+# ==================== 默认实例 ====================
+
+default_tokenizer = Tokenizer()
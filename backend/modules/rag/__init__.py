@@ -1,4 +1,6 @@
 """RAG 模块：检索增强生成"""
 from .retriever import Retriever, Evidence
+from .bm25_index import BM25Index
+from .hybrid_retriever import HybridRetriever, get_hybrid_retriever
 
-__all__ = ["Retriever", "Evidence"]
+__all__ = ["Retriever", "Evidence", "BM25Index", "HybridRetriever", "get_hybrid_retriever"]
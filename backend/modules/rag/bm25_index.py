@@ -0,0 +1,209 @@
+"""
+BM25 倒排索引：postings 列表 + 预计算文档长度/IDF + 堆选 Top-K
+"""
+import heapq
+import logging
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from modules.nlp.tokenizer import STOP_PHRASES
+
+logger = logging.getLogger(__name__)
+
+
+def is_boundary_fragment(term: str, anchors: Iterable[str]) -> bool:
+    """
+    是否为跨锚点词边界的字符 n-gram（如 "充电桩怎么安装" 中的 "桩怎"、"么安装"）
+    锚点为命中词与多字停用词；这类片段由切分方式产生、本身不携带新的查询意图。只对中文片段判断
+    """
+    if term.isascii():
+        return False
+    for anchor in anchors:
+        if anchor in term:
+            return True
+        for size in range(1, min(len(term), len(anchor))):
+            if term.startswith(anchor[-size:]) or term.endswith(anchor[:size]):
+                return True
+    return False
+
+
+def unmatched_upper_bound(unmatched_terms: Iterable[str], matched_terms: Iterable[str], n_docs: int) -> float:
+    """
+    未登录查询词的归一化上界贡献
+    每个未登录词按语料中最稀有词（df=1）的 IDF 计入，查询只部分命中知识库时得分随之降低；
+    跨命中词或停用词边界的 n-gram 片段除外
+    """
+    anchors = [*matched_terms, *STOP_PHRASES]
+    rare_idf = math.log(1 + (n_docs - 0.5) / 1.5)
+    return sum(
+        rare_idf for term in unmatched_terms
+        if not is_boundary_fragment(term, anchors)
+    )
+
+
+class BM25Index:
+    """
+    BM25 倒排索引
+    - postings: term -> {doc_id: tf}，查询只遍历命中词的倒排表
+    - 文档长度归一化因子、IDF 惰性计算并缓存，新增文档后按需失效
+    - 支持增量添加（add），无需全量重建
+    """
+
+    def __init__(
+        self,
+        tokenizer: Callable[[str], List[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        keyword_boost: float = 2.0
+    ):
+        """
+        Args:
+            tokenizer: 分词函数（文档与查询共用）
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+            keyword_boost: 人工关键词命中时计入的额外词频
+        """
+        self.tokenizer = tokenizer
+        self.k1 = k1
+        self.b = b
+        self.keyword_boost = keyword_boost
+
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._doc_len: List[float] = []
+        self._total_len = 0.0
+
+        # 缓存：新增文档后失效
+        self._idf: Dict[str, float] = {}
+        self._len_norm: List[float] = []
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    @property
+    def vocab_size(self) -> int:
+        return len(self._postings)
+
+    @property
+    def doc_lengths(self) -> List[float]:
+        return list(self._doc_len)
+
+    def iter_postings(self) -> Iterable[Tuple[str, Dict[int, float]]]:
+        """遍历倒排表 (term, {doc_id: tf})（用于导出）"""
+        return self._postings.items()
+
+    def clear(self) -> None:
+        """清空索引"""
+        self._postings.clear()
+        self._doc_len.clear()
+        self._total_len = 0.0
+        self._idf.clear()
+        self._len_norm = []
+        self._dirty = False
+
+    def add(self, content: str, keywords: Optional[Iterable[str]] = None) -> int:
+        """
+        增量添加一篇文档
+        Args:
+            content: 文档内容
+            keywords: 人工标注关键词（命中时额外加权）
+        Returns:
+            int: 文档编号（按添加顺序递增，与语料列表下标一致）
+        """
+        doc_id = len(self._doc_len)
+
+        term_freq: Dict[str, float] = {}
+        tokens = self.tokenizer(content)
+        for token in tokens:
+            term_freq[token] = term_freq.get(token, 0.0) + 1.0
+
+        for keyword in keywords or ():
+            for token in self.tokenizer(keyword):
+                term_freq[token] = term_freq.get(token, 0.0) + self.keyword_boost
+
+        for term, tf in term_freq.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+        doc_len = float(len(tokens))
+        self._doc_len.append(doc_len)
+        self._total_len += doc_len
+        self._dirty = True
+
+        return doc_id
+
+    def search(self, query: str, topn: int) -> List[Tuple[int, float]]:
+        """
+        检索
+        Args:
+            query: 查询文本
+            topn: 返回数量
+        Returns:
+            List[Tuple[int, float]]: [(doc_id, 归一化得分 0-1)]，按得分降序
+        """
+        if topn <= 0 or not self._doc_len:
+            return []
+
+        query_terms = set(self.tokenizer(query))
+        if not query_terms:
+            return []
+
+        self._refresh()
+
+        k1 = self.k1
+        scores: Dict[int, float] = {}
+        upper_bound = 0.0
+        matched_terms: List[str] = []
+        unmatched_terms: List[str] = []
+
+        # 归一化上界：命中词取其在语料中的最大贡献（全部命中且贡献最大的文档得分为 1），
+        # 未登录词按最稀有词的 IDF 计入，只命中个别词的离题问题得分随之降低
+        for term in query_terms:
+            postings = self._postings.get(term)
+            if not postings:
+                unmatched_terms.append(term)
+                continue
+            matched_terms.append(term)
+
+            idf = self._get_idf(term)
+            len_norm = self._len_norm
+            term_max = 0.0
+            for doc_id, tf in postings.items():
+                impact = idf * tf * (k1 + 1) / (tf + len_norm[doc_id])
+                scores[doc_id] = scores.get(doc_id, 0.0) + impact
+                if impact > term_max:
+                    term_max = impact
+            upper_bound += term_max
+
+        if not scores or upper_bound <= 0:
+            return []
+        upper_bound += unmatched_upper_bound(unmatched_terms, matched_terms, len(self._doc_len))
+
+        top = heapq.nlargest(topn, scores.items(), key=lambda item: item[1])
+        return [(doc_id, min(score / upper_bound, 1.0)) for doc_id, score in top]
+
+    # ==================== 辅助方法 ====================
+
+    def _refresh(self) -> None:
+        """新增文档后重算长度归一化因子，并使 IDF 缓存失效"""
+        if not self._dirty:
+            return
+
+        avgdl = self._total_len / len(self._doc_len) or 1.0
+        k1, b = self.k1, self.b
+        self._len_norm = [
+            k1 * (1 - b + b * doc_len / avgdl) for doc_len in self._doc_len
+        ]
+        self._idf.clear()
+        self._dirty = False
+
+    def _get_idf(self, term: str) -> float:
+        """BM25 IDF（带 +1 平滑，恒为正）"""
+        idf = self._idf.get(term)
+        if idf is None:
+            n_docs = len(self._doc_len)
+            df = len(self._postings.get(term, ()))
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            # 只缓存索引内的词，避免任意查询词撑大缓存
+            if df:
+                self._idf[term] = idf
+        return idf
@@ -0,0 +1,345 @@
+"""
+内存映射语料库：紧凑的磁盘格式 + 只读 mmap 加载
+多个 uvicorn worker 映射同一文件时共享物理页，启动无需逐行反序列化
+"""
+import array
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from .bm25_index import BM25Index, unmatched_upper_bound
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"WXCORP01"
+FORMAT_VERSION = 1
+_ALIGN = 8
+
+# 定长文本字段：UTF-8 拼接 blob + int64 偏移数组
+_TEXT_FIELDS = ("chunk_id", "section", "content", "keywords")
+# 低基数字段：驻留表 + int32 下标
+_INTERNED_FIELDS = ("document_name", "document_version")
+
+
+def _encode_strings(values: Iterable[str]) -> Tuple[bytes, array.array]:
+    """将字符串序列编码为 (blob, offsets[n+1])"""
+    blob = bytearray()
+    offsets = array.array("q", [0])
+    for value in values:
+        blob += value.encode("utf-8")
+        offsets.append(len(blob))
+    return bytes(blob), offsets
+
+
+def write_corpus_store(
+    path: str,
+    chunks: Sequence[Dict[str, Any]],
+    index: BM25Index
+) -> None:
+    """
+    写出语料库文件
+    Args:
+        path: 输出文件路径
+        chunks: 知识块列表（与 index 的 doc_id 一一对应）
+        index: 已构建的 BM25 索引
+    """
+    if len(chunks) != len(index):
+        raise ValueError(f"语料与索引不一致: chunks={len(chunks)}, index={len(index)}")
+
+    sections: Dict[str, bytes] = {}
+    typecodes: Dict[str, str] = {}
+
+    def put(name: str, data) -> None:
+        if isinstance(data, array.array):
+            typecodes[name] = data.typecode
+            data = data.tobytes()
+        sections[name] = data
+
+    # 文本字段
+    for field in _TEXT_FIELDS:
+        if field == "keywords":
+            values = (",".join(chunk.get("keywords") or []) for chunk in chunks)
+        else:
+            values = (chunk.get(field) or "" for chunk in chunks)
+        blob, offsets = _encode_strings(values)
+        put(f"{field}.blob", blob)
+        put(f"{field}.off", offsets)
+
+    # 驻留字段
+    for field in _INTERNED_FIELDS:
+        table: Dict[str, int] = {}
+        ids = array.array("i")
+        for chunk in chunks:
+            ids.append(table.setdefault(chunk.get(field) or "", len(table)))
+        blob, offsets = _encode_strings(table)
+        put(f"{field}.blob", blob)
+        put(f"{field}.off", offsets)
+        put(f"{field}.idx", ids)
+
+    # 文档长度
+    doc_lengths = index.doc_lengths
+    put("doc_len", array.array("f", doc_lengths))
+
+    # 倒排表：词按 UTF-8 字节序排序，查询时二分查找
+    postings = sorted(
+        ((term.encode("utf-8"), docs) for term, docs in index.iter_postings()),
+        key=lambda item: item[0]
+    )
+    vocab_blob, vocab_off = _encode_strings(term.decode("utf-8") for term, _ in postings)
+    post_off = array.array("q", [0])
+    post_doc = array.array("i")
+    post_tf = array.array("f")
+    for _, docs in postings:
+        for doc_id in sorted(docs):
+            post_doc.append(doc_id)
+            post_tf.append(docs[doc_id])
+        post_off.append(len(post_doc))
+    put("vocab.blob", vocab_blob)
+    put("vocab.off", vocab_off)
+    put("post.off", post_off)
+    put("post.doc", post_doc)
+    put("post.tf", post_tf)
+
+    # 头部：各段偏移
+    n_docs = len(chunks)
+    header = {
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "n_docs": n_docs,
+        "avgdl": (sum(doc_lengths) / n_docs) if n_docs else 0.0,
+        "k1": index.k1,
+        "b": index.b,
+        "sections": {}
+    }
+
+    # 头部长度依赖偏移，预留足够空间后回填
+    layout: List[Tuple[str, int]] = []
+    header_reserve = 256 + 96 * len(sections)
+    cursor = len(MAGIC) + 8 + header_reserve
+    for name, data in sections.items():
+        cursor = (cursor + _ALIGN - 1) // _ALIGN * _ALIGN
+        header["sections"][name] = [cursor, len(data), typecodes.get(name)]
+        layout.append((name, cursor))
+        cursor += len(data)
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    if len(header_bytes) > header_reserve:
+        raise ValueError("语料库头部超出预留空间")
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for name, offset in layout:
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(sections[name])
+    # 原子替换：已映射旧文件的进程不受影响
+    os.replace(tmp_path, path)
+
+    logger.info(
+        f"语料库已写出: {path}, docs={n_docs}, vocab={len(postings)}, "
+        f"size={cursor / 1024 / 1024:.1f}MB"
+    )
+
+
+class CorpusStore:
+    """
+    只读语料库（mmap）
+    - 知识块按需从映射区解码，不常驻 Python 对象
+    - 作为 Sequence 使用：len(store) / store[i] / 迭代
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._arrays: Dict[str, memoryview] = {}
+        self._view = None
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"不是有效的语料库文件: {path}")
+
+        header_len = int.from_bytes(self._mm[len(MAGIC):len(MAGIC) + 8], "little")
+        header_start = len(MAGIC) + 8
+        self.header = json.loads(self._mm[header_start:header_start + header_len])
+
+        if self.header.get("version") != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"语料库版本不兼容: {self.header.get('version')}")
+        if self.header.get("byteorder") != sys.byteorder:
+            self.close()
+            raise ValueError("语料库字节序与当前平台不一致，请重新生成")
+
+        self._view = memoryview(self._mm)
+        for name, (offset, length, typecode) in self.header["sections"].items():
+            if typecode:
+                self._arrays[name] = self._view[offset:offset + length].cast(typecode)
+
+        self.n_docs: int = self.header["n_docs"]
+        self._interned = {
+            field: self._decode_table(field) for field in _INTERNED_FIELDS
+        }
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def __getitem__(self, doc_id: int) -> Dict[str, Any]:
+        if not 0 <= doc_id < self.n_docs:
+            raise IndexError(doc_id)
+
+        keywords = self._get_text("keywords", doc_id)
+        return {
+            'chunk_id': self._get_text("chunk_id", doc_id),
+            'document_name': self._get_interned("document_name", doc_id),
+            'document_version': self._get_interned("document_version", doc_id) or 'v1.0',
+            'section': self._get_text("section", doc_id),
+            'content': self._get_text("content", doc_id),
+            'keywords': keywords.split(',') if keywords else []
+        }
+
+    def __iter__(self):
+        for doc_id in range(self.n_docs):
+            yield self[doc_id]
+
+    def close(self) -> None:
+        """释放映射（需先释放所有视图）"""
+        for view in self._arrays.values():
+            view.release()
+        self._arrays = {}
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+    # ==================== 倒排表访问 ====================
+
+    def array(self, name: str) -> memoryview:
+        """获取数值段（零拷贝视图）"""
+        return self._arrays[name]
+
+    def find_term(self, term: str) -> int:
+        """二分查找词项编号，未命中返回 -1"""
+        key = term.encode("utf-8")
+        offsets = self._arrays["vocab.off"]
+        base = self.header["sections"]["vocab.blob"][0]
+        mm = self._mm
+
+        lo, hi = 0, len(offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = mm[base + offsets[mid]:base + offsets[mid + 1]]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    # ==================== 内部实现 ====================
+
+    def _get_text(self, field: str, i: int) -> str:
+        offsets = self._arrays[f"{field}.off"]
+        base = self.header["sections"][f"{field}.blob"][0]
+        return self._mm[base + offsets[i]:base + offsets[i + 1]].decode("utf-8")
+
+    def _get_interned(self, field: str, doc_id: int) -> str:
+        return self._interned[field][self._arrays[f"{field}.idx"][doc_id]]
+
+    def _decode_table(self, field: str) -> List[str]:
+        size = len(self._arrays[f"{field}.off"]) - 1
+        return [self._get_text(field, i) for i in range(size)]
+
+
+class MappedBM25Index:
+    """
+    基于 CorpusStore 倒排段的只读 BM25 索引
+    打分公式与 BM25Index 一致（含 0-1 归一化），postings 直接读映射区
+    """
+
+    def __init__(self, store: CorpusStore, tokenizer: Callable[[str], List[str]]):
+        self.store = store
+        self.tokenizer = tokenizer
+        self.k1 = store.header["k1"]
+        self.b = store.header["b"]
+        self._avgdl = store.header["avgdl"] or 1.0
+
+        self._doc_len = store.array("doc_len")
+        self._post_off = store.array("post.off")
+        self._post_doc = store.array("post.doc")
+        self._post_tf = store.array("post.tf")
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    @property
+    def vocab_size(self) -> int:
+        return len(self._post_off) - 1
+
+    def search(self, query: str, topn: int) -> List[Tuple[int, float]]:
+        """检索，返回 [(doc_id, 归一化得分 0-1)]"""
+        n_docs = len(self.store)
+        if topn <= 0 or not n_docs:
+            return []
+
+        query_terms = set(self.tokenizer(query))
+        if not query_terms:
+            return []
+
+        k1, b, avgdl = self.k1, self.b, self._avgdl
+        doc_len, post_doc, post_tf = self._doc_len, self._post_doc, self._post_tf
+        scores: Dict[int, float] = {}
+        upper_bound = 0.0
+        matched_terms: List[str] = []
+        unmatched_terms: List[str] = []
+
+        for term in query_terms:
+            term_id = self.store.find_term(term)
+            if term_id < 0:
+                unmatched_terms.append(term)
+                continue
+            matched_terms.append(term)
+
+            start, end = self._post_off[term_id], self._post_off[term_id + 1]
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+            # 与 BM25Index 一致：上界为各命中词在语料中的最大贡献之和，再加未登录词的惩罚
+            term_max = 0.0
+            for i in range(start, end):
+                doc_id = post_doc[i]
+                tf = post_tf[i]
+                len_norm = k1 * (1 - b + b * doc_len[doc_id] / avgdl)
+                impact = idf * tf * (k1 + 1) / (tf + len_norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + impact
+                if impact > term_max:
+                    term_max = impact
+            upper_bound += term_max
+
+        if not scores or upper_bound <= 0:
+            return []
+        upper_bound += unmatched_upper_bound(unmatched_terms, matched_terms, n_docs)
+
+        top = heapq.nlargest(topn, scores.items(), key=lambda item: item[1])
+        return [(doc_id, min(score / upper_bound, 1.0)) for doc_id, score in top]
+
+
+def open_corpus_store(
+    path: str,
+    tokenizer: Callable[[str], List[str]]
+) -> Tuple[CorpusStore, MappedBM25Index]:
+    """打开语料库，返回 (语料序列, 只读索引)"""
+    store = CorpusStore(path)
+    return store, MappedBM25Index(store, tokenizer)
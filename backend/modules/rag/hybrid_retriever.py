@@ -0,0 +1,238 @@
+"""
+混合检索：BM25（本地倒排索引）+ pgvector 语义检索并行召回，RRF/加权融合
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from .retriever import Retriever, Evidence
+
+logger = logging.getLogger(__name__)
+
+
+class HybridRetriever:
+    """
+    混合检索器
+    - 两路召回用 asyncio 并发发起，总耗时约为 max(各路) 而非 sum(各路)
+    - 每路独立超时，超时/异常的一路被丢弃，返回另一路的部分结果
+    - 融合方式：
+        rrf      倒数排名融合，score 取各路原始得分的最大值（保持 0-1 置信度语义）
+        weighted 按权重加权各路归一化得分（0-1）
+    - 两路结果以 chunk_id / 向量 id 对齐（语义库向量 id 应与知识块 chunk_id 一致）
+    """
+
+    FUSION_METHODS = ("rrf", "weighted")
+
+    def __init__(
+        self,
+        retriever: Retriever,
+        vector_service=None,
+        fusion: str = "rrf",
+        rrf_k: int = 60,
+        lexical_weight: float = 0.5,
+        semantic_weight: float = 0.5,
+        candidate_k: int = 20,
+        lexical_timeout: float = 0.2,
+        semantic_timeout: float = 1.5,
+        similarity_threshold: float = 0.5
+    ):
+        """
+        Args:
+            retriever: BM25 检索器
+            vector_service: 向量检索服务（VectorSearchService，可选）
+            fusion: 融合方式 rrf | weighted
+            rrf_k: RRF 平滑常数
+            lexical_weight: BM25 路权重
+            semantic_weight: 语义路权重
+            candidate_k: 每路召回候选数
+            lexical_timeout: BM25 路超时（秒）
+            semantic_timeout: 语义路超时（秒）
+            similarity_threshold: 语义路相似度阈值
+        """
+        if fusion not in self.FUSION_METHODS:
+            raise ValueError(f"不支持的融合方式: {fusion}")
+
+        self.retriever = retriever
+        self.vector_service = vector_service
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.lexical_weight = lexical_weight
+        self.semantic_weight = semantic_weight
+        self.candidate_k = candidate_k
+        self.lexical_timeout = lexical_timeout
+        self.semantic_timeout = semantic_timeout
+        self.similarity_threshold = similarity_threshold
+
+        logger.info(
+            f"HybridRetriever 初始化: fusion={fusion}, candidate_k={candidate_k}, "
+            f"semantic={'on' if vector_service else 'off'}"
+        )
+
+    async def retrieve(
+        self,
+        question: str,
+        k: Optional[int] = None,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[Evidence]:
+        """
+        混合检索
+        Args:
+            question: 用户问题
+            k: 返回数量（默认使用 retriever.top_k）
+            metadata_filter: 语义路元数据过滤条件
+        Returns:
+            List[Evidence]: 融合后的证据列表（按融合得分降序）
+        """
+        k = k or self.retriever.top_k
+        candidate_k = max(k, self.candidate_k)
+
+        legs: Dict[str, asyncio.Task] = {}
+        if self.retriever.corpus_size > 0:
+            legs["lexical"] = asyncio.ensure_future(
+                self._run_leg(self._lexical_search(question, candidate_k), self.lexical_timeout)
+            )
+        if self.vector_service is not None:
+            legs["semantic"] = asyncio.ensure_future(
+                self._run_leg(
+                    self._semantic_search(question, candidate_k, metadata_filter),
+                    self.semantic_timeout
+                )
+            )
+
+        if not legs:
+            # 两路均不可用：沿用 Retriever 的默认行为
+            return self.retriever.retrieve(question, k)
+
+        results = dict(zip(legs.keys(), await asyncio.gather(*legs.values())))
+        ranked = {name: hits for name, hits in results.items() if hits is not None}
+
+        missed = [name for name, hits in results.items() if hits is None]
+        if missed:
+            logger.warning(f"混合检索部分召回: 未返回={missed}, question={question[:30]}...")
+
+        evidences = self._fuse(ranked, k)
+
+        logger.info(
+            f"混合检索完成: question={question[:30]}..., "
+            + ", ".join(f"{name}={len(hits)}" for name, hits in ranked.items())
+            + f", fused={len(evidences)}"
+        )
+        return evidences
+
+    # ==================== 召回 ====================
+
+    async def _run_leg(self, coro, timeout: float) -> Optional[List[Evidence]]:
+        """执行单路召回；超时或异常返回 None"""
+        try:
+            return await asyncio.wait_for(coro, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"召回超时({timeout}s)")
+        except Exception as e:
+            logger.error(f"召回失败: {e}")
+        return None
+
+    async def _lexical_search(self, question: str, candidate_k: int) -> List[Evidence]:
+        """BM25 路：CPU 计算放到线程，与语义路的网络 IO 重叠"""
+        return await asyncio.to_thread(self.retriever.retrieve, question, candidate_k)
+
+    async def _semantic_search(
+        self,
+        question: str,
+        candidate_k: int,
+        metadata_filter: Optional[Dict[str, Any]]
+    ) -> List[Evidence]:
+        """语义路：pgvector 相似度检索"""
+        matches = await self.vector_service.search_similar_documents(
+            query=question,
+            top_k=candidate_k,
+            similarity_threshold=self.similarity_threshold,
+            metadata_filter=metadata_filter
+        )
+
+        evidences = []
+        for match in matches:
+            metadata = match.get("metadata") or {}
+            evidences.append(Evidence(
+                chunk_id=str(match["id"]),
+                document_name=metadata.get("document_name") or metadata.get("title", ""),
+                document_version=metadata.get("document_version", "v1.0"),
+                section=metadata.get("section", ""),
+                content=match.get("content", ""),
+                score=max(0.0, min(float(match.get("score", 0.0)), 1.0)),
+                keywords=metadata.get("keywords")
+            ))
+        return evidences
+
+    # ==================== 融合 ====================
+
+    def _fuse(self, ranked: Dict[str, List[Evidence]], k: int) -> List[Evidence]:
+        """融合多路结果"""
+        weights = {"lexical": self.lexical_weight, "semantic": self.semantic_weight}
+
+        fused: Dict[str, Tuple[float, Evidence]] = {}
+        best_scores: Dict[str, float] = {}
+
+        for name, hits in ranked.items():
+            weight = weights.get(name, 1.0)
+            for rank, evidence in enumerate(hits, 1):
+                if self.fusion == "rrf":
+                    contribution = weight / (self.rrf_k + rank)
+                else:
+                    contribution = weight * evidence.score
+
+                key = evidence.chunk_id
+                if key in fused:
+                    total, kept = fused[key]
+                    fused[key] = (total + contribution, kept)
+                else:
+                    fused[key] = (contribution, evidence)
+                best_scores[key] = max(best_scores.get(key, 0.0), evidence.score)
+
+        top = sorted(fused.items(), key=lambda item: item[1][0], reverse=True)[:k]
+        # 加权模式按实际返回的路归一化，单路降级时得分不被稀释
+        weight_sum = sum(weights.get(name, 1.0) for name in ranked) or 1.0
+
+        evidences = []
+        for key, (total, evidence) in top:
+            if self.fusion == "rrf":
+                score = best_scores[key]
+            else:
+                score = min(total / weight_sum, 1.0)
+            evidences.append(Evidence(
+                chunk_id=evidence.chunk_id,
+                document_name=evidence.document_name,
+                document_version=evidence.document_version,
+                section=evidence.section,
+                content=evidence.content,
+                score=score,
+                keywords=evidence.keywords
+            ))
+        return evidences
+
+
+# 全局混合检索器
+_hybrid_retriever: Optional[HybridRetriever] = None
+
+
+def get_hybrid_retriever(vector_service=None) -> HybridRetriever:
+    """
+    获取全局混合检索器
+    首次调用时从 RAG_KB_DB_PATH（默认 data/data.db）加载 BM25 知识库，RAG_CORPUS_PATH 指定时以 mmap 语料库加载；
+    语义路使用传入的向量服务
+    """
+    global _hybrid_retriever
+    if _hybrid_retriever is None:
+        retriever = Retriever()
+        retriever.load_knowledge_base(
+            os.getenv("RAG_KB_DB_PATH", "data/data.db"),
+            corpus_path=os.getenv("RAG_CORPUS_PATH") or None
+        )
+        _hybrid_retriever = HybridRetriever(
+            retriever,
+            vector_service,
+            fusion=os.getenv("RAG_FUSION", "rrf").lower()
+        )
+    elif vector_service is not None and _hybrid_retriever.vector_service is None:
+        _hybrid_retriever.vector_service = vector_service
+    return _hybrid_retriever
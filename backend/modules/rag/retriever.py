@@ -1,10 +1,13 @@
 """
-RAG 检索器：BM25 召回 + 简化版检索
+RAG 检索器：BM25 倒排索引召回
 """
 import logging
-import re
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
+
+from .bm25_index import BM25Index
+from .corpus_store import CorpusStore, open_corpus_store, write_corpus_store
+from modules.nlp.tokenizer import Tokenizer, default_tokenizer
 
 logger = logging.getLogger(__name__)
 
@@ -24,40 +27,60 @@ class Evidence:
 class Retriever:
     """
     RAG 检索器
-    实现 BM25 关键词检索
+    实现 BM25 关键词检索（倒排索引，查询只遍历命中词的 postings）
     """
     
     def __init__(
         self,
         bm25_topn: int = 50,
         top_k: int = 4,
-        min_confidence: float = 0.75
+        min_confidence: float = 0.75,
+        tokenizer: Optional[Tokenizer] = None
     ):
         """
         Args:
             bm25_topn: BM25 召回数量
             top_k: 最终返回的证据数量
             min_confidence: 最低置信度阈值
+            tokenizer: 分词器（默认使用共享的中文分词器）
         """
         self.bm25_topn = bm25_topn
         self.top_k = top_k
         self.min_confidence = min_confidence
+        self.tokenizer = tokenizer or default_tokenizer
         
-        # 知识库
+        # 知识库（内存列表，或只读映射的 CorpusStore）
         self._corpus: List[Dict[str, Any]] = []
-        self._bm25_index = None
+        self._bm25_index = BM25Index(tokenizer=self._tokenize)
+        self._store: Optional[CorpusStore] = None
+        
+        # 知识块变更监听（如网关响应缓存失效）
+        self._change_listeners: List[Callable[[Optional[List[str]]], Any]] = []
         
         logger.info(
             f"Retriever 初始化: "
             f"bm25_topn={bm25_topn}, top_k={top_k}, min_conf={min_confidence}"
         )
     
+    def add_change_listener(self, callback: Callable[[Optional[List[str]]], Any]) -> None:
+        """
+        注册知识块变更监听
+        Args:
+            callback: 参数为变更的 chunk_id 列表；None 表示知识库整体变更
+        """
+        self._change_listeners.append(callback)
+    
+    @property
+    def corpus_size(self) -> int:
+        """知识库知识块数量"""
+        return len(self._corpus)
+    
     def retrieve(self, question: str, k: Optional[int] = None) -> List[Evidence]:
         """
         检索相关证据
         Args:
             question: 用户问题
-            k: 返回数量（默认使用 self.top_k）
+            k: 返回数量（默认使用 self.top_k，上限为 self.bm25_topn）
         Returns:
             List[Evidence]: 证据列表
         """
@@ -71,20 +94,11 @@ class Retriever:
         # BM25 检索
         logger.debug(f"检索问题: {question[:50]}..., k={k}")
         
-        # 简单的关键词匹配评分
-        query_terms = self._tokenize(question)
-        scored_chunks = []
-        
-        for chunk in self._corpus:
-            score = self._calculate_bm25_score(query_terms, chunk)
-            if score > 0:
-                scored_chunks.append((chunk, score))
-        
-        # 按得分排序
-        scored_chunks.sort(key=lambda x: x[1], reverse=True)
-        
-        # 取 top_k
-        top_chunks = scored_chunks[:k]
+        # 召回数量不超过 bm25_topn
+        top_chunks = [
+            (self._corpus[doc_id], score)
+            for doc_id, score in self._bm25_index.search(question, min(k, self.bm25_topn))
+        ]
         
         # 转换为 Evidence
         evidences = []
@@ -95,7 +109,7 @@ class Retriever:
                 document_version=chunk.get('document_version', 'v1.0'),
                 section=chunk.get('section', ''),
                 content=chunk['content'],
-                score=min(score, 1.0),
+                score=score,
                 keywords=chunk.get('keywords', [])
             )
             evidences.append(evidence)
@@ -194,11 +208,13 @@ class Retriever:
     
     # ==================== 知识库管理 ====================
     
-    def load_knowledge_base(self, db_path: str) -> None:
+    def load_knowledge_base(self, db_path: str, corpus_path: Optional[str] = None) -> None:
         """
         从数据库加载知识库
         Args:
             db_path: 数据库路径
+            corpus_path: 语料库文件路径（可选）。文件比数据库新时直接 mmap 加载，
+                否则从数据库读取后重新生成该文件再映射
         """
         import sqlite3
         from pathlib import Path
@@ -207,6 +223,14 @@ class Retriever:
             logger.warning(f"数据库不存在: {db_path}")
             return
         
+        if corpus_path and Path(corpus_path).exists():
+            if Path(corpus_path).stat().st_mtime >= Path(db_path).stat().st_mtime:
+                try:
+                    self.load_corpus_store(corpus_path)
+                    return
+                except Exception as e:
+                    logger.warning(f"语料库文件不可用，改从数据库加载: {e}")
+        
         try:
             conn = sqlite3.connect(db_path)
             cursor = conn.cursor()
@@ -219,6 +243,7 @@ class Retriever:
             """)
             
             rows = cursor.fetchall()
+            self._release_store()
             self._corpus = []
             
             for row in rows:
@@ -234,11 +259,42 @@ class Retriever:
             
             conn.close()
             
+            self.rebuild_index()
             logger.info(f"知识库已加载: {len(self._corpus)} 条知识块")
+            self._notify_change(None)
+            
+            if corpus_path:
+                self.save_corpus_store(corpus_path)
+                self.load_corpus_store(corpus_path)
             
         except Exception as e:
             logger.error(f"加载知识库失败: {e}")
     
+    def save_corpus_store(self, path: str) -> None:
+        """
+        将当前知识库与 BM25 索引写出为语料库文件
+        Args:
+            path: 输出文件路径
+        """
+        self._ensure_mutable()
+        write_corpus_store(path, self._corpus, self._bm25_index)
+    
+    def load_corpus_store(self, path: str) -> None:
+        """
+        以只读 mmap 方式加载语料库文件
+        多个 worker 进程映射同一文件时共享物理内存页
+        Args:
+            path: 语料库文件路径
+        """
+        store, index = open_corpus_store(path, self._tokenize)
+        self._release_store()
+        self._store = store
+        self._corpus = store
+        self._bm25_index = index
+        
+        logger.info(f"语料库已映射: {path}, {len(store)} 条知识块")
+        self._notify_change(None)
+    
     def add_document(
         self,
         document_name: str,
@@ -252,6 +308,9 @@ class Retriever:
             document_version: 版本
             chunks: 分块内容 [{'section': '', 'content': '', 'keywords': []}, ...]
         """
+        self._ensure_mutable()
+        
+        chunk_ids = []
         for i, chunk_data in enumerate(chunks):
             chunk = {
                 'chunk_id': f"{document_name}_{document_version}_{i}",
@@ -262,8 +321,11 @@ class Retriever:
                 'keywords': chunk_data.get('keywords', [])
             }
             self._corpus.append(chunk)
+            self._bm25_index.add(chunk['content'], chunk['keywords'])
+            chunk_ids.append(chunk['chunk_id'])
         
         logger.info(f"文档已添加: {document_name} v{document_version}, {len(chunks)} 块")
+        self._notify_change(chunk_ids)
     
     def save_to_db(self, db_path: str) -> None:
         """
@@ -305,42 +367,47 @@ class Retriever:
             logger.error(f"保存知识库失败: {e}")
     
     def rebuild_index(self) -> None:
-        """重建索引（当前使用实时计算，无需重建）"""
-        logger.info(f"当前使用实时检索，无需重建索引。知识库大小: {len(self._corpus)}")
+        """按当前知识库全量重建 BM25 倒排索引"""
+        if self._store is not None:
+            self._ensure_mutable()
+            return
+        
+        self._bm25_index = BM25Index(tokenizer=self._tokenize)
+        for chunk in self._corpus:
+            self._bm25_index.add(chunk['content'], chunk.get('keywords', []))
+        
+        logger.info(
+            f"BM25 索引已重建: docs={len(self._bm25_index)}, "
+            f"vocab={self._bm25_index.vocab_size}"
+        )
     
     # ==================== 辅助方法 ====================
     
-    def _tokenize(self, text: str) -> List[str]:
-        """简单分词"""
-        # 移除标点，分割为词
-        text = re.sub(r'[^\w\s]', ' ', text)
-        tokens = text.lower().split()
-        # 过滤停用词（简化）
-        stopwords = {'的', '了', '是', '在', '我', '你', '他', '她', '它', '们', '吗', '呢', '吧'}
-        return [t for t in tokens if t and t not in stopwords]
+    def _notify_change(self, chunk_ids: Optional[List[str]]) -> None:
+        """通知知识块变更（监听方异常不影响知识库操作）"""
+        for callback in self._change_listeners:
+            try:
+                callback(chunk_ids)
+            except Exception as e:
+                logger.error(f"知识块变更通知失败: {e}")
     
-    def _calculate_bm25_score(self, query_terms: List[str], chunk: Dict[str, Any]) -> float:
-        """
-        计算 BM25 得分（简化版）
-        """
-        # 简化的 TF-IDF 评分
-        content = chunk['content'].lower()
-        keywords = [k.lower() for k in chunk.get('keywords', [])]
-        
-        score = 0.0
-        
-        for term in query_terms:
-            # 内容匹配
-            if term in content:
-                tf = content.count(term)
-                score += tf * 0.5
-            
-            # 关键词匹配（权重更高）
-            if term in keywords:
-                score += 2.0
-        
-        # 归一化
-        if query_terms:
-            score = score / len(query_terms)
+    def _ensure_mutable(self) -> None:
+        """映射的语料库只读：修改前物化为内存列表并重建索引"""
+        if self._store is None:
+            return
         
-        return score
+        logger.info("语料库为只读映射，物化到内存以便修改")
+        self._corpus = list(self._store)
+        self._release_store()
+        self.rebuild_index()
+    
+    def _release_store(self) -> None:
+        """关闭已映射的语料库"""
+        if self._store is not None:
+            store, self._store = self._store, None
+            self._bm25_index = BM25Index(tokenizer=self._tokenize)
+            store.close()
+    
+    def _tokenize(self, text: str) -> List[str]:
+        """分词（中文 n-gram + 词典词，结果由分词器缓存）"""
+        return self.tokenizer.tokenize(text)
@@ -1,4 +1,10 @@
 """存储模块：SQLite 封装与数据持久化"""
 from .db import Database, MessageLog, SessionInfo
+from .sqlite_pool import SQLiteConnectionManager, get_sqlite_manager
+from .write_behind import MessageWriteBehind
+from .rate_limiter import SlidingWindowRateLimiter, get_rate_limiter
+from .dedup import DuplicateDetector
 
-__all__ = ["Database", "MessageLog", "SessionInfo"]
+__all__ = ["Database", "MessageLog", "SessionInfo", "SQLiteConnectionManager", "get_sqlite_manager",
+           "MessageWriteBehind", "SlidingWindowRateLimiter", "get_rate_limiter",
+           "DuplicateDetector"]
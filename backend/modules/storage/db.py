@@ -4,6 +4,7 @@
 """
 
 import logging
+import os
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
@@ -12,6 +13,10 @@ logger = logging.getLogger(__name__)
 
 # 导入统一数据库管理器
 from .unified_database import get_database_manager, init_database_manager
+from .sqlite_pool import get_sqlite_manager
+from .write_behind import MessageWriteBehind
+from .rate_limiter import get_rate_limiter
+from .dedup import DuplicateDetector
 
 # 保持原有的数据类定义以保持兼容性
 @dataclass
@@ -84,14 +89,35 @@ class Database:
     使用统一数据库管理器，保持原有API接口
     """
     
-    def __init__(self, db_path: str = "data/data.db"):
+    def __init__(self, db_path: str = "data/data.db", write_behind: Optional[bool] = None):
         """
         初始化数据库（兼容性构造函数）
         
         Args:
             db_path: 数据库路径（仅SQLite使用，Supabase忽略此参数）
+            write_behind: 消息日志是否后写（批量异步落盘），默认读取 DB_WRITE_BEHIND（默认关闭）。
+                后写模式下 log_message 不返回消息ID，调用方需要ID时不要开启
         """
         self.db_path = db_path
+        self.sqlite = get_sqlite_manager(db_path)
+        try:
+            self.sqlite.ensure_schema()
+        except Exception as e:
+            logger.error(f"❌ SQLite 表结构初始化失败: {e}")
+        
+        if write_behind is None:
+            write_behind = os.getenv("DB_WRITE_BEHIND", "false").lower() == "true"
+        self.writer: Optional[MessageWriteBehind] = None
+        if write_behind:
+            self.writer = MessageWriteBehind(
+                self.sqlite,
+                flush_interval_ms=int(os.getenv("DB_WRITE_BEHIND_INTERVAL_MS", "50")),
+                max_batch=int(os.getenv("DB_WRITE_BEHIND_BATCH", "500"))
+            )
+        
+        self.rate_limiter = get_rate_limiter()
+        self.dedup = DuplicateDetector(backend=os.getenv("DEDUP_BACKEND", "memory").lower())
+        self._warm_duplicate_detector()
         self.db_manager = get_database_manager()
         
         logger.info(f"✅ 数据库包装器初始化: {self.db_manager.get_database_type().value}")
@@ -105,7 +131,10 @@ class Database:
         logger.info("数据库表结构初始化（由统一数据库管理器自动处理）")
     
     def close(self):
-        """兼容性方法 - 统一数据库管理器不需要显式关闭"""
+        """落盘后写队列并关闭本地 SQLite 连接（统一数据库管理器不需要显式关闭）"""
+        if self.writer is not None:
+            self.writer.close()
+        self.sqlite.close_all()
         logger.debug("数据库连接关闭（由统一数据库管理器自动处理）")
     
     # ==================== 会话管理 ====================
@@ -180,16 +209,9 @@ class Database:
     def get_session(self, session_key: str) -> Optional[SessionInfo]:
         """获取会话信息（同步版本，保持兼容性）"""
         try:
-            import sqlite3
-            
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM sessions WHERE session_key = ?", (session_key,))
-            row = cursor.fetchone()
-            
-            conn.close()
+            row = self.sqlite.connection().execute(
+                "SELECT * FROM sessions WHERE session_key = ?", (session_key,)
+            ).fetchone()
             
             if row:
                 return SessionInfo(
@@ -216,46 +238,32 @@ class Database:
     def update_summary(self, session_key: str, summary: str) -> None:
         """更新会话摘要（同步版本，保持兼容性）"""
         try:
-            import sqlite3
-            
             if len(summary) > 200:
                 summary = summary[:200]
                 logger.warning(f"会话摘要被截断到200字: {session_key}")
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("UPDATE sessions SET summary = ? WHERE session_key = ?", (summary, session_key))
-            conn.commit()
+            with self.sqlite.transaction() as conn:
+                cursor = conn.execute("UPDATE sessions SET summary = ? WHERE session_key = ?", (summary, session_key))
             
             if cursor.rowcount > 0:
                 logger.debug(f"会话摘要已更新: {session_key}")
             else:
                 logger.warning(f"会话摘要更新失败: {session_key}")
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"❌ 更新会话摘要失败: {e}")
     
     def bind_customer(self, session_key: str, customer_name: str) -> None:
         """绑定客户名称（同步版本，保持兼容性）"""
         try:
-            import sqlite3
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("UPDATE sessions SET customer_name = ? WHERE session_key = ?", (customer_name, session_key))
-            conn.commit()
+            with self.sqlite.transaction() as conn:
+                cursor = conn.execute("UPDATE sessions SET customer_name = ? WHERE session_key = ?", (customer_name, session_key))
             
             if cursor.rowcount > 0:
                 logger.info(f"客户名称已绑定: {session_key} -> {customer_name}")
             else:
                 logger.warning(f"客户名称绑定失败: {session_key}")
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"❌ 绑定客户名称失败: {e}")
     
@@ -270,9 +278,11 @@ class Database:
     def log_message(self, msg: MessageLog) -> Optional[int]:
         """
         记录消息日志（同步版本，保持兼容性）
+        
+        Returns:
+            消息ID（失败时返回 None）；开启后写（DB_WRITE_BEHIND=true）时记录只入队，返回 None
         """
         try:
-            import sqlite3
             import hashlib
             
             # 自动计算消息哈希（用于去重）
@@ -284,68 +294,32 @@ class Database:
             if not msg.received_at:
                 msg.received_at = datetime.now()
             
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # 创建消息表（如果不存在）
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    request_id TEXT NOT NULL UNIQUE,
-                    session_id INTEGER,
-                    group_id TEXT NOT NULL,
-                    group_name TEXT,
-                    sender_id TEXT NOT NULL,
-                    sender_name TEXT,
-                    user_message TEXT NOT NULL,
-                    user_message_hash TEXT,
-                    bot_response TEXT,
-                    evidence_ids TEXT,
-                    evidence_summary TEXT,
-                    confidence REAL,
-                    branch TEXT,
-                    handoff_reason TEXT,
-                    provider TEXT,
-                    model TEXT,
-                    token_in INTEGER DEFAULT 0,
-                    token_out INTEGER DEFAULT 0,
-                    token_total INTEGER DEFAULT 0,
-                    latency_receive_ms INTEGER,
-                    latency_retrieval_ms INTEGER,
-                    latency_generation_ms INTEGER,
-                    latency_send_ms INTEGER,
-                    latency_total_ms INTEGER,
-                    received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    responded_at DATETIME,
-                    status TEXT DEFAULT 'pending',
-                    error_message TEXT,
-                    debug_info TEXT,
-                    FOREIGN KEY (session_id) REFERENCES sessions(id)
-                )
-            """)
+            if self.writer is not None:
+                self.writer.enqueue_insert(msg)
+                self.dedup.record(msg.group_id, msg.sender_id, msg.user_message, msg.received_at)
+                logger.debug(f"消息记录入队: {msg.request_id}")
+                return None
             
             # 插入消息
-            cursor.execute("""
-                INSERT INTO messages 
-                (request_id, session_id, group_id, group_name, sender_id, sender_name, 
-                 user_message, user_message_hash, bot_response, evidence_ids, evidence_summary,
-                 confidence, branch, handoff_reason, provider, model, token_in, token_out, token_total,
-                 latency_receive_ms, latency_retrieval_ms, latency_generation_ms, latency_send_ms, latency_total_ms,
-                 received_at, responded_at, status, error_message, debug_info)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                msg.request_id, msg.session_id, msg.group_id, msg.group_name, msg.sender_id, msg.sender_name,
-                msg.user_message, msg.user_message_hash, msg.bot_response, msg.evidence_ids, msg.evidence_summary,
-                msg.confidence, msg.branch, msg.handoff_reason, msg.provider, msg.model, msg.token_in, msg.token_out, msg.token_total,
-                msg.latency_receive_ms, msg.latency_retrieval_ms, msg.latency_generation_ms, msg.latency_send_ms, msg.latency_total_ms,
-                msg.received_at, msg.responded_at, msg.status, msg.error_message, msg.debug_info
-            ))
-            
-            conn.commit()
-            message_id = cursor.lastrowid
+            with self.sqlite.transaction() as conn:
+                cursor = conn.execute("""
+                    INSERT INTO messages 
+                    (request_id, session_id, group_id, group_name, sender_id, sender_name, 
+                     user_message, user_message_hash, bot_response, evidence_ids, evidence_summary,
+                     confidence, branch, handoff_reason, provider, model, token_in, token_out, token_total,
+                     latency_receive_ms, latency_retrieval_ms, latency_generation_ms, latency_send_ms, latency_total_ms,
+                     received_at, responded_at, status, error_message, debug_info)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    msg.request_id, msg.session_id, msg.group_id, msg.group_name, msg.sender_id, msg.sender_name,
+                    msg.user_message, msg.user_message_hash, msg.bot_response, msg.evidence_ids, msg.evidence_summary,
+                    msg.confidence, msg.branch, msg.handoff_reason, msg.provider, msg.model, msg.token_in, msg.token_out, msg.token_total,
+                    msg.latency_receive_ms, msg.latency_retrieval_ms, msg.latency_generation_ms, msg.latency_send_ms, msg.latency_total_ms,
+                    msg.received_at, msg.responded_at, msg.status, msg.error_message, msg.debug_info
+                ))
             
-            conn.close()
+            message_id = cursor.lastrowid
+            self.dedup.record(msg.group_id, msg.sender_id, msg.user_message, msg.received_at)
             
             logger.debug(f"消息记录成功: {msg.request_id}")
             return message_id
@@ -357,46 +331,41 @@ class Database:
     def update_message(self, request_id: str, **kwargs) -> None:
         """更新消息记录（同步版本，保持兼容性）"""
         try:
-            import sqlite3
-            
             if not kwargs:
                 return
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            if self.writer is not None:
+                self.writer.enqueue_update(request_id, **kwargs)
+                return
             
             # 构建更新语句
             set_clause = ', '.join([f"{k} = ?" for k in kwargs.keys()])
             values = list(kwargs.values()) + [request_id]
             
-            cursor.execute(f"UPDATE messages SET {set_clause} WHERE request_id = ?", values)
-            conn.commit()
+            with self.sqlite.transaction() as conn:
+                cursor = conn.execute(f"UPDATE messages SET {set_clause} WHERE request_id = ?", values)
             
             if cursor.rowcount > 0:
                 logger.debug(f"消息已更新: {request_id}, fields={list(kwargs.keys())}")
             else:
                 logger.warning(f"消息更新失败: {request_id}")
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"❌ 更新消息失败: {e}")
     
     def get_message(self, request_id: str) -> Optional[Dict[str, Any]]:
         """获取消息记录（同步版本，保持兼容性）"""
         try:
-            import sqlite3
-            
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM messages WHERE request_id = ?", (request_id,))
-            row = cursor.fetchone()
+            # 后写队列中尚未落盘的数据优先（读己之写）
+            pending, updates = self.writer.pending_message(request_id) if self.writer is not None else (None, {})
+            if pending is not None:
+                return {**pending, **updates}
             
-            conn.close()
+            row = self.sqlite.connection().execute(
+                "SELECT * FROM messages WHERE request_id = ?", (request_id,)
+            ).fetchone()
             
-            return dict(row) if row else None
+            return {**dict(row), **updates} if row else None
             
         except Exception as e:
             logger.error(f"❌ 获取消息失败: {e}")
@@ -409,26 +378,9 @@ class Database:
         message: str,
         window_seconds: int = 10
     ) -> bool:
-        """检查消息是否重复（同步版本，保持兼容性）"""
+        """检查消息是否重复（同步版本，保持兼容性；内存指纹查找，不再查询 messages 表）"""
         try:
-            import sqlite3
-            import hashlib
-            
-            msg_hash = hashlib.md5(f"{group_id}:{sender_id}:{message}".encode('utf-8')).hexdigest()
-            cutoff_time = datetime.now() - timedelta(seconds=window_seconds)
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT COUNT(*) FROM messages 
-                WHERE user_message_hash = ? AND received_at > ?
-            """, (msg_hash, cutoff_time))
-            
-            count = cursor.fetchone()[0]
-            conn.close()
-            
-            return count > 0
+            return self.dedup.is_duplicate(group_id, sender_id, message, window_seconds)
             
         except Exception as e:
             logger.error(f"❌ 检查重复消息失败: {e}")
@@ -443,58 +395,9 @@ class Database:
         limit: int,
         window_seconds: int
     ) -> tuple[bool, int]:
-        """检查速率限制（同步版本，保持兼容性）"""
+        """检查速率限制（同步版本，保持兼容性；进程内/Redis 滑动窗口计数，不再读写 rate_limits 表）"""
         try:
-            import sqlite3
-            
-            now = datetime.now()
-            window_start = now - timedelta(seconds=window_seconds)
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 创建速率限制表（如果不存在）
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS rate_limits (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    entity_type TEXT NOT NULL,
-                    entity_id TEXT NOT NULL,
-                    window_start DATETIME NOT NULL,
-                    request_count INTEGER DEFAULT 1,
-                    last_request_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(entity_type, entity_id, window_start)
-                )
-            """)
-            
-            # 查询当前窗口内的请求数
-            cursor.execute("""
-                SELECT SUM(request_count) as total FROM rate_limits
-                WHERE entity_type = ? AND entity_id = ? AND window_start >= ?
-            """, (entity_type, entity_id, window_start))
-            
-            row = cursor.fetchone()
-            current_count = int(row[0]) if row and row[0] else 0
-            
-            is_allowed = current_count < limit
-            
-            if is_allowed:
-                # 更新或插入速率记录
-                cursor.execute("""
-                    INSERT INTO rate_limits 
-                    (entity_type, entity_id, window_start, request_count, last_request_at)
-                    VALUES (?, ?, ?, 1, ?)
-                    ON CONFLICT(entity_type, entity_id, window_start)
-                    DO UPDATE SET 
-                        request_count = request_count + 1,
-                        last_request_at = ?
-                """, (entity_type, entity_id, now, now, now))
-                
-                conn.commit()
-                current_count += 1
-            
-            conn.close()
-            
-            return is_allowed, current_count
+            return self.rate_limiter.check(entity_type, entity_id, limit, window_seconds)
             
         except Exception as e:
             logger.error(f"❌ 速率限制检查失败: {e}")
@@ -523,13 +426,11 @@ class Database:
     ) -> str:
         """导出消息日志为CSV（同步版本，保持兼容性）"""
         try:
-            import sqlite3
             import csv
             from pathlib import Path
             
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            if self.writer is not None:
+                self.writer.flush()
             
             # 查询消息
             query = "SELECT * FROM messages"
@@ -549,10 +450,7 @@ class Database:
             
             query += " ORDER BY received_at DESC LIMIT 10000"
             
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            conn.close()
+            rows = self.sqlite.connection().execute(query, params).fetchall()
             
             if not rows:
                 logger.warning("没有数据可导出")
@@ -576,6 +474,18 @@ class Database:
     
     # ==================== 辅助方法 ====================
     
+    def _warm_duplicate_detector(self) -> None:
+        """用保留窗口内的消息记录预热去重指纹"""
+        try:
+            cutoff = datetime.now() - timedelta(seconds=self.dedup.retention_seconds)
+            rows = self.sqlite.connection().execute("""
+                SELECT group_id, sender_id, user_message, received_at FROM messages
+                WHERE received_at > ? ORDER BY received_at
+            """, (cutoff,)).fetchall()
+            self.dedup.warm(tuple(row) for row in rows)
+        except Exception as e:
+            logger.warning(f"去重指纹预热失败: {e}")
+    
     @staticmethod
     def _hash_message(group_id: str, sender_id: str, message: str) -> str:
         """生成消息哈希（用于去重）"""
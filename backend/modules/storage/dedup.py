@@ -0,0 +1,169 @@
+"""
+重复消息检测
+消息指纹（blake2b）按时间分桶保存在内存中，查重为一次字典查找；过期的桶整体淘汰。
+启动时从最近的消息记录预热，多 worker 部署时可通过 Redis 共享指纹（SET + EX 自动过期）
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, Optional, Set, Tuple
+
+from .redis_client import connect_redis
+
+logger = logging.getLogger(__name__)
+
+
+def message_fingerprint(group_id: str, sender_id: str, message: str) -> bytes:
+    """消息指纹（群 + 发送者 + 内容）"""
+    return hashlib.blake2b(f"{group_id}:{sender_id}:{message}".encode("utf-8"), digest_size=16).digest()
+
+
+class DuplicateDetector:
+    """
+    时间分桶的重复消息检测器
+
+    用法：
+        detector = DuplicateDetector(retention_seconds=60)
+        detector.record("group", "user", "你好")
+        detector.is_duplicate("group", "user", "你好", window_seconds=10)  # True
+    """
+
+    def __init__(
+        self,
+        retention_seconds: int = 60,
+        bucket_seconds: int = 1,
+        backend: str = "memory",
+        redis_url: Optional[str] = None,
+        redis_client: Any = None,
+        key_prefix: str = "dedup"
+    ):
+        """
+        Args:
+            retention_seconds: 指纹保留时长（秒），查重窗口超过该值时自动延长
+            bucket_seconds: 分桶粒度（秒）
+            backend: 共享后端（memory / redis）
+            redis_url: Redis 地址（backend=redis 时使用）
+            redis_client: 已创建的 Redis 客户端（优先于 redis_url）
+            key_prefix: Redis 键前缀
+        """
+        self.retention_seconds = retention_seconds
+        self.bucket_seconds = bucket_seconds
+        self.backend = backend
+        self.key_prefix = key_prefix
+        self.redis_client = redis_client
+
+        # 指纹 -> 最近一次出现的时间；桶记录每个时间段内出现的指纹，用于整体淘汰
+        self._last_seen: Dict[bytes, float] = {}
+        self._buckets: Deque[Tuple[int, Set[bytes]]] = deque()
+        self._lock = threading.Lock()
+        self._stats = {"checks": 0, "duplicates": 0, "recorded": 0, "expired": 0, "backend_errors": 0}
+
+        if self.backend == "redis" and self.redis_client is None:
+            self.redis_client = connect_redis(redis_url, "去重指纹")
+            if self.redis_client is None:
+                self.backend = "memory"
+
+    # ==================== 公共 API ====================
+
+    def record(self, group_id: str, sender_id: str, message: str, received_at: Optional[datetime] = None) -> None:
+        """记录一条已接收的消息"""
+        fingerprint = message_fingerprint(group_id, sender_id, message)
+        seen_at = received_at.timestamp() if received_at else time.time()
+        self._record_local(fingerprint, seen_at)
+
+        if self.backend == "redis":
+            try:
+                self.redis_client.set(self._redis_key(fingerprint), seen_at, ex=self.retention_seconds)
+            except Exception as e:
+                self._stats["backend_errors"] += 1
+                logger.warning(f"⚠️ Redis 去重指纹写入失败: {e}")
+
+    def is_duplicate(self, group_id: str, sender_id: str, message: str, window_seconds: int = 10) -> bool:
+        """窗口内是否已有相同消息"""
+        if window_seconds > self.retention_seconds:
+            self.retention_seconds = window_seconds
+
+        fingerprint = message_fingerprint(group_id, sender_id, message)
+        cutoff = time.time() - window_seconds
+        self._stats["checks"] += 1
+
+        with self._lock:
+            seen_at = self._last_seen.get(fingerprint)
+
+        if (seen_at is None or seen_at <= cutoff) and self.backend == "redis":
+            try:
+                shared = self.redis_client.get(self._redis_key(fingerprint))
+                seen_at = float(shared) if shared is not None else seen_at
+            except Exception as e:
+                self._stats["backend_errors"] += 1
+                logger.warning(f"⚠️ Redis 去重查询失败，仅使用本地指纹: {e}")
+
+        duplicate = seen_at is not None and seen_at > cutoff
+        if duplicate:
+            self._stats["duplicates"] += 1
+        return duplicate
+
+    def warm(self, rows: Iterable[Tuple[str, str, str, Any]]) -> int:
+        """
+        从最近的消息记录预热
+
+        Args:
+            rows: (group_id, sender_id, user_message, received_at) 序列，received_at 为 datetime 或 ISO 字符串
+
+        Returns:
+            预热的条数
+        """
+        count = 0
+        for group_id, sender_id, message, received_at in rows:
+            if isinstance(received_at, str):
+                received_at = datetime.fromisoformat(received_at)
+            if received_at is None:
+                continue
+            self._record_local(message_fingerprint(group_id, sender_id, message), received_at.timestamp())
+            count += 1
+        if count:
+            logger.info(f"✅ 去重指纹预热 {count} 条")
+        return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """去重统计"""
+        return {
+            "backend": self.backend,
+            "fingerprints": len(self._last_seen),
+            "buckets": len(self._buckets),
+            **self._stats
+        }
+
+    # ==================== 内部实现 ====================
+
+    def _redis_key(self, fingerprint: bytes) -> str:
+        return f"{self.key_prefix}:{fingerprint.hex()}"
+
+    def _record_local(self, fingerprint: bytes, seen_at: float) -> None:
+        bucket = int(seen_at // self.bucket_seconds)
+        with self._lock:
+            if seen_at > self._last_seen.get(fingerprint, 0.0):
+                self._last_seen[fingerprint] = seen_at
+
+            # 预热数据可能乱序：只有比最新桶更新时才开新桶，否则并入最新桶（淘汰会略晚，不影响正确性）
+            if self._buckets and self._buckets[-1][0] >= bucket:
+                self._buckets[-1][1].add(fingerprint)
+            else:
+                self._buckets.append((bucket, {fingerprint}))
+            self._stats["recorded"] += 1
+            self._expire(time.time())
+
+    def _expire(self, now: float) -> None:
+        """淘汰整桶过期的指纹（调用方持有锁）"""
+        oldest = int((now - self.retention_seconds) // self.bucket_seconds)
+        while self._buckets and self._buckets[0][0] < oldest:
+            _, fingerprints = self._buckets.popleft()
+            for fingerprint in fingerprints:
+                seen_at = self._last_seen.get(fingerprint)
+                if seen_at is not None and seen_at < now - self.retention_seconds:
+                    del self._last_seen[fingerprint]
+                    self._stats["expired"] += 1
+
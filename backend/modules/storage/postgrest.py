@@ -0,0 +1,185 @@
+"""
+PostgREST 异步客户端
+直接通过 httpx 调用 Supabase 的 /rest/v1 接口：异步请求不阻塞事件循环，连接池在请求间复用。
+httpx.AsyncClient 的连接绑定事件循环，因此按事件循环各建一个客户端；同步调用使用独立的同步连接池
+"""
+import asyncio
+import logging
+import weakref
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class PostgRESTError(Exception):
+    """PostgREST 请求失败"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"PostgREST {status_code}: {message}")
+        self.status_code = status_code
+
+
+class PostgRESTClient:
+    """
+    Supabase PostgREST 客户端
+
+    用法：
+        client = PostgRESTClient(url, key)
+        rows = await client.select("sessions", filters={"session_key": key})
+        total = await client.count("messages")
+        await client.aclose()
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        max_connections: int = 20,
+        timeout: float = 10.0,
+        transport: Any = None
+    ):
+        """
+        Args:
+            url: Supabase 项目地址
+            key: API key（anon 或 service role）
+            max_connections: 连接池上限
+            timeout: 请求超时（秒）
+            transport: 自定义 httpx 传输层（代理、测试）
+        """
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self.headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+        }
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.timeout = timeout
+        self.transport = transport
+
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._sync_client: Optional[httpx.Client] = None
+
+    # ==================== 异步接口 ====================
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Dict[str, Any]] = None,
+        order: Optional[str] = None,
+        desc: bool = False,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        查询
+
+        Args:
+            table: 表名
+            columns: 返回列
+            filters: 等值过滤条件 {列: 值}
+            order: 排序列
+            desc: 是否倒序
+            limit: 返回条数
+        """
+        params = self._params(filters, select=columns)
+        if order:
+            params["order"] = f"{order}.{'desc' if desc else 'asc'}"
+        if limit is not None:
+            params["limit"] = str(limit)
+        response = await self._request("GET", table, params=params)
+        return response.json()
+
+    async def count(self, table: str, filters: Optional[Dict[str, Any]] = None) -> int:
+        """精确行数（HEAD 请求，只读取 Content-Range）"""
+        response = await self._request(
+            "HEAD", table, params=self._params(filters, select="id"), headers={"Prefer": "count=exact"}
+        )
+        return self._parse_count(response)
+
+    async def insert(self, table: str, rows: Any) -> List[Dict[str, Any]]:
+        """插入（返回插入后的记录）"""
+        response = await self._request(
+            "POST", table, json=rows, headers={"Prefer": "return=representation"}
+        )
+        return response.json()
+
+    async def update(self, table: str, values: Dict[str, Any], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """按等值条件更新（返回更新后的记录）"""
+        response = await self._request(
+            "PATCH", table, params=self._params(filters), json=values, headers={"Prefer": "return=representation"}
+        )
+        return response.json()
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环的连接池与同步连接池"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+        self.close_sync()
+
+    # ==================== 同步接口（供同步调用方使用） ====================
+
+    def select_sync(self, table: str, columns: str = "*", limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """查询（同步）"""
+        params = self._params(None, select=columns)
+        if limit is not None:
+            params["limit"] = str(limit)
+        return self._request_sync("GET", table, params=params).json()
+
+    def insert_sync(self, table: str, rows: Any) -> List[Dict[str, Any]]:
+        """插入（同步）"""
+        return self._request_sync("POST", table, json=rows, headers={"Prefer": "return=representation"}).json()
+
+    def close_sync(self) -> None:
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+    # ==================== 内部实现 ====================
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=self.base_url, headers=self.headers, limits=self.limits,
+                timeout=self.timeout, transport=self.transport
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def _request(self, method: str, table: str, **kwargs) -> httpx.Response:
+        response = await self._async_client().request(method, f"/{table}", **kwargs)
+        return self._check(response)
+
+    def _request_sync(self, method: str, table: str, **kwargs) -> httpx.Response:
+        if self._sync_client is None:
+            self._sync_client = httpx.Client(
+                base_url=self.base_url, headers=self.headers, limits=self.limits,
+                timeout=self.timeout, transport=self.transport
+            )
+        return self._check(self._sync_client.request(method, f"/{table}", **kwargs))
+
+    @staticmethod
+    def _params(filters: Optional[Dict[str, Any]], **extra: str) -> Dict[str, str]:
+        params = dict(extra)
+        for column, value in (filters or {}).items():
+            params[column] = f"eq.{value}"
+        return params
+
+    @staticmethod
+    def _check(response: httpx.Response) -> httpx.Response:
+        if response.status_code >= 400:
+            raise PostgRESTError(response.status_code, response.text[:200])
+        return response
+
+    @staticmethod
+    def _parse_count(response: httpx.Response) -> int:
+        """Content-Range: 0-9/123 或 */0"""
+        content_range = response.headers.get("content-range", "")
+        _, _, total = content_range.partition("/")
+        return int(total) if total.isdigit() else 0
@@ -0,0 +1,179 @@
+"""
+速率限制
+滑动窗口计数（当前窗口计数 + 上一窗口按剩余比例加权），每个实体只保存两个计数，检查为 O(1)；
+默认在进程内存中计数，多 worker 部署时可切换到 Redis 共享计数（窗口键自动过期）
+"""
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .redis_client import connect_redis
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowRateLimiter:
+    """
+    滑动窗口速率限制器
+
+    用法：
+        limiter = get_rate_limiter()
+        allowed, count = limiter.check("user", "wxid_123", limit=10, window_seconds=60)
+    """
+
+    def __init__(
+        self,
+        backend: str = "memory",
+        redis_url: Optional[str] = None,
+        redis_client: Any = None,
+        key_prefix: str = "ratelimit",
+        sweep_interval: int = 1024
+    ):
+        """
+        Args:
+            backend: 计数后端（memory / redis）
+            redis_url: Redis 地址（backend=redis 时使用）
+            redis_client: 已创建的 Redis 客户端（优先于 redis_url）
+            key_prefix: Redis 键前缀
+            sweep_interval: 内存后端每多少次检查清理一次过期窗口
+        """
+        self.backend = backend
+        self.key_prefix = key_prefix
+        self.sweep_interval = sweep_interval
+        self.redis_client = redis_client
+
+        # 实体键 -> [窗口序号, 当前窗口计数, 上一窗口计数, 窗口秒数]
+        self._windows: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._checks_since_sweep = 0
+        self._stats = {"checks": 0, "rejected": 0, "expired": 0, "backend_errors": 0}
+
+        if self.backend == "redis" and self.redis_client is None:
+            self.redis_client = connect_redis(redis_url, "速率限制")
+            if self.redis_client is None:
+                self.backend = "memory"
+
+    # ==================== 公共 API ====================
+
+    def check(self, entity_type: str, entity_id: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        """
+        检查并记录一次请求
+
+        Args:
+            entity_type: 实体类型（user / group ...）
+            entity_id: 实体ID
+            limit: 窗口内允许的请求数
+            window_seconds: 窗口长度（秒）
+
+        Returns:
+            (是否允许, 当前窗口内的请求数（允许时包含本次）)
+        """
+        key = f"{entity_type}:{entity_id}"
+        if self.backend == "redis":
+            try:
+                allowed, count = self._check_redis(key, limit, window_seconds)
+            except Exception as e:
+                self._stats["backend_errors"] += 1
+                logger.warning(f"⚠️ Redis 速率限制失败，使用进程内计数: {e}")
+                allowed, count = self._check_memory(key, limit, window_seconds)
+        else:
+            allowed, count = self._check_memory(key, limit, window_seconds)
+
+        self._stats["checks"] += 1
+        if not allowed:
+            self._stats["rejected"] += 1
+        return allowed, count
+
+    async def acheck(self, entity_type: str, entity_id: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        """异步版本：内存计数直接执行，Redis 调用放到线程池避免阻塞事件循环"""
+        if self.backend == "redis":
+            return await asyncio.to_thread(self.check, entity_type, entity_id, limit, window_seconds)
+        return self.check(entity_type, entity_id, limit, window_seconds)
+
+    def reset(self) -> None:
+        """清空进程内计数"""
+        with self._lock:
+            self._windows.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """速率限制统计"""
+        return {"backend": self.backend, "tracked_entities": len(self._windows), **self._stats}
+
+    # ==================== 内部实现 ====================
+
+    @staticmethod
+    def _estimate(previous: float, current: int, now: float, window_seconds: int) -> float:
+        """滑动窗口内的请求数估计：上一窗口按未过去的比例加权"""
+        elapsed = (now % window_seconds) / window_seconds
+        return previous * (1 - elapsed) + current
+
+    def _check_memory(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        now = time.time()
+        window = int(now // window_seconds)
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or entry[3] != window_seconds:
+                entry = self._windows[key] = [window, 0, 0, window_seconds]
+            elif entry[0] != window:
+                # 相邻窗口：当前计数转为上一窗口；更早的窗口已完全滑出
+                entry[2] = entry[1] if entry[0] == window - 1 else 0
+                entry[0], entry[1] = window, 0
+
+            estimate = self._estimate(entry[2], entry[1], now, window_seconds)
+            allowed = estimate < limit
+            if allowed:
+                entry[1] += 1
+                estimate += 1
+
+            self._checks_since_sweep += 1
+            if self._checks_since_sweep >= self.sweep_interval:
+                self._sweep(now)
+
+        return allowed, math.floor(estimate)
+
+    def _sweep(self, now: float) -> None:
+        """清理已完全滑出的窗口（调用方持有锁）"""
+        self._checks_since_sweep = 0
+        expired = [
+            key for key, (window, _, _, seconds) in self._windows.items()
+            if window < int(now // seconds) - 1
+        ]
+        for key in expired:
+            del self._windows[key]
+        self._stats["expired"] += len(expired)
+
+    def _check_redis(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        """先原子自增当前窗口，超限再回退，保证多 worker 并发下不超发"""
+        now = time.time()
+        window = int(now // window_seconds)
+        current_key = f"{self.key_prefix}:{key}:{window_seconds}:{window}"
+        previous_key = f"{self.key_prefix}:{key}:{window_seconds}:{window - 1}"
+
+        pipe = self.redis_client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, window_seconds * 2)
+        pipe.get(previous_key)
+        current, _, previous = pipe.execute()
+
+        estimate = self._estimate(float(previous or 0), int(current), now, window_seconds)
+        if estimate - 1 < limit:
+            return True, math.floor(estimate)
+
+        self.redis_client.decr(current_key)
+        return False, math.floor(estimate - 1)
+
+
+# 全局实例
+_rate_limiter: Optional[SlidingWindowRateLimiter] = None
+
+
+def get_rate_limiter() -> SlidingWindowRateLimiter:
+    """获取全局速率限制器（RATE_LIMIT_BACKEND=memory|redis）"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = SlidingWindowRateLimiter(backend=os.getenv("RATE_LIMIT_BACKEND", "memory").lower())
+    return _rate_limiter
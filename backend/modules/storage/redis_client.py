@@ -0,0 +1,34 @@
+"""
+Redis 连接
+速率限制、去重等多 worker 共享状态共用的 Redis 客户端创建逻辑；redis 为可选依赖，
+未安装或连接失败时返回 None，由调用方回退到进程内实现
+"""
+import logging
+import os
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def connect_redis(redis_url: Optional[str], purpose: str) -> Optional[Any]:
+    """
+    创建并验证 Redis 客户端
+
+    Args:
+        redis_url: Redis 地址，未指定时读取 REDIS_URL
+        purpose: 用途描述（用于日志，如 "速率限制"）
+
+    Returns:
+        可用的 Redis 客户端；不可用时返回 None
+    """
+    try:
+        import redis
+        client = redis.Redis.from_url(
+            redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True
+        )
+        client.ping()
+        logger.info(f"✅ {purpose}使用 Redis 共享")
+        return client
+    except Exception as e:
+        logger.warning(f"⚠️ Redis 连接失败，{purpose}回退到进程内实现: {e}")
+        return None
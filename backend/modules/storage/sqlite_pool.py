@@ -0,0 +1,234 @@
+"""
+SQLite 连接管理
+每个线程复用一条长连接（WAL 模式 + 调优的 PRAGMA），sqlite3 按连接缓存预编译语句；
+线程退出时其连接随线程局部数据回收并关闭。表结构在启动时建立一次，热路径上不再有 connect / DDL 开销
+"""
+import logging
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+# 会话与消息表（与 sql/init.sql 一致；消息表原先在每次 log_message 时创建）
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_key TEXT NOT NULL UNIQUE,
+        group_id TEXT NOT NULL,
+        sender_id TEXT NOT NULL,
+        sender_name TEXT,
+        customer_name TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_active_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        expires_at DATETIME,
+        turn_count INTEGER DEFAULT 0,
+        summary TEXT,
+        status TEXT DEFAULT 'active',
+        metadata TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_group ON sessions(group_id)",
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        request_id TEXT NOT NULL UNIQUE,
+        session_id INTEGER,
+        group_id TEXT NOT NULL,
+        group_name TEXT,
+        sender_id TEXT NOT NULL,
+        sender_name TEXT,
+        user_message TEXT NOT NULL,
+        user_message_hash TEXT,
+        bot_response TEXT,
+        evidence_ids TEXT,
+        evidence_summary TEXT,
+        confidence REAL,
+        branch TEXT,
+        handoff_reason TEXT,
+        provider TEXT,
+        model TEXT,
+        token_in INTEGER DEFAULT 0,
+        token_out INTEGER DEFAULT 0,
+        token_total INTEGER DEFAULT 0,
+        latency_receive_ms INTEGER,
+        latency_retrieval_ms INTEGER,
+        latency_generation_ms INTEGER,
+        latency_send_ms INTEGER,
+        latency_total_ms INTEGER,
+        received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        responded_at DATETIME,
+        status TEXT DEFAULT 'pending',
+        error_message TEXT,
+        debug_info TEXT,
+        FOREIGN KEY (session_id) REFERENCES sessions(id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_messages_hash_received ON messages(user_message_hash, received_at)",
+]
+
+
+class _ThreadConnection:
+    """线程持有的连接；线程退出后线程局部数据被回收，finalizer 随之关闭连接"""
+
+    __slots__ = ("conn", "generation", "finalizer", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, generation: int, finalizer_args: tuple):
+        self.conn = conn
+        self.generation = generation
+        self.finalizer = weakref.finalize(self, *finalizer_args)
+
+
+class SQLiteConnectionManager:
+    """
+    SQLite 线程级连接池
+
+    用法：
+        manager = get_sqlite_manager("data/data.db")
+        manager.ensure_schema()
+        with manager.transaction() as conn:
+            conn.execute("UPDATE ...", params)
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        busy_timeout_ms: int = 5000,
+        cache_size_kb: int = 16384,
+        mmap_size: int = 256 * 1024 * 1024,
+        statement_cache_size: int = 256
+    ):
+        """
+        Args:
+            db_path: 数据库文件路径
+            busy_timeout_ms: 写锁等待时间（毫秒）
+            cache_size_kb: 每条连接的页缓存大小（KB）
+            mmap_size: 内存映射读取的字节数（0 表示关闭）
+            statement_cache_size: 每条连接缓存的预编译语句数
+        """
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.statement_cache_size = statement_cache_size
+
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        # 只弱引用各线程的连接持有者，不阻止线程退出后的回收
+        self._holders: "weakref.WeakSet[_ThreadConnection]" = weakref.WeakSet()
+        self._generation = 0
+        self._schema_ready = False
+        self._stats = {"opened": 0, "closed": 0}
+
+    def connection(self) -> sqlite3.Connection:
+        """当前线程的连接（首次调用时打开）"""
+        holder = getattr(self._local, "holder", None)
+        if holder is not None and holder.generation == self._generation:
+            return holder.conn
+
+        conn = self._open()
+        holder = _ThreadConnection(conn, self._generation, (_close_connection, conn, self._stats))
+        with self._lock:
+            self._holders.add(holder)
+        self._local.holder = holder
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务：正常退出提交，异常回滚"""
+        conn = self.connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def ensure_schema(self) -> None:
+        """建表与索引（每个数据库文件只执行一次）"""
+        if self._schema_ready:
+            return
+        with self._lock:
+            if self._schema_ready:
+                return
+            conn = self.connection()
+            for statement in SCHEMA_STATEMENTS:
+                conn.execute(statement)
+            conn.commit()
+            self._schema_ready = True
+        logger.info(f"✅ SQLite 表结构就绪: {self.db_path}")
+
+    def close_all(self) -> None:
+        """关闭所有线程的连接（之后再访问会重新打开）"""
+        with self._lock:
+            holders = list(self._holders)
+            self._holders.clear()
+            self._generation += 1
+        for holder in holders:
+            holder.finalizer()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """连接池统计"""
+        return {
+            "db_path": self.db_path,
+            "open_connections": len(self._holders),
+            "schema_ready": self._schema_ready,
+            **self._stats
+        }
+
+    # ==================== 内部实现 ====================
+
+    def _open(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.db_path)
+        if directory and self.db_path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+
+        # 连接只在所属线程使用；关闭可能发生在其他线程（close_all）
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA cache_size={-int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+
+        with self._lock:
+            self._stats["opened"] += 1
+        logger.debug(f"打开 SQLite 连接: {self.db_path} (thread={threading.get_ident()})")
+        return conn
+
+
+def _close_connection(conn: sqlite3.Connection, stats: Dict[str, int]) -> None:
+    """关闭连接（线程退出回收或 close_all 时调用，每条连接只执行一次）"""
+    try:
+        conn.close()
+        stats["closed"] += 1
+    except sqlite3.Error as e:
+        logger.warning(f"关闭 SQLite 连接失败: {e}")
+
+
+# 按数据库文件共享的连接管理器
+_managers: Dict[str, SQLiteConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_sqlite_manager(db_path: str) -> SQLiteConnectionManager:
+    """获取数据库文件对应的连接管理器（同一文件共享）"""
+    key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = SQLiteConnectionManager(db_path)
+        return manager
@@ -3,6 +3,7 @@
 专为企业级云原生应用设计
 """
 
+import asyncio
 import os
 import logging
 from typing import Dict, Any, Optional, List, Union
@@ -10,6 +11,9 @@ from abc import ABC, abstractmethod
 from datetime import datetime
 from enum import Enum
 
+from .postgrest import PostgRESTClient
+from .rate_limiter import get_rate_limiter
+
 logger = logging.getLogger(__name__)
 
 
@@ -63,80 +67,93 @@ class DatabaseAdapter(ABC):
 
 
 class SupabaseAdapter(DatabaseAdapter):
-    """Supabase数据库适配器 - 官方接入方案"""
+    """Supabase数据库适配器 - 通过 PostgREST 异步 HTTP 接口访问，不阻塞事件循环"""
     
-    def __init__(self, url: str, key: str, service_role_key: Optional[str] = None):
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        service_role_key: Optional[str] = None,
+        max_connections: int = 20,
+        timeout: float = 10.0,
+        transport: Any = None
+    ):
+        """
+        Args:
+            url: Supabase 项目地址
+            key: anon key
+            service_role_key: service role key（管理员权限）
+            max_connections: 连接池上限
+            timeout: 请求超时（秒）
+            transport: 自定义 httpx 传输层（代理、测试）
+        """
         self.url = url
         self.key = key
         self.service_role_key = service_role_key
+        self.rate_limiter = get_rate_limiter()
         
-        try:
-            from supabase import create_client, Client
-            from supabase.lib.client_options import ClientOptions
-            
-            # 创建Supabase客户端
-            self.client: Client = create_client(
-                supabase_url=url,
-                supabase_key=key,
-                options=ClientOptions(
-                    auto_refresh_token=True,
-                    persist_session=True
-                )
-            )
-            
-            # 创建管理员客户端（用于需要更高权限的操作）
-            if service_role_key:
-                self.admin_client: Client = create_client(
-                    supabase_url=url,
-                    supabase_key=service_role_key
-                )
-            else:
-                self.admin_client = self.client
-            
-            logger.info(f"✅ Supabase客户端初始化成功: {url}")
-            
-            # 验证连接
-            self._verify_connection()
-            
-        except ImportError:
-            raise ImportError("Supabase库未安装: pip install supabase")
-        except Exception as e:
-            logger.error(f"❌ Supabase初始化失败: {e}")
-            raise
+        # 创建 PostgREST 客户端（连接池在请求间复用）
+        self.client = PostgRESTClient(url, key, max_connections=max_connections,
+                                      timeout=timeout, transport=transport)
+        
+        # 创建管理员客户端（用于需要更高权限的操作）
+        if service_role_key:
+            self.admin_client = PostgRESTClient(url, service_role_key, max_connections=max_connections,
+                                                timeout=timeout, transport=transport)
+        else:
+            self.admin_client = self.client
+        
+        logger.info(f"✅ Supabase客户端初始化成功: {url}")
+        
+        # 验证连接
+        self._verify_connection()
     
     def _verify_connection(self):
-        """验证Supabase连接"""
+        """验证Supabase连接（在事件循环中构造时转为后台任务，避免阻塞）"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        
+        if loop is not None:
+            self._verify_task = loop.create_task(self.verify_connection())
+            return
+        
         try:
             # 尝试查询系统表来验证连接
-            result = self.client.table('sessions').select('id').limit(1).execute()
+            self.client.select_sync('sessions', columns='id', limit=1)
             logger.info("✅ Supabase连接验证成功")
         except Exception as e:
-            logger.warning(f"⚠️ Supabase连接验证失败: {e}")
-            logger.info("💡 请检查:")
-            logger.info("   1. SUPABASE_URL是否正确")
-            logger.info("   2. SUPABASE_ANON_KEY是否有效")
-            logger.info("   3. 网络连接是否正常")
-            logger.info("   4. Supabase项目是否已创建")
+            self._log_verify_failure(e)
+    
+    async def verify_connection(self) -> bool:
+        """验证Supabase连接（异步）"""
+        try:
+            await self.client.select('sessions', columns='id', limit=1)
+            logger.info("✅ Supabase连接验证成功")
+            return True
+        except Exception as e:
+            self._log_verify_failure(e)
+            return False
+    
+    @staticmethod
+    def _log_verify_failure(e: Exception) -> None:
+        logger.warning(f"⚠️ Supabase连接验证失败: {e}")
+        logger.info("💡 请检查:")
+        logger.info("   1. SUPABASE_URL是否正确")
+        logger.info("   2. SUPABASE_ANON_KEY是否有效")
+        logger.info("   3. 网络连接是否正常")
+        logger.info("   4. Supabase项目是否已创建")
     
     def create_session_sync(self, session_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """创建会话（同步版本）"""
+        """创建会话（同步版本，使用同步连接池，不再为每次调用新建事件循环）"""
         try:
-            # 在新的事件循环中运行异步方法
-            import asyncio
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    # 如果已经在事件循环中，使用线程池
-                    import concurrent.futures
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        future = executor.submit(asyncio.run, self.create_session(session_data))
-                        return future.result()
-                else:
-                    return loop.run_until_complete(self.create_session(session_data))
-            except RuntimeError:
-                # 没有事件循环，创建新的
-                return asyncio.run(self.create_session(session_data))
-                
+            data = self.client.insert_sync('sessions', session_data)
+            if data:
+                logger.debug(f"✅ Supabase会话创建成功: {session_data.get('session_key')}")
+                return data[0]
+            logger.error(f"❌ Supabase会话创建失败: 无返回数据")
+            return None
         except Exception as e:
             logger.error(f"❌ 同步创建会话失败: {e}")
             return None
@@ -144,10 +161,10 @@ class SupabaseAdapter(DatabaseAdapter):
     async def create_session(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
         """创建会话"""
         try:
-            result = self.client.table('sessions').insert(session_data).execute()
-            if result.data:
+            data = await self.client.insert('sessions', session_data)
+            if data:
                 logger.debug(f"✅ Supabase会话创建成功: {session_data.get('session_key')}")
-                return result.data[0]
+                return data[0]
             else:
                 logger.error(f"❌ Supabase会话创建失败: 无返回数据")
                 return {}
@@ -158,12 +175,8 @@ class SupabaseAdapter(DatabaseAdapter):
     async def get_session(self, session_key: str) -> Optional[Dict[str, Any]]:
         """获取会话"""
         try:
-            result = self.client.table('sessions')\
-                .select('*')\
-                .eq('session_key', session_key)\
-                .execute()
-            
-            return result.data[0] if result.data else None
+            data = await self.client.select('sessions', filters={'session_key': session_key})
+            return data[0] if data else None
         except Exception as e:
             logger.error(f"❌ Supabase获取会话失败: {e}")
             return None
@@ -171,12 +184,8 @@ class SupabaseAdapter(DatabaseAdapter):
     async def update_session(self, session_key: str, updates: Dict[str, Any]) -> bool:
         """更新会话"""
         try:
-            result = self.client.table('sessions')\
-                .update(updates)\
-                .eq('session_key', session_key)\
-                .execute()
-            
-            return len(result.data) > 0
+            data = await self.client.update('sessions', updates, filters={'session_key': session_key})
+            return len(data) > 0
         except Exception as e:
             logger.error(f"❌ Supabase更新会话失败: {e}")
             return False
@@ -184,10 +193,10 @@ class SupabaseAdapter(DatabaseAdapter):
     async def create_message(self, message_data: Dict[str, Any]) -> Dict[str, Any]:
         """创建消息"""
         try:
-            result = self.client.table('messages').insert(message_data).execute()
-            if result.data:
+            data = await self.client.insert('messages', message_data)
+            if data:
                 logger.debug(f"✅ Supabase消息创建成功: {message_data.get('request_id')}")
-                return result.data[0]
+                return data[0]
             else:
                 logger.error(f"❌ Supabase消息创建失败: 无返回数据")
                 return {}
@@ -198,13 +207,10 @@ class SupabaseAdapter(DatabaseAdapter):
     async def get_messages(self, session_id: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
         """获取消息列表"""
         try:
-            query = self.client.table('messages').select('*')
-            
-            if session_id:
-                query = query.eq('session_id', session_id)
-            
-            result = query.order('received_at', desc=True).limit(limit).execute()
-            return result.data
+            filters = {'session_id': session_id} if session_id else None
+            return await self.client.select(
+                'messages', filters=filters, order='received_at', desc=True, limit=limit
+            )
         except Exception as e:
             logger.error(f"❌ Supabase获取消息失败: {e}")
             return []
@@ -212,47 +218,16 @@ class SupabaseAdapter(DatabaseAdapter):
     async def update_message(self, request_id: str, updates: Dict[str, Any]) -> bool:
         """更新消息"""
         try:
-            result = self.client.table('messages')\
-                .update(updates)\
-                .eq('request_id', request_id)\
-                .execute()
-            
-            return len(result.data) > 0
+            data = await self.client.update('messages', updates, filters={'request_id': request_id})
+            return len(data) > 0
         except Exception as e:
             logger.error(f"❌ Supabase更新消息失败: {e}")
             return False
     
     async def check_rate_limit(self, entity_type: str, entity_id: str, limit: int, window_seconds: int) -> tuple[bool, int]:
-        """检查速率限制"""
+        """检查速率限制（滑动窗口计数，不再每次请求插入 rate_limits 行）"""
         try:
-            from datetime import datetime, timedelta
-            
-            now = datetime.now()
-            window_start = now - timedelta(seconds=window_seconds)
-            
-            # 查询当前窗口内的请求数
-            result = self.client.table('rate_limits')\
-                .select('request_count')\
-                .eq('entity_type', entity_type)\
-                .eq('entity_id', entity_id)\
-                .gte('window_start', window_start.isoformat())\
-                .execute()
-            
-            current_count = sum(row['request_count'] for row in result.data)
-            is_allowed = current_count < limit
-            
-            if is_allowed:
-                # 插入新的速率记录
-                self.client.table('rate_limits').insert({
-                    'entity_type': entity_type,
-                    'entity_id': entity_id,
-                    'window_start': now.isoformat(),
-                    'request_count': 1,
-                    'last_request_at': now.isoformat()
-                }).execute()
-                current_count += 1
-            
-            return is_allowed, current_count
+            return await self.rate_limiter.acheck(entity_type, entity_id, limit, window_seconds)
         except Exception as e:
             logger.error(f"❌ Supabase速率限制检查失败: {e}")
             return False, 0
@@ -260,29 +235,27 @@ class SupabaseAdapter(DatabaseAdapter):
     async def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
         try:
-            # 并行查询统计信息
-            import asyncio
-            
-            async def get_count(table: str) -> int:
-                result = self.client.table(table).select('id', count='exact').execute()
-                return result.count or 0
-            
-            tasks = [
-                get_count('sessions'),
-                get_count('messages')
-            ]
-            
-            results = await asyncio.gather(*tasks)
+            # 两个计数请求并发执行
+            session_count, message_count = await asyncio.gather(
+                self.client.count('sessions'),
+                self.client.count('messages')
+            )
             
             return {
                 "database_type": "supabase",
-                "session_count": results[0],
-                "message_count": results[1],
+                "session_count": session_count,
+                "message_count": message_count,
                 "supabase_url": self.url
             }
         except Exception as e:
             logger.error(f"❌ Supabase获取统计失败: {e}")
             return {"database_type": "supabase", "error": str(e)}
+    
+    async def close(self) -> None:
+        """关闭连接池"""
+        await self.client.aclose()
+        if self.admin_client is not self.client:
+            await self.admin_client.aclose()
 
 
 class UnifiedDatabaseManager:
@@ -310,7 +283,11 @@ class UnifiedDatabaseManager:
             key = key or "your_supabase_anon_key"
             service_role_key = service_role_key or "your_supabase_service_role_key"
         
-        return SupabaseAdapter(url, key, service_role_key)
+        return SupabaseAdapter(
+            url, key, service_role_key,
+            max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20")),
+            timeout=float(os.getenv("SUPABASE_TIMEOUT", "10"))
+        )
     
     # 代理方法到适配器
     def create_session_sync(self, tenant_id: str, session_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -341,6 +318,10 @@ class UnifiedDatabaseManager:
     async def get_stats(self) -> Dict[str, Any]:
         return await self.adapter.get_stats()
     
+    async def close(self) -> None:
+        """关闭适配器连接池"""
+        await self.adapter.close()
+    
     def get_database_type(self) -> DatabaseType:
         """获取当前数据库类型"""
         return self.db_type
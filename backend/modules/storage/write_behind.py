@@ -0,0 +1,248 @@
+"""
+消息日志后写队列（group commit）
+log_message / update_message 只写入内存缓冲并立即返回，后台线程每 N 毫秒或攒够 M 行
+以一个事务 executemany 落盘；同一 request_id 的多次更新在落盘前合并。
+缓冲满时对写入方施加背压，进程退出时同步落盘剩余记录
+"""
+import atexit
+import dataclasses
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .sqlite_pool import SQLiteConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriteBehind:
+    """
+    消息日志后写器
+
+    用法：
+        writer = MessageWriteBehind(get_sqlite_manager("data/data.db"))
+        writer.enqueue_insert(msg)
+        writer.enqueue_update(msg.request_id, status="answered")
+        writer.close()  # 落盘剩余记录
+    """
+
+    def __init__(
+        self,
+        manager: SQLiteConnectionManager,
+        flush_interval_ms: int = 50,
+        max_batch: int = 500,
+        max_pending: int = 10000,
+        block_timeout: float = 1.0
+    ):
+        """
+        Args:
+            manager: SQLite 连接管理器
+            flush_interval_ms: 定时落盘间隔（毫秒）
+            max_batch: 缓冲达到该行数时立即落盘
+            max_pending: 缓冲上限，超过后写入方等待（背压）
+            block_timeout: 背压等待上限（秒），超时后由写入方自己落盘
+        """
+        self.manager = manager
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.block_timeout = block_timeout
+
+        # 插入按 request_id 保持入队顺序；更新按 request_id 合并字段
+        self._inserts: Dict[str, Any] = {}
+        self._updates: Dict[str, Dict[str, Any]] = {}
+        # 正在落盘的一批（落盘完成前仍对读可见）
+        self._inflight_inserts: Dict[str, Any] = {}
+        self._inflight_updates: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            "inserts": 0, "updates": 0, "coalesced": 0,
+            "flushes": 0, "rows_written": 0, "failed": 0, "backpressure": 0
+        }
+
+        self._thread = threading.Thread(target=self._run, name="message-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ==================== 公共 API ====================
+
+    def enqueue_insert(self, msg: Any) -> None:
+        """消息记录入队（MessageLog）"""
+        self._wait_for_space()
+        with self._cond:
+            self._inserts[msg.request_id] = msg
+            self._stats["inserts"] += 1
+            self._notify_if_full()
+        if self._closed:
+            self.flush()
+
+    def enqueue_update(self, request_id: str, **fields) -> None:
+        """消息更新入队（未落盘的插入直接合并，已有更新按字段合并）"""
+        if not fields:
+            return
+        self._wait_for_space()
+        with self._cond:
+            self._stats["updates"] += 1
+            pending = self._inserts.get(request_id)
+            if pending is not None and all(hasattr(pending, k) for k in fields):
+                self._inserts[request_id] = dataclasses.replace(pending, **fields)
+                self._stats["coalesced"] += 1
+            elif request_id in self._updates:
+                self._updates[request_id].update(fields)
+                self._stats["coalesced"] += 1
+            else:
+                self._updates[request_id] = dict(fields)
+                self._notify_if_full()
+        if self._closed:
+            self.flush()
+
+    def pending_message(self, request_id: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        未落盘的数据（读己之写）
+
+        Returns:
+            (未落盘的插入记录, 未落盘的更新字段)
+        """
+        with self._cond:
+            msg = self._inserts.get(request_id) or self._inflight_inserts.get(request_id)
+            fields = {**self._inflight_updates.get(request_id, {}), **self._updates.get(request_id, {})}
+            return dataclasses.asdict(msg) if msg is not None else None, fields
+
+    def pending_messages(self) -> List[Any]:
+        """未落盘的插入记录"""
+        with self._cond:
+            return list(self._inflight_inserts.values()) + list(self._inserts.values())
+
+    def flush(self) -> int:
+        """立即落盘缓冲中的全部记录，返回写入行数"""
+        with self._flush_lock:
+            with self._cond:
+                self._inflight_inserts, self._inserts = self._inserts, {}
+                self._inflight_updates, self._updates = self._updates, {}
+                inserts, updates = list(self._inflight_inserts.values()), self._inflight_updates
+                self._cond.notify_all()
+            if not inserts and not updates:
+                return 0
+
+            try:
+                written = self._write(inserts, updates)
+            finally:
+                with self._cond:
+                    self._inflight_inserts, self._inflight_updates = {}, {}
+            self._stats["flushes"] += 1
+            self._stats["rows_written"] += written
+            return written
+
+    def close(self) -> None:
+        """停止后台线程并落盘剩余记录"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+        written = self.flush()
+        atexit.unregister(self.close)
+        if written:
+            logger.info(f"✅ 消息日志退出前落盘 {written} 行")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """后写队列统计"""
+        with self._cond:
+            pending = len(self._inserts) + len(self._updates)
+        return {"pending": pending, **self._stats}
+
+    # ==================== 内部实现 ====================
+
+    def _pending(self) -> int:
+        return len(self._inserts) + len(self._updates)
+
+    def _notify_if_full(self) -> None:
+        if self._pending() >= self.max_batch:
+            self._cond.notify_all()
+
+    def _wait_for_space(self) -> None:
+        """背压：缓冲已满时等待后台落盘，超时则由写入方自己落盘"""
+        with self._cond:
+            if self._pending() < self.max_pending:
+                return
+            self._stats["backpressure"] += 1
+            self._cond.notify_all()
+            has_space = self._cond.wait_for(
+                lambda: self._pending() < self.max_pending or self._closed, timeout=self.block_timeout
+            )
+        if not has_space:
+            logger.warning(f"⚠️ 消息日志缓冲已满({self.max_pending})，写入方同步落盘")
+            self.flush()
+
+    def _run(self) -> None:
+        interval = self.flush_interval_ms / 1000
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + interval
+                while not self._closed and self._pending() < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ 消息日志落盘失败: {e}")
+
+    def _write(self, inserts: List[Any], updates: Dict[str, Dict[str, Any]]) -> int:
+        """一个事务写入整批；失败时逐行重试以隔离坏数据"""
+        insert_sql, insert_rows = self._insert_statement(inserts)
+        update_batches = self._update_statements(updates)
+        try:
+            with self.manager.transaction() as conn:
+                if insert_rows:
+                    conn.executemany(insert_sql, insert_rows)
+                for sql, rows in update_batches:
+                    conn.executemany(sql, rows)
+            return len(insert_rows) + len(updates)
+        except Exception as e:
+            logger.warning(f"消息日志批量落盘失败，逐行重试: {e}")
+
+        written = 0
+        statements = [(insert_sql, row) for row in insert_rows]
+        statements += [(sql, row) for sql, rows in update_batches for row in rows]
+        for sql, row in statements:
+            try:
+                with self.manager.transaction() as conn:
+                    conn.execute(sql, row)
+                written += 1
+            except Exception as e:
+                self._stats["failed"] += 1
+                logger.error(f"❌ 消息日志写入失败: {e}")
+        return written
+
+    @staticmethod
+    def _insert_statement(inserts: List[Any]) -> Tuple[str, List[tuple]]:
+        if not inserts:
+            return "", []
+        columns = [field.name for field in dataclasses.fields(inserts[0])]
+        sql = (
+            f"INSERT INTO messages ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        return sql, [tuple(getattr(msg, column) for column in columns) for msg in inserts]
+
+    @staticmethod
+    def _update_statements(updates: Dict[str, Dict[str, Any]]) -> List[Tuple[str, List[tuple]]]:
+        """按更新字段集合分组，每组一条 executemany"""
+        groups: Dict[Tuple[str, ...], List[tuple]] = {}
+        for request_id, fields in updates.items():
+            columns = tuple(sorted(fields))
+            groups.setdefault(columns, []).append(
+                tuple(fields[column] for column in columns) + (request_id,)
+            )
+        return [
+            (f"UPDATE messages SET {', '.join(f'{column} = ?' for column in columns)} WHERE request_id = ?", rows)
+            for columns, rows in groups.items()
+        ]
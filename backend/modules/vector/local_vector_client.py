@@ -0,0 +1,616 @@
+"""
+本地进程内向量库（NumPy + IVF）
+与 SupabaseVectorClient 接口一致，适用于单租户/小规模知识库
+
+特性：
+- 向量矩阵 float32 存盘（.npy），加载时 mmap 只读映射，多 worker 共享页缓存
+- 规模较大时构建 IVF 倒排聚类索引（k-means 粗量化 + nprobe 探测），否则精确暴力检索
+- 写操作只标记脏数据，按 persist_interval 合并落盘；IVF 仅在新增/删除比例超过阈值时重新训练
+- 元数据等值过滤先于打分执行（pre-filtering），语义同 metadata->>'key' = value
+- 距离度量与 pgvector 一致：cosine / l2 / inner_product
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LocalVectorClient:
+    """
+    本地向量数据库客户端
+
+    存储布局（{storage_dir}/{table_name}/）：
+        embeddings.npy    向量矩阵 (N, dim) float32，cosine 度量下已归一化
+        records.jsonl     每行一条记录：id / content / metadata / 时间戳
+        ivf_centroids.npy IVF 聚类中心（可选）
+        ivf_assign.npy    每行所属聚类（可选）
+    """
+
+    def __init__(
+        self,
+        storage_dir: str = "data/vectors",
+        table_name: str = "knowledge_vectors",
+        embedding_dimension: int = 1536,
+        distance_metric: str = "cosine",
+        ivf_min_vectors: int = 20000,
+        nprobe: int = 8,
+        auto_persist: bool = True,
+        persist_interval: float = 5.0,
+        ivf_retrain_ratio: float = 0.2
+    ):
+        """
+        初始化本地向量客户端
+
+        Args:
+            storage_dir: 存储目录
+            table_name: 向量表名（子目录名）
+            embedding_dimension: 向量维度
+            distance_metric: 距离度量（cosine, l2, inner_product）
+            ivf_min_vectors: 向量数达到该值时构建 IVF 索引
+            nprobe: IVF 查询时探测的聚类数
+            auto_persist: 写操作后自动落盘（合并 persist_interval 秒内的写入）
+            persist_interval: 合并落盘的延迟（秒），0 表示每次写操作立即落盘
+            ivf_retrain_ratio: 自上次训练以来新增+删除的行数占比超过该值时重新训练 IVF，
+                否则沿用已有聚类中心，只为新增行分配聚类
+        """
+        if distance_metric not in ("cosine", "l2", "inner_product"):
+            raise ValueError(f"不支持的距离度量: {distance_metric}")
+
+        self.table_name = table_name
+        self.embedding_dimension = embedding_dimension
+        self.distance_metric = distance_metric
+        self.ivf_min_vectors = ivf_min_vectors
+        self.nprobe = nprobe
+        self.auto_persist = auto_persist
+        self.persist_interval = persist_interval
+        self.ivf_retrain_ratio = ivf_retrain_ratio
+        self.path = Path(storage_dir) / table_name
+
+        self._matrix = np.zeros((0, embedding_dimension), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._records: List[Dict[str, Any]] = []
+        self._id_to_row: Dict[str, int] = {}
+
+        # IVF 索引（覆盖前 _ivf_rows 行，其后为未索引的新增行）
+        self._centroids: Optional[np.ndarray] = None
+        self._assign: Optional[np.ndarray] = None
+        self._ivf_rows = 0
+        # 自上次训练以来累计的新增/删除行数（只在进程内统计）
+        self._ivf_stale_rows = 0
+
+        # 未落盘的写入与合并落盘定时器
+        self._dirty = False
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # 元数据倒排：key -> value -> [row]，写操作后失效
+        self._meta_index: Optional[Dict[str, Dict[str, List[int]]]] = None
+
+        self._load()
+        atexit.register(self.flush)
+
+    # ==================== 写操作 ====================
+
+    async def upsert_vectors(self, vectors: List[Dict[str, Any]]) -> bool:
+        """
+        插入或更新向量
+
+        Args:
+            vectors: 向量列表，每个向量包含：
+                - id: 向量ID
+                - content: 文本内容
+                - embedding: 向量嵌入
+                - metadata: 元数据
+        """
+        try:
+            if not vectors:
+                logger.warning("⚠️ 向量列表为空")
+                return True
+
+            for vector in vectors:
+                if not vector.get("id"):
+                    raise ValueError("向量ID不能为空")
+                if vector.get("embedding") is None or len(vector["embedding"]) == 0:
+                    raise ValueError("向量嵌入不能为空")
+                if len(vector["embedding"]) != self.embedding_dimension:
+                    raise ValueError(f"向量维度必须为 {self.embedding_dimension}")
+
+            now = datetime.now().isoformat()
+            new_rows = self._prepare(np.asarray([v["embedding"] for v in vectors], dtype=np.float32))
+
+            # 旧行打墓碑，新行追加到尾部（mmap 只读，落盘时压实）
+            start = len(self._records)
+            self._alive = np.concatenate([self._alive, np.ones(len(vectors), dtype=bool)])
+            for offset, vector in enumerate(vectors):
+                vector_id = str(vector["id"])
+                old_row = self._id_to_row.get(vector_id)
+                created_at = now
+                if old_row is not None:
+                    self._alive[old_row] = False
+                    created_at = self._records[old_row]["created_at"]
+
+                self._records.append({
+                    "id": vector_id,
+                    "content": vector.get("content", ""),
+                    "metadata": vector.get("metadata") or {},
+                    "created_at": created_at,
+                    "updated_at": now
+                })
+                self._id_to_row[vector_id] = start + offset
+
+            self._matrix = np.concatenate([np.asarray(self._matrix), new_rows])
+            self._meta_index = None
+            self._mark_dirty()
+
+            logger.info(f"✅ 成功插入/更新 {len(vectors)} 个向量（本地）")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ 向量插入失败: {e}")
+            return False
+
+    async def delete_vectors(self, vector_ids: List[str]) -> bool:
+        """删除向量"""
+        try:
+            if not vector_ids:
+                logger.warning("⚠️ 向量ID列表为空")
+                return True
+
+            for vector_id in vector_ids:
+                row = self._id_to_row.pop(str(vector_id), None)
+                if row is not None:
+                    self._alive[row] = False
+            self._meta_index = None
+            self._mark_dirty()
+
+            logger.info(f"✅ 成功删除 {len(vector_ids)} 个向量（本地）")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ 向量删除失败: {e}")
+            return False
+
+    async def update_vector_metadata(self, vector_id: str, metadata: Dict[str, Any]) -> bool:
+        """更新向量元数据"""
+        try:
+            row = self._id_to_row.get(vector_id)
+            if row is None:
+                logger.warning(f"⚠️ 向量不存在: {vector_id}")
+                return False
+
+            self._records[row]["metadata"] = metadata
+            self._records[row]["updated_at"] = datetime.now().isoformat()
+            self._meta_index = None
+            self._mark_dirty()
+
+            logger.info(f"✅ 成功更新向量 {vector_id} 的元数据")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ 更新向量元数据失败: {e}")
+            return False
+
+    # ==================== 查询 ====================
+
+    async def search_vectors(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        similarity_threshold: float = 0.7,
+        metadata_filter: Optional[Dict] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        向量相似度搜索
+
+        Args:
+            query_embedding: 查询向量
+            top_k: 返回结果数量
+            similarity_threshold: 相似度阈值（与 pgvector 版一致：distance < 1 - threshold）
+            metadata_filter: 元数据过滤条件
+        """
+        try:
+            if query_embedding is None or len(query_embedding) == 0:
+                logger.warning("⚠️ 查询向量为空")
+                return []
+
+            if len(query_embedding) != self.embedding_dimension:
+                logger.error(f"❌ 查询向量维度错误: {len(query_embedding)} != {self.embedding_dimension}")
+                return []
+
+            query = self._prepare(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+            rows = self._candidate_rows(query, metadata_filter)
+            if rows is not None and len(rows) == 0:
+                return []
+
+            if rows is None:
+                distances = self._distances(self._matrix, query)
+                distances[~self._alive] = np.inf
+                row_ids = None
+            else:
+                distances = self._distances(self._matrix[rows], query)
+                row_ids = rows
+
+            return self._collect(distances, row_ids, top_k, similarity_threshold)
+
+        except Exception as e:
+            logger.error(f"❌ 向量搜索失败: {e}")
+            return []
+
+    async def batch_search(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        similarity_threshold: float = 0.7,
+        metadata_filter: Optional[Dict] = None,
+        chunk_size: int = 256
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量向量搜索：查询矩阵与向量矩阵一次矩阵乘（按 chunk_size 分块控制内存），精确检索
+
+        Args:
+            query_embeddings: 查询向量列表
+            top_k: 每个查询返回结果数量
+            similarity_threshold: 相似度阈值
+            metadata_filter: 元数据过滤条件
+            chunk_size: 每次矩阵乘的查询数
+        """
+        try:
+            if not query_embeddings:
+                return []
+
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+            if queries.ndim != 2 or queries.shape[1] != self.embedding_dimension:
+                logger.error(f"❌ 查询向量维度错误: {queries.shape} != (*, {self.embedding_dimension})")
+                return [[] for _ in query_embeddings]
+            queries = self._prepare(queries)
+
+            if metadata_filter:
+                rows = self._filter_rows(metadata_filter)
+                matrix = self._matrix[rows]
+            else:
+                rows = None
+                matrix = self._matrix
+
+            results: List[List[Dict[str, Any]]] = []
+            for start in range(0, len(queries), chunk_size):
+                distances = self._distance_matrix(matrix, queries[start:start + chunk_size])
+                if rows is None:
+                    distances[:, ~self._alive] = np.inf
+                for row_distances in distances:
+                    results.append(self._collect(row_distances, rows, top_k, similarity_threshold))
+
+            logger.info(f"🔍 批量搜索完成: {len(query_embeddings)} 个查询（本地）")
+            return results
+
+        except Exception as e:
+            logger.error(f"❌ 批量搜索失败: {e}")
+            return []
+
+    async def get_vector_by_id(self, vector_id: str) -> Optional[Dict[str, Any]]:
+        """根据ID获取向量"""
+        row = self._id_to_row.get(vector_id)
+        if row is None:
+            return None
+
+        record = self._records[row]
+        return {
+            "id": record["id"],
+            "content": record["content"],
+            "metadata": record["metadata"],
+            "embedding": np.asarray(self._matrix[row]).tolist(),
+            "created_at": record["created_at"],
+            "updated_at": record["updated_at"]
+        }
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """获取向量统计信息"""
+        alive_rows = [self._records[row] for row in self._id_to_row.values()]
+        return {
+            "total_vectors": len(alive_rows),
+            "table_name": self.table_name,
+            "embedding_dimension": self.embedding_dimension,
+            "distance_metric": self.distance_metric,
+            "latest_update": max((r["updated_at"] for r in alive_rows), default=None),
+            "latest_created": max((r["created_at"] for r in alive_rows), default=None),
+            "backend": "local",
+            "index_type": "ivf" if self._centroids is not None else "flat",
+            "storage_path": str(self.path)
+        }
+
+    async def health_check(self) -> bool:
+        """健康检查"""
+        return self._matrix.shape[1] == self.embedding_dimension
+
+    # ==================== 持久化 ====================
+
+    def flush(self) -> bool:
+        """
+        立即落盘未保存的写入
+
+        Returns:
+            是否执行了落盘（无未保存写入时返回 False）
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return False
+        self.persist()
+        return True
+
+    def persist(self) -> None:
+        """压实墓碑行并落盘，随后以 mmap 重新映射"""
+        alive_rows = np.nonzero(self._alive)[0]
+        matrix = np.ascontiguousarray(self._matrix[alive_rows], dtype=np.float32)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._atomic_save(self.path / "embeddings.npy", matrix)
+        self._write_records(self._records, alive_rows.tolist())
+
+        stale_rows = self._ivf_stale_rows
+        if len(matrix) >= self.ivf_min_vectors:
+            centroids, assign, stale_rows = self._update_ivf(matrix, alive_rows)
+            self._atomic_save(self.path / "ivf_centroids.npy", centroids)
+            self._atomic_save(self.path / "ivf_assign.npy", assign)
+        else:
+            for name in ("ivf_centroids.npy", "ivf_assign.npy"):
+                (self.path / name).unlink(missing_ok=True)
+
+        self._load()
+        self._ivf_stale_rows = stale_rows
+        self._dirty = False
+
+    def _mark_dirty(self) -> None:
+        """标记未落盘的写入，persist_interval 秒后合并落盘（同一时段内的多次写入只落盘一次）"""
+        self._dirty = True
+        if not self.auto_persist:
+            return
+        if self.persist_interval <= 0:
+            self.flush()
+            return
+
+        loop = asyncio.get_running_loop()
+        if self._flush_handle is None or self._flush_loop is not loop or self._flush_loop.is_closed():
+            self._flush_loop = loop
+            self._flush_handle = loop.call_later(self.persist_interval, self._scheduled_flush)
+
+    def _scheduled_flush(self) -> None:
+        self._flush_handle = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"❌ 本地向量库落盘失败: {e}")
+
+    def _load(self) -> None:
+        """从磁盘加载（向量矩阵 mmap 只读）"""
+        matrix_path = self.path / "embeddings.npy"
+        records_path = self.path / "records.jsonl"
+        if not matrix_path.exists() or not records_path.exists():
+            return
+
+        matrix = np.load(matrix_path, mmap_mode="r")
+        if matrix.ndim != 2 or matrix.shape[1] != self.embedding_dimension:
+            raise ValueError(f"本地向量维度不一致: {matrix.shape} != (*, {self.embedding_dimension})")
+
+        with open(records_path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        if len(records) != len(matrix):
+            raise ValueError(f"本地向量库损坏: records={len(records)}, vectors={len(matrix)}")
+
+        self._matrix = matrix
+        self._records = records
+        self._alive = np.ones(len(records), dtype=bool)
+        self._id_to_row = {record["id"]: row for row, record in enumerate(records)}
+        self._meta_index = None
+
+        centroids_path = self.path / "ivf_centroids.npy"
+        assign_path = self.path / "ivf_assign.npy"
+        if centroids_path.exists() and assign_path.exists():
+            self._centroids = np.load(centroids_path)
+            self._assign = np.load(assign_path, mmap_mode="r")
+            self._ivf_rows = len(self._assign)
+        else:
+            self._centroids = None
+            self._assign = None
+            self._ivf_rows = 0
+
+        logger.info(
+            f"✅ 本地向量库已加载: {self.path}, {len(records)} 个向量, "
+            f"索引={'ivf' if self._centroids is not None else 'flat'}"
+        )
+
+    def _write_records(self, records: List[Dict[str, Any]], rows: List[int]) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        records_path = self.path / "records.jsonl"
+        tmp_path = records_path.with_suffix(".jsonl.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(records[row], ensure_ascii=False) + "\n")
+        os.replace(tmp_path, records_path)
+
+    @staticmethod
+    def _atomic_save(path: Path, array: np.ndarray) -> None:
+        tmp_path = path.with_suffix(".tmp.npy")
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    # ==================== 索引与打分 ====================
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """cosine 度量下预先归一化，检索时只需点积"""
+        if self.distance_metric != "cosine":
+            return vectors
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _distances(self, matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """与 pgvector 操作符一致的距离：<=> / <-> / <#>"""
+        if self.distance_metric == "cosine":
+            return 1.0 - matrix @ query
+        if self.distance_metric == "l2":
+            return np.linalg.norm(matrix - query, axis=1)
+        return -(matrix @ query)
+
+    def _distance_matrix(self, matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """批量距离 (n_queries, n_rows)"""
+        if self.distance_metric == "cosine":
+            return 1.0 - queries @ matrix.T
+        if self.distance_metric == "l2":
+            sq = (
+                (queries ** 2).sum(axis=1)[:, None]
+                - 2 * queries @ matrix.T
+                + (np.asarray(matrix) ** 2).sum(axis=1)[None, :]
+            )
+            return np.sqrt(np.maximum(sq, 0))
+        return -(queries @ matrix.T)
+
+    def _similarity(self, distance: float) -> float:
+        if self.distance_metric == "cosine":
+            return 1 - distance
+        if self.distance_metric == "l2":
+            return 1 / (1 + distance)
+        return -distance
+
+    def _candidate_rows(self, query: np.ndarray, metadata_filter: Optional[Dict]) -> Optional[np.ndarray]:
+        """
+        候选行：元数据过滤 > IVF 探测 > 全量（返回 None）
+        """
+        if metadata_filter:
+            return self._filter_rows(metadata_filter)
+
+        if self._centroids is None:
+            return None
+
+        nprobe = min(self.nprobe, len(self._centroids))
+        centroid_dist = self._distances(self._centroids, query)
+        probe = np.argpartition(centroid_dist, nprobe - 1)[:nprobe]
+        indexed = np.nonzero(np.isin(self._assign, probe))[0]
+        tail = np.arange(self._ivf_rows, len(self._records))
+        rows = np.concatenate([indexed, tail])
+        return rows[self._alive[rows]]
+
+    def _filter_rows(self, metadata_filter: Dict) -> np.ndarray:
+        """元数据等值过滤后的存活行"""
+        rows = None
+        meta_index = self._get_meta_index()
+        for key, value in metadata_filter.items():
+            matched = set(meta_index.get(key, {}).get(self._meta_text(value), ()))
+            rows = matched if rows is None else rows & matched
+            if not rows:
+                return np.zeros(0, dtype=np.int64)
+        rows = np.fromiter(sorted(rows), dtype=np.int64)
+        return rows[self._alive[rows]]
+
+    def _collect(
+        self,
+        distances: np.ndarray,
+        row_ids: Optional[np.ndarray],
+        top_k: int,
+        similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """按阈值与 top_k 取结果"""
+        if top_k <= 0 or len(distances) == 0:
+            return []
+
+        k = min(top_k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+
+        results = []
+        max_distance = 1 - similarity_threshold
+        for i in top:
+            distance = float(distances[i])
+            if not distance < max_distance:
+                break
+            row = int(row_ids[i]) if row_ids is not None else int(i)
+            record = self._records[row]
+            results.append({
+                "id": record["id"],
+                "content": record["content"],
+                "metadata": record["metadata"],
+                "similarity": self._similarity(distance),
+                "distance": distance,
+                "created_at": record["created_at"],
+                "updated_at": record["updated_at"]
+            })
+        return results
+
+    def _get_meta_index(self) -> Dict[str, Dict[str, List[int]]]:
+        if self._meta_index is None:
+            meta_index: Dict[str, Dict[str, List[int]]] = {}
+            for row in self._id_to_row.values():
+                for key, value in (self._records[row]["metadata"] or {}).items():
+                    meta_index.setdefault(key, {}).setdefault(self._meta_text(value), []).append(row)
+            self._meta_index = meta_index
+        return self._meta_index
+
+    @staticmethod
+    def _meta_text(value: Any) -> str:
+        """元数据值转文本，与 jsonb ->> 运算符一致"""
+        return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+    def _update_ivf(self, matrix: np.ndarray, alive_rows: np.ndarray):
+        """
+        更新 IVF 索引：变化比例未超过 ivf_retrain_ratio 时沿用聚类中心，
+        已索引行保留原聚类，只为新增行分配；否则重新训练
+
+        Returns:
+            (centroids, assign, 自上次训练以来累计的变化行数)
+        """
+        if self._centroids is not None and self._ivf_rows:
+            added = len(self._records) - self._ivf_rows
+            deleted = int(np.count_nonzero(~self._alive[:self._ivf_rows]))
+            stale_rows = self._ivf_stale_rows + added + deleted
+            if stale_rows <= self.ivf_retrain_ratio * len(matrix):
+                # alive_rows 有序：已索引的存活行在前，新增行在后
+                indexed = alive_rows[alive_rows < self._ivf_rows]
+                assign = np.concatenate([
+                    np.asarray(self._assign)[indexed].astype(np.int32),
+                    self._assign_lists(matrix[len(indexed):], self._centroids).astype(np.int32)
+                ])
+                return self._centroids, assign, stale_rows
+
+        centroids, assign = self._train_ivf(matrix)
+        return centroids, assign, 0
+
+    def _train_ivf(self, matrix: np.ndarray, iterations: int = 10, seed: int = 0):
+        """k-means 训练 IVF 聚类中心，返回 (centroids, assign)"""
+        n_lists = max(1, int(np.sqrt(len(matrix))))
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(len(matrix), size=min(len(matrix), n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = self._assign_lists(sample, centroids)
+            for c in range(n_lists):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = self._prepare(centroids)
+
+        assign = self._assign_lists(matrix, centroids).astype(np.int32)
+        logger.info(f"✅ IVF 索引已构建: lists={n_lists}, vectors={len(matrix)}")
+        return centroids.astype(np.float32), assign
+
+    def _assign_lists(self, vectors: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        """按距离最近的聚类中心分配（分块避免大矩阵）"""
+        labels = np.empty(len(vectors), dtype=np.int64)
+        c_sq = (centroids ** 2).sum(axis=1)
+        for start in range(0, len(vectors), chunk):
+            block = np.asarray(vectors[start:start + chunk])
+            if self.distance_metric == "l2":
+                scores = 2 * block @ centroids.T - c_sq
+            else:
+                scores = block @ centroids.T
+            labels[start:start + chunk] = scores.argmax(axis=1)
+        return labels
@@ -7,7 +7,7 @@ Supabase向量数据库服务 - 基于 pgvector
 
 import os
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime
 import asyncio
 
@@ -17,44 +17,61 @@ logger = logging.getLogger(__name__)
 class VectorSearchService:
     """向量搜索服务 - 集成 Supabase pgvector 和嵌入服务"""
     
-    def __init__(self, supabase_client):
+    def __init__(self, supabase_client=None):
         """
         初始化向量搜索服务
         
         Args:
-            supabase_client: Supabase客户端实例
+            supabase_client: Supabase客户端实例（VECTOR_BACKEND=local 时可为 None）
         """
-        # 导入统一的向量客户端
-        from .supabase_vector_client import SupabaseVectorClient
-        
         # 获取配置
+        backend = os.getenv("VECTOR_BACKEND", "supabase").lower()
         table_name = os.getenv("VECTOR_TABLE_NAME", "knowledge_vectors")
         dimension = int(os.getenv("VECTOR_DIMENSION", "1536"))
         distance_metric = os.getenv("VECTOR_DISTANCE_METRIC", "cosine")
+        self.backend = backend
         
-        # 处理不同类型的客户端
-        if hasattr(supabase_client, 'client'):
-            supabase_url = supabase_client.url
-            supabase_key = supabase_client.supabase_key
+        if backend == "local":
+            # 本地进程内向量库（无需 Supabase）
+            from .local_vector_client import LocalVectorClient
+            
+            self.vector_client = LocalVectorClient(
+                storage_dir=os.getenv("VECTOR_LOCAL_PATH", "data/vectors"),
+                table_name=table_name,
+                embedding_dimension=dimension,
+                distance_metric=distance_metric,
+                ivf_min_vectors=int(os.getenv("VECTOR_LOCAL_IVF_MIN", "20000")),
+                nprobe=int(os.getenv("VECTOR_LOCAL_NPROBE", "8")),
+                persist_interval=float(os.getenv("VECTOR_LOCAL_PERSIST_INTERVAL", "5"))
+            )
         else:
-            supabase_url = supabase_client.url
-            supabase_key = supabase_client.supabase_key
-        
-        # 初始化向量客户端
-        self.vector_client = SupabaseVectorClient(
-            supabase_url=supabase_url,
-            supabase_key=supabase_key,
-            table_name=table_name,
-            embedding_dimension=dimension,
-            distance_metric=distance_metric
-        )
+            # 导入统一的向量客户端
+            from .supabase_vector_client import SupabaseVectorClient
+            
+            # 处理不同类型的客户端
+            if hasattr(supabase_client, 'client'):
+                supabase_url = supabase_client.url
+                supabase_key = supabase_client.supabase_key
+            else:
+                supabase_url = supabase_client.url
+                supabase_key = supabase_client.supabase_key
+            
+            # 初始化向量客户端
+            self.vector_client = SupabaseVectorClient(
+                supabase_url=supabase_url,
+                supabase_key=supabase_key,
+                table_name=table_name,
+                embedding_dimension=dimension,
+                distance_metric=distance_metric
+            )
         
         self.embedding_service = None
+        self._change_listeners: List[Callable[[Optional[List[str]]], Any]] = []
         
         # 初始化嵌入服务
         self._initialize_embedding_service()
         
-        logger.info(f"✅ 向量搜索服务初始化完成（Supabase pgvector, 表: {table_name}）")
+        logger.info(f"✅ 向量搜索服务初始化完成（后端: {backend}, 表: {table_name}）")
     
     def _initialize_embedding_service(self):
         """初始化嵌入服务"""
@@ -66,6 +83,23 @@ class VectorSearchService:
             logger.warning(f"⚠️ 嵌入服务初始化失败: {e}")
             logger.info("💡 向量搜索功能将不可用")
     
+    def add_change_listener(self, callback: Callable[[Optional[List[str]]], Any]) -> None:
+        """
+        注册知识块变更监听（如响应缓存失效）
+        
+        Args:
+            callback: 参数为变更的文档ID列表
+        """
+        self._change_listeners.append(callback)
+    
+    def _notify_change(self, document_ids: List[str]) -> None:
+        """通知知识块变更（监听方异常不影响写入结果）"""
+        for callback in self._change_listeners:
+            try:
+                callback(document_ids)
+            except Exception as e:
+                logger.warning(f"⚠️ 知识块变更通知失败: {e}")
+    
     async def add_documents(self, documents: List[Dict[str, Any]]) -> bool:
         """
         添加文档到向量数据库
@@ -104,6 +138,7 @@ class VectorSearchService:
             success = await self.vector_client.upsert_vectors(vectors)
             
             if success:
+                self._notify_change([vector["id"] for vector in vectors])
                 logger.info(f"✅ 文档添加成功: {len(documents)}条")
             else:
                 logger.error(f"❌ 文档添加失败")
@@ -168,12 +203,66 @@ class VectorSearchService:
             logger.error(f"❌ 文档搜索失败: {e}")
             return []
     
+    async def search_similar_documents_batch(
+        self,
+        queries: List[str],
+        top_k: int = 10,
+        similarity_threshold: float = 0.7,
+        metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量搜索相似文档（一次批量嵌入 + 一次批量检索）
+        
+        Args:
+            queries: 查询文本列表
+            top_k: 每个查询返回结果数量
+            similarity_threshold: 相似度阈值
+            metadata_filter: 元数据过滤条件
+        """
+        try:
+            if not queries:
+                return []
+            
+            if not self.embedding_service:
+                logger.error("❌ 嵌入服务未初始化")
+                return [[] for _ in queries]
+            
+            query_embeddings = await self.embedding_service.embed_batch(queries)
+            if len(query_embeddings) != len(queries):
+                logger.error("❌ 查询向量生成失败")
+                return [[] for _ in queries]
+            
+            batch_matches = await self.vector_client.batch_search(
+                query_embeddings,
+                top_k=top_k,
+                similarity_threshold=similarity_threshold,
+                metadata_filter=metadata_filter
+            )
+            
+            return [
+                [
+                    {
+                        "id": match["id"],
+                        "score": match["similarity"],
+                        "content": match["content"],
+                        "metadata": match["metadata"]
+                    }
+                    for match in matches
+                ]
+                for matches in batch_matches
+            ]
+            
+        except Exception as e:
+            logger.error(f"❌ 批量文档搜索失败: {e}")
+            return [[] for _ in queries]
+    
     async def delete_documents(self, document_ids: List[str]) -> bool:
         """删除文档"""
         try:
             success = await self.vector_client.delete_vectors(document_ids)
             
             if success:
+                self._notify_change(list(document_ids))
                 logger.info(f"✅ 文档删除成功: {len(document_ids)}条")
             else:
                 logger.error(f"❌ 文档删除失败")
@@ -191,7 +280,7 @@ class VectorSearchService:
             
             return {
                 "service_type": "vector_search",
-                "backend": "supabase_pgvector",
+                "backend": "local" if self.backend == "local" else "supabase_pgvector",
                 "stats": stats,
                 "embedding_service_available": self.embedding_service is not None
             }
@@ -221,8 +310,8 @@ def get_vector_search_service() -> VectorSearchService:
     return _vector_search_service
 
 
-def init_vector_search_service(supabase_client):
+def init_vector_search_service(supabase_client=None):
     """初始化全局向量搜索服务"""
     global _vector_search_service
     _vector_search_service = VectorSearchService(supabase_client)
-    logger.info("✅ 全局向量搜索服务初始化完成（Supabase pgvector）")
+    logger.info(f"✅ 全局向量搜索服务初始化完成（后端: {_vector_search_service.backend}）")
@@ -12,6 +12,10 @@ Supabase pgvector 向量数据库客户端
 
 import logging
 import asyncio
+import csv
+import io
+import os
+import random
 from typing import Dict, List, Any, Optional, Union
 from supabase import create_client, Client
 import numpy as np
@@ -40,7 +44,13 @@ class SupabaseVectorClient:
         supabase_key: str,
         table_name: str = "knowledge_vectors",
         embedding_dimension: int = 1536,
-        distance_metric: str = "cosine"
+        distance_metric: str = "cosine",
+        upsert_concurrency: int = 4,
+        max_payload_bytes: int = 4 * 1024 * 1024,
+        max_batch_rows: int = 1000,
+        max_retries: int = 3,
+        db_dsn: Optional[str] = None,
+        copy_threshold: int = 20000
     ):
         """
         初始化Supabase向量客户端
@@ -51,11 +61,23 @@ class SupabaseVectorClient:
             table_name: 向量表名
             embedding_dimension: 向量维度
             distance_metric: 距离度量（cosine, l2, inner_product）
+            upsert_concurrency: 批量写入时并发的批次数
+            max_payload_bytes: 单批请求体上限（按估算字节数自适应切批）
+            max_batch_rows: 单批最大行数
+            max_retries: 单批失败重试次数（upsert 幂等，可安全重试）
+            db_dsn: Postgres 直连串（COPY 导入用，默认读 SUPABASE_DB_URL / DATABASE_URL）
+            copy_threshold: 向量数达到该值且配置了 db_dsn 时走 COPY 导入
         """
         self.supabase: Client = create_client(supabase_url, supabase_key)
         self.table_name = table_name
         self.embedding_dimension = embedding_dimension
         self.distance_metric = distance_metric
+        self.upsert_concurrency = upsert_concurrency
+        self.max_payload_bytes = max_payload_bytes
+        self.max_batch_rows = max_batch_rows
+        self.max_retries = max_retries
+        self.db_dsn = db_dsn or os.getenv("SUPABASE_DB_URL") or os.getenv("DATABASE_URL")
+        self.copy_threshold = copy_threshold
         self._init_table()
     
     def _init_table(self):
@@ -118,6 +140,10 @@ class SupabaseVectorClient:
         """
         插入或更新向量
         
+        每批一次多行 upsert 请求；批大小按估算请求体字节数自适应，
+        有限并发发送，失败批次按指数退避重试（on_conflict 幂等）。
+        大批量且配置了 Postgres 直连时改走 COPY 导入。
+        
         Args:
             vectors: 向量列表，每个向量包含：
                 - id: 向量ID
@@ -139,36 +165,181 @@ class SupabaseVectorClient:
                 if len(vector.get("embedding", [])) != self.embedding_dimension:
                     raise ValueError(f"向量维度必须为 {self.embedding_dimension}")
             
-            # 批量插入/更新
-            batch_size = 100
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i:i + batch_size]
-                
-                for vector in batch:
-                    # 准备数据
-                    data = {
-                        "vector_id": vector.get("id"),
-                        "content": vector.get("content", ""),
-                        "metadata": vector.get("metadata", {}),
-                        "embedding": vector.get("embedding"),
-                        "updated_at": datetime.now().isoformat()
-                    }
-                    
-                    # 使用upsert操作
-                    result = self.supabase.table(self.table_name).upsert(
-                        data, 
+            if self.db_dsn and len(vectors) >= self.copy_threshold:
+                return await self.bulk_load_vectors(vectors)
+            
+            # 同一请求内重复 ID 会触发 ON CONFLICT 二次更新错误，保留最后一条
+            now = datetime.now().isoformat()
+            latest = {vector["id"]: vector for vector in vectors}
+            rows = [self._to_row(vector, now) for vector in latest.values()]
+            batches = self._plan_batches(rows)
+            
+            semaphore = asyncio.Semaphore(self.upsert_concurrency)
+            done = 0
+            
+            async def run(batch: List[Dict[str, Any]]) -> bool:
+                nonlocal done
+                async with semaphore:
+                    ok = await self._upsert_batch(batch)
+                done += len(batch)
+                logger.info(f"✅ 已处理 {done}/{len(rows)} 个向量")
+                return ok
+            
+            results = await asyncio.gather(*(run(batch) for batch in batches))
+            failed = sum(len(batch) for batch, ok in zip(batches, results) if not ok)
+            
+            if failed:
+                logger.error(f"❌ 向量插入部分失败: {failed}/{len(rows)} 个向量")
+                return False
+            
+            logger.info(f"✅ 成功插入/更新 {len(vectors)} 个向量（{len(batches)} 批）")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ 向量插入失败: {e}")
+            return False
+    
+    def _to_row(self, vector: Dict[str, Any], updated_at: str) -> Dict[str, Any]:
+        """向量转表行"""
+        embedding = vector.get("embedding")
+        if isinstance(embedding, np.ndarray):
+            embedding = embedding.tolist()
+        return {
+            "vector_id": vector.get("id"),
+            "content": vector.get("content", ""),
+            "metadata": vector.get("metadata", {}),
+            "embedding": embedding,
+            "updated_at": updated_at
+        }
+    
+    def _plan_batches(self, rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """按估算请求体字节数切批（向量部分按首行实测估算，避免逐行序列化）"""
+        embedding_bytes = len(json.dumps(rows[0]["embedding"]))
+        
+        batches: List[List[Dict[str, Any]]] = []
+        batch: List[Dict[str, Any]] = []
+        batch_bytes = 0
+        for row in rows:
+            row_bytes = (
+                embedding_bytes
+                + len(row["content"].encode("utf-8"))
+                + len(json.dumps(row["metadata"], ensure_ascii=False))
+                + 128
+            )
+            if batch and (
+                batch_bytes + row_bytes > self.max_payload_bytes
+                or len(batch) >= self.max_batch_rows
+            ):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(row)
+            batch_bytes += row_bytes
+        if batch:
+            batches.append(batch)
+        
+        return batches
+    
+    async def _upsert_batch(self, batch: List[Dict[str, Any]]) -> bool:
+        """发送单批多行 upsert，失败重试；请求体过大时对半拆分"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.to_thread(
+                    lambda: self.supabase.table(self.table_name).upsert(
+                        batch,
                         on_conflict="vector_id"
                     ).execute()
+                )
+                return True
+                
+            except Exception as e:
+                message = str(e).lower()
+                if len(batch) > 1 and ("413" in message or "too large" in message):
+                    half = len(batch) // 2
+                    logger.warning(f"⚠️ 请求体过大，拆分批次: {len(batch)} -> {half}+{len(batch) - half}")
+                    left, right = await asyncio.gather(
+                        self._upsert_batch(batch[:half]),
+                        self._upsert_batch(batch[half:])
+                    )
+                    return left and right
                 
-                logger.info(f"✅ 已处理 {min(i + batch_size, len(vectors))}/{len(vectors)} 个向量")
+                if attempt >= self.max_retries:
+                    logger.error(f"❌ 批次写入失败({len(batch)}条)，已重试{self.max_retries}次: {e}")
+                    return False
                 
-            logger.info(f"✅ 成功插入/更新 {len(vectors)} 个向量")
+                delay = (2 ** attempt) * 0.5 + random.uniform(0, 0.25)
+                logger.warning(f"⚠️ 批次写入失败，{delay:.1f}s 后重试({attempt + 1}/{self.max_retries}): {e}")
+                await asyncio.sleep(delay)
+        
+        return False
+    
+    async def bulk_load_vectors(self, vectors: List[Dict[str, Any]]) -> bool:
+        """
+        COPY 方式批量导入（需 Postgres 直连）
+        
+        先 COPY 到临时表，再 INSERT ... ON CONFLICT 合并到向量表，单事务完成。
+        """
+        if not self.db_dsn:
+            logger.error("❌ 未配置 Postgres 直连串（SUPABASE_DB_URL / DATABASE_URL），无法 COPY 导入")
+            return False
+        
+        try:
+            await asyncio.to_thread(self._copy_vectors, vectors)
+            logger.info(f"✅ COPY 导入完成: {len(vectors)} 个向量")
             return True
-            
         except Exception as e:
-            logger.error(f"❌ 向量插入失败: {e}")
+            logger.error(f"❌ COPY 导入失败: {e}")
             return False
     
+    def _copy_vectors(self, vectors: List[Dict[str, Any]]) -> None:
+        import psycopg2
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        now = datetime.now().isoformat()
+        for seq, vector in enumerate(vectors):
+            embedding = vector["embedding"]
+            if isinstance(embedding, np.ndarray):
+                embedding = embedding.tolist()
+            writer.writerow([
+                seq,
+                vector["id"],
+                vector.get("content", ""),
+                json.dumps(vector.get("metadata", {}), ensure_ascii=False),
+                "[" + ",".join(repr(float(x)) for x in embedding) + "]",
+                now
+            ])
+        buffer.seek(0)
+        
+        staging = f"{self.table_name}_staging"
+        conn = psycopg2.connect(self.db_dsn)
+        try:
+            with conn, conn.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TEMP TABLE {staging} "
+                    f"(seq BIGINT, vector_id TEXT, content TEXT, metadata JSONB, "
+                    f"embedding VECTOR({self.embedding_dimension}), updated_at TIMESTAMP) "
+                    f"ON COMMIT DROP"
+                )
+                cursor.copy_expert(
+                    f"COPY {staging} (seq, vector_id, content, metadata, embedding, updated_at) "
+                    f"FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+                # 同一 vector_id 出现多次时保留最后一条（与 REST 分批 upsert 的语义一致）
+                cursor.execute(f"""
+                    INSERT INTO {self.table_name} (vector_id, content, metadata, embedding, updated_at)
+                    SELECT DISTINCT ON (vector_id) vector_id, content, metadata, embedding, updated_at
+                    FROM {staging}
+                    ORDER BY vector_id, seq DESC
+                    ON CONFLICT (vector_id) DO UPDATE SET
+                        content = EXCLUDED.content,
+                        metadata = EXCLUDED.metadata,
+                        embedding = EXCLUDED.embedding,
+                        updated_at = EXCLUDED.updated_at
+                """)
+        finally:
+            conn.close()
+    
     async def search_vectors(
         self, 
         query_embedding: List[float], 
@@ -314,25 +485,50 @@ class SupabaseVectorClient:
         self, 
         query_embeddings: List[List[float]], 
         top_k: int = 5,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        metadata_filter: Optional[Dict] = None,
+        max_concurrency: int = 8
     ) -> List[List[Dict[str, Any]]]:
         """
         批量向量搜索
         
+        所有查询向量经 unnest + LATERAL 在一次 RPC 中完成；
+        RPC 不可用时退化为有限并发的逐条查询。
+        
         Args:
             query_embeddings: 查询向量列表
             top_k: 每个查询返回结果数量
             similarity_threshold: 相似度阈值
+            metadata_filter: 元数据过滤条件
+            max_concurrency: 退化模式下的并发查询数
         """
         try:
-            results = []
+            if not query_embeddings:
+                return []
+            
             for query_embedding in query_embeddings:
-                result = await self.search_vectors(
-                    query_embedding, 
-                    top_k, 
-                    similarity_threshold
+                if len(query_embedding) != self.embedding_dimension:
+                    logger.error(f"❌ 查询向量维度错误: {len(query_embedding)} != {self.embedding_dimension}")
+                    return [[] for _ in query_embeddings]
+            
+            try:
+                results = await self._batch_search_single_rpc(
+                    query_embeddings, top_k, similarity_threshold, metadata_filter
                 )
-                results.append(result)
+            except Exception as e:
+                logger.warning(f"⚠️ 批量 RPC 搜索失败，改为并发逐条查询: {e}")
+                semaphore = asyncio.Semaphore(max_concurrency)
+                
+                async def search_one(query_embedding: List[float]) -> List[Dict[str, Any]]:
+                    async with semaphore:
+                        return await self.search_vectors(
+                            query_embedding,
+                            top_k,
+                            similarity_threshold,
+                            metadata_filter
+                        )
+                
+                results = list(await asyncio.gather(*(search_one(q) for q in query_embeddings)))
             
             logger.info(f"🔍 批量搜索完成: {len(query_embeddings)} 个查询")
             return results
@@ -341,6 +537,71 @@ class SupabaseVectorClient:
             logger.error(f"❌ 批量搜索失败: {e}")
             return []
     
+    async def _batch_search_single_rpc(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        similarity_threshold: float,
+        metadata_filter: Optional[Dict]
+    ) -> List[List[Dict[str, Any]]]:
+        """一次 RPC 执行全部查询：unnest(查询向量) WITH ORDINALITY + LATERAL top-k"""
+        distance_op = self._get_distance_operator()
+        
+        params: List[Any] = [
+            ["[" + ",".join(repr(float(x)) for x in q) + "]" for q in query_embeddings],
+            1 - similarity_threshold
+        ]
+        
+        filter_sql = ""
+        if metadata_filter:
+            for key, value in metadata_filter.items():
+                filter_sql += f" AND t.metadata->>'{key}' = %s"
+                params.append(str(value))
+        params.append(top_k)
+        
+        sql = f"""
+        SELECT 
+            q.query_idx,
+            m.vector_id,
+            m.content,
+            m.metadata,
+            m.distance,
+            m.created_at,
+            m.updated_at
+        FROM unnest(%s::text[]) WITH ORDINALITY AS q(embedding, query_idx)
+        CROSS JOIN LATERAL (
+            SELECT 
+                t.vector_id,
+                t.content,
+                t.metadata,
+                t.embedding {distance_op} q.embedding::vector AS distance,
+                t.created_at,
+                t.updated_at
+            FROM {self.table_name} t
+            WHERE t.embedding {distance_op} q.embedding::vector < %s{filter_sql}
+            ORDER BY distance ASC
+            LIMIT %s
+        ) m
+        ORDER BY q.query_idx, m.distance ASC
+        """
+        
+        result = await asyncio.to_thread(
+            lambda: self.supabase.rpc('exec_sql', {'sql': sql, 'params': params}).execute()
+        )
+        
+        results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        for row in result.data or []:
+            results[int(row["query_idx"]) - 1].append({
+                "id": row["vector_id"],
+                "content": row["content"],
+                "metadata": row["metadata"],
+                "similarity": self._calculate_similarity(row["distance"]),
+                "distance": row["distance"],
+                "created_at": row["created_at"],
+                "updated_at": row["updated_at"]
+            })
+        return results
+    
     async def update_vector_metadata(self, vector_id: str, metadata: Dict[str, Any]) -> bool:
         """更新向量元数据"""
         try:
@@ -0,0 +1,79 @@
+"""
+测试共用的替身对象
+FakeClock：可控时钟（clock fixture 替换 time.time）
+FakeRedis：Redis 客户端的最小内存实现（fake_redis fixture），供速率限制、去重等 Redis 后端测试使用
+"""
+import time
+
+import pytest
+
+
+class FakeClock:
+    """可控时钟"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+
+class FakeRedis:
+    """Redis 客户端的最小内存实现（set / get / incr / decr / expire / pipeline）"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def set(self, key, value, ex=None):
+        self.data[key] = str(value)
+        self.expires[key] = ex
+        return True
+
+    def get(self, key):
+        value = self.data.get(key)
+        return str(value) if value is not None else None
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def decr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) - 1
+        return self.data[key]
+
+    def expire(self, key, seconds):
+        self.expires[key] = seconds
+        return True
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+class FakePipeline:
+    """按顺序记录调用，execute 时依次执行"""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
@@ -0,0 +1,177 @@
+"""
+批量调用测试
+覆盖：有界并发、按完成顺序返回、检查点恢复、配额排队、触发器批量接口
+"""
+import asyncio
+import json
+import time
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.ai_gateway.base import BaseLLMProvider
+from modules.ai_gateway.batch import RateLimiter
+from modules.ai_gateway.gateway import AIGateway
+from modules.ai_gateway.types import LLMRequest, LLMResponse, ProviderConfig
+from modules.customer_hub.triggers import TriggerEngine
+
+
+class EchoProvider(BaseLLMProvider):
+    """回显用户消息，记录并发峰值；消息含 fail 时返回错误"""
+
+    def __init__(self, name="qwen", delay=0.01):
+        super().__init__(ProviderConfig(name=name, api_key="k", api_base="", model=name))
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+
+    def generate(self, request):
+        raise AssertionError("网关不应走同步路径")
+
+    async def agenerate(self, request):
+        self.calls.append(request.user_message)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        error = "boom" if "fail" in request.user_message else None
+        return LLMResponse(
+            content="" if error else f"re:{request.user_message}", provider=self.name, model=self.name,
+            token_in=5, token_out=5, token_total=10, latency_ms=1, error=error
+        )
+
+
+def make_gateway(provider, **kwargs):
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False, **kwargs)
+    gateway.providers = [provider]
+    return gateway
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_batch_bounded_concurrency():
+    """并发不超过上限，所有条目都有结果"""
+    provider = EchoProvider()
+    gateway = make_gateway(provider)
+    requests = [LLMRequest(user_message=f"q{i}") for i in range(20)]
+
+    results = asyncio.run(collect(gateway.generate_batch(requests, max_concurrency=4)))
+
+    assert provider.peak == 4
+    assert sorted(r.index for r in results) == list(range(20))
+    assert all(r.ok and r.response.content == f"re:q{r.index}" for r in results)
+
+
+def test_batch_checkpoint_resume(tmp_path):
+    """中断后用同一检查点重跑：已完成的不再调用，失败的条目重试"""
+    checkpoint = str(tmp_path / "job.jsonl")
+    requests = [LLMRequest(user_message=m) for m in ("a", "b", "fail", "d")]
+    ids = ["t1", "t2", "t3", "t4"]
+
+    async def interrupted():
+        results = []
+        async for result in make_gateway(EchoProvider()).generate_batch(
+            requests, ids=ids, max_concurrency=1, checkpoint_path=checkpoint
+        ):
+            results.append(result)
+            if len(results) == 2:
+                break
+        return results
+
+    assert [r.item_id for r in asyncio.run(interrupted())] == ["t1", "t2"]
+
+    provider = EchoProvider()
+    results = asyncio.run(collect(make_gateway(provider).generate_batch(
+        requests, ids=ids, max_concurrency=2, checkpoint_path=checkpoint
+    )))
+
+    assert provider.calls.count("a") == 0 and provider.calls.count("b") == 0
+    assert {r.item_id for r in results if r.resumed} == {"t1", "t2"}
+    assert next(r for r in results if r.item_id == "t3").error
+    with open(checkpoint, encoding="utf-8") as f:
+        assert [json.loads(line)["id"] for line in f] == ["t1", "t2", "t4"]
+
+
+def test_checkpoint_skips_changed_requests(tmp_path):
+    """条目内容变化时检查点不复用"""
+    checkpoint = str(tmp_path / "job.jsonl")
+    asyncio.run(collect(make_gateway(EchoProvider()).generate_batch(
+        [LLMRequest(user_message="old")], ids=["t1"], checkpoint_path=checkpoint
+    )))
+
+    provider = EchoProvider()
+    results = asyncio.run(collect(make_gateway(provider).generate_batch(
+        [LLMRequest(user_message="new")], ids=["t1"], checkpoint_path=checkpoint
+    )))
+
+    assert provider.calls == ["new"]
+    assert results[0].response.content == "re:new"
+
+
+def test_rate_limiter_paces_batch():
+    """批量请求超过 RPM 额度时等待；在线请求只记账"""
+    limiter = RateLimiter(requests_per_minute=600)  # 10 次/秒，桶容量 600
+    limiter._requests = 2
+
+    async def run():
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire(0)
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    assert elapsed >= 0.09
+    assert limiter.get_stats()["waits"] == 1
+
+    limiter.consume(0)
+    assert limiter.get_stats()["available_requests"] < 0.5
+
+
+def test_gateway_rate_limits_corrected_by_usage():
+    """网关按预估扣减 token 额度，响应后用实际用量修正"""
+    gateway = make_gateway(EchoProvider(delay=0), provider_rate_limits={"qwen": {"tpm": 100000}})
+    request = LLMRequest(user_message="充电桩", max_tokens=100)
+
+    asyncio.run(collect(gateway.generate_batch([request])))
+    stats = gateway.get_routing_stats()["rate_limits"]["qwen"]
+
+    assert stats["requests"] == 1
+    assert stats["tokens"] == 10
+    assert stats["available_tokens"] >= 100000 - 10 - 1
+
+
+def test_trigger_batch_through_gateway():
+    """触发器批量接口经网关执行并解析表单"""
+    class FormProvider(EchoProvider):
+        async def agenerate(self, request):
+            response = await super().agenerate(request)
+            response.content = '```json\n{"form": {"报警码": "E103"}, "reply_draft": "收到"}\n```'
+            return response
+
+    engine = TriggerEngine(llm_client=make_gateway(FormProvider()))
+    items = [("t1", "售后", "报警码E103"), ("t2", "售前", "320kW 报价")]
+
+    results = asyncio.run(collect(engine.trigger_batch(items)))
+
+    assert {r["item_id"] for r in results} == {"t1", "t2"}
+    by_id = {r["item_id"]: r for r in results}
+    assert by_id["t1"]["output"].form == {"报警码": "E103"}
+    assert by_id["t2"]["trigger_type"] == "售前"
+
+
+def test_trigger_batch_without_llm():
+    """无 LLM 客户端时逐条使用模拟输出"""
+    results = asyncio.run(collect(TriggerEngine().trigger_batch([("t1", "客户开发", "想聊代理和返点")])))
+
+    assert results[0]["output"].form["线索级别"] == "B"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
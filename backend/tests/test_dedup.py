@@ -0,0 +1,83 @@
+"""
+重复消息检测单元测试
+覆盖：窗口内查重、过期淘汰、从消息表预热、Redis 跨 worker 共享
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.storage.dedup import DuplicateDetector
+from modules.storage.sqlite_pool import SQLiteConnectionManager
+
+
+def test_duplicate_within_window(clock):
+    """窗口内重复，窗口外不重复"""
+    detector = DuplicateDetector()
+    assert detector.is_duplicate("g1", "u1", "你好") is False
+
+    detector.record("g1", "u1", "你好")
+    assert detector.is_duplicate("g1", "u1", "你好", window_seconds=10) is True
+    assert detector.is_duplicate("g1", "u2", "你好", window_seconds=10) is False
+
+    clock.now += 11
+    assert detector.is_duplicate("g1", "u1", "你好", window_seconds=10) is False
+    assert detector.is_duplicate("g1", "u1", "你好", window_seconds=30) is True
+
+
+def test_expired_buckets_evicted(clock):
+    """超过保留时长的指纹整桶淘汰"""
+    detector = DuplicateDetector(retention_seconds=5)
+    for i in range(10):
+        detector.record("g1", "u1", f"消息{i}")
+        clock.now += 1
+
+    stats = detector.get_stats()
+    assert stats["fingerprints"] == 6
+    assert stats["expired"] == 4
+    assert detector.is_duplicate("g1", "u1", "消息9", window_seconds=5) is True
+
+
+def test_warm_from_messages(tmp_path):
+    """从消息表最近记录预热"""
+    manager = SQLiteConnectionManager(str(tmp_path / "test.db"))
+    manager.ensure_schema()
+    now = datetime.now()
+    with manager.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO messages (request_id, group_id, sender_id, user_message, received_at) VALUES (?, ?, ?, ?, ?)",
+            [("r1", "g1", "u1", "旧消息", now - timedelta(minutes=10)),
+             ("r2", "g1", "u1", "新消息", now - timedelta(seconds=3))]
+        )
+
+    detector = DuplicateDetector(retention_seconds=60)
+    rows = manager.connection().execute(
+        "SELECT group_id, sender_id, user_message, received_at FROM messages "
+        "WHERE received_at > ? ORDER BY received_at",
+        (now - timedelta(seconds=60),)
+    ).fetchall()
+    assert detector.warm(tuple(row) for row in rows) == 1
+
+    assert detector.is_duplicate("g1", "u1", "新消息", window_seconds=10) is True
+    assert detector.is_duplicate("g1", "u1", "旧消息", window_seconds=10) is False
+    manager.close_all()
+
+
+def test_redis_shared_between_workers(clock, fake_redis):
+    """一个 worker 记录的消息在另一个 worker 查重可见"""
+    worker_a = DuplicateDetector(backend="redis", redis_client=fake_redis)
+    worker_b = DuplicateDetector(backend="redis", redis_client=fake_redis)
+
+    worker_a.record("g1", "u1", "你好")
+    assert worker_b.is_duplicate("g1", "u1", "你好", window_seconds=10) is True
+    assert list(fake_redis.expires.values()) == [60]
+
+    clock.now += 20
+    assert worker_b.is_duplicate("g1", "u1", "你好", window_seconds=10) is False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
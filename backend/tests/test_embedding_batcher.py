@@ -0,0 +1,123 @@
+"""
+嵌入请求合并器测试
+覆盖：窗口合并、批量上限、同窗口去重、异常分发、SmartEmbeddingService 接入
+"""
+import asyncio
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.embeddings.embedding_batcher import EmbeddingBatcher
+from modules.embeddings.unified_embedding_service import EmbeddingService, SmartEmbeddingService
+
+
+class RecordingBatch:
+    """记录每次批量调用的文本"""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("provider down")
+        return [[float(len(text))] for text in texts]
+
+
+class FakeProvider(EmbeddingService):
+    def __init__(self, max_batch_size=None):
+        self.batch = RecordingBatch()
+        self.max_batch_size = max_batch_size
+
+    async def embed_text(self, text):
+        return (await self.batch([text]))[0]
+
+    async def embed_batch(self, texts):
+        return await self.batch(texts)
+
+    def get_dimension(self):
+        return 1
+
+    def get_provider_name(self):
+        return "ZhipuAI-embedding-2"
+
+
+def test_concurrent_calls_are_coalesced():
+    """同一窗口内的并发请求合并为一次批量调用，且去重"""
+    batch = RecordingBatch()
+    batcher = EmbeddingBatcher(batch, max_batch_size=32, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(text) for text in ["a", "bb", "a", "ccc"]))
+
+    results = asyncio.run(run())
+
+    assert results == [[1.0], [2.0], [1.0], [3.0]]
+    assert batch.calls == [["a", "bb", "ccc"]]
+    assert batcher.get_stats()["deduplicated"] == 1
+
+
+def test_flush_on_max_batch_size():
+    """达到批量上限立即发送"""
+    batch = RecordingBatch()
+    batcher = EmbeddingBatcher(batch, max_batch_size=2, max_wait_ms=1000)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(str(i)) for i in range(4))), timeout=0.5
+        )
+
+    asyncio.run(run())
+    assert [len(call) for call in batch.calls] == [2, 2]
+
+
+def test_errors_fan_out_to_waiters():
+    """批量失败时每个等待者都收到异常"""
+    batcher = EmbeddingBatcher(RecordingBatch(fail=True), max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_smart_service_coalesces_embed_text():
+    """SmartEmbeddingService.embed_text 并发调用走一次 embed_batch"""
+    provider = FakeProvider()
+    service = SmartEmbeddingService(providers={"zhipuai": provider}, enable_cache=False)
+
+    async def run():
+        return await asyncio.gather(*(service.embed_text(f"充电桩故障{i}") for i in range(10)))
+
+    results = asyncio.run(run())
+
+    assert len(results) == 10
+    assert len(provider.batch.calls) == 1
+    assert service.get_stats()["batching"]["ZhipuAI-embedding-2"]["batches"] == 1
+
+
+def test_provider_max_batch_size_caps_requests():
+    """提供商单次请求上限（通义千问 25 条）同时约束请求合并与批量调用"""
+    provider = FakeProvider(max_batch_size=25)
+    service = SmartEmbeddingService(providers={"zhipuai": provider}, enable_cache=False, batch_max_size=32)
+    texts = [f"充电桩故障{i}" for i in range(60)]
+
+    async def run():
+        coalesced = await asyncio.gather(*(service.embed_text(text) for text in texts[:30]))
+        batched = await service.embed_batch(texts)
+        return coalesced, batched
+
+    coalesced, batched = asyncio.run(run())
+
+    assert all(len(call) <= 25 for call in provider.batch.calls)
+    assert len(provider.batch.calls) == 2 + 3
+    assert coalesced == [[float(len(text))] for text in texts[:30]]
+    assert batched == [[float(len(text))] for text in texts]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
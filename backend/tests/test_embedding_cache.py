@@ -0,0 +1,124 @@
+"""
+嵌入缓存测试
+覆盖：键规范化、LRU 淘汰、TTL 过期、SQLite 磁盘层持久化、SmartEmbeddingService 接入
+"""
+import asyncio
+import time
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.embeddings.embedding_cache import EmbeddingCache, make_cache_key
+from modules.embeddings.unified_embedding_service import EmbeddingService, SmartEmbeddingService
+
+
+class FakeProvider(EmbeddingService):
+    """记录调用次数的假提供商"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def embed_text(self, text):
+        self.calls += 1
+        return [float(len(text)), 0.5]
+
+    async def embed_batch(self, texts):
+        self.calls += 1
+        return [[float(len(text)), 0.5] for text in texts]
+
+    def get_dimension(self):
+        return 2
+
+    def get_provider_name(self):
+        return "ZhipuAI-embedding-2"
+
+
+def test_cache_key_normalization():
+    """全角/空白差异归一到同一个键，不同提供商不共用"""
+    assert make_cache_key("p", "充电桩  故障 ") == make_cache_key("p", "充电桩 故障")
+    assert make_cache_key("p", "ＡＢＣ") == make_cache_key("p", "ABC")
+    assert make_cache_key("p", "abc") != make_cache_key("q", "abc")
+
+
+def test_lru_eviction():
+    """超出上限淘汰最久未使用的条目"""
+    cache = EmbeddingCache(max_entries=2, ttl=60)
+    cache.set("a", [1.0])
+    cache.set("b", [2.0])
+    assert cache.get("a") == [1.0]
+    cache.set("c", [3.0])
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_ttl_expiration():
+    """过期条目被真正移除"""
+    cache = EmbeddingCache(max_entries=10, ttl=0)
+    cache.set("a", [1.0])
+    time.sleep(0.01)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """磁盘层跨实例（重启/多 worker）共享"""
+    path = str(tmp_path / "cache.db")
+    first = EmbeddingCache(disk_path=path)
+    first.set("k", [0.25, 0.5])
+    first.close()
+
+    second = EmbeddingCache(disk_path=path)
+    assert second.get("k") == [0.25, 0.5]
+    assert second.get_stats()["disk_hits"] == 1
+    second.close()
+
+
+def test_disk_tier_bounded_and_purged(tmp_path):
+    """磁盘层超过容量时淘汰最早过期的条目，打开时清理过期条目"""
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(max_entries=1, disk_path=path, max_disk_entries=10)
+    for i in range(25):
+        cache.set(f"k{i}", [float(i)])
+
+    assert cache.get_stats()["disk_entries"] <= 10
+    assert cache.get_stats()["disk_evictions"] >= 15
+    assert cache.get("k24") == [24.0]
+    cache.close()
+
+    expired = EmbeddingCache(disk_path=path, disk_ttl=0)
+    expired.set("old", [1.0])
+    expired.close()
+
+    reopened = EmbeddingCache(disk_path=path)
+    assert reopened.get_stats()["disk_entries"] <= 10
+    assert reopened.get("old") is None
+    reopened.close()
+
+
+def test_smart_service_uses_cache():
+    """重复文本不再调用提供商，批量请求只请求未命中的文本"""
+    provider = FakeProvider()
+    service = SmartEmbeddingService(providers={"zhipuai": provider})
+
+    first = asyncio.run(service.embed_text("充电桩无法启动"))
+    second = asyncio.run(service.embed_text("充电桩无法启动 "))
+    assert first == second
+    assert provider.calls == 1
+
+    embeddings = asyncio.run(service.embed_batch(["充电桩无法启动", "充电枪拔不出来"]))
+    assert embeddings[0] == first
+    assert provider.calls == 2
+    assert service.get_stats()["cached_texts"] == 2
+
+    service.clear_cache()
+    assert service.get_stats()["cached_texts"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,88 @@
+"""
+嵌入提供商异步 HTTP 测试
+覆盖：智谱AI/通义千问请求解析、每提供商并发上限（共享连接池）
+"""
+import asyncio
+import json
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+httpx = pytest.importorskip("httpx")
+
+from modules.embeddings import http_client
+from modules.embeddings.unified_embedding_service import ZhipuAIEmbeddingService, QwenEmbeddingService
+
+
+def _install_transport(handler):
+    """在当前事件循环上安装 MockTransport 客户端"""
+    http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    http_client._client_loop = asyncio.get_running_loop()
+
+
+def test_zhipuai_batch_request():
+    """智谱AI批量请求走共享客户端"""
+    def handler(request):
+        payload = json.loads(request.content)
+        assert request.headers["Authorization"] == "Bearer k"
+        return httpx.Response(200, json={
+            "data": [{"embedding": [float(i)]} for i, _ in enumerate(payload["input"])]
+        })
+
+    async def run():
+        _install_transport(handler)
+        provider = ZhipuAIEmbeddingService("k")
+        try:
+            return await provider.embed_batch(["a", "b"])
+        finally:
+            await http_client.close_http_client()
+
+    assert asyncio.run(run()) == [[0.0], [1.0]]
+
+
+def test_qwen_orders_by_text_index():
+    """通义千问按 text_index 还原顺序"""
+    def handler(request):
+        return httpx.Response(200, json={"output": {"embeddings": [
+            {"text_index": 1, "embedding": [1.0]},
+            {"text_index": 0, "embedding": [0.0]}
+        ]}})
+
+    async def run():
+        _install_transport(handler)
+        provider = QwenEmbeddingService("k")
+        try:
+            return await provider.embed_batch(["a", "b"])
+        finally:
+            await http_client.close_http_client()
+
+    assert asyncio.run(run()) == [[0.0], [1.0]]
+
+
+def test_provider_concurrency_limit():
+    """单个提供商的并发请求数不超过上限"""
+    state = {"active": 0, "peak": 0}
+
+    async def handler(request):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return httpx.Response(200, json={"data": [{"embedding": [1.0]}]})
+
+    async def run():
+        _install_transport(handler)
+        provider = ZhipuAIEmbeddingService("k", max_concurrency=2)
+        try:
+            await asyncio.gather(*(provider.embed_text(str(i)) for i in range(6)))
+        finally:
+            await http_client.close_http_client()
+
+    asyncio.run(run())
+    assert state["peak"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,316 @@
+"""
+AI 网关异步调用测试
+覆盖：OpenAI 兼容提供商原生异步调用、网关使用 agenerate 及降级、流式响应、对冲请求
+"""
+import asyncio
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.ai_gateway.base import BaseLLMProvider
+from modules.ai_gateway.gateway import AIGateway
+from modules.ai_gateway.types import LLMRequest, LLMResponse, LLMStreamChunk, ProviderConfig
+
+
+class FakeCompletions:
+    """模拟 AsyncOpenAI chat.completions"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(0)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="您好"), finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=5, completion_tokens=2, total_tokens=7)
+        )
+
+
+class AsyncOnlyProvider(BaseLLMProvider):
+    """只支持异步调用的提供商（同步调用即失败）"""
+
+    def __init__(self, name, content="", error=None):
+        super().__init__(ProviderConfig(name=name, api_key="k", api_base="", model=name))
+        self.content = content
+        self.error = error
+
+    def generate(self, request):
+        raise AssertionError("网关不应走同步路径")
+
+    async def agenerate(self, request):
+        return LLMResponse(
+            content=self.content, provider=self.name, model=self.name,
+            token_in=1, token_out=1, token_total=2, latency_ms=1, error=self.error
+        )
+
+
+def test_openai_compatible_agenerate():
+    """OpenAI 兼容提供商通过异步客户端调用"""
+    pytest.importorskip("openai")
+    from modules.ai_gateway.providers import QwenProvider
+
+    provider = QwenProvider(ProviderConfig(name="qwen", api_key="k", api_base="", model="qwen-turbo"))
+    completions = FakeCompletions()
+    provider.async_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    response = asyncio.run(provider.agenerate(LLMRequest(user_message="充电桩怎么启动")))
+
+    assert response.content == "您好"
+    assert response.provider == "qwen"
+    assert response.token_total == 7
+    assert completions.calls[0]["model"] == "qwen-turbo"
+
+
+def test_openai_compatible_astream():
+    """OpenAI 兼容提供商解析流式事件与末尾用量"""
+    pytest.importorskip("openai")
+    from modules.ai_gateway.providers import DeepSeekProvider
+
+    def event(content=None, finish_reason=None, usage=None):
+        choices = [] if content is None and finish_reason is None else [
+            SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)
+        ]
+        return SimpleNamespace(choices=choices, usage=usage)
+
+    class FakeStream:
+        closed = False
+
+        def __init__(self):
+            self.events = iter([
+                event("您"), event("好"), event(None, "stop"),
+                event(usage=SimpleNamespace(prompt_tokens=9, completion_tokens=2))
+            ])
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self.events)
+            except StopIteration:
+                raise StopAsyncIteration
+
+        async def close(self):
+            FakeStream.closed = True
+
+    class StreamingCompletions:
+        async def create(self, **kwargs):
+            assert kwargs["stream"] is True
+            return FakeStream()
+
+    provider = DeepSeekProvider(ProviderConfig(name="deepseek", api_key="k", api_base="", model="deepseek-chat"))
+    provider.async_client = SimpleNamespace(chat=SimpleNamespace(completions=StreamingCompletions()))
+
+    async def run():
+        return [chunk async for chunk in provider.astream(LLMRequest(user_message="hi"))]
+
+    chunks = asyncio.run(run())
+
+    assert "".join(chunk.delta for chunk in chunks) == "您好"
+    assert chunks[-1].token_in == 9
+    assert FakeStream.closed
+
+
+def test_shared_http_client_per_event_loop():
+    """共享连接池按事件循环创建，关闭后提供商自动换用新的连接池"""
+    pytest.importorskip("openai")
+    from modules.ai_gateway.providers import QwenProvider
+    from modules.ai_gateway.providers.openai_compatible import close_shared_async_http_client
+
+    provider = QwenProvider(ProviderConfig(name="qwen", api_key="k", api_base="", model="qwen-turbo"))
+
+    async def lifespan():
+        first = provider.async_client
+        assert provider.async_client is first
+        await close_shared_async_http_client()
+        second = provider.async_client
+        http_client = second._client
+        await close_shared_async_http_client()
+        return first, second, http_client
+
+    first, second, http_client = asyncio.run(lifespan())
+    assert second is not first
+    assert http_client.is_closed
+
+    async def other_loop():
+        client = provider.async_client
+        await close_shared_async_http_client()
+        return client
+
+    assert asyncio.run(other_loop()) is not second
+
+
+def test_default_agenerate_uses_sync_generate():
+    """未覆盖 agenerate 的提供商走线程池兼容路径"""
+
+    class SyncProvider(BaseLLMProvider):
+        def generate(self, request):
+            return LLMResponse(
+                content="ok", provider="sync", model="m",
+                token_in=0, token_out=0, token_total=0, latency_ms=0
+            )
+
+    provider = SyncProvider(ProviderConfig(name="sync", api_key="k", api_base="", model="m"))
+    assert asyncio.run(provider.agenerate(LLMRequest(user_message="hi"))).content == "ok"
+
+
+def test_gateway_uses_agenerate_with_fallback():
+    """网关原生异步调用，主提供商失败时降级"""
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False)
+    gateway.providers = [
+        AsyncOnlyProvider("primary", error="timeout"),
+        AsyncOnlyProvider("fallback", content="备用回复")
+    ]
+
+    response = asyncio.run(gateway.generate(user_message="充电桩故障"))
+
+    assert response.content == "备用回复"
+    assert response.provider == "fallback"
+
+
+class StreamingProvider(BaseLLMProvider):
+    """按给定片段流式输出，可在指定位置抛出异常"""
+
+    def __init__(self, name, deltas, fail_at=None):
+        super().__init__(ProviderConfig(name=name, api_key="k", api_base="", model=name))
+        self.deltas = deltas
+        self.fail_at = fail_at
+
+    def generate(self, request):
+        raise AssertionError("网关不应走同步路径")
+
+    async def astream(self, request):
+        for i, delta in enumerate(self.deltas):
+            if i == self.fail_at:
+                raise RuntimeError("connection reset")
+            yield LLMStreamChunk(delta=delta)
+        yield LLMStreamChunk(finish_reason="stop", token_in=8, token_out=len(self.deltas))
+
+
+def test_stream_falls_back_before_first_token():
+    """首个片段之前失败时降级，流结束后记账"""
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False)
+    gateway.providers = [
+        StreamingProvider("primary", ["x"], fail_at=0),
+        StreamingProvider("fallback", ["充电", "桩"])
+    ]
+    completed = []
+
+    async def run():
+        stream = await gateway.generate_stream(user_message="充电桩故障", on_complete=completed.append)
+        deltas = [delta async for delta in stream]
+        return stream, deltas
+
+    stream, deltas = asyncio.run(run())
+
+    assert stream.provider == "fallback"
+    assert deltas == ["充电", "桩"]
+    assert completed[0].content == "充电桩"
+    assert completed[0].token_in == 8
+    assert completed[0].finish_reason == "stop"
+    assert completed[0].ttft_ms is not None
+
+
+def test_stream_truncated_after_first_token():
+    """首个片段之后失败：不再降级，截断并记录错误"""
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False)
+    gateway.providers = [
+        StreamingProvider("primary", ["您好", "，请"], fail_at=1),
+        StreamingProvider("fallback", ["备用"])
+    ]
+
+    async def run():
+        stream = await gateway.generate_stream(user_message="充电桩故障")
+        text = await stream.text()
+        return stream, text
+
+    stream, text = asyncio.run(run())
+
+    assert text == "您好"
+    assert stream.response.error == "connection reset"
+
+
+def test_stream_default_astream_wraps_agenerate():
+    """未实现流式的提供商整段输出为单个片段"""
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False)
+    gateway.providers = [AsyncOnlyProvider("primary", content="完整回复")]
+
+    async def run():
+        stream = await gateway.generate_stream(user_message="hi")
+        return [delta async for delta in stream]
+
+    assert asyncio.run(run()) == ["完整回复"]
+
+
+class SlowProvider(AsyncOnlyProvider):
+    """延迟返回，记录是否被取消"""
+
+    def __init__(self, name, content, delay):
+        super().__init__(name, content=content)
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = False
+
+    async def agenerate(self, request):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return await super().agenerate(request)
+
+
+def _hedging_gateway(primary, backup, **kwargs):
+    gateway = AIGateway(
+        enable_smart_routing=False, enable_fallback=False,
+        enable_hedging=True, hedge_default_delay_ms=20, **kwargs
+    )
+    gateway.providers = [primary, backup]
+    return gateway
+
+
+def test_hedge_backup_wins_and_primary_cancelled():
+    """主请求超过对冲延迟，备用先返回，主请求被取消"""
+    primary = SlowProvider("primary", "主回复", delay=1.0)
+    backup = SlowProvider("backup", "备用回复", delay=0.01)
+    gateway = _hedging_gateway(primary, backup)
+
+    response = asyncio.run(gateway.generate(user_message="充电桩故障"))
+
+    assert response.content == "备用回复"
+    assert primary.cancelled
+    assert gateway.get_routing_stats()["hedging"]["routes"]["primary"]["backup_wins"] == 1
+
+
+def test_no_hedge_when_primary_is_fast():
+    """主请求在延迟内返回，不发起对冲"""
+    primary = SlowProvider("primary", "主回复", delay=0)
+    backup = SlowProvider("backup", "备用回复", delay=0)
+    gateway = _hedging_gateway(primary, backup)
+
+    response = asyncio.run(gateway.generate(user_message="充电桩故障"))
+
+    assert response.content == "主回复"
+    assert backup.calls == 0
+
+
+def test_hedge_budget_exhausted():
+    """预算为 0 的路由不对冲，等待主请求"""
+    primary = SlowProvider("primary", "主回复", delay=0.05)
+    backup = SlowProvider("backup", "备用回复", delay=0)
+    gateway = _hedging_gateway(primary, backup, hedge_budgets={"primary": 0.0})
+
+    response = asyncio.run(gateway.generate(user_message="充电桩故障"))
+
+    assert response.content == "主回复"
+    assert backup.calls == 0
+    assert gateway.hedge_budget.get_stats()["primary"]["denied"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
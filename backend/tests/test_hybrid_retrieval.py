@@ -0,0 +1,101 @@
+"""
+混合检索测试
+覆盖：并发召回、RRF/加权融合、单路超时降级
+"""
+import asyncio
+import time
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.rag.retriever import Retriever
+from modules.rag.hybrid_retriever import HybridRetriever
+
+
+class FakeVectorService:
+    """模拟 VectorSearchService.search_similar_documents"""
+    
+    def __init__(self, matches, delay=0.0):
+        self.matches = matches
+        self.delay = delay
+    
+    async def search_similar_documents(self, query, top_k=10, similarity_threshold=0.7,
+                                       metadata_filter=None):
+        await asyncio.sleep(self.delay)
+        return self.matches[:top_k]
+
+
+@pytest.fixture
+def retriever():
+    """带中文语料的检索器"""
+    r = Retriever(top_k=3)
+    r.add_document("手册", "v1", [
+        {"section": "安装", "content": "充电桩安装需要独立供电线路"},
+        {"section": "故障", "content": "报警码E01表示输入过压"},
+        {"section": "价格", "content": "交流桩含税价格请咨询销售"},
+    ])
+    return r
+
+
+def _semantic_match(chunk_id, score, section):
+    return {
+        "id": chunk_id,
+        "score": score,
+        "content": f"{section}内容",
+        "metadata": {"document_name": "手册", "section": section},
+    }
+
+
+def test_rrf_fusion_prefers_consensus(retriever):
+    """测试两路都命中的知识块排在最前"""
+    service = FakeVectorService([
+        _semantic_match("手册_v1_1", 0.82, "故障"),
+        _semantic_match("手册_v1_0", 0.80, "安装"),
+    ])
+    hybrid = HybridRetriever(retriever, service, fusion="rrf")
+    
+    evidences = asyncio.run(hybrid.retrieve("充电桩安装", k=3))
+    
+    assert evidences[0].chunk_id == "手册_v1_0"
+    assert {e.chunk_id for e in evidences} >= {"手册_v1_0", "手册_v1_1"}
+    assert all(0 <= e.score <= 1 for e in evidences)
+
+
+def test_weighted_fusion(retriever):
+    """测试加权融合得分在 0-1 之间且降序"""
+    service = FakeVectorService([_semantic_match("手册_v1_2", 0.95, "价格")])
+    hybrid = HybridRetriever(retriever, service, fusion="weighted",
+                             lexical_weight=0.3, semantic_weight=0.7)
+    
+    evidences = asyncio.run(hybrid.retrieve("价格多少", k=3))
+    
+    assert evidences[0].chunk_id == "手册_v1_2"
+    scores = [e.score for e in evidences]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0 <= s <= 1 for s in scores)
+
+
+def test_semantic_timeout_returns_partial(retriever):
+    """测试语义路超时时返回 BM25 部分结果，耗时受超时约束"""
+    service = FakeVectorService([_semantic_match("x", 0.9, "安装")], delay=1.0)
+    hybrid = HybridRetriever(retriever, service, semantic_timeout=0.05)
+    
+    start = time.perf_counter()
+    evidences = asyncio.run(hybrid.retrieve("报警码E01", k=3))
+    elapsed = time.perf_counter() - start
+    
+    assert elapsed < 0.5
+    assert evidences[0].section == "故障"
+    assert all(e.chunk_id != "x" for e in evidences)
+
+
+def test_invalid_fusion(retriever):
+    """测试不支持的融合方式"""
+    with pytest.raises(ValueError):
+        HybridRetriever(retriever, fusion="max")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
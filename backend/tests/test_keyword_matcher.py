@@ -0,0 +1,98 @@
+"""
+关键词匹配自动机测试
+覆盖：与子串扫描结果一致、重叠关键词、共享注册、缓存、分类器接入
+"""
+import asyncio
+import random
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.nlp.keyword_matcher import KeywordMatcher, get_keyword_matcher
+from modules.ai_gateway.first_turn_router import FirstTurnRouter
+from modules.ai_gateway.smart_router import SmartModelRouter
+from modules.conversation_context.context_manager import DialogueType, IntentClassifier
+
+
+def test_matches_substring_semantics():
+    """随机关键词/文本下与 `kw in text` 计数一致"""
+    rng = random.Random(7)
+    for _ in range(100):
+        keywords = list({
+            "".join(rng.choice("abcd") for _ in range(rng.randint(1, 4)))
+            for _ in range(rng.randint(1, 12))
+        })
+        groups = {"x": keywords, "y": keywords[::2]}
+        matcher = KeywordMatcher(groups)
+        for _ in range(50):
+            text = "".join(rng.choice("abcde") for _ in range(rng.randint(0, 15)))
+            expected = {name: sum(kw in text for kw in kws) for name, kws in groups.items()}
+            assert matcher.count(text) == expected
+
+
+def test_overlapping_chinese_keywords():
+    """重叠/包含关系的中文关键词都命中"""
+    matcher = KeywordMatcher({"q": ["什么", "为什么", "怎么", "怎么办"], "r": ["原因"]})
+
+    assert matcher.count("为什么怎么办都没用，原因呢") == {"q": 4, "r": 1}
+    assert matcher.has("怎么", "q")
+    assert not matcher.has("怎么", "r")
+
+
+def test_shared_registration_and_cache():
+    """相同分组只注册一次；多个视图共享同一次扫描的缓存"""
+    first = get_keyword_matcher({"greeting": ["你好", "您好"]})
+    second = get_keyword_matcher({"greeting": ["你好", "您好"]})
+    other = get_keyword_matcher({"greeting": ["早上好"]})
+
+    assert first is second
+    assert first.count("你好，早上好")["greeting"] == 1
+    assert other.count("你好，早上好")["greeting"] == 1
+    assert other.count("你好")["greeting"] == 0
+    assert first.count("你好")["missing"] == 0
+
+
+def test_smart_router_classification():
+    """智能路由任务分类与复杂度打分"""
+    router = SmartModelRouter()
+
+    assert router._classify_task("帮我总结一下区别") == "summary"
+    assert router._classify_task("帮我排查一下") == "reasoning"
+    assert router._classify_task("多少钱") == "qa"
+    assert router._analyze_complexity("如果报错导致无法充电，为什么？请分析并建议") == pytest.approx(
+        min(len("如果报错导致无法充电，为什么？请分析并建议") / 100, 1.0) * 0.2 + 0.3 + 0.2
+    )
+
+
+def test_first_turn_router_keywords():
+    """首轮路由：转人工优先，业务查询只在命中触发词时匹配正则"""
+    router = FirstTurnRouter()
+
+    transfer = asyncio.run(router.decide("我要投诉，转人工"))
+    order = asyncio.run(router.decide("查一下订单 AB12345678"))
+    plain = asyncio.run(router.decide("充电桩能装在室外吗"))
+
+    assert transfer.suggested_action == "transfer_human"
+    assert order.suggested_action == "query_erp_order"
+    assert "AB12345678" in order.suggested_response
+    assert plain.use_llm
+
+
+def test_intent_classifier():
+    """意图分类：业务（含数字特征）/ 咨询 / 闲聊"""
+    classifier = IntentClassifier()
+
+    business = classifier.classify_detailed("订单 20240101 什么时候发货")
+    consultation = classifier.classify_detailed("这款充电桩支持什么功能？")
+
+    assert business["type"] == DialogueType.BUSINESS
+    assert business["subtype"] == "订单查询"
+    assert consultation["type"] == DialogueType.CONSULTATION
+    assert consultation["subtype"] == "产品咨询"
+    assert classifier.classify("谢谢")[0] == DialogueType.SMALL_TALK
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,159 @@
+"""
+本地向量库测试
+覆盖：upsert/search/delete、元数据预过滤、持久化 mmap 重载、IVF 索引
+"""
+import asyncio
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+np = pytest.importorskip("numpy")
+
+from modules.vector.local_vector_client import LocalVectorClient
+
+
+DIM = 8
+
+
+def _vec(i):
+    v = np.zeros(DIM, dtype=np.float32)
+    v[i % DIM] = 1.0
+    v[(i + 1) % DIM] = 0.1
+    return v.tolist()
+
+
+@pytest.fixture
+def client(tmp_path):
+    """本地向量库 fixture"""
+    return LocalVectorClient(storage_dir=str(tmp_path), embedding_dimension=DIM)
+
+
+def _upsert(client, vectors):
+    return asyncio.run(client.upsert_vectors(vectors))
+
+
+def test_upsert_and_search(client):
+    """测试插入与相似度搜索"""
+    assert _upsert(client, [
+        {"id": f"c{i}", "content": f"内容{i}", "embedding": _vec(i), "metadata": {"doc": "手册" if i < 4 else "价格"}}
+        for i in range(8)
+    ])
+    
+    results = asyncio.run(client.search_vectors(_vec(2), top_k=3, similarity_threshold=0.5))
+    
+    assert results[0]["id"] == "c2"
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+    assert set(results[0]) >= {"id", "content", "metadata", "similarity", "distance"}
+
+
+def test_metadata_prefilter(client):
+    """测试元数据预过滤"""
+    _upsert(client, [
+        {"id": f"c{i}", "content": "", "embedding": _vec(i), "metadata": {"doc": "手册" if i < 4 else "价格"}}
+        for i in range(8)
+    ])
+    
+    results = asyncio.run(client.search_vectors(
+        _vec(2), top_k=3, similarity_threshold=-1.0, metadata_filter={"doc": "价格"}
+    ))
+    
+    assert results
+    assert all(r["metadata"]["doc"] == "价格" for r in results)
+
+
+def test_update_delete_and_reload(client, tmp_path):
+    """测试覆盖写、删除与磁盘重载"""
+    _upsert(client, [{"id": "a", "content": "旧", "embedding": _vec(0)},
+                     {"id": "b", "content": "b", "embedding": _vec(3)}])
+    _upsert(client, [{"id": "a", "content": "新", "embedding": _vec(5)}])
+    asyncio.run(client.delete_vectors(["b"]))
+    assert client.flush()
+    
+    reloaded = LocalVectorClient(storage_dir=str(tmp_path), embedding_dimension=DIM)
+    stats = asyncio.run(reloaded.get_stats())
+    results = asyncio.run(reloaded.search_vectors(_vec(5), top_k=5, similarity_threshold=0.5))
+    
+    assert stats["total_vectors"] == 1
+    assert [r["id"] for r in results] == ["a"]
+    assert results[0]["content"] == "新"
+    assert isinstance(reloaded._matrix, np.memmap)
+
+
+def test_ivf_index(tmp_path):
+    """测试 IVF 索引检索召回"""
+    rng = np.random.default_rng(42)
+    data = rng.normal(size=(400, DIM)).astype(np.float32)
+    client = LocalVectorClient(storage_dir=str(tmp_path), embedding_dimension=DIM,
+                               ivf_min_vectors=100, nprobe=4)
+    _upsert(client, [{"id": str(i), "content": "", "embedding": data[i].tolist()} for i in range(400)])
+    client.flush()
+    
+    stats = asyncio.run(client.get_stats())
+    results = asyncio.run(client.search_vectors(data[17].tolist(), top_k=1, similarity_threshold=0.5))
+    
+    assert stats["index_type"] == "ivf"
+    assert results[0]["id"] == "17"
+
+
+def test_writes_are_coalesced(tmp_path):
+    """测试多次写操作合并为一次落盘"""
+    client = LocalVectorClient(storage_dir=str(tmp_path), embedding_dimension=DIM, persist_interval=60)
+    
+    async def write():
+        for i in range(5):
+            await client.upsert_vectors([{"id": f"c{i}", "content": "", "embedding": _vec(i)}])
+        await client.delete_vectors(["c0"])
+    
+    asyncio.run(write())
+    assert not (tmp_path / "knowledge_vectors" / "embeddings.npy").exists()
+    
+    assert client.flush()
+    assert not client.flush()
+    reloaded = LocalVectorClient(storage_dir=str(tmp_path), embedding_dimension=DIM)
+    assert asyncio.run(reloaded.get_stats())["total_vectors"] == 4
+
+
+def test_ivf_reused_below_drift_threshold(tmp_path):
+    """测试少量新增时沿用 IVF 聚类中心，超过阈值才重新训练"""
+    rng = np.random.default_rng(7)
+    data = rng.normal(size=(520, DIM)).astype(np.float32)
+    client = LocalVectorClient(storage_dir=str(tmp_path), embedding_dimension=DIM,
+                               ivf_min_vectors=100, ivf_retrain_ratio=0.2)
+    _upsert(client, [{"id": str(i), "content": "", "embedding": data[i].tolist()} for i in range(400)])
+    client.flush()
+    centroids = client._centroids.copy()
+    
+    _upsert(client, [{"id": str(i), "content": "", "embedding": data[i].tolist()} for i in range(400, 440)])
+    client.flush()
+    assert np.array_equal(client._centroids, centroids)
+    assert len(client._assign) == 440
+    results = asyncio.run(client.search_vectors(data[420].tolist(), top_k=1, similarity_threshold=0.5))
+    assert results[0]["id"] == "420"
+    
+    _upsert(client, [{"id": str(i), "content": "", "embedding": data[i].tolist()} for i in range(440, 520)])
+    client.flush()
+    assert not np.array_equal(client._centroids, centroids)
+
+
+def test_batch_search_matches_single(client):
+    """测试批量搜索与逐条搜索结果一致"""
+    _upsert(client, [
+        {"id": f"c{i}", "content": "", "embedding": _vec(i), "metadata": {"doc": "手册" if i < 4 else "价格"}}
+        for i in range(8)
+    ])
+    queries = [_vec(1), _vec(6), _vec(3)]
+    
+    batch = asyncio.run(client.batch_search(queries, top_k=2, similarity_threshold=0.0))
+    single = [asyncio.run(client.search_vectors(q, top_k=2, similarity_threshold=0.0)) for q in queries]
+    
+    assert [[r["id"] for r in rs] for rs in batch] == [[r["id"] for r in rs] for rs in single]
+    
+    filtered = asyncio.run(client.batch_search(queries, top_k=2, similarity_threshold=-1.0,
+                                               metadata_filter={"doc": "手册"}))
+    assert all(r["metadata"]["doc"] == "手册" for rs in filtered for r in rs)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,125 @@
+"""
+消息处理流程测试
+覆盖：流式与非流式模式共用 检索 → 网关 流程
+"""
+import asyncio
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+pytest.importorskip("fastapi")
+
+from modules.ai_gateway.types import LLMResponse
+from modules.ai_gateway.streaming import LLMStream
+from modules.api.messages import MessageRequest, MessageService
+from modules.rag.hybrid_retriever import HybridRetriever
+from modules.rag.retriever import Retriever
+
+
+class FakeDatabase:
+    """记录消息写入的数据库"""
+
+    def __init__(self):
+        self.messages = {}
+
+    async def create_message(self, tenant_id, data):
+        self.messages[data["request_id"]] = dict(data)
+
+    async def update_message(self, tenant_id, request_id, data):
+        self.messages[request_id].update(data)
+        return True
+
+
+class FakeVectorService:
+    """返回固定证据的向量检索"""
+
+    def __init__(self):
+        self.queries = []
+
+    async def search_similar_documents(self, query, top_k=10, **kwargs):
+        self.queries.append(query)
+        return [{"id": "c1", "score": 0.9, "content": "充电桩安装步骤", "metadata": {"document_name": "手册"}}]
+
+
+class FakeGateway:
+    """记录调用参数的网关"""
+
+    def __init__(self):
+        self.calls = []
+
+    def _response(self):
+        return LLMResponse(
+            content="请按手册安装", provider="qwen", model="qwen-turbo",
+            token_in=10, token_out=4, token_total=14, latency_ms=5
+        )
+
+    async def generate(self, **kwargs):
+        self.calls.append(kwargs)
+        return self._response()
+
+    async def generate_stream(self, **kwargs):
+        self.calls.append(kwargs)
+        return LLMStream.from_response(self._response())
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_stream_and_non_stream_share_pipeline(stream):
+    """两种模式都先检索证据，再把证据交给网关"""
+    db, gateway = FakeDatabase(), FakeGateway()
+    service = MessageService(db, FakeVectorService(), ai_gateway=gateway)
+    request = MessageRequest(
+        request_id="r1", group_id="g", sender_id="s", user_message="充电桩怎么安装", stream=stream
+    )
+
+    async def run():
+        if stream:
+            return [event async for event in service.stream_message(request)]
+        return await service.process_message(request)
+
+    asyncio.run(run())
+
+    assert gateway.calls[0]["evidence_context"] == "充电桩安装步骤"
+    record = db.messages["r1"]
+    assert record["bot_response"] == "请按手册安装"
+    assert record["evidence_ids"] == ["c1"]
+    assert record["branch"] == "rag"
+    assert record["confidence"] == 0.9
+
+
+def test_retrieve_evidence_uses_hybrid_retriever():
+    """本地知识库已加载时 BM25 与向量两路召回并融合"""
+    retriever = Retriever()
+    retriever.add_document("手册", "v1", [
+        {"section": "安装", "content": "充电桩安装需要独立供电线路"},
+        {"section": "故障", "content": "报警码E01表示输入过压"},
+    ])
+    vector_service = FakeVectorService()
+    service = MessageService(
+        FakeDatabase(), vector_service, hybrid_retriever=HybridRetriever(retriever, vector_service)
+    )
+
+    evidence = asyncio.run(service._retrieve_evidence("充电桩安装"))
+
+    assert vector_service.queries == ["充电桩安装"]
+    assert set(evidence["evidence_ids"]) >= {"手册_v1_0", "c1"}
+    assert "充电桩安装需要独立供电线路" in evidence["evidence_context"]
+    assert evidence["branch"] == "rag"
+
+
+def test_retrieve_evidence_falls_back_to_vector_only():
+    """本地知识库为空时只用向量检索（不返回 BM25 的模拟证据）"""
+    vector_service = FakeVectorService()
+    service = MessageService(
+        FakeDatabase(), vector_service, hybrid_retriever=HybridRetriever(Retriever(), vector_service)
+    )
+
+    evidence = asyncio.run(service._retrieve_evidence("充电桩安装"))
+
+    assert evidence["evidence_ids"] == ["c1"]
+    assert evidence["confidence"] == 0.9
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,147 @@
+"""
+Supabase 异步适配器单元测试（httpx MockTransport 模拟 PostgREST 服务端）
+覆盖：查询参数、插入/更新、计数、统计并发、同步创建会话、跨事件循环复用客户端
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.storage.postgrest import PostgRESTClient, PostgRESTError
+from modules.storage.unified_database import SupabaseAdapter
+
+
+class FakePostgREST:
+    """记录请求并返回固定数据的 PostgREST 服务端"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.requests = []
+        self.counts = {"sessions": 3, "messages": 42}
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        table = request.url.path.rsplit("/", 1)[-1]
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"content-range": f"*/{self.counts[table]}"})
+        if request.method in ("POST", "PATCH"):
+            body = json.loads(request.content)
+            return httpx.Response(201, json=[{"id": 1, **body}])
+        if table == "missing":
+            return httpx.Response(404, json={"message": "relation does not exist"})
+        return httpx.Response(200, json=[{"id": 1, "session_key": "g:u"}])
+
+    async def handle_async(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self.delay)
+        return self.handle(request)
+
+
+def make_adapter(server: FakePostgREST, async_only: bool = False) -> SupabaseAdapter:
+    handler = server.handle_async if async_only else server.handle
+    return SupabaseAdapter("https://demo.supabase.co", "anon", transport=httpx.MockTransport(handler))
+
+
+def test_select_and_filters():
+    """查询参数按 PostgREST 语法构造"""
+    server = FakePostgREST()
+    adapter = make_adapter(server)
+
+    async def run():
+        session = await adapter.get_session("g:u")
+        messages = await adapter.get_messages(session_id="7", limit=5)
+        await adapter.close()
+        return session, messages
+
+    session, messages = asyncio.run(run())
+    assert session["session_key"] == "g:u"
+    assert len(messages) == 1
+
+    request = server.requests[-1]
+    assert request.url.path == "/rest/v1/messages"
+    assert request.url.params["session_id"] == "eq.7"
+    assert request.url.params["order"] == "received_at.desc"
+    assert request.url.params["limit"] == "5"
+    assert request.headers["apikey"] == "anon"
+    assert request.headers["authorization"] == "Bearer anon"
+
+
+def test_insert_and_update():
+    """插入与更新返回记录，更新按 request_id 过滤"""
+    server = FakePostgREST()
+    adapter = make_adapter(server)
+
+    async def run():
+        created = await adapter.create_message({"request_id": "r1", "user_message": "你好"})
+        updated = await adapter.update_message("r1", {"status": "answered"})
+        return created, updated
+
+    created, updated = asyncio.run(run())
+    assert created["request_id"] == "r1"
+    assert updated is True
+
+    patch = server.requests[-1]
+    assert patch.method == "PATCH"
+    assert patch.url.params["request_id"] == "eq.r1"
+    assert patch.headers["prefer"] == "return=representation"
+
+
+def test_get_stats_runs_concurrently():
+    """统计的两个计数请求并发执行"""
+    server = FakePostgREST(delay=0.2)
+
+    async def run():
+        # 在事件循环中构造：连接验证转为后台任务
+        adapter = make_adapter(server, async_only=True)
+        start = time.perf_counter()
+        stats = await adapter.get_stats()
+        return stats, time.perf_counter() - start
+
+    stats, elapsed = asyncio.run(run())
+    assert stats["session_count"] == 3
+    assert stats["message_count"] == 42
+    assert elapsed < 0.35
+    assert all(r.headers["prefer"] == "count=exact" for r in server.requests if r.method == "HEAD")
+
+
+def test_create_session_sync():
+    """同步创建会话不依赖事件循环"""
+    server = FakePostgREST()
+    adapter = make_adapter(server)
+
+    session = adapter.create_session_sync({"session_key": "g:u", "group_id": "g", "sender_id": "u"})
+    assert session["session_key"] == "g:u"
+    assert server.requests[-1].method == "POST"
+
+
+def test_client_per_event_loop():
+    """每个事件循环使用各自的连接池"""
+    server = FakePostgREST()
+    client = PostgRESTClient("https://demo.supabase.co", "anon", transport=httpx.MockTransport(server.handle))
+
+    async def count():
+        return await client.count("messages"), client._async_client()
+
+    first_count, first_client = asyncio.run(count())
+    second_count, second_client = asyncio.run(count())
+    assert first_count == second_count == 42
+    assert first_client is not second_client
+
+
+def test_error_status_raises():
+    """HTTP 错误转为 PostgRESTError"""
+    server = FakePostgREST()
+    client = PostgRESTClient("https://demo.supabase.co", "anon", transport=httpx.MockTransport(server.handle))
+
+    with pytest.raises(PostgRESTError) as exc:
+        asyncio.run(client.select("missing"))
+    assert exc.value.status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
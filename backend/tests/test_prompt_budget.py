@@ -0,0 +1,153 @@
+"""
+提示词预算测试
+覆盖：按模型族计数与缓存、消息格式开销、按优先级裁剪历史与证据、网关调用前裁剪、上下文筛选
+"""
+import asyncio
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.ai_gateway.base import BaseLLMProvider
+from modules.ai_gateway.gateway import AIGateway
+from modules.ai_gateway.prompt_budget import PromptBudgeter
+from modules.ai_gateway.types import LLMRequest, LLMResponse, ProviderConfig
+from modules.nlp.token_counter import TOKENS_PER_MESSAGE, TOKENS_PER_REPLY, TokenCounter
+
+
+def test_counter_families_and_cache():
+    """不同模型族按各自比例计数，相同文本只计一次"""
+    counter = TokenCounter()
+
+    assert counter.family("qwen-turbo") == "qwen"
+    assert counter.family("Qwen-text-embedding-v2") == "qwen"
+    assert counter.family("deepseek-chat") == "deepseek"
+    assert counter.family("gpt-4o-mini") == "openai-o200k"
+    assert counter.count("充电桩" * 10, "deepseek-chat") == 18
+    assert counter.count("hello world", "deepseek-chat") == 3
+
+    counter.count("充电桩" * 10, "deepseek-chat")
+    assert counter.cache_info().hits == 1
+
+
+def test_registered_tokenizer_is_exact():
+    """挂接真实分词器后按其结果计数"""
+    counter = TokenCounter()
+    counter.register_tokenizer("glm", lambda text: text.split())
+
+    assert counter.is_exact("glm-4-flash")
+    assert counter.count("a b c d", "glm-4-flash") == 4
+    assert counter.count_messages(
+        [{"role": "user", "content": "a b"}], "glm-4-flash"
+    ) == TOKENS_PER_REPLY + TOKENS_PER_MESSAGE + 2
+
+
+def make_budgeter():
+    counter = TokenCounter()
+    counter.register_tokenizer("qwen", list)  # 每个字符 1 token，便于精确断言
+    return PromptBudgeter(counter)
+
+
+def test_fit_trims_in_priority_order():
+    """超预算时保留最近历史 > 证据（按排序）> 更早历史"""
+    budgeter = make_budgeter()
+    history = [{"role": "user", "content": "a" * 50}, {"role": "assistant", "content": "b" * 50},
+               {"role": "user", "content": "c" * 50}]
+    request = LLMRequest(
+        user_message="q" * 10,
+        session_history=history,
+        evidence_context="\n\n".join(["e" * 40, "f" * 40, "g" * 40])
+    )
+    full = budgeter.count(request, "qwen-turbo")
+
+    trimmed, budget = budgeter.fit(request, "qwen-turbo", max_input_tokens=full - 50)
+
+    assert [turn["content"][0] for turn in trimmed.session_history] == ["b", "c"]
+    assert trimmed.evidence_context == "\n\n".join(["e" * 40, "f" * 40, "g" * 40])
+    assert budget.history_dropped == 1 and budget.evidence_dropped == 0
+
+    trimmed, budget = budgeter.fit(request, "qwen-turbo", max_input_tokens=full - 150)
+
+    assert [turn["content"][0] for turn in trimmed.session_history] == ["c"]
+    assert trimmed.evidence_context == "\n\n".join(["e" * 40, "f" * 40])
+    assert budget.input_tokens == budgeter.count(trimmed, "qwen-turbo")
+    assert budget.input_tokens <= full - 150
+
+
+def test_fit_within_budget_returns_original():
+    """预算内不裁剪，报告分项 token 数"""
+    budgeter = make_budgeter()
+    request = LLMRequest(user_message="充电桩", evidence_context="资料")
+
+    fitted, budget = budgeter.fit(request, "qwen-turbo", max_input_tokens=1000, system_prompt="客服")
+
+    assert fitted is request
+    assert budget.breakdown == {"system": 2, "history": 0, "evidence": 2, "question": 3}
+    assert not budget.trimmed
+
+
+class RecordingProvider(BaseLLMProvider):
+    """记录收到的请求"""
+
+    def __init__(self):
+        super().__init__(ProviderConfig(name="qwen", api_key="k", api_base="", model="qwen-turbo"))
+        self.requests = []
+
+    def _get_default_system_prompt(self):
+        return "客服"
+
+    def generate(self, request):
+        raise AssertionError("网关不应走同步路径")
+
+    async def agenerate(self, request):
+        self.requests.append(request)
+        return LLMResponse(content="ok", provider="qwen", model="qwen-turbo",
+                           token_in=1, token_out=1, token_total=2, latency_ms=1)
+
+
+def test_gateway_fits_prompt_before_call():
+    """网关调用前按预算裁剪并在响应中报告预计输入 token 数"""
+    provider = RecordingProvider()
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False, max_input_tokens=120)
+    gateway.providers = [provider]
+    history = [{"role": "user", "content": "旧问题" * 100}, {"role": "assistant", "content": "回答"}]
+
+    response = asyncio.run(gateway.generate("充电桩多少钱", session_history=history))
+
+    sent = provider.requests[0]
+    assert [turn["content"] for turn in sent.session_history] == ["回答"]
+    assert response.prompt_budget["history_dropped"] == 1
+    assert response.prompt_budget["input_tokens"] <= 120
+
+
+def test_gateway_counts_provider_system_prompt():
+    """按提供商实际发送的系统指令计数（OpenAIProvider 覆盖了默认指令）"""
+    from modules.ai_gateway.providers import OpenAIProvider
+
+    provider = OpenAIProvider(ProviderConfig(name="openai", api_key="k", api_base="", model="gpt-4o-mini"))
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False)
+    request = LLMRequest(user_message="充电桩多少钱")
+
+    _, budget = gateway._fit_prompt(provider, request)
+
+    sent_system = provider._build_messages(request)[0]["content"]
+    assert sent_system == provider._get_default_system_prompt()
+    assert budget.breakdown["system"] == gateway.prompt_budgeter.counter.count(sent_system, "gpt-4o-mini")
+
+
+def test_relevant_context_uses_token_counts():
+    """上下文筛选按 token 数从最早的消息开始丢弃"""
+    from modules.conversation_context.context_manager import ContextManager, DialogueType
+
+    manager = ContextManager()
+    for message in ["充电桩" * 100, "怎么安装", "需要什么条件"]:
+        manager.add_message("c1", message, "user")
+
+    context = manager.get_relevant_context("c1", DialogueType.BUSINESS, max_tokens=50)
+
+    assert [msg["content"] for msg in context] == ["怎么安装", "需要什么条件"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,152 @@
+"""
+提供商熔断与并发限制测试
+覆盖：熔断后快速跳过、错误率/慢调用熔断、并发排队与拒绝、健康检查
+"""
+import asyncio
+import time
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.ai_gateway.base import BaseLLMProvider
+from modules.ai_gateway.circuit_breaker import CircuitBreaker
+from modules.ai_gateway.concurrency import ConcurrencyLimiter, ProviderOverloaded
+from modules.ai_gateway.gateway import AIGateway
+from modules.ai_gateway.types import LLMResponse, ProviderConfig
+
+
+class CountingProvider(BaseLLMProvider):
+    """记录调用次数，可模拟失败与延迟"""
+
+    def __init__(self, name, error=None, delay=0.0):
+        super().__init__(ProviderConfig(name=name, api_key="k", api_base="", model=name))
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    def generate(self, request):
+        raise AssertionError("网关不应走同步路径")
+
+    async def agenerate(self, request):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return LLMResponse(
+            content="" if self.error else "ok", provider=self.name, model=self.name,
+            token_in=1, token_out=1, token_total=2, latency_ms=1, error=self.error
+        )
+
+
+def make_gateway(primary, fallback, **kwargs):
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False, **kwargs)
+    gateway.providers = [primary, fallback]
+    return gateway
+
+
+def test_open_breaker_skips_provider():
+    """连续失败熔断后不再调用该提供商，直接走备用"""
+    dead = CountingProvider("dead", error="timeout")
+    backup = CountingProvider("backup")
+    gateway = make_gateway(dead, backup, breaker_failure_threshold=2)
+
+    async def run():
+        return [await gateway.generate("充电桩故障") for _ in range(5)]
+
+    responses = asyncio.run(run())
+
+    assert all(r.provider == "backup" for r in responses)
+    assert dead.calls == 2
+    assert backup.calls == 5
+    circuit = gateway.health_check()["providers"][0]["circuit"]
+    assert circuit["state"] == "open"
+    assert circuit["rejected"] == 3
+
+
+def test_error_rate_trips_breaker():
+    """错误率达到阈值时熔断（即使没有连续失败）"""
+    breaker = CircuitBreaker(failure_threshold=100, error_rate_threshold=0.5, window_size=10, min_calls=4)
+    for success in (True, False, True, False):
+        assert breaker.state == "closed"
+        breaker.record_result(success)
+
+    assert breaker.state == "open"
+    assert breaker.get_stats()["trips"] == 1
+
+
+def test_slow_calls_count_as_failures():
+    """超过慢调用阈值的成功调用按失败计"""
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_ms=1000)
+    breaker.record_result(True, latency_ms=200)
+    breaker.record_result(True, latency_ms=5000)
+    breaker.record_result(True, latency_ms=5000)
+
+    assert breaker.state == "open"
+    assert breaker.get_stats()["slow_calls"] == 2
+
+
+def test_half_open_probe_released_when_not_called():
+    """放行的探测请求未实际调用时归还名额"""
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.allow_request()
+
+
+def test_limiter_queue_and_reject():
+    """超过并发数的请求排队，队列满立即拒绝，排队超时按过载处理"""
+    limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+
+    async def hold(seconds):
+        async with limiter:
+            await asyncio.sleep(seconds)
+
+    async def run():
+        first = asyncio.ensure_future(hold(0.02))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(hold(0))
+        await asyncio.sleep(0)
+        with pytest.raises(ProviderOverloaded):
+            await limiter.acquire()
+        await asyncio.gather(first, second)
+
+        blocker = asyncio.ensure_future(hold(0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(ProviderOverloaded):
+            await limiter.acquire()
+        await blocker
+
+    asyncio.run(run())
+    stats = limiter.get_stats()
+
+    assert stats["active"] == 0 and stats["waiting"] == 0
+    assert stats["rejected"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["admitted"] == 3
+
+
+def test_gateway_overload_falls_back():
+    """提供商并发与排队已满时请求立即降级到备用"""
+    slow = CountingProvider("slow", delay=0.05)
+    backup = CountingProvider("backup")
+    gateway = make_gateway(slow, backup, provider_max_concurrency=1, provider_max_queue=0)
+
+    async def run():
+        return await asyncio.gather(*(gateway.generate("充电桩多少钱") for _ in range(3)))
+
+    responses = asyncio.run(run())
+
+    assert [r.provider for r in responses].count("slow") == 1
+    assert backup.calls == 2
+    status = gateway.health_check()["providers"][0]
+    assert status["concurrency"]["rejected"] == 2
+    assert status["circuit"]["state"] == "closed"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -3,12 +3,14 @@ RAG 与置信度分流测试
 覆盖：三段阈值、证据格式化
 """
 import pytest
+import sqlite3
 from pathlib import Path
 
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from modules.rag.retriever import Retriever, Evidence
+from modules.rag.bm25_index import BM25Index
 
 
 @pytest.fixture
@@ -221,5 +223,166 @@ def test_retriever_stub_behavior(retriever):
         assert abs(e1.score - e2.score) < 0.01  # 得分应该接近
 
 
+def test_bm25_index_ranking():
+    """测试 BM25 倒排索引排序与归一化得分"""
+    index = BM25Index(tokenizer=lambda text: text.lower().split())
+    index.add("charger install guide wall mount")
+    index.add("charger fault code e01 reset")
+    index.add("price list for dealers")
+    
+    hits = index.search("install charger", topn=2)
+    
+    assert [doc_id for doc_id, _ in hits][0] == 0
+    assert len(hits) == 2
+    assert all(0 < score <= 1 for _, score in hits)
+    assert hits[0][1] >= hits[1][1]
+    assert index.search("unknown words", topn=3) == []
+
+
+def test_bm25_index_incremental_keywords():
+    """测试增量添加与关键词加权"""
+    index = BM25Index(tokenizer=lambda text: text.lower().split())
+    index.add("reset steps for the charger")
+    assert index.search("reset", topn=5)[0][0] == 0
+    
+    # 新文档带人工关键词，应排在前面
+    index.add("power cycle the unit", keywords=["reset"])
+    hits = index.search("reset", topn=5)
+    assert [doc_id for doc_id, _ in hits] == [1, 0]
+
+
+def test_retriever_with_corpus():
+    """测试加载语料后走倒排索引检索"""
+    retriever = Retriever(top_k=2)
+    retriever.add_document("manual", "v1.0", [
+        {"section": "install", "content": "install the charger on a wall"},
+        {"section": "fault", "content": "fault e01 means over voltage"},
+    ])
+    
+    evidences = retriever.retrieve("fault e01", k=2)
+    
+    assert len(evidences) == 1
+    assert evidences[0].section == "fault"
+    assert evidences[0].chunk_id == "manual_v1.0_1"
+    assert 0 < evidences[0].score <= 1
+
+
+def test_retriever_chinese_corpus():
+    """测试中文语料检索（无空格文本走 n-gram 分词）"""
+    retriever = Retriever(top_k=3)
+    retriever.add_document("充电桩手册", "v2.0", [
+        {"section": "安装", "content": "交流充电桩安装前请确认供电线路满足要求"},
+        {"section": "故障", "content": "报警码E01表示过压，请检查输入电压"},
+        {"section": "价格", "content": "7kW交流桩含税价格请咨询销售"},
+    ])
+    
+    evidences = retriever.retrieve("充电桩怎么安装？", k=3)
+    assert evidences[0].section == "安装"
+    
+    evidences = retriever.retrieve("出现报警码E01", k=3)
+    assert evidences[0].section == "故障"
+
+
+def test_retriever_realistic_question_confidence():
+    """测试真实问题命中相关知识块时置信度达到默认阈值（未登录的 n-gram 不拉低得分）"""
+    retriever = Retriever()
+    retriever.add_document("充电桩手册", "v2.0", [
+        {"section": "安装", "content": "交流充电桩安装前请确认供电线路满足要求，安装步骤：固定桩体、接线、通电测试"},
+        {"section": "故障", "content": "报警码E01表示过压，请检查输入电压"},
+        {"section": "价格", "content": "7kW交流桩含税价格请咨询销售"},
+        {"section": "会员", "content": "会员充电享受九折优惠"},
+    ])
+    
+    evidences = retriever.retrieve("充电桩怎么安装？")
+    
+    assert evidences[0].section == "安装"
+    assert retriever.calculate_confidence(evidences) >= retriever.min_confidence
+    # 只命中个别词的知识块仍低于阈值
+    assert all(e.score < retriever.min_confidence for e in evidences[1:])
+
+
+def test_retriever_off_topic_single_shared_term():
+    """测试离题问题只与知识库共享一个词时置信度远低于阈值"""
+    retriever = Retriever()
+    retriever.add_document("充电桩手册", "v2.0", [
+        {"section": "安装", "content": "交流充电桩安装前请确认供电线路满足要求，安装步骤：固定桩体、接线、通电测试"},
+        {"section": "价格", "content": "7kW交流桩含税价格请咨询销售"},
+        {"section": "会员", "content": "会员充电享受九折优惠"},
+    ])
+
+    for question in ["明天下雨吗销售", "请帮我写一首诗关于安装"]:
+        evidences = retriever.retrieve(question)
+        assert retriever.calculate_confidence(evidences) < 0.5
+
+
+def test_retriever_bm25_topn_caps_recall():
+    """测试召回数量不超过 bm25_topn"""
+    retriever = Retriever(bm25_topn=2)
+    retriever.add_document("manual", "v1.0", [
+        {"content": f"charger install step {i}"} for i in range(5)
+    ])
+    
+    assert len(retriever.retrieve("charger install", k=5)) == 2
+
+
+def test_corpus_store_roundtrip(tmp_path):
+    """测试语料库写出后 mmap 加载，检索结果与内存索引一致"""
+    retriever = Retriever(top_k=3)
+    retriever.add_document("充电桩手册", "v2.0", [
+        {"section": "安装", "content": "交流充电桩安装前请确认供电线路", "keywords": ["安装"]},
+        {"section": "故障", "content": "报警码E01表示过压，请检查输入电压"},
+    ])
+    retriever.add_document("价格表", "v1.0", [
+        {"section": "报价", "content": "7kW交流桩含税价格请咨询销售"},
+    ])
+    expected = retriever.retrieve("充电桩安装电压", k=3)
+    
+    corpus_path = str(tmp_path / "kb.corpus")
+    retriever.save_corpus_store(corpus_path)
+    
+    mapped = Retriever(top_k=3)
+    mapped.load_corpus_store(corpus_path)
+    actual = mapped.retrieve("充电桩安装电压", k=3)
+    
+    assert [e.chunk_id for e in actual] == [e.chunk_id for e in expected]
+    assert all(abs(a.score - e.score) < 1e-5 for a, e in zip(actual, expected))
+    assert actual[0].document_name == expected[0].document_name
+    assert actual[0].keywords == expected[0].keywords
+    
+    # 只读映射上追加文档：自动物化后继续可用
+    mapped.add_document("补充", "v1.0", [{"content": "固件升级步骤"}])
+    assert mapped.retrieve("固件升级", k=1)[0].document_name == "补充"
+
+
+def test_load_knowledge_base_with_corpus_file(tmp_path):
+    """测试从 SQLite 加载时生成并映射语料库文件"""
+    db_path = str(tmp_path / "kb.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE knowledge_chunks (chunk_id TEXT PRIMARY KEY, document_name TEXT, "
+        "document_version TEXT, section TEXT, content TEXT, keywords TEXT)"
+    )
+    conn.execute(
+        "INSERT INTO knowledge_chunks VALUES (?, ?, ?, ?, ?, ?)",
+        ("c1", "手册", "v1", "安装", "充电桩安装说明", "安装,接线")
+    )
+    conn.commit()
+    conn.close()
+    
+    corpus_path = str(tmp_path / "kb.corpus")
+    retriever = Retriever()
+    retriever.load_knowledge_base(db_path, corpus_path=corpus_path)
+    
+    assert Path(corpus_path).exists()
+    evidences = retriever.retrieve("怎么安装", k=1)
+    assert evidences[0].chunk_id == "c1"
+    assert evidences[0].keywords == ["安装", "接线"]
+    
+    # 第二个进程直接映射已有文件
+    other = Retriever()
+    other.load_knowledge_base(db_path, corpus_path=corpus_path)
+    assert other.retrieve("怎么安装", k=1)[0].chunk_id == "c1"
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
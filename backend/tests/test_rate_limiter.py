@@ -0,0 +1,89 @@
+"""
+滑动窗口速率限制单元测试
+覆盖：窗口内计数、超限拒绝、窗口滑动、过期清理、异步接口、Redis 共享计数
+"""
+import asyncio
+from pathlib import Path
+
+import pytest
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.storage.rate_limiter import SlidingWindowRateLimiter
+
+
+def test_counts_and_rejects(clock):
+    """窗口内按次计数，超限拒绝且不计数"""
+    limiter = SlidingWindowRateLimiter()
+    for i in range(3):
+        assert limiter.check("user", "u1", limit=3, window_seconds=60) == (True, i + 1)
+
+    assert limiter.check("user", "u1", limit=3, window_seconds=60) == (False, 3)
+    assert limiter.check("user", "u2", limit=3, window_seconds=60) == (True, 1)
+    assert limiter.get_stats()["rejected"] == 1
+
+
+def test_window_slides(clock):
+    """上一窗口的计数按剩余比例衰减"""
+    limiter = SlidingWindowRateLimiter()
+    clock.now = 600.0  # 窗口起点
+    for _ in range(4):
+        limiter.check("user", "u1", limit=4, window_seconds=60)
+    assert limiter.check("user", "u1", limit=4, window_seconds=60)[0] is False
+
+    # 下一窗口过去一半：上一窗口 4 次按 50% 计 2 次
+    clock.now = 690.0
+    assert limiter.check("user", "u1", limit=4, window_seconds=60) == (True, 3)
+    assert limiter.check("user", "u1", limit=4, window_seconds=60) == (True, 4)
+    assert limiter.check("user", "u1", limit=4, window_seconds=60)[0] is False
+
+    # 两个窗口之后完全清零
+    clock.now = 800.0
+    assert limiter.check("user", "u1", limit=4, window_seconds=60) == (True, 1)
+
+
+def test_expired_windows_swept(clock):
+    """过期窗口被自动清理"""
+    limiter = SlidingWindowRateLimiter(sweep_interval=10)
+    for i in range(9):
+        limiter.check("user", f"u{i}", limit=5, window_seconds=10)
+    assert limiter.get_stats()["tracked_entities"] == 9
+
+    clock.now += 100
+    limiter.check("user", "fresh", limit=5, window_seconds=10)
+    stats = limiter.get_stats()
+    assert stats["tracked_entities"] == 1
+    assert stats["expired"] == 9
+
+
+def test_async_check(clock):
+    """异步接口与同步接口共享计数"""
+    limiter = SlidingWindowRateLimiter()
+    limiter.check("group", "g1", limit=2, window_seconds=60)
+    assert asyncio.run(limiter.acheck("group", "g1", limit=2, window_seconds=60)) == (True, 2)
+    assert asyncio.run(limiter.acheck("group", "g1", limit=2, window_seconds=60)) == (False, 2)
+
+
+def test_redis_shared_counts(clock, fake_redis):
+    """多个实例通过 Redis 共享计数，超限时回退自增"""
+    worker_a = SlidingWindowRateLimiter(backend="redis", redis_client=fake_redis)
+    worker_b = SlidingWindowRateLimiter(backend="redis", redis_client=fake_redis)
+
+    assert worker_a.check("user", "u1", limit=2, window_seconds=60) == (True, 1)
+    assert worker_b.check("user", "u1", limit=2, window_seconds=60) == (True, 2)
+    assert worker_a.check("user", "u1", limit=2, window_seconds=60) == (False, 2)
+
+    assert list(fake_redis.data.values()) == [2]
+    assert list(fake_redis.expires.values()) == [120]
+
+
+def test_redis_unavailable_falls_back(clock):
+    """Redis 不可用时回退到进程内计数"""
+    limiter = SlidingWindowRateLimiter(backend="redis", redis_url="redis://127.0.0.1:1/0")
+    assert limiter.backend == "memory"
+    assert limiter.check("user", "u1", limit=1, window_seconds=60) == (True, 1)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,273 @@
+"""
+网关响应缓存测试
+覆盖：规范化精确命中、证据指纹、近似命中、租户隔离、LRU/TTL、知识块失效、网关接入
+"""
+import asyncio
+import numpy as np
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.ai_gateway.base import BaseLLMProvider
+from modules.ai_gateway.gateway import AIGateway
+from modules.ai_gateway.response_cache import ResponseCache, normalize_question
+from modules.ai_gateway.types import LLMResponse, ProviderConfig
+from modules.rag.retriever import Retriever
+from modules.vector.supabase_vector import VectorSearchService
+
+
+def _response(content="7kW 单相", error=None):
+    return LLMResponse(
+        content=content, provider="qwen", model="qwen-turbo",
+        token_in=100, token_out=20, token_total=120, latency_ms=1500, error=error
+    )
+
+
+async def fake_embedder(text):
+    """按关键词构造向量：含"功率"的问题彼此相似"""
+    return [1.0 if "功率" in text else 0.0, 1.0 if "价格" in text else 0.0, 0.1]
+
+
+def test_normalize_question():
+    """全角/大小写/空白/标点不影响命中"""
+    assert normalize_question(" 支持多少功率？ ") == normalize_question("支持多少功率")
+    assert normalize_question("ＡＢＣ，充电") == "abc充电"
+
+
+def test_exact_hit_requires_same_evidence():
+    """相同问题、相同证据集合（顺序无关）命中；证据不同则不命中"""
+    cache = ResponseCache()
+
+    async def run():
+        await cache.store("多少钱？", _response("199元"), evidence_ids=["c1", "c2"])
+        hit = await cache.lookup("多少钱", evidence_ids=["c2", "c1"])
+        miss = await cache.lookup("多少钱", evidence_ids=["c3"])
+        return hit, miss
+
+    hit, miss = asyncio.run(run())
+
+    assert hit.match == "exact"
+    assert hit.response.content == "199元"
+    assert miss is None
+
+
+def test_semantic_hit_and_tenant_isolation():
+    """相似问题近似命中；不同租户互不可见"""
+    cache = ResponseCache(embedder=fake_embedder, similarity_threshold=0.9)
+
+    async def run():
+        await cache.store("支持多少功率", _response(), evidence_ids=["c1"], tenant="t1")
+        near = await cache.lookup("最大功率是多少", evidence_ids=["c1"], tenant="t1")
+        other = await cache.lookup("最大功率是多少", evidence_ids=["c1"], tenant="t2")
+        unrelated = await cache.lookup("价格多少", evidence_ids=["c1"], tenant="t1")
+        return near, other, unrelated
+
+    near, other, unrelated = asyncio.run(run())
+
+    assert near.match == "semantic"
+    assert near.similarity >= 0.9
+    assert other is None
+    assert unrelated is None
+
+
+def test_lru_and_ttl_eviction():
+    """超过条数淘汰最久未用的条目；过期条目不命中"""
+    cache = ResponseCache(max_entries=2)
+
+    async def run():
+        await cache.store("问题一", _response())
+        await cache.store("问题二", _response())
+        await cache.lookup("问题一")
+        await cache.store("问题三", _response())
+        return await cache.lookup("问题一"), await cache.lookup("问题二")
+
+    first, second = asyncio.run(run())
+    assert first is not None
+    assert second is None
+    assert cache.get_stats()["evictions"] == 1
+
+    expired = ResponseCache(ttl=0)
+    asyncio.run(expired.store("问题", _response()))
+    assert asyncio.run(expired.lookup("问题")) is None
+
+
+def test_invalidate_chunks_and_stale_store():
+    """知识块变更只失效依赖它的条目；失效前发起的写入被丢弃"""
+    cache = ResponseCache()
+
+    async def run():
+        await cache.store("怎么安装", _response(), evidence_ids=["install_1"])
+        await cache.store("多少钱", _response(), evidence_ids=["price_1"])
+        generation = cache.generation
+        cache.invalidate_chunks(["install_1"])
+        stored = await cache.store("保修多久", _response(), generation=generation)
+        return (
+            await cache.lookup("怎么安装", evidence_ids=["install_1"]),
+            await cache.lookup("多少钱", evidence_ids=["price_1"]),
+            stored
+        )
+
+    install, price, stored = asyncio.run(run())
+
+    assert install is None
+    assert price is not None
+    assert stored is False
+
+
+def test_context_and_params_are_part_of_key():
+    """无 chunk_id 时按证据文本区分；生成参数不同互不命中"""
+    cache = ResponseCache()
+
+    async def run():
+        await cache.store("怎么安装", _response(), evidence_context="壁挂安装说明", max_tokens=512, temperature=0.3)
+        return (
+            await cache.lookup("怎么安装", evidence_context="壁挂安装说明", max_tokens=512, temperature=0.3),
+            await cache.lookup("怎么安装", evidence_context="立柱安装说明", max_tokens=512, temperature=0.3),
+            await cache.lookup("怎么安装", max_tokens=512, temperature=0.3),
+            await cache.lookup("怎么安装", evidence_context="壁挂安装说明", max_tokens=128, temperature=0.3),
+            await cache.lookup("怎么安装", evidence_context="壁挂安装说明", max_tokens=512, temperature=0.9),
+        )
+
+    same, other_context, no_context, other_tokens, other_temperature = asyncio.run(run())
+
+    assert same is not None
+    assert other_context is None and no_context is None
+    assert other_tokens is None and other_temperature is None
+
+
+def test_semantic_scan_over_large_group():
+    """同组大量条目时近似匹配仍命中最相似的一条，删除条目后矩阵保持一致"""
+    rng = np.random.default_rng(0)
+    vectors = {f"问题{i}": rng.normal(size=64).tolist() for i in range(300)}
+
+    async def embedder(text):
+        return vectors[text.split("的")[0]]
+
+    cache = ResponseCache(max_entries=250, embedder=embedder)
+
+    async def run():
+        for i in range(300):
+            await cache.store(f"问题{i}", _response(f"答案{i}"), evidence_ids=["c1"])
+        cache.invalidate_chunks(["unrelated"])
+        return await cache.lookup("问题123的另一种问法", evidence_ids=["c1"])
+
+    hit = asyncio.run(run())
+
+    assert len(cache) == 250
+    group = next(iter(cache._groups.values()))
+    assert len(group) == 250
+    for key, row in group.rows.items():
+        assert np.allclose(group.matrix[row], cache._entries[key].vector)
+    assert hit.match == "semantic"
+    assert hit.response.content == "答案123"
+
+
+def test_retriever_change_listener():
+    """Retriever 添加文档时通知变更的 chunk_id"""
+    retriever = Retriever()
+    changes = []
+    retriever.add_change_listener(changes.append)
+
+    retriever.add_document("安装手册", "v1", [{"content": "先断电再安装"}])
+
+    assert changes == [["安装手册_v1_0"]]
+
+
+class CountingProvider(BaseLLMProvider):
+    """记录调用次数"""
+
+    def __init__(self, content="回复", error=None):
+        super().__init__(ProviderConfig(name="primary", api_key="k", api_base="", model="m"))
+        self.content = content
+        self.error = error
+        self.calls = 0
+
+    def generate(self, request):
+        raise AssertionError("网关不应走同步路径")
+
+    async def agenerate(self, request):
+        self.calls += 1
+        return _response(self.content, error=self.error)
+
+
+def test_gateway_serves_repeats_from_cache():
+    """重复问题第二次不调用提供商，返回零 token 的缓存响应"""
+    provider = CountingProvider("7kW")
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False, response_cache=ResponseCache())
+    gateway.providers = [provider]
+
+    async def run():
+        first = await gateway.generate("支持多少功率？", evidence_ids=["c1"], metadata={"tenant_id": "t1"})
+        second = await gateway.generate("支持多少功率", evidence_ids=["c1"], metadata={"tenant_id": "t1"})
+        with_history = await gateway.generate(
+            "支持多少功率", evidence_ids=["c1"], metadata={"tenant_id": "t1"},
+            session_history=[{"role": "user", "content": "你好"}]
+        )
+        return first, second, with_history
+
+    first, second, with_history = asyncio.run(run())
+
+    assert provider.calls == 2
+    assert second.content == first.content
+    assert second.token_total == 0
+    assert second.cache_hit["match"] == "exact"
+    assert not hasattr(with_history, "cache_hit")
+    assert gateway.get_routing_stats()["response_cache"]["exact_hits"] == 1
+
+
+def test_gateway_does_not_cache_failures():
+    """失败（桩响应）不写入缓存"""
+    provider = CountingProvider(error="timeout")
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False, response_cache=ResponseCache())
+    gateway.providers = [provider]
+
+    asyncio.run(gateway.generate("多少钱"))
+    asyncio.run(gateway.generate("多少钱"))
+
+    assert provider.calls == 2
+    assert len(gateway.response_cache) == 0
+
+
+class FakeEmbedding:
+    """固定维度的嵌入"""
+
+    async def embed_text(self, text):
+        return [float(len(text)), 1.0, 0.0, 0.0]
+
+
+def test_vector_upsert_invalidates_gateway_cache(tmp_path, monkeypatch):
+    """知识块经向量服务更新后，引用它的缓存回答失效"""
+    monkeypatch.setenv("VECTOR_BACKEND", "local")
+    monkeypatch.setenv("VECTOR_LOCAL_PATH", str(tmp_path))
+    monkeypatch.setenv("VECTOR_DIMENSION", "4")
+    vector_service = VectorSearchService()
+    vector_service.embedding_service = FakeEmbedding()
+
+    provider = CountingProvider("7kW")
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False, response_cache=ResponseCache())
+    gateway.providers = [provider]
+    gateway.watch_knowledge_source(vector_service)
+    gateway.watch_knowledge_source(vector_service)
+
+    async def ask():
+        return await gateway.generate("支持多少功率", evidence_ids=["c1"], metadata={"tenant_id": "t1"})
+
+    async def run():
+        await ask()
+        await ask()
+        assert await vector_service.add_documents([{"id": "c1", "content": "支持 11kW"}])
+        await ask()
+        await vector_service.delete_documents(["c1"])
+        await ask()
+
+    asyncio.run(run())
+
+    assert provider.calls == 3
+    assert gateway.response_cache.get_stats()["invalidations"] == 2
+    vector_service.vector_client.flush()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
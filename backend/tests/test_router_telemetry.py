@@ -0,0 +1,169 @@
+"""
+智能路由实时遥测测试
+覆盖：熔断器状态流转、EWMA/p95/错误率统计、路由降级、网关回报遥测
+"""
+import asyncio
+import time
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.ai_gateway.base import BaseLLMProvider
+from modules.ai_gateway.circuit_breaker import CircuitBreaker
+from modules.ai_gateway.gateway import AIGateway
+from modules.ai_gateway.smart_router import SmartModelRouter
+from modules.ai_gateway.telemetry import ModelTelemetry
+from modules.ai_gateway.types import LLMRequest, LLMResponse, ProviderConfig
+
+
+def test_circuit_breaker_transitions():
+    """连续失败熔断，冷却后半开放行一个探测，成功后恢复"""
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # 探测名额已占用
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.get_stats()["trips"] == 1
+
+
+def test_half_open_probe_failure_reopens():
+    """半开探测失败立即重新熔断"""
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_telemetry_snapshot():
+    """EWMA、p95、错误率、吞吐"""
+    telemetry = ModelTelemetry(ewma_alpha=0.5)
+    for latency in (1000, 2000):
+        telemetry.record("qwen-turbo", latency, success=True, token_out=100)
+    telemetry.record("qwen-turbo", 30000, success=False)
+
+    snapshot = telemetry.snapshot("qwen-turbo")
+
+    assert snapshot["ewma_latency_ms"] == 1500
+    assert snapshot["p95_latency_ms"] == 2000
+    assert snapshot["error_rate"] == pytest.approx(1 / 3, abs=1e-3)
+    assert snapshot["tokens_per_second"] == pytest.approx(200 * 1000 / 3000, abs=0.1)
+
+
+def test_router_demotes_slow_model():
+    """目标模型延迟远超画像时改选健康模型，预估延迟使用实时值"""
+    router = SmartModelRouter()
+    router.available_models = {"qwen-turbo", "qwen-plus", "deepseek"}
+    router.routing_rules = [{'rule_id': 'all', 'priority': 1, 'conditions': {},
+                             'target_model': 'qwen-turbo', 'reason': '测试'}]
+    for _ in range(5):
+        router.record_result("qwen-turbo", 8000, success=True)
+
+    routing = asyncio.run(router.route("充电桩怎么安装", context="安装指南"))
+
+    assert routing["model_key"] != "qwen-turbo"
+    assert routing["model_key"] in router.available_models
+    assert routing["demoted_from"] == "qwen-turbo"
+    assert router.get_live_table()["qwen-turbo"]["healthy"] is False
+
+
+def test_router_demotes_open_circuit_by_model_name():
+    """按模型名回报（deepseek-chat）映射到模型 key，熔断后不再被选中"""
+    router = SmartModelRouter(telemetry=ModelTelemetry(failure_threshold=2))
+    router.available_models = {"deepseek", "qwen-plus"}
+    router.routing_rules = [{'rule_id': 'all', 'priority': 1, 'conditions': {},
+                             'target_model': 'deepseek', 'reason': '测试'}]
+    router.record_result("deepseek-chat", 100, success=False)
+    router.record_result("deepseek-chat", 100, success=False)
+
+    routing = asyncio.run(router.route("充电桩故障"))
+
+    assert router.get_live_table()["deepseek"]["circuit"] == "open"
+    assert routing["model_key"] == "qwen-plus"
+
+
+class FlakyProvider(BaseLLMProvider):
+    """按给定错误返回"""
+
+    def __init__(self, model, error=None):
+        super().__init__(ProviderConfig(name="qwen", api_key="k", api_base="", model=model))
+        self.error = error
+
+    def generate(self, request):
+        raise AssertionError("网关不应走同步路径")
+
+    async def agenerate(self, request):
+        return LLMResponse(
+            content="" if self.error else "ok", provider="qwen", model=self.config.model,
+            token_in=1, token_out=10, token_total=11, latency_ms=1, error=self.error
+        )
+
+
+def test_gateway_reports_telemetry():
+    """网关每次调用后向路由器回报结果"""
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False)
+    gateway.router = SmartModelRouter()
+    gateway.providers = [FlakyProvider("qwen-plus", error="timeout"), FlakyProvider("qwen-turbo")]
+
+    asyncio.run(gateway.generate("充电桩故障"))
+    table = gateway.get_live_model_table()
+
+    assert table["qwen-plus"]["total_errors"] == 1
+    assert table["qwen-turbo"]["total_calls"] == 1
+    assert table["qwen-turbo"]["error_rate"] == 0.0
+
+
+def test_gateway_and_router_share_model_breaker():
+    """网关与路由使用同一个模型熔断器：网关侧失败熔断后路由也不再选中该模型"""
+    gateway = AIGateway(enable_fallback=False, breaker_failure_threshold=2)
+    gateway.router.available_models = {"qwen-plus", "qwen-turbo"}
+    flaky = FlakyProvider("qwen-plus", error="timeout")
+
+    for _ in range(2):
+        assert asyncio.run(gateway._call_provider(flaky, LLMRequest(user_message="你好"))) is None
+
+    breaker, _ = gateway._get_provider_guard(flaky)
+    assert breaker is gateway.router.get_breaker("qwen-plus")
+    assert breaker.is_open()
+    assert gateway.get_live_model_table()["qwen-plus"]["circuit"] == "open"
+    assert gateway.router.get_live_table()["qwen-plus"]["healthy"] is False
+
+
+
+def test_models_health_route(monkeypatch):
+    """GET /api/v1/health/models 返回网关的实时遥测表"""
+    pytest.importorskip("fastapi")
+    pytest.importorskip("psutil")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from modules.ai_gateway import gateway as gateway_module
+    from modules.api.health import router
+
+    gateway = AIGateway(enable_smart_routing=False, enable_fallback=False)
+    gateway.router = SmartModelRouter()
+    gateway.providers = [FlakyProvider("qwen-turbo")]
+    asyncio.run(gateway.generate("充电桩故障"))
+    monkeypatch.setattr(gateway_module, "_ai_gateway", gateway)
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1/health")
+    response = TestClient(app).get("/api/v1/health/models")
+
+    assert response.status_code == 200
+    assert response.json()["models"]["qwen-turbo"]["total_calls"] == 1
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,113 @@
+"""
+首轮投机应答测试
+覆盖：高置信度直接返回、临界置信度 LLM 超时返回模板并后台对比、LLM 按时返回、低置信度走 LLM
+"""
+import asyncio
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.ai_gateway.first_turn_router import FirstTurnRouter
+from modules.ai_gateway.speculative import SpeculativeResponder
+from modules.ai_gateway.types import LLMResponse
+from modules.rag.retriever import Evidence
+
+
+EVIDENCES = [
+    Evidence(chunk_id="c1", document_name="安装手册", document_version="v1", section="3.2 壁挂安装",
+             content="壁挂安装需要承重墙，预留 16A 专用回路。", score=0.9),
+    Evidence(chunk_id="c2", document_name="FAQ", document_version="v1", section="",
+             content="安装前请确认电表容量。", score=0.8),
+]
+
+
+class FakeGateway:
+    """按设定延迟返回的网关"""
+
+    def __init__(self, delay=0.0, content="壁挂安装需要承重墙和 16A 专用回路。"):
+        self.delay = delay
+        self.content = content
+        self.calls = []
+
+    async def generate(self, message, evidence_context=None, metadata=None, evidence_ids=None):
+        self.calls.append((message, evidence_context, evidence_ids))
+        await asyncio.sleep(self.delay)
+        return LLMResponse(content=self.content, provider="qwen", model="qwen-turbo",
+                           token_in=10, token_out=10, token_total=20, latency_ms=int(self.delay * 1000))
+
+
+def test_template_assembly_cites_top_evidence():
+    """模板答案引用最相关证据并标注出处"""
+    template = FirstTurnRouter().assemble_template(EVIDENCES)
+
+    assert template.startswith("壁挂安装需要承重墙")
+    assert "《安装手册》 3.2 壁挂安装" in template
+    assert FirstTurnRouter().assemble_template([]) is None
+
+
+def test_high_confidence_answers_without_llm():
+    """高置信度直接返回规则/模板答案，不调用 LLM"""
+    gateway = FakeGateway()
+    responder = SpeculativeResponder(gateway)
+
+    greeting = asyncio.run(responder.respond("你好"))
+    template = asyncio.run(responder.respond("壁挂怎么安装", EVIDENCES, kb_confidence=0.97))
+
+    assert greeting.source == "rule_engine"
+    assert template.source == "template_assembly"
+    assert "承重墙" in template.content
+    assert gateway.calls == []
+
+
+def test_borderline_returns_template_when_llm_misses_slo():
+    """临界置信度：LLM 超过 SLO 时先返回模板，LLM 完成后记录对比"""
+    gateway = FakeGateway(delay=0.1)
+    compared = []
+    responder = SpeculativeResponder(gateway, latency_slo_ms=20, on_compare=compared.append)
+
+    async def run():
+        answer = await responder.respond("壁挂怎么安装", EVIDENCES, kb_confidence=0.9)
+        pending = responder.get_stats()["pending_background"]
+        await responder.drain()
+        return answer, pending
+
+    answer, pending = asyncio.run(run())
+
+    assert answer.source == "template_fallback"
+    assert answer.latency_ms < 100
+    assert pending == 1
+    assert compared[0]["served"] == "template"
+    assert compared[0]["llm"] == gateway.content
+    assert 0 < compared[0]["similarity"] <= 1
+    assert gateway.calls[0][2] == ["c1", "c2"]
+    assert responder.get_stats()["template_fallback"] == 1
+
+
+def test_borderline_uses_llm_within_slo():
+    """临界置信度：LLM 在 SLO 内返回则使用 LLM 答案"""
+    gateway = FakeGateway(delay=0)
+    responder = SpeculativeResponder(gateway, latency_slo_ms=500)
+
+    answer = asyncio.run(responder.respond("壁挂怎么安装", EVIDENCES, kb_confidence=0.9))
+
+    assert answer.source == "llm"
+    assert answer.content == gateway.content
+    assert responder.comparisons[0]["served"] == "llm"
+
+
+def test_low_confidence_waits_for_llm():
+    """低于投机阈值时只走 LLM（不受 SLO 限制）"""
+    gateway = FakeGateway(delay=0.05)
+    responder = SpeculativeResponder(gateway, latency_slo_ms=10)
+
+    answer = asyncio.run(responder.respond("壁挂怎么安装", EVIDENCES, kb_confidence=0.8))
+
+    assert answer.source == "llm"
+    assert answer.decision.speculative_response is None
+    assert responder.get_stats()["llm"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
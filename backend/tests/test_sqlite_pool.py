@@ -0,0 +1,113 @@
+"""
+SQLite 连接管理单元测试
+覆盖：WAL/PRAGMA、线程级连接复用、表结构只建一次、事务回滚、关闭后重开
+"""
+import gc
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.storage.sqlite_pool import SQLiteConnectionManager, get_sqlite_manager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """临时数据库的连接管理器"""
+    manager = SQLiteConnectionManager(str(tmp_path / "data" / "test.db"))
+    manager.ensure_schema()
+    yield manager
+    manager.close_all()
+
+
+def test_pragmas(manager):
+    """连接使用 WAL 与调优的 PRAGMA"""
+    conn = manager.connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA cache_size").fetchone()[0] == -manager.cache_size_kb
+
+
+def test_connection_reused_per_thread(manager):
+    """同一线程复用连接，不同线程各自一条，线程退出后其连接被关闭"""
+    assert manager.connection() is manager.connection()
+
+    other = []
+    started, release = threading.Event(), threading.Event()
+
+    def worker():
+        other.append(manager.connection())
+        started.set()
+        release.wait()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    started.wait()
+
+    assert other[0] is not manager.connection()
+    assert manager.get_stats()["open_connections"] == 2
+
+    release.set()
+    thread.join()
+    gc.collect()
+
+    assert manager.get_stats()["open_connections"] == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        other[0].execute("SELECT 1")
+
+
+def test_schema_created_once(manager):
+    """表与去重索引在启动时建立"""
+    conn = manager.connection()
+    names = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert {"sessions", "messages", "idx_messages_hash_received"} <= names
+    assert "rate_limits" not in names
+
+    conn.execute("DROP INDEX idx_messages_hash_received")
+    manager.ensure_schema()
+    names = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert "idx_messages_hash_received" not in names
+
+
+def test_transaction_rollback(manager):
+    """事务内异常回滚"""
+    with pytest.raises(RuntimeError):
+        with manager.transaction() as conn:
+            conn.execute(
+                "INSERT INTO messages (request_id, group_id, sender_id, user_message) VALUES (?, ?, ?, ?)",
+                ("r1", "g", "u", "hi")
+            )
+            raise RuntimeError("boom")
+
+    with manager.transaction() as conn:
+        conn.execute(
+            "INSERT INTO messages (request_id, group_id, sender_id, user_message) VALUES (?, ?, ?, ?)",
+            ("r2", "g", "u", "hi")
+        )
+
+    rows = manager.connection().execute("SELECT request_id FROM messages").fetchall()
+    assert [row["request_id"] for row in rows] == ["r2"]
+
+
+def test_close_all_reopens(manager):
+    """关闭后再次访问重新打开连接"""
+    first = manager.connection()
+    manager.close_all()
+
+    second = manager.connection()
+    assert second is not first
+    assert second.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 0
+
+
+def test_shared_manager_per_path(tmp_path):
+    """同一文件共享连接管理器"""
+    path = str(tmp_path / "shared.db")
+    assert get_sqlite_manager(path) is get_sqlite_manager(path)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
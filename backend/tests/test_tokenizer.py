@@ -0,0 +1,91 @@
+"""
+中文分词器测试
+覆盖：n-gram 切分、词典匹配、关键词提取、缓存与批量接口
+"""
+import pytest
+from pathlib import Path
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.nlp.tokenizer import Tokenizer
+
+
+@pytest.fixture
+def tokenizer():
+    """分词器 fixture"""
+    return Tokenizer(dictionary=["EXW", "报警码"])
+
+
+def test_tokenize_chinese_ngrams(tokenizer):
+    """测试中文串输出 bigram/trigram，并按停用词断开"""
+    tokens = tokenizer.tokenize("设备的安装")
+    
+    assert "设备" in tokens
+    assert "安装" in tokens
+    # 停用词不参与 n-gram
+    assert "备的" not in tokens
+    assert "的安" not in tokens
+
+
+def test_tokenize_keeps_content_morphemes(tokenizer):
+    """测试只按助词断开：会员、需要、到货、功能、个人等词不被切碎"""
+    tokens = tokenizer.tokenize("会员需要的功能到货了吗个人")
+    
+    for word in ["会员", "需要", "功能", "到货", "个人"]:
+        assert word in tokens
+    assert "要的" not in tokens
+
+
+def test_tokenize_mixed_text(tokenizer):
+    """测试中英混合文本与全角字符"""
+    tokens = tokenizer.tokenize("请问３２０ＫＷ充电桩报价？")
+    
+    assert "320kw" in tokens
+    assert "充电桩" in tokens
+    assert "报价" in tokens
+
+
+def test_term_counts_dictionary(tokenizer):
+    """测试词典词计数（大小写不敏感）"""
+    counts = tokenizer.term_counts("EXW价格，exw报价，报警码E103")
+    
+    assert counts["exw"] == 2
+    assert counts["报警码"] == 1
+    assert "故障" not in counts
+
+
+def test_keywords_overlap(tokenizer):
+    """测试关键词提取可用于主题重合度计算"""
+    k1 = tokenizer.keywords("充电桩支持多少功率？")
+    k2 = tokenizer.keywords("这个充电桩的功率是多少")
+    
+    assert "充电桩" in k1 and "功率" in k1
+    assert len(k1 & k2) >= 3
+
+
+def test_cache_and_batch(tokenizer):
+    """测试 LRU 缓存与批量接口"""
+    texts = ["如何安装设备", "如何安装设备", "故障怎么处理"]
+    batch = tokenizer.tokenize_batch(texts)
+    
+    assert batch[0] == batch[1]
+    assert batch[2] == tokenizer.tokenize("故障怎么处理")
+    assert tokenizer.cache_info().hits >= 2
+    
+    # 返回值是副本，修改不影响缓存
+    batch[0].append("x")
+    assert "x" not in tokenizer.tokenize("如何安装设备")
+
+
+def test_add_words_invalidates_cache(tokenizer):
+    """测试添加词典词后缓存失效"""
+    assert "快充模块" not in tokenizer.term_counts("更换快充模块")
+    
+    tokenizer.add_words(["快充模块"])
+    
+    assert tokenizer.term_counts("更换快充模块") == {"快充模块": 1}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
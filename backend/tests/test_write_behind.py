@@ -0,0 +1,132 @@
+"""
+消息日志后写队列单元测试
+覆盖：批量落盘、更新合并、读己之写、背压、退出落盘、坏数据隔离
+"""
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.storage.db import MessageLog
+from modules.storage.sqlite_pool import SQLiteConnectionManager
+from modules.storage.write_behind import MessageWriteBehind
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """临时数据库的连接管理器"""
+    manager = SQLiteConnectionManager(str(tmp_path / "test.db"))
+    manager.ensure_schema()
+    yield manager
+    manager.close_all()
+
+
+def make_msg(request_id: str, text: str = "如何安装设备？") -> MessageLog:
+    return MessageLog(request_id=request_id, group_id="g1", sender_id="u1", user_message=text)
+
+
+def count_rows(manager) -> int:
+    return manager.connection().execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+
+def test_batched_flush(manager):
+    """攒够 max_batch 行后一次落盘"""
+    writer = MessageWriteBehind(manager, flush_interval_ms=10000, max_batch=20)
+    for i in range(20):
+        writer.enqueue_insert(make_msg(f"r{i}"))
+
+    deadline = time.time() + 2
+    while count_rows(manager) < 20 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert count_rows(manager) == 20
+    assert writer.get_stats()["flushes"] == 1
+    writer.close()
+
+
+def test_updates_coalesced(manager):
+    """同一 request_id 的更新在落盘前合并"""
+    writer = MessageWriteBehind(manager, flush_interval_ms=10000)
+    writer.enqueue_insert(make_msg("r1"))
+    writer.enqueue_update("r1", status="processing")
+    writer.enqueue_update("r1", status="answered", bot_response="答案")
+    writer.flush()
+
+    writer.enqueue_update("r1", token_in=10)
+    writer.enqueue_update("r1", token_out=20)
+    assert writer.get_stats()["pending"] == 1
+    writer.flush()
+
+    row = manager.connection().execute("SELECT * FROM messages WHERE request_id = 'r1'").fetchone()
+    assert row["status"] == "answered"
+    assert row["bot_response"] == "答案"
+    assert (row["token_in"], row["token_out"]) == (10, 20)
+    assert writer.get_stats()["coalesced"] == 3
+    writer.close()
+
+
+def test_pending_visible(manager):
+    """未落盘的插入与更新对读可见"""
+    writer = MessageWriteBehind(manager, flush_interval_ms=10000)
+    writer.enqueue_insert(make_msg("r1"))
+    writer.enqueue_update("r1", status="answered")
+
+    pending, updates = writer.pending_message("r1")
+    assert pending["status"] == "answered"
+    assert updates == {}
+    assert [m.request_id for m in writer.pending_messages()] == ["r1"]
+    assert count_rows(manager) == 0
+    writer.close()
+
+
+def test_close_flushes(manager):
+    """关闭时落盘剩余记录"""
+    writer = MessageWriteBehind(manager, flush_interval_ms=10000)
+    for i in range(5):
+        writer.enqueue_insert(make_msg(f"r{i}"))
+    writer.close()
+
+    assert count_rows(manager) == 5
+
+
+def test_backpressure(manager):
+    """缓冲满且后台未及时落盘时，写入方同步落盘"""
+    writer = MessageWriteBehind(manager, flush_interval_ms=10000, max_batch=1000,
+                                max_pending=3, block_timeout=0.05)
+    # 占住落盘锁，模拟后台落盘缓慢
+    writer._flush_lock.acquire()
+    threading.Timer(0.2, writer._flush_lock.release).start()
+
+    for i in range(4):
+        writer.enqueue_insert(make_msg(f"r{i}"))
+
+    assert writer.get_stats()["backpressure"] == 1
+    assert count_rows(manager) >= 3
+    writer.close()
+    assert count_rows(manager) == 4
+
+
+def test_bad_row_isolated(manager):
+    """批量失败时逐行重试，坏数据不影响其他记录"""
+    with manager.transaction() as conn:
+        conn.execute(
+            "INSERT INTO messages (request_id, group_id, sender_id, user_message) VALUES ('dup', 'g', 'u', 'x')"
+        )
+
+    writer = MessageWriteBehind(manager, flush_interval_ms=10000)
+    writer.enqueue_insert(make_msg("r1"))
+    writer.enqueue_insert(make_msg("dup"))
+    writer.enqueue_insert(make_msg("r2"))
+
+    assert writer.flush() == 2
+    assert writer.get_stats()["failed"] == 1
+    assert count_rows(manager) == 3
+    writer.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])